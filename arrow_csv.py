@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+PyArrow CSV 解析引擎
+以 pyarrow.csv 多執行緒解析 CSV，直接略過第二行的英文欄位名稱，欄位型別依資料表定義指定
+（數值欄位為 float64、其他為 string），清理也以 pyarrow.compute 向量化處理；
+回傳的 DataFrame 每個欄位都是 pd.ArrowDtype，字串不會轉成一個個 Python str 物件，
+直到寫入資料庫組成參數列時才轉為 Python 值
+
+數值欄位含有非數字字元（例如千分位逗號）時，改以字串讀取後依 clean_data 相同的規則清理
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.compute as pc
+
+logger = logging.getLogger(__name__)
+
+# 與 EnhancedDataImporter.clean_data 相同：數值欄位只保留數字、小數點與負號
+NON_NUMERIC_PATTERN = r'[^\d.-]'
+NUMBER_PATTERN = r'^-?(\d+\.?\d*|\.\d+)$'
+
+
+def read_csv(source, encoding: str, numeric_columns: List[str], string_columns: List[str],
+             typed_numeric: bool = True, skip_english_header: bool = True) -> pd.DataFrame:
+    """
+    以 pyarrow 讀取 CSV（第一行為欄位名稱）
+
+    Args:
+        source: 檔案路徑或檔案物件（例如 csv_splitter 切出的位元組範圍）
+        typed_numeric: True 時數值欄位直接解析為 float64；False 時以字串讀取（由 clean_frame 清理）
+        skip_english_header: 是否略過第二行英文欄位名稱
+    """
+    column_types = {name: pa.string() for name in string_columns}
+    numeric_type = pa.float64() if typed_numeric else pa.string()
+    column_types.update({name: numeric_type for name in numeric_columns})
+
+    table = pa_csv.read_csv(
+        source,
+        read_options=pa_csv.ReadOptions(encoding=encoding, skip_rows_after_names=1 if skip_english_header else 0,
+                                        use_threads=True),
+        parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+        convert_options=pa_csv.ConvertOptions(column_types=column_types, strings_can_be_null=True)
+    )
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+
+def read_csv_file(content, numeric_columns: List[str], string_columns: List[str]) -> Optional[pd.DataFrame]:
+    """
+    以 file_access 判斷出的編碼讀取同一個記憶體對應；數值欄位無法直接解析時改以字串讀取
+
+    Args:
+        content: file_access.CsvFile（已完成掃描）
+    """
+    for typed_numeric in (True, False):
+        try:
+            df = read_csv(content.reader(), content.encoding, numeric_columns, string_columns, typed_numeric)
+            logger.info(f"✅ 成功讀取 {content.file_path} (編碼: {content.encoding}, 引擎: arrow)")
+            return df
+        except pa.ArrowInvalid as e:
+            if typed_numeric and 'conversion error to double' in str(e).lower():
+                logger.info(f"ℹ️ {content.file_path} 數值欄位含非數字字元，改以字串讀取後清理")
+                continue
+            logger.error(f"❌ 無法讀取 {content.file_path}: {str(e)}")
+            break
+    return None
+
+
+def is_arrow_frame(df: pd.DataFrame) -> bool:
+    """DataFrame 是否所有欄位都是 pd.ArrowDtype"""
+    return len(df.columns) > 0 and all(isinstance(dtype, pd.ArrowDtype) for dtype in df.dtypes)
+
+
+def clean_numeric(values: pa.Array) -> pa.Array:
+    """數值欄位清理（已是數值時不處理；字串時移除非數值字元，無法轉換的設為 null）"""
+    if pa.types.is_floating(values.type) or pa.types.is_integer(values.type):
+        return pc.cast(values, pa.float64())
+    values = pc.replace_substring_regex(pc.cast(values, pa.string()), NON_NUMERIC_PATTERN, '')
+    valid = pc.match_substring_regex(values, NUMBER_PATTERN)
+    return pc.cast(pc.if_else(valid, values, pa.scalar(None, pa.string())), pa.float64())
+
+
+def clean_string(values: pa.Array) -> pa.Array:
+    """字串欄位清理（空值轉為空字串、換行轉為空白、去除前後空白、'nan' 轉為空字串）"""
+    values = pc.fill_null(values, '')
+    values = pc.replace_substring(values, '\r\n', ' ')
+    values = pc.replace_substring(values, '\n', ' ')
+    values = pc.utf8_trim_whitespace(values)
+    return pc.if_else(pc.equal(values, 'nan'), '', values)
+
+
+def clean_frame(df: pd.DataFrame, numeric_columns: List[str]) -> pd.DataFrame:
+    """
+    與 EnhancedDataImporter.clean_data 相同的清理規則，全程維持 Arrow 欄位
+    pyarrow.compute 執行時釋放 GIL，各欄位以執行緒平行清理
+    """
+    df = df.dropna(how='all')
+    numeric_set = set(numeric_columns)
+
+    def clean_column(column: str) -> pa.Array:
+        values = pa.array(df[column].array)
+        if column in numeric_set:
+            return clean_numeric(values)
+        if pa.types.is_string(values.type) or pa.types.is_large_string(values.type):
+            return clean_string(values)
+        return values
+
+    with ThreadPoolExecutor(max_workers=pa.cpu_count()) as executor:
+        cleaned = list(executor.map(clean_column, df.columns))
+    return pd.DataFrame({column: pd.Series(pd.arrays.ArrowExtensionArray(values), index=df.index)
+                         for column, values in zip(df.columns, cleaned)}, index=df.index)
@@ -0,0 +1,394 @@
+# -*- coding: utf-8 -*-
+"""
+asyncio 匯入協調器
+import_new_folders 與 ParallelBatchImporter 以一個執行緒處理一個檔案（解析、清理、寫入都在同一個執行緒），
+同時進行的檔案數等於執行緒數，而執行緒大部分時間在等待 SQL Server 的網路往返。
+此模組改以 asyncio 協調，每個檔案是一個協程：
+    - CPU 工作（讀取、清理、計算檔案統計）交給程序池（ASYNC_PARSE_WORKERS 個子程序，EnhancedDataImporter.prepare_file）；
+      子程序由主程序取得資料表欄位（含欄位漂移檢查加入的欄位），清理結果與 csv_splitter 相同以共享記憶體傳回
+      （CSV_SPLIT_TRANSPORT，shm_transport），不經程序池的 pickle
+    - 資料庫寫入交給專用的寫入執行緒池（pyodbc 沒有非同步介面，以 run_in_executor 橋接；
+      執行緒數即同時使用的連線數，EnhancedDataImporter.write_prepared_file）
+    - 同時進行中的檔案最多 ASYNC_MAX_IN_FLIGHT 個：數百個小檔案（_park / _land 多為數百筆）可同時在佇列中，
+      等待中的檔案只是協程，不佔用執行緒，也還沒有解析結果
+    - 解析中與已解析、尚未寫入完成的檔案最多 ASYNC_MAX_PARSED 個（預設為寫入連線數的 2 倍）：
+      解析結果是整個檔案的 DataFrame，寫入較慢時不會在記憶體中累積數百個等待寫入的 DataFrame
+超過 CSV_SPLIT_THRESHOLD_MB 的檔案在寫入執行緒中以 import_single_file 匯入（由 csv_splitter 自行以子程序平行解析）
+
+執行中每 ASYNC_REPORT_SECONDS 秒記錄一次進行中的檔案數與各階段佇列長度，
+結束時回報同時進行中的檔案數（最大 / 時間加權平均）與各階段的佇列等待時間、執行時間
+
+用法:
+    result = AsyncImporter(db_writers=8).run([(file_path, folder), ...])
+    result['results']   與 import_new_folders.import_single_file_worker 相同格式的結果列表
+    result['metrics']   ImportMetrics.summary()
+"""
+
+import os
+import time
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from config import MAX_WORKERS
+import csv_splitter
+import shm_transport
+import zip_source
+
+try:
+    from config import ASYNC_MAX_IN_FLIGHT
+except ImportError:
+    ASYNC_MAX_IN_FLIGHT = 256
+
+try:
+    from config import ASYNC_MAX_PARSED
+except ImportError:
+    ASYNC_MAX_PARSED = None
+
+try:
+    from config import ASYNC_PARSE_WORKERS
+except ImportError:
+    ASYNC_PARSE_WORKERS = None
+
+try:
+    from config import ASYNC_REPORT_SECONDS
+except ImportError:
+    ASYNC_REPORT_SECONDS = 10
+
+logger = logging.getLogger(__name__)
+
+STAGES = ('admission', 'parse_slot', 'parse', 'write', 'direct')
+STAGE_NAMES = {'admission': '等待進入', 'parse_slot': '等待解析名額', 'parse': '解析清理', 'write': '資料庫寫入',
+               'direct': '大型檔案匯入'}
+# 只有等待時間、沒有執行時間的階段（取得名額）
+SLOT_STAGES = ('admission', 'parse_slot')
+
+# 子程序中重複使用的匯入器（只用於解析與清理，不連線資料庫）
+_worker_importers = {}
+
+
+def _prepare_in_worker(file_path: str, csv_engine: str, numeric_columns: Optional[List[str]],
+                       string_columns: Optional[List[str]], shared_name: Optional[str]) -> Tuple[float, float, Optional[Tuple]]:
+    """
+    子程序：讀取、清理並計算檔案統計，回傳 (開始時間, 結束時間, (清理後的 DataFrame 或寫入共享記憶體的位元組數, 檔案統計))
+    指定共享記憶體名稱時資料以 Arrow IPC 寫入共享記憶體；超過配置大小時仍傳回 DataFrame
+    """
+    started_at = time.time()
+    importer = _worker_importers.get(csv_engine)
+    if importer is None:
+        from enhanced_data_importer import EnhancedDataImporter
+        importer = EnhancedDataImporter(csv_engine=csv_engine, split_large_files=False)
+        _worker_importers[csv_engine] = importer
+    prepared = importer.prepare_file(file_path, numeric_columns, string_columns)
+    if prepared is not None and shared_name is not None:
+        import shm_transport
+        df, file_stats = prepared
+        written = shm_transport.write_frame(shared_name, df)
+        if written is not None:
+            prepared = (written, file_stats)
+    return started_at, time.time(), prepared
+
+
+def _timed(func: Callable, *args) -> Tuple[float, float, object]:
+    """寫入執行緒：執行 func 並回傳 (開始時間, 結束時間, 結果)"""
+    started_at = time.time()
+    result = func(*args)
+    return started_at, time.time(), result
+
+
+def _import_directly(file_path: str, quarter: str, csv_engine: str) -> Tuple[bool, int]:
+    """寫入執行緒：以獨立的匯入器匯入單一檔案（大型檔案），回傳 (是否成功, 筆數)"""
+    from enhanced_data_importer import EnhancedDataImporter
+
+    importer = EnhancedDataImporter(csv_engine=csv_engine)
+    success = importer.import_single_file(file_path, quarter)
+    return success, importer.last_file_stats['rows'] if importer.last_file_stats else 0
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    """已排序列表的百分位數（最接近的排名）"""
+    if not values:
+        return 0.0
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+class StageMetrics:
+    """
+    單一階段的佇列等待與執行時間（秒），以及同時在此階段（排隊中 + 執行中）的工作數
+    子程序與執行緒回報實際開始時間，等待時間 = 開始時間 - 送出時間
+    """
+
+    def __init__(self):
+        self.waits: List[float] = []
+        self.durations: List[float] = []
+        self.active = 0
+        self.peak = 0
+
+    def submitted(self):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+
+    def completed(self, wait: float, duration: float):
+        self.active -= 1
+        self.waits.append(max(wait, 0.0))
+        self.durations.append(max(duration, 0.0))
+
+    def abandoned(self):
+        """工作以例外結束（沒有開始與結束時間）"""
+        self.active -= 1
+
+    def summary(self) -> Dict:
+        waits = sorted(self.waits)
+        durations = sorted(self.durations)
+        return {
+            'count': len(waits),
+            'peak': self.peak,
+            'wait_avg': sum(waits) / len(waits) if waits else 0.0,
+            'wait_p50': _percentile(waits, 0.5),
+            'wait_p95': _percentile(waits, 0.95),
+            'wait_max': waits[-1] if waits else 0.0,
+            'run_avg': sum(durations) / len(durations) if durations else 0.0,
+            'run_max': durations[-1] if durations else 0.0
+        }
+
+
+class ImportMetrics:
+    """
+    協調器的執行統計（只在事件迴圈的執行緒中更新，不需要鎖）
+    進行中 = 已進入（取得 ASYNC_MAX_IN_FLIGHT 名額）但尚未完成的檔案
+    """
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.stages = {stage: StageMetrics() for stage in STAGES}
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.completed = 0
+        self._area = 0.0
+        self._last_change = self.started_at
+
+    def _account(self):
+        now = time.perf_counter()
+        self._area += self.in_flight * (now - self._last_change)
+        self._last_change = now
+
+    def enter(self):
+        self._account()
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def leave(self):
+        self._account()
+        self.in_flight -= 1
+        self.completed += 1
+
+    def summary(self) -> Dict:
+        self._account()
+        elapsed = self._last_change - self.started_at
+        return {
+            'elapsed': elapsed,
+            'completed': self.completed,
+            'peak_in_flight': self.peak_in_flight,
+            'avg_in_flight': self._area / elapsed if elapsed > 0 else 0.0,
+            'stages': {stage: metrics.summary() for stage, metrics in self.stages.items()}
+        }
+
+    def progress_line(self) -> str:
+        """執行中的狀態（定期記錄）"""
+        return (f"⏱️ 進行中 {self.in_flight} 個檔案（已完成 {self.completed}，"
+                f"等待進入 {self.stages['admission'].active}）｜"
+                f"等待解析名額 {self.stages['parse_slot'].active}｜"
+                f"解析中 {self.stages['parse'].active}｜"
+                f"寫入中 {self.stages['write'].active + self.stages['direct'].active}（含排隊）")
+
+    def log_summary(self):
+        summary = self.summary()
+        logger.info(f"📈 協調器統計: {summary['completed']} 個檔案，耗時 {summary['elapsed']:.1f}s，"
+                    f"同時進行中 最大 {summary['peak_in_flight']} / 平均 {summary['avg_in_flight']:.1f}")
+        for stage, stats in summary['stages'].items():
+            if not stats['count']:
+                continue
+            line = (f"   {STAGE_NAMES[stage]}: {stats['count']} 次，同時最多 {stats['peak']}，"
+                    f"佇列等待 平均 {stats['wait_avg']:.2f}s / p50 {stats['wait_p50']:.2f}s / "
+                    f"p95 {stats['wait_p95']:.2f}s / 最大 {stats['wait_max']:.2f}s")
+            if stage not in SLOT_STAGES:
+                line += f"，執行 平均 {stats['run_avg']:.2f}s / 最大 {stats['run_max']:.2f}s"
+            logger.info(line)
+
+
+class AsyncImporter:
+    """asyncio 匯入協調器"""
+
+    def __init__(self, db_writers: int = None, parse_workers: int = None, max_in_flight: int = None,
+                 max_parsed: int = None, csv_engine: str = None):
+        """
+        Args:
+            db_writers: 寫入執行緒數（同時使用的資料庫連線數，預設為 MAX_WORKERS）
+            parse_workers: 解析子程序數（預設為 ASYNC_PARSE_WORKERS，None 為 CPU 核心數）
+            max_in_flight: 同時進行中的檔案數上限（預設為 ASYNC_MAX_IN_FLIGHT）
+            max_parsed: 解析中與已解析、尚未寫入完成的檔案數上限（預設為 ASYNC_MAX_PARSED，None 為 db_writers 的 2 倍）
+            csv_engine: CSV 解析引擎（預設使用 config.py 中的 CSV_ENGINE）
+        """
+        from enhanced_data_importer import EnhancedDataImporter
+
+        self.db_writers = db_writers or MAX_WORKERS
+        self.parse_workers = parse_workers or ASYNC_PARSE_WORKERS or os.cpu_count() or 1
+        self.max_in_flight = max_in_flight or ASYNC_MAX_IN_FLIGHT
+        self.max_parsed = max_parsed or ASYNC_MAX_PARSED or self.db_writers * 2
+        # 寫入階段共用的匯入器（write_prepared_file 不修改匯入器狀態，每次寫入各自建立連線）
+        self.writer = EnhancedDataImporter(csv_engine=csv_engine)
+        self.csv_engine = self.writer.csv_engine
+        self.use_shared_memory = csv_splitter.CSV_SPLIT_TRANSPORT == 'shared_memory'
+        self.metrics = ImportMetrics()
+
+    def run(self, files: List[Tuple[str, str]], on_result: Callable[[Dict], None] = None) -> Dict:
+        """
+        匯入所有檔案（在新的事件迴圈中執行，呼叫端維持同步介面）
+
+        Args:
+            files: [(檔案路徑, 資料夾或壓縮檔), ...]
+            on_result: 每個檔案完成時呼叫（在事件迴圈的執行緒中，可用於更新進度條）
+
+        Returns:
+            {'results': [各檔案結果], 'metrics': ImportMetrics.summary()}
+        """
+        return asyncio.run(self.import_files(files, on_result))
+
+    async def import_files(self, files: List[Tuple[str, str]], on_result: Callable[[Dict], None] = None) -> Dict:
+        """以協程匯入所有檔案"""
+        self.metrics = ImportMetrics()
+        logger.info(f"🚀 asyncio 協調器: {len(files)} 個檔案，同時進行最多 {self.max_in_flight} 個，"
+                    f"解析中或待寫入最多 {self.max_parsed} 個，"
+                    f"解析子程序 {self.parse_workers} 個，寫入連線 {self.db_writers} 條")
+
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+        parse_slots = asyncio.Semaphore(self.max_parsed)
+        if self.use_shared_memory:
+            shm_transport.start_tracker()
+        parse_pool = ProcessPoolExecutor(max_workers=self.parse_workers)
+        write_pool = ThreadPoolExecutor(max_workers=self.db_writers, thread_name_prefix='lvr-db-writer')
+        reporter = asyncio.create_task(self._report_progress())
+        try:
+            # 先啟動解析子程序（fork 時寫入執行緒尚未建立，子程序不會繼承執行中的資料庫連線）
+            await asyncio.get_running_loop().run_in_executor(parse_pool, os.getpid)
+            tasks = [
+                asyncio.create_task(self._import_file(file_path, folder, semaphore, parse_slots, parse_pool,
+                                                      write_pool, on_result))
+                for file_path, folder in files
+            ]
+            results = await asyncio.gather(*tasks)
+        finally:
+            reporter.cancel()
+            parse_pool.shutdown(wait=True, cancel_futures=True)
+            write_pool.shutdown(wait=True)
+
+        self.metrics.log_summary()
+        return {'results': results, 'metrics': self.metrics.summary()}
+
+    async def _report_progress(self):
+        """定期記錄進行中的檔案數與佇列長度"""
+        while True:
+            await asyncio.sleep(ASYNC_REPORT_SECONDS)
+            logger.info(self.metrics.progress_line())
+
+    async def _run_stage(self, stage: str, executor, func: Callable, *args):
+        """於執行器中執行一個階段並記錄佇列等待與執行時間，回傳 func 的結果"""
+        loop = asyncio.get_running_loop()
+        metrics = self.metrics.stages[stage]
+        submitted_at = time.time()
+        metrics.submitted()
+        try:
+            if isinstance(executor, ProcessPoolExecutor):
+                started_at, finished_at, result = await loop.run_in_executor(executor, func, *args)
+            else:
+                started_at, finished_at, result = await loop.run_in_executor(executor, _timed, func, *args)
+        except BaseException:
+            metrics.abandoned()
+            raise
+        metrics.completed(started_at - submitted_at, finished_at - started_at)
+        return result
+
+    async def _parse_and_write(self, file_path: str, quarter: str, parse_slots: asyncio.Semaphore,
+                               parse_pool: ProcessPoolExecutor,
+                               write_pool: ThreadPoolExecutor) -> Tuple[bool, int, Optional[str]]:
+        """取得解析名額後解析並寫入，回傳 (是否成功, 筆數, 錯誤說明)；解析結果只在持有名額期間存在"""
+        # 主程序的資料表定義（欄位漂移檢查加入的欄位只存在於本程序的 schema_registry）
+        schema = self.writer.schema_registry.get_schema_for_file(os.path.basename(file_path))
+        numeric_columns = list(schema.numeric_columns) if schema else None
+        string_columns = list(schema.string_columns) if schema else None
+
+        metrics = self.metrics.stages['parse_slot']
+        queued_at = time.time()
+        metrics.submitted()
+        async with parse_slots:
+            metrics.completed(time.time() - queued_at, 0.0)
+            shared = None
+            if self.use_shared_memory:
+                shared = shm_transport.SharedSlot(max(zip_source.file_size(file_path) * csv_splitter.SHARED_MEMORY_FACTOR,
+                                                      csv_splitter.SHARED_MEMORY_MIN_BYTES))
+            try:
+                prepared = await self._run_stage('parse', parse_pool, _prepare_in_worker, file_path, self.csv_engine,
+                                                 numeric_columns, string_columns, shared.name if shared else None)
+                if prepared is None:
+                    return False, 0, '讀取或清理失敗'
+                payload, file_stats = prepared
+                df = payload
+                if not isinstance(payload, pd.DataFrame):
+                    df = shared.read_frame(payload, arrow_dtypes=self.csv_engine == 'arrow')
+            finally:
+                if shared is not None:
+                    # 刪除名稱；arrow 引擎的欄位仍參照共享記憶體，在 DataFrame 釋放後才回收
+                    shared.release()
+            success = await self._run_stage('write', write_pool, self.writer.write_prepared_file,
+                                            file_path, quarter, df, file_stats)
+            return success, file_stats['rows'] if success else 0, None
+
+    async def _import_file(self, file_path: str, folder: str, semaphore: asyncio.Semaphore,
+                           parse_slots: asyncio.Semaphore, parse_pool: ProcessPoolExecutor,
+                           write_pool: ThreadPoolExecutor, on_result: Callable[[Dict], None] = None) -> Dict:
+        """單一檔案：取得名額 → 取得解析名額 → 子程序解析清理 → 寫入執行緒寫入（寫入完成才釋放解析名額）"""
+        filename = os.path.basename(file_path)
+        quarter = zip_source.folder_name(folder)
+        admission = self.metrics.stages['admission']
+        queued_at = time.time()
+        admission.submitted()
+
+        async with semaphore:
+            admission.completed(time.time() - queued_at, 0.0)
+            self.metrics.enter()
+            start_time = time.time()
+            records = 0
+            error = None
+            try:
+                if csv_splitter.should_split(file_path):
+                    # 大型檔案：import_single_file 自行切割並以子程序平行解析，寫入同一個交易
+                    success, records = await self._run_stage('direct', write_pool, _import_directly,
+                                                             file_path, quarter, self.csv_engine)
+                else:
+                    success, records, error = await self._parse_and_write(file_path, quarter, parse_slots,
+                                                                          parse_pool, write_pool)
+                if not success and error is None:
+                    error = '寫入失敗'
+            except Exception as e:
+                logger.error(f"❌ 匯入 {filename} 失敗: {str(e)}")
+                success = False
+                error = str(e)
+            finally:
+                self.metrics.leave()
+
+        result = {
+            'filename': filename,
+            'file_path': file_path,
+            'folder': folder,
+            'success': success,
+            'records': records,
+            'processing_time': time.time() - start_time,
+            'error': error
+        }
+        if on_result is not None:
+            on_result(result)
+        return result
+
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+備份目錄
+記錄每一次備份（完整 / 差異 / 交易記錄）的檔案、LSN 範圍、大小與檢查碼，
+列出備份與選擇還原點只讀取目錄，不再掃描備份資料夾或從檔名解析資料庫名稱與時間，
+還原時據此計算最少的還原順序（完整備份 + 最新差異備份 + 其後的交易記錄備份）
+"""
+
+import os
+import json
+import hashlib
+import threading
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+BACKUP_TYPES = ('full', 'diff', 'log')
+
+# 備份類型 → 副檔名
+BACKUP_EXTENSIONS = {
+    'full': 'bak',
+    'diff': 'dif',
+    'log': 'trn'
+}
+
+# RESTORE HEADERONLY 的 BackupType → 備份類型
+HEADER_BACKUP_TYPES = {
+    1: 'full',
+    2: 'log',
+    5: 'diff'
+}
+
+CHECKSUM_BUFFER_SIZE = 8 * 1024 * 1024
+
+
+def make_entry_id(database_name: str, timestamp: str, backup_type: str) -> str:
+    """備份組代號，例如 LVR_UsedHouse@20250909_084500.full（資料庫名稱含底線也不會混淆）"""
+    return f"{database_name}@{timestamp}.{backup_type}"
+
+
+def file_checksum(files: List) -> str:
+    """計算備份檔案（依分割順序串接）的 SHA-256"""
+    digest = hashlib.sha256()
+    for file in files:
+        with open(file, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHECKSUM_BUFFER_SIZE), b''):
+                digest.update(chunk)
+    return f"sha256:{digest.hexdigest()}"
+
+
+def _lsn(value) -> Optional[int]:
+    """LSN 以字串存放（JSON 無法精確表示 25 位數整數），比較時轉回整數"""
+    return int(value) if value not in (None, '') else None
+
+
+class BackupCatalog:
+    """
+    備份目錄（JSON 檔案）
+
+    每筆記錄:
+        {'id', 'database', 'type', 'timestamp', 'files', 'compression',
+         'first_lsn', 'last_lsn', 'checkpoint_lsn', 'database_backup_lsn',
+         'base_timestamp', 'backup_size', 'file_size', 'checksum', 'has_backup_checksums'}
+    files 為備份資料夾中的檔名（依分割順序）
+    """
+
+    def __init__(self, catalog_file):
+        self.catalog_file = Path(catalog_file)
+        self._lock = threading.Lock()
+        self.entries: List[Dict] = []
+        self._by_id: Dict[str, Dict] = {}
+        self._by_file: Dict[str, Dict] = {}
+        if self.catalog_file.exists():
+            with open(self.catalog_file, 'r', encoding='utf-8') as f:
+                for entry in json.load(f):
+                    self._index(entry)
+
+    def _index(self, entry: Dict):
+        """加入記錄並更新索引（同一代號的記錄以新的取代）"""
+        entry.setdefault('id', make_entry_id(entry['database'], entry['timestamp'], entry['type']))
+        previous = self._by_id.get(entry['id'])
+        if previous:
+            self.entries.remove(previous)
+        self.entries.append(entry)
+        self._by_id[entry['id']] = entry
+        for name in entry['files']:
+            self._by_file[name] = entry
+
+    def save(self):
+        """寫入目錄檔（先寫暫存檔再取代，避免中斷時留下不完整的檔案）"""
+        temp_file = self.catalog_file.with_name(self.catalog_file.name + '.tmp')
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, ensure_ascii=False, indent=2)
+        os.replace(temp_file, self.catalog_file)
+
+    def add(self, entry: Dict):
+        """新增一筆備份記錄（可由多個備份執行緒同時呼叫）"""
+        with self._lock:
+            self._index(entry)
+            self.save()
+
+    def find(self, entry_id: str) -> Optional[Dict]:
+        """依代號取得備份記錄"""
+        return self._by_id.get(entry_id)
+
+    def find_by_file(self, filename: str) -> Optional[Dict]:
+        """依任一備份檔名（含分割檔）取得備份記錄"""
+        return self._by_file.get(os.path.basename(str(filename)))
+
+    def get_timestamps(self) -> List[str]:
+        """所有備份時間戳記（新到舊）"""
+        return sorted({entry['timestamp'] for entry in self.entries}, reverse=True)
+
+    def get_entries(self, database_name: str = None, backup_type: str = None) -> List[Dict]:
+        """依資料庫與類型篩選備份記錄（依時間排序）"""
+        entries = [
+            entry for entry in self.entries
+            if (database_name is None or entry['database'] == database_name)
+            and (backup_type is None or entry['type'] == backup_type)
+        ]
+        return sorted(entries, key=lambda entry: entry['timestamp'])
+
+    def list_restore_points(self, database_name: str = None, limit: int = None) -> List[Dict]:
+        """列出還原點（新到舊），只讀取目錄，不存取備份檔案"""
+        entries = list(reversed(self.get_entries(database_name)))
+        return entries[:limit] if limit else entries
+
+    def latest_full(self, database_name: str, before: str = None) -> Optional[Dict]:
+        """取得指定時間（含）之前最新的完整備份"""
+        fulls = [entry for entry in self.get_entries(database_name, 'full')
+                 if before is None or entry['timestamp'] <= before]
+        return fulls[-1] if fulls else None
+
+    @staticmethod
+    def is_based_on(entry: Dict, full: Dict) -> bool:
+        """判斷差異 / 交易記錄備份是否以指定的完整備份為基礎"""
+        if _lsn(entry.get('database_backup_lsn')) is not None and _lsn(full.get('checkpoint_lsn')) is not None:
+            return _lsn(entry['database_backup_lsn']) == _lsn(full['checkpoint_lsn'])
+        return entry.get('base_timestamp') == full['timestamp']
+
+    def get_restore_sequence(self, database_name: str, before: str = None) -> List[Dict]:
+        """
+        計算還原到指定時間（含）的最少備份順序
+
+        Returns:
+            [完整備份, 最新差異備份(可無), 交易記錄備份...]；沒有完整備份時回傳空列表
+        """
+        full = self.latest_full(database_name, before)
+        if not full:
+            return []
+
+        def in_range(entry):
+            return entry['timestamp'] >= full['timestamp'] and (before is None or entry['timestamp'] <= before)
+
+        sequence = [full]
+        diffs = [entry for entry in self.get_entries(database_name, 'diff')
+                 if in_range(entry) and self.is_based_on(entry, full)]
+        if diffs:
+            sequence.append(diffs[-1])
+
+        # 交易記錄備份需從目前還原點起連續（前一份的 last_lsn = 下一份的 first_lsn）
+        last_lsn = _lsn(sequence[-1].get('last_lsn'))
+        logs = [entry for entry in self.get_entries(database_name, 'log') if in_range(entry)]
+        for entry in sorted(logs, key=lambda entry: _lsn(entry.get('first_lsn')) or 0):
+            first, last = _lsn(entry.get('first_lsn')), _lsn(entry.get('last_lsn'))
+            if last_lsn is None or first is None or last is None:
+                break
+            if last <= last_lsn:
+                continue  # 已包含在差異備份中
+            if first > last_lsn:
+                logger.warning(f"⚠️ {database_name} 交易記錄備份鏈中斷於 {entry['timestamp']}，只還原到前一份備份")
+                break
+            sequence.append(entry)
+            last_lsn = last
+
+        return sequence
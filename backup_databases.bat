@@ -5,6 +5,9 @@ echo LVR 資料庫備份工具
 echo ========================================
 echo.
 
+REM 切換到程式目錄（備份目錄 backups\backup_catalog.json 以此為基準）
+cd /d "%~dp0"
+
 REM 設定變數
 set SERVER=localhost\SQLEXPRESS
 set BACKUP_DIR=%~dp0backups
@@ -26,6 +29,8 @@ echo [1/3] 備份 LVR_UsedHouse 資料庫...
 sqlcmd -S %SERVER% -E -Q "BACKUP DATABASE [LVR_UsedHouse] TO DISK = '%BACKUP_DIR%\LVR_UsedHouse_%TIMESTAMP%.bak' WITH FORMAT, INIT, NAME = 'LVR_UsedHouse-Full Database Backup', SKIP, NOREWIND, NOUNLOAD, STATS = 10"
 if %ERRORLEVEL% EQU 0 (
     echo ✅ LVR_UsedHouse 備份成功
+    REM 登錄到備份目錄（資料庫、類型、LSN、大小、檢查碼），還原工具依目錄選擇還原點
+    python lvr_cli.py catalog register "%BACKUP_DIR%\LVR_UsedHouse_%TIMESTAMP%.bak"
 ) else (
     echo ❌ LVR_UsedHouse 備份失敗
     pause
@@ -38,6 +43,8 @@ echo [2/3] 備份 LVR_PreSale 資料庫...
 sqlcmd -S %SERVER% -E -Q "BACKUP DATABASE [LVR_PreSale] TO DISK = '%BACKUP_DIR%\LVR_PreSale_%TIMESTAMP%.bak' WITH FORMAT, INIT, NAME = 'LVR_PreSale-Full Database Backup', SKIP, NOREWIND, NOUNLOAD, STATS = 10"
 if %ERRORLEVEL% EQU 0 (
     echo ✅ LVR_PreSale 備份成功
+    REM 登錄到備份目錄（資料庫、類型、LSN、大小、檢查碼），還原工具依目錄選擇還原點
+    python lvr_cli.py catalog register "%BACKUP_DIR%\LVR_PreSale_%TIMESTAMP%.bak"
 ) else (
     echo ❌ LVR_PreSale 備份失敗
     pause
@@ -50,6 +57,8 @@ echo [3/3] 備份 LVR_Rental 資料庫...
 sqlcmd -S %SERVER% -E -Q "BACKUP DATABASE [LVR_Rental] TO DISK = '%BACKUP_DIR%\LVR_Rental_%TIMESTAMP%.bak' WITH FORMAT, INIT, NAME = 'LVR_Rental-Full Database Backup', SKIP, NOREWIND, NOUNLOAD, STATS = 10"
 if %ERRORLEVEL% EQU 0 (
     echo ✅ LVR_Rental 備份成功
+    REM 登錄到備份目錄（資料庫、類型、LSN、大小、檢查碼），還原工具依目錄選擇還原點
+    python lvr_cli.py catalog register "%BACKUP_DIR%\LVR_Rental_%TIMESTAMP%.bak"
 ) else (
     echo ❌ LVR_Rental 備份失敗
     pause
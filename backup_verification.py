@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+備份內容統計
+備份時記錄每個資料表的資料列數與每季彙總值（筆數、金額合計），
+還原後重新計算並比對，用來發現備份檔案或還原過程中未被察覺的資料毀損
+"""
+
+import logging
+from decimal import Decimal
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+# 每季彙總的金額欄位（依序取資料表中第一個存在的欄位）
+AGGREGATE_COLUMNS = ['總價元', '總額元']
+
+QUARTER_COLUMN = 'quarter'
+
+
+def collect_database_stats(cursor) -> Dict:
+    """
+    計算目前連線資料庫的統計
+
+    Returns:
+        {'row_counts': {資料表: 筆數},
+         'quarters': {資料表: {季度: {'rows': 筆數, 'sum_column': 欄位, 'sum': '金額合計'}}}}
+        金額合計以字串保存（DECIMAL 在 JSON 中無法精確表示）
+    """
+    # 資料列數取自 sys.partitions（不掃描資料表）
+    cursor.execute("""
+        SELECT t.name, SUM(p.rows)
+        FROM sys.tables t
+        JOIN sys.partitions p ON p.object_id = t.object_id AND p.index_id IN (0, 1)
+        WHERE t.is_ms_shipped = 0
+        GROUP BY t.name
+    """)
+    row_counts = {name: int(rows) for name, rows in cursor.fetchall()}
+
+    cursor.execute(
+        "SELECT TABLE_NAME, COLUMN_NAME FROM INFORMATION_SCHEMA.COLUMNS WHERE COLUMN_NAME IN (?, ?, ?)",
+        QUARTER_COLUMN, *AGGREGATE_COLUMNS
+    )
+    table_columns: Dict[str, List[str]] = {}
+    for table_name, column_name in cursor.fetchall():
+        table_columns.setdefault(table_name, []).append(column_name)
+
+    quarters = {}
+    for table_name, columns in sorted(table_columns.items()):
+        if QUARTER_COLUMN not in columns:
+            continue
+        sum_column = next((name for name in AGGREGATE_COLUMNS if name in columns), None)
+        sum_expr = f"SUM(CAST([{sum_column}] AS DECIMAL(38,2)))" if sum_column else "NULL"
+        cursor.execute(
+            f"SELECT [{QUARTER_COLUMN}], COUNT_BIG(*), {sum_expr} FROM [{table_name}] GROUP BY [{QUARTER_COLUMN}]"
+        )
+        quarters[table_name] = {
+            str(quarter): {
+                'rows': int(rows),
+                'sum_column': sum_column,
+                'sum': str(total) if total is not None else None
+            }
+            for quarter, rows, total in cursor.fetchall()
+        }
+
+    return {'row_counts': row_counts, 'quarters': quarters}
+
+
+def compare_database_stats(expected: Dict, actual: Dict) -> List[str]:
+    """比對備份時與還原後的統計，回傳差異說明（一致時為空列表）"""
+    mismatches = []
+
+    expected_counts = expected.get('row_counts', {})
+    actual_counts = actual.get('row_counts', {})
+    for table_name, rows in sorted(expected_counts.items()):
+        if table_name not in actual_counts:
+            mismatches.append(f"{table_name}: 資料表不存在")
+        elif actual_counts[table_name] != rows:
+            mismatches.append(f"{table_name}: 資料列數 {actual_counts[table_name]:,}（備份時 {rows:,}）")
+
+    for table_name, expected_quarters in sorted(expected.get('quarters', {}).items()):
+        actual_quarters = actual.get('quarters', {}).get(table_name, {})
+        for quarter in sorted(set(expected_quarters) | set(actual_quarters)):
+            before, after = expected_quarters.get(quarter), actual_quarters.get(quarter)
+            if before is None or after is None:
+                mismatches.append(f"{table_name} {quarter}: 還原後{'多出' if before is None else '缺少'}此季資料")
+            elif before['rows'] != after['rows']:
+                mismatches.append(f"{table_name} {quarter}: 筆數 {after['rows']:,}（備份時 {before['rows']:,}）")
+            elif before['sum'] is not None and (after['sum'] is None or Decimal(before['sum']) != Decimal(after['sum'])):
+                mismatches.append(f"{table_name} {quarter}: {before['sum_column']} 合計 {after['sum']}（備份時 {before['sum']}）")
+
+    return mismatches
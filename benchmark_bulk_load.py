@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+大量載入模式比較
+將同一個清理後的 CSV 分別以目前的逐列 INSERT、暫存資料表 + TABLOCK（維持目前的復原模式）、
+大量載入（BULK_LOGGED 復原模式 + TABLOCK）寫入目標資料表，量測每次交易產生的交易記錄量
+（目標資料庫與 tempdb，sys.dm_tran_database_transactions）、交易記錄檔成長與寫入耗時（取中位數）
+
+每次寫入都在交易中完成後復原，資料表內容不變；最少記錄的資料頁在提交時才寫入資料檔，
+復原不含這段時間，因此耗時只比較資料傳送與寫入階段。需 ALTER DATABASE 與 VIEW SERVER STATE 權限
+
+用法: python benchmark_bulk_load.py [CSV 檔案] [執行次數]（預設為 DATA_FOLDERS 中第一個中古屋主檔 *_lvr_land_a.csv，3 次）
+"""
+
+import os
+import sys
+import time
+import statistics
+
+import pyodbc
+
+import bulk_load
+import zip_source
+
+DEFAULT_RUNS = 3
+
+
+def measure(importer, file_info: dict, city_info: dict, df, filename: str, runs: int) -> dict:
+    """以匯入器目前的設定寫入 runs 次（每次復原），回傳中位數耗時、交易記錄量與記錄檔成長"""
+    database_name = file_info['database_name']
+    conn = pyodbc.connect(importer.connection_string + f"Database={database_name};")
+    before = bulk_load.log_space(conn.cursor())
+    conn.rollback()
+
+    times = []
+    log_bytes = []
+    rows = 0
+    for _ in range(runs):
+        start = time.perf_counter()
+        rows = importer.write_rows(conn, database_name, file_info['table_name'], df, filename, 'benchmark',
+                                   city_info['city_code'], city_info['city_name'])
+        times.append(time.perf_counter() - start)
+        log_bytes.append(bulk_load.transaction_log_bytes(conn.cursor()))
+        conn.rollback()
+
+    after = bulk_load.log_space(conn.cursor())
+    conn.rollback()
+    conn.close()
+    return {
+        'rows': rows,
+        'seconds': statistics.median(times),
+        'database': statistics.median(item['database'] for item in log_bytes),
+        'tempdb': statistics.median(item['tempdb'] for item in log_bytes),
+        'records': int(statistics.median(item['records'] for item in log_bytes)),
+        'growth': after['total'] - before['total'],
+    }
+
+
+def find_default_file():
+    """DATA_FOLDERS 中第一個中古屋主檔"""
+    from config import DATA_FOLDERS
+    for folder in DATA_FOLDERS:
+        for path in zip_source.list_csv_files(zip_source.resolve_folder(folder)):
+            if path.lower().endswith('_lvr_land_a.csv') and not zip_source.is_member_path(path):
+                return path
+    return None
+
+
+def main():
+    file_path = sys.argv[1] if len(sys.argv) > 1 else find_default_file()
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_RUNS
+    if not file_path or not os.path.isfile(file_path):
+        print("❌ 找不到 CSV 檔案（壓縮檔成員請先解壓縮）")
+        return 1
+
+    from enhanced_data_importer import EnhancedDataImporter
+
+    # 只比較資料列寫入：不寫入 import_stats、不更新 transaction_detail，也不寫入字典編碼的維度資料表
+    importer = EnhancedDataImporter(use_dictionary_encoding=False, build_transaction_detail=False,
+                                    use_cleaned_cache=False)
+    filename = os.path.basename(file_path)
+    file_info = importer.file_mapping.get_file_info(filename)
+    city_info = importer.city_mapping.get_city_info_from_filename(filename)
+    prepared = importer.prepare_file(file_path) if file_info and city_info else None
+    if prepared is None:
+        print(f"❌ 無法讀取 {filename}")
+        return 1
+    df, _ = prepared
+    database_name = file_info['database_name']
+
+    conn = bulk_load.connect(database_name)
+    model = bulk_load.recovery_model(conn.cursor(), database_name)
+    conn.close()
+
+    print(f"📄 {file_path} → {database_name}.{file_info['table_name']}（{model} 復原模式，{runs} 次取中位數）")
+    print(f"{'模式':<26}{'筆數':>8}{'耗時':>9}{'交易記錄':>12}{'記錄數':>10}{'tempdb':>11}{'記錄檔成長':>12}")
+
+    results = {}
+    importer.bulk = False
+    results['目前（逐列 INSERT）'] = measure(importer, file_info, city_info, df, filename, runs)
+    importer.bulk = True
+    if model == 'FULL':
+        # 只鎖定資料表、不切換復原模式：FULL 模式下仍完整記錄
+        results[f'TABLOCK（{model}）'] = measure(importer, file_info, city_info, df, filename, runs)
+    # 資料已復原，沒有需要備份的最少記錄作業
+    with bulk_load.BulkLoadWindow([database_name], backup=False):
+        results['大量載入（TABLOCK）'] = measure(importer, file_info, city_info, df, filename, runs)
+
+    for name, result in results.items():
+        print(f"{name:<26}{result['rows']:>8,}{result['seconds']:>8.2f}s"
+              f"{result['database'] / 1024 / 1024:>10.2f}MB{result['records']:>10,}"
+              f"{result['tempdb'] / 1024 / 1024:>9.2f}MB{result['growth'] / 1024 / 1024:>10.1f}MB")
+
+    baseline = results['目前（逐列 INSERT）']
+    bulk = results['大量載入（TABLOCK）']
+    if baseline['database'] and baseline['seconds']:
+        print(f"📉 大量載入的交易記錄量為目前的 {bulk['database'] / baseline['database']:.1%}，"
+              f"耗時為 {bulk['seconds'] / baseline['seconds']:.1%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+CSV 解析引擎比較
+以子程序分別用 pandas（C 引擎）與 arrow（pyarrow.csv）讀取、清理同一個 CSV 並組成 INSERT 參數列（不連線資料庫），
+量測各階段耗時與記憶體峰值（Python 物件以 tracemalloc 計算，Arrow 緩衝區以 pyarrow 記憶體池計算；
+參數列依 BATCH_SIZE 分批組成後即丟棄，與實際匯入相同），
+並確認兩種引擎產生的參數列完全相同
+
+用法: python benchmark_csv_engines.py [CSV 檔案或資料夾 ...]（預設為 config.py 中 DATA_FOLDERS 的第一個資料夾）
+"""
+
+import os
+import sys
+import json
+import glob
+import time
+import hashlib
+import subprocess
+
+ENGINES = ['pandas', 'arrow']
+
+SCRIPT_PATH = os.path.abspath(__file__)
+
+
+def process(importer, schema, file_path: str, timings: dict = None):
+    """讀取、清理並依 BATCH_SIZE 分批組成參數列（同 import_single_file），回傳 (筆數, 參數列雜湊, DataFrame 大小)"""
+    from config import BATCH_SIZE
+
+    start = time.perf_counter()
+    df = importer.read_csv_file(file_path, schema)
+    if df is None:
+        raise RuntimeError('讀取失敗')
+    read_end = time.perf_counter()
+    df = importer.clean_data(df, schema.file_type, schema.data_type)
+    clean_end = time.perf_counter()
+
+    # 參數列的雜湊，用於確認兩種引擎結果一致（整數與浮點數以相同形式計算，繫結時同為 SQL_DOUBLE）
+    digest = hashlib.sha256()
+    rows = 0
+    for i in range(0, len(df), BATCH_SIZE):
+        batch = importer.prepare_batch_rows(df.iloc[i:i + BATCH_SIZE], 'a', '臺北市',
+                                            os.path.basename(file_path), 'benchmark')
+        rows += len(batch)
+        digest.update(repr([[float(value) if isinstance(value, int) else value for value in row]
+                            for row in batch]).encode('utf-8'))
+    prepare_end = time.perf_counter()
+
+    if timings is not None:
+        timings.update(read=read_end - start, clean=clean_end - read_end, prepare=prepare_end - clean_end)
+    return rows, digest.hexdigest(), int(df.memory_usage(deep=True).sum())
+
+
+def measure(engine: str, file_path: str) -> dict:
+    """
+    在目前程序中以指定引擎處理檔案並回傳量測結果
+    第一次量測耗時；第二次以 tracemalloc 量測記憶體峰值（追蹤會明顯拖慢執行，因此分開執行）
+    """
+    import tracemalloc
+    import pyarrow as pa
+    from enhanced_data_importer import EnhancedDataImporter
+
+    importer = EnhancedDataImporter(use_dictionary_encoding=False, csv_engine=engine)
+    schema = importer.schema_registry.get_schema_for_file(os.path.basename(file_path))
+    if schema is None:
+        return {'error': '不支援的檔案類型'}
+
+    timings = {}
+    rows, digest, frame_bytes = process(importer, schema, file_path, timings)
+
+    tracemalloc.start()
+    process(importer, schema, file_path)
+    _, python_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return dict(timings, rows=rows, digest=digest, frame_mb=frame_bytes / 1024 / 1024,
+                peak_mb=(python_peak + pa.default_memory_pool().max_memory()) / 1024 / 1024)
+
+
+def run_child(engine: str, file_path: str) -> dict:
+    """以子程序執行量測（各引擎的記憶體峰值互不影響）"""
+    result = subprocess.run([sys.executable, SCRIPT_PATH, '--child', engine, file_path],
+                            capture_output=True)
+    if result.returncode != 0 or not result.stdout.strip():
+        lines = result.stderr.decode('utf-8', errors='replace').strip().splitlines()
+        return {'error': lines[-1] if lines else f'結束代碼 {result.returncode}'}
+    return json.loads(result.stdout.decode('utf-8').strip().splitlines()[-1])
+
+
+def collect_files(paths) -> list:
+    """展開資料夾為其中的 CSV 檔案"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, '*.csv'))))
+        else:
+            files.append(path)
+    return files
+
+
+def main():
+    paths = sys.argv[1:]
+    if not paths:
+        from config import DATA_FOLDERS
+        paths = DATA_FOLDERS[:1]
+    files = collect_files(paths)
+    if not files:
+        print("❌ 找不到 CSV 檔案")
+        return 1
+
+    print(f"{'檔案':<28}{'引擎':<8}{'筆數':>10}{'讀取':>9}{'清理':>9}{'參數列':>9}{'DataFrame':>12}{'峰值':>10}")
+    all_match = True
+    for file_path in files:
+        results = {engine: run_child(engine, file_path) for engine in ENGINES}
+        for engine, result in results.items():
+            if 'error' in result:
+                print(f"{os.path.basename(file_path):<28}{engine:<8}❌ {result['error']}")
+                continue
+            print(f"{os.path.basename(file_path):<28}{engine:<8}{result['rows']:>10,}"
+                  f"{result['read']:>8.2f}s{result['clean']:>8.2f}s{result['prepare']:>8.2f}s"
+                  f"{result['frame_mb']:>10.1f}MB{result['peak_mb']:>8.1f}MB")
+        digests = {result.get('digest') for result in results.values()}
+        if len(digests) != 1 or None in digests:
+            all_match = False
+            print(f"⚠️ {os.path.basename(file_path)}: 兩種引擎產生的參數列不一致")
+
+    print("✅ 兩種引擎的參數列完全相同" if all_match else "❌ 部分檔案的結果不一致")
+    return 0 if all_match else 1
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == '--child':
+        # 子程序：不輸出匯入器的日誌，只輸出量測結果
+        print(json.dumps(measure(sys.argv[2], sys.argv[3])))
+        sys.exit(0)
+    sys.exit(main())
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+子程序結果傳遞方式比較
+子程序解析、清理一個 CSV（預設為建物明細 _a_build.csv）後保留結果，主程序反覆要求子程序傳回同一份結果，
+分別以 pickle（程序池預設）與共享記憶體（shm_transport，Arrow IPC）傳遞，
+量測由送出要求到主程序取得 DataFrame、再組成 INSERT 參數列為止的耗時（取中位數）與傳遞的資料量，
+並確認兩種方式產生的參數列完全相同（不連線資料庫）
+
+用法: python benchmark_shm_transport.py [CSV 檔案] [執行次數]（預設為 DATA_FOLDERS 中第一個 *_a_build.csv，20 次）
+"""
+
+import os
+import sys
+import time
+import pickle
+import hashlib
+import statistics
+from concurrent.futures import ProcessPoolExecutor
+
+import zip_source
+
+TRANSPORTS = ['pickle', 'shared_memory']
+ENGINES = ['pandas', 'arrow']
+DEFAULT_RUNS = 20
+
+# 子程序中保留的清理結果 {(檔案, 引擎): DataFrame}
+_frames = {}
+
+
+def _load(file_path: str, engine: str):
+    """子程序：讀取並清理檔案（同一檔案與引擎只執行一次）"""
+    key = (file_path, engine)
+    if key not in _frames:
+        from enhanced_data_importer import EnhancedDataImporter
+        importer = EnhancedDataImporter(use_dictionary_encoding=False, csv_engine=engine, use_cleaned_cache=False)
+        schema = importer.schema_registry.get_schema_for_file(os.path.basename(file_path))
+        df = importer.read_csv_file(file_path, schema)
+        if df is None:
+            raise RuntimeError('讀取失敗')
+        _frames[key] = importer.clean_data(df, schema.file_type, schema.data_type)
+    return _frames[key]
+
+
+def prepare(file_path: str, engine: str) -> int:
+    """子程序：預先讀取並清理，回傳筆數（不計入傳遞時間）"""
+    return len(_load(file_path, engine))
+
+
+def send(file_path: str, engine: str, shared_name: str = None):
+    """子程序：傳回保留的結果（指定共享記憶體時寫入共享記憶體，只傳回位元組數）"""
+    df = _load(file_path, engine)
+    if shared_name is None:
+        return df
+    import shm_transport
+    return shm_transport.write_frame(shared_name, df)
+
+
+def payload_sizes(file_path: str, engine: str) -> dict:
+    """子程序：兩種方式傳遞的位元組數"""
+    import pyarrow as pa
+    df = _load(file_path, engine)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.MockOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return {'pickle': len(pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL)), 'shared_memory': sink.size()}
+
+
+def measure(executor, importer, file_path: str, engine: str, transport: str, runs: int) -> dict:
+    """量測單一引擎與傳遞方式，回傳 {'transfer', 'total'（中位數秒數）, 'rows', 'digest'}"""
+    import shm_transport
+    from config import BATCH_SIZE
+
+    transfer_times = []
+    total_times = []
+    digest = None
+    rows = 0
+    for run in range(runs):
+        start = time.perf_counter()
+        slot = None
+        if transport == 'shared_memory':
+            slot = shm_transport.SharedSlot(max(os.path.getsize(file_path) * 3, 1024 * 1024))
+        payload = executor.submit(send, file_path, engine, slot.name if slot else None).result()
+        if slot is not None:
+            if payload is None:
+                slot.release()
+                raise RuntimeError('共享記憶體配置不足')
+            df = slot.read_frame(payload, arrow_dtypes=engine == 'arrow')
+            slot.release()
+        else:
+            df = payload
+        transfer_end = time.perf_counter()
+
+        # 組成參數列（同 insert_data_batch 依 BATCH_SIZE 分批），只在第一次計算雜湊
+        run_digest = hashlib.sha256() if run == 0 else None
+        rows = 0
+        for i in range(0, len(df), BATCH_SIZE):
+            batch = importer.prepare_batch_rows(df.iloc[i:i + BATCH_SIZE], 'a', '臺北市',
+                                                os.path.basename(file_path), 'benchmark')
+            rows += len(batch)
+            if run_digest is not None:
+                run_digest.update(repr([[float(value) if isinstance(value, int) else value for value in row]
+                                        for row in batch]).encode('utf-8'))
+        end = time.perf_counter()
+        del df
+        if run_digest is not None:
+            digest = run_digest.hexdigest()
+        transfer_times.append(transfer_end - start)
+        total_times.append(end - start)
+
+    return {'transfer': statistics.median(transfer_times), 'total': statistics.median(total_times),
+            'rows': rows, 'digest': digest}
+
+
+def find_default_file():
+    """DATA_FOLDERS 中第一個建物明細檔案"""
+    from config import DATA_FOLDERS
+    for folder in DATA_FOLDERS:
+        for path in zip_source.list_csv_files(zip_source.resolve_folder(folder)):
+            if path.lower().endswith('_a_build.csv') and not zip_source.is_member_path(path):
+                return path
+    return None
+
+
+def main():
+    file_path = sys.argv[1] if len(sys.argv) > 1 else find_default_file()
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_RUNS
+    if not file_path or not os.path.isfile(file_path):
+        print("❌ 找不到 CSV 檔案（壓縮檔成員請先解壓縮）")
+        return 1
+
+    import shm_transport
+    from enhanced_data_importer import EnhancedDataImporter
+    shm_transport.start_tracker()
+    importer = EnhancedDataImporter(use_dictionary_encoding=False, use_cleaned_cache=False)
+
+    print(f"📄 {file_path}（{runs} 次取中位數）")
+    print(f"{'引擎':<8}{'傳遞方式':<15}{'筆數':>8}{'傳遞量':>11}{'取得資料':>10}{'含參數列':>10}")
+    all_match = True
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        for engine in ENGINES:
+            rows = executor.submit(prepare, file_path, engine).result()
+            sizes = executor.submit(payload_sizes, file_path, engine).result()
+            results = {}
+            for transport in TRANSPORTS:
+                # 先執行一次，排除首次載入模組的時間
+                measure(executor, importer, file_path, engine, transport, 1)
+                results[transport] = measure(executor, importer, file_path, engine, transport, runs)
+                result = results[transport]
+                print(f"{engine:<8}{transport:<15}{rows:>8,}{sizes[transport] / 1024 / 1024:>9.2f}MB"
+                      f"{result['transfer'] * 1000:>8.1f}ms{result['total'] * 1000:>8.1f}ms")
+            if results['pickle']['digest'] != results['shared_memory']['digest']:
+                all_match = False
+                print(f"⚠️ {engine}: 兩種傳遞方式產生的參數列不一致")
+
+    print("✅ 兩種傳遞方式的參數列完全相同" if all_match else "❌ 部分結果不一致")
+    return 0 if all_match else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
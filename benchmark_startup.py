@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+啟動時間測試
+以子程序重複執行各進入點，量測冷啟動時間（含直譯器啟動），
+並確認沒有新資料夾時 `lvr_cli.py scan` 不會載入 pandas、pyodbc 等重量級模組
+
+用法: python benchmark_startup.py [執行次數]
+"""
+
+import os
+import sys
+import time
+import subprocess
+import statistics
+
+# 沒有新資料夾時 scan 的目標啟動時間
+SCAN_TARGET_MS = 200
+
+HEAVY_MODULES = ['pandas', 'numpy', 'pyodbc', 'sqlalchemy', 'tqdm']
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+BENCHMARKS = [
+    ('python（空程式）', [sys.executable, '-c', 'pass']),
+    ('lvr_cli.py scan', [sys.executable, os.path.join(SCRIPT_DIR, 'lvr_cli.py'), 'scan']),
+    ('import import_new_folders', [sys.executable, '-c', 'import import_new_folders']),
+    ('import enhanced_data_importer', [sys.executable, '-c', 'import enhanced_data_importer']),
+]
+
+
+def run_benchmark(command, runs: int):
+    """執行指令多次並回傳每次耗時（毫秒）；執行失敗時回傳 None"""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run(command, cwd=os.getcwd(), capture_output=True)
+        timings.append((time.perf_counter() - start) * 1000)
+        if result.returncode != 0:
+            print(result.stderr.decode('utf-8', errors='replace').strip().splitlines()[-1])
+            return None
+    return timings
+
+
+def loaded_heavy_modules():
+    """在 scan 子命令執行後列出已載入的重量級模組"""
+    code = (
+        "import sys, lvr_cli\n"
+        "lvr_cli.main(['scan'])\n"
+        f"print('HEAVY:' + ','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True)
+    if result.returncode != 0:
+        return None
+    for line in result.stdout.decode('utf-8', errors='replace').splitlines():
+        if line.startswith('HEAVY:'):
+            return line[len('HEAVY:'):]
+    return None
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+
+    print("⏱️ LVR 啟動時間測試")
+    print("=" * 80)
+    print(f"執行次數: {runs}，工作目錄: {os.getcwd()}\n")
+
+    # 讓 -c 指令也能匯入本專案模組
+    os.environ['PYTHONPATH'] = os.pathsep.join(filter(None, [SCRIPT_DIR, os.environ.get('PYTHONPATH')]))
+
+    scan_median = None
+    print(f"{'進入點':<34}{'最小':>10}{'中位數':>10}{'最大':>10}")
+    print("-" * 64)
+    for name, command in BENCHMARKS:
+        timings = run_benchmark(command, runs)
+        if timings is None:
+            print(f"{name:<34}{'執行失敗':>10}")
+            continue
+        median = statistics.median(timings)
+        print(f"{name:<34}{min(timings):>8.0f}ms{median:>8.0f}ms{max(timings):>8.0f}ms")
+        if name == 'lvr_cli.py scan':
+            scan_median = median
+
+    heavy = loaded_heavy_modules()
+    print()
+    if heavy is None:
+        print("❌ 無法檢查 scan 載入的模組")
+    elif heavy:
+        print(f"⚠️ scan 載入了重量級模組: {heavy}")
+    else:
+        print("✅ scan 沒有載入 pandas / pyodbc / tqdm 等重量級模組")
+
+    if scan_median is not None:
+        status = "✅ 達成" if scan_median < SCAN_TARGET_MS else "❌ 未達成"
+        print(f"{status}目標: scan 中位數 {scan_median:.0f}ms（目標 < {SCAN_TARGET_MS}ms）")
+
+
+if __name__ == "__main__":
+    main()
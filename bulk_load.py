@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+"""
+大量載入模式（最少記錄）
+預設的 insert_data_batch 以參數化 INSERT 逐列寫入，在 FULL 復原模式下每一列都完整記錄在交易記錄檔中，
+多季回補時 LVR_UsedHouse 的交易記錄檔會大幅成長。大量載入模式：
+
+    復原模式  匯入期間將 FULL 的資料庫暫時切換為 BULK_LOGGED（SIMPLE 與 BULK_LOGGED 維持不變），
+              結束後還原，並立即做交易記錄備份（沒有可用的完整備份時改做完整備份），
+              含最少記錄作業的記錄區間不能還原到其中的時間點，備份後記錄鏈即回到一般狀態
+    資料表鎖定 每個檔案的資料列先寫入連線的暫存資料表（tempdb），
+              再以 INSERT ... WITH (TABLOCK) SELECT 一次寫入目標資料表：參數化 INSERT 不論是否鎖定資料表
+              都會完整記錄，只有 INSERT ... SELECT（或 BULK INSERT）搭配 TABLOCK 才符合最少記錄條件。
+              TABLOCK 取得資料表的排他鎖，同一資料表同時只有一個交易寫入（其他執行緒、程序的暫存寫入不受影響），
+              叢集索引（id）的新頁面為最少記錄，非叢集索引（例如 query --create-indexes 建立的索引）仍完整記錄
+
+多個匯入程序（work_queue、多台機器）同時使用時，以資料庫中的應用程式鎖協調：
+第一個程序切換復原模式並在資料庫的擴充屬性記錄原本的模式，最後結束的程序才還原並備份；
+程序中斷而未還原時，下一次大量載入結束（或 lvr_cli.py bulk restore）會依擴充屬性還原
+"""
+
+import logging
+import threading
+from typing import Dict, List, Optional
+
+import pyodbc
+
+from config import DB_CONFIG, DATABASES
+from schema_registry import quote_column
+
+logger = logging.getLogger(__name__)
+
+# 每個連線的暫存資料表（IDENTITY 欄位保留原始列順序，寫入目標資料表時 id 依 CSV 順序產生）
+STAGE_TABLE = '#lvr_bulk_stage'
+STAGE_ROW_COLUMN = '_stage_row'
+
+# 記錄切換前復原模式的資料庫擴充屬性，以及協調多個程序的應用程式鎖
+RESTORE_PROPERTY = 'lvr_bulk_load_restore'
+SWITCH_LOCK = 'lvr_bulk_load_switch'
+ACTIVE_LOCK = 'lvr_bulk_load_active'
+
+# 本程序中作用中的大量載入 {資料庫: 視窗數}
+_active = {}
+_active_lock = threading.Lock()
+
+
+def is_active(database_name: str) -> bool:
+    """本程序是否有涵蓋此資料庫的大量載入視窗（EnhancedDataImporter 據此改用暫存資料表 + TABLOCK 寫入）"""
+    with _active_lock:
+        return _active.get(database_name, 0) > 0
+
+
+def stage_table_sql(table_name: str, columns: List[str]) -> str:
+    """建立與目標資料表欄位型別相同、沒有資料的暫存資料表"""
+    column_names = ', '.join(quote_column(column) for column in columns)
+    return (
+        f"IF OBJECT_ID(N'tempdb..{STAGE_TABLE}') IS NOT NULL DROP TABLE [{STAGE_TABLE}];\n"
+        f"SELECT TOP 0 IDENTITY(INT, 1, 1) AS [{STAGE_ROW_COLUMN}], {column_names} "
+        f"INTO [{STAGE_TABLE}] FROM [{table_name}]"
+    )
+
+
+def load_stage_sql(table_name: str, columns: List[str]) -> str:
+    """由暫存資料表以 TABLOCK 寫入目標資料表（符合最少記錄條件）"""
+    column_names = ', '.join(quote_column(column) for column in columns)
+    return (
+        f"INSERT INTO [{table_name}] WITH (TABLOCK) ({column_names}) "
+        f"SELECT {column_names} FROM [{STAGE_TABLE}] ORDER BY [{STAGE_ROW_COLUMN}]"
+    )
+
+
+def recovery_model(cursor, database_name: str) -> str:
+    cursor.execute("SELECT recovery_model_desc FROM sys.databases WHERE name = ?", database_name)
+    return cursor.fetchone()[0]
+
+
+def pending_restore(cursor) -> Optional[str]:
+    """大量載入切換前的復原模式（目前連線的資料庫；沒有待還原的切換時為 None）"""
+    cursor.execute("SELECT CAST(value AS NVARCHAR(20)) FROM sys.extended_properties WHERE class = 0 AND name = ?",
+                   RESTORE_PROPERTY)
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def log_space(cursor) -> Dict:
+    """目前連線資料庫的交易記錄檔大小與已使用空間（位元組）"""
+    cursor.execute("SELECT total_log_size_in_bytes, used_log_space_in_bytes FROM sys.dm_db_log_space_usage")
+    total, used = cursor.fetchone()
+    cursor.execute("SELECT log_reuse_wait_desc FROM sys.databases WHERE database_id = DB_ID()")
+    return {'total': total, 'used': used, 'reuse_wait': cursor.fetchone()[0]}
+
+
+def transaction_log_bytes(cursor) -> Dict:
+    """
+    目前交易已產生的交易記錄量（需 VIEW SERVER STATE 權限）
+
+    Returns:
+        {'database': 目前資料庫的位元組數, 'tempdb': 暫存資料表的位元組數, 'records': 目前資料庫的記錄數}
+    """
+    cursor.execute(
+        "SELECT SUM(CASE WHEN dt.database_id = DB_ID() THEN dt.database_transaction_log_bytes_used ELSE 0 END), "
+        "       SUM(CASE WHEN dt.database_id = 2 THEN dt.database_transaction_log_bytes_used ELSE 0 END), "
+        "       SUM(CASE WHEN dt.database_id = DB_ID() THEN dt.database_transaction_log_record_count ELSE 0 END) "
+        "FROM sys.dm_tran_database_transactions dt "
+        "JOIN sys.dm_tran_session_transactions st ON st.transaction_id = dt.transaction_id "
+        "WHERE st.session_id = @@SPID"
+    )
+    database_bytes, tempdb_bytes, records = cursor.fetchone()
+    return {'database': database_bytes or 0, 'tempdb': tempdb_bytes or 0, 'records': records or 0}
+
+
+def connect(database_name: str, db_config: Dict = None):
+    """自動認可的連線（ALTER DATABASE 不能在交易中執行）"""
+    db_config = {**DB_CONFIG, **(db_config or {})}
+    return pyodbc.connect(
+        f"DRIVER={{{db_config['driver']}}};"
+        f"SERVER={db_config['server']};"
+        f"UID={db_config['username']};"
+        f"PWD={db_config['password']};"
+        f"Trusted_Connection={db_config['trusted_connection']};"
+        f"Encrypt={db_config['encrypt']};"
+        f"Database={database_name};",
+        autocommit=True
+    )
+
+
+def _get_applock(cursor, resource: str, mode: str, timeout_ms: int = -1) -> bool:
+    """取得連線層級的應用程式鎖（timeout_ms 為 -1 時一直等待）"""
+    cursor.execute(
+        "SET NOCOUNT ON; DECLARE @result INT; "
+        "EXEC @result = sp_getapplock @Resource = ?, @LockMode = ?, @LockOwner = 'Session', @LockTimeout = ?; "
+        "SELECT @result",
+        resource, mode, timeout_ms
+    )
+    return cursor.fetchone()[0] >= 0
+
+
+def _release_applock(cursor, resource: str):
+    cursor.execute("EXEC sp_releaseapplock @Resource = ?, @LockOwner = 'Session'", resource)
+
+
+def _restore_recovery(cursor, database_name: str) -> Optional[str]:
+    """
+    依擴充屬性還原大量載入前的復原模式（呼叫端需持有 ACTIVE_LOCK 排他鎖，確認沒有其他大量載入）
+
+    Returns:
+        還原後的復原模式；沒有待還原的切換時為 None
+    """
+    restore_to = pending_restore(cursor)
+    if not restore_to:
+        return None
+    if restore_to == 'FULL' and recovery_model(cursor, database_name) == 'BULK_LOGGED':
+        cursor.execute(f"ALTER DATABASE [{database_name}] SET RECOVERY FULL")
+        logger.info(f"🔄 {database_name} 復原模式還原: BULK_LOGGED → FULL")
+    else:
+        # 期間已手動變更復原模式，只清除記錄
+        restore_to = None
+    cursor.execute("EXEC sys.sp_dropextendedproperty @name = ?", RESTORE_PROPERTY)
+    return restore_to
+
+
+class BulkLoadWindow:
+    """
+    大量載入視窗：進入時切換復原模式並讓本程序的 EnhancedDataImporter 改用 TABLOCK 寫入，
+    離開時（最後一個程序）還原復原模式並備份
+
+        with BulkLoadWindow(['LVR_UsedHouse']):
+            ...匯入...
+    """
+
+    def __init__(self, database_names: List[str], backup: bool = True, db_config: Dict = None):
+        """
+        Args:
+            database_names: 要大量載入的資料庫
+            backup: 還原為 FULL 後是否立即做交易記錄備份（沒有可用的完整備份時為完整備份）
+            db_config: 覆寫 config.py 中 DB_CONFIG 的欄位
+        """
+        self.database_names = list(database_names)
+        self.backup = backup
+        self.db_config = db_config
+        # 進入時的復原模式 {資料庫: 'FULL' | 'BULK_LOGGED' | 'SIMPLE'}
+        self.models = {}
+        # 離開時由本程序還原的資料庫 {資料庫: 還原後的復原模式}
+        self.restored = {}
+        # 持有 ACTIVE_LOCK 共用鎖的連線（視窗期間保持開啟，連線關閉時應用程式鎖隨之釋放）
+        self._connections = {}
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def open(self):
+        try:
+            for database_name in self.database_names:
+                self._open_database(database_name)
+        except Exception:
+            self.close()
+            raise
+
+    def _open_database(self, database_name: str):
+        conn = connect(database_name, self.db_config)
+        try:
+            cursor = conn.cursor()
+            _get_applock(cursor, SWITCH_LOCK, 'Exclusive')
+            _get_applock(cursor, ACTIVE_LOCK, 'Shared')
+            model = recovery_model(cursor, database_name)
+            if model == 'FULL':
+                if not pending_restore(cursor):
+                    cursor.execute("EXEC sys.sp_addextendedproperty @name = ?, @value = ?", RESTORE_PROPERTY, 'FULL')
+                cursor.execute(f"ALTER DATABASE [{database_name}] SET RECOVERY BULK_LOGGED")
+                logger.info(f"🔄 {database_name} 復原模式: FULL → BULK_LOGGED（大量載入期間）")
+            elif model == 'BULK_LOGGED' and pending_restore(cursor):
+                logger.info(f"ℹ️ {database_name} 已由其他大量載入切換為 BULK_LOGGED，結束時由最後一個程序還原")
+            else:
+                logger.info(f"ℹ️ {database_name} 為 {model} 復原模式，不需切換即可最少記錄")
+            _release_applock(cursor, SWITCH_LOCK)
+        except Exception:
+            conn.close()
+            raise
+
+        self.models[database_name] = model
+        self._connections[database_name] = conn
+        with _active_lock:
+            _active[database_name] = _active.get(database_name, 0) + 1
+
+    def close(self):
+        with _active_lock:
+            for database_name in self._connections:
+                _active[database_name] -= 1
+
+        for database_name, conn in self._connections.items():
+            try:
+                cursor = conn.cursor()
+                _get_applock(cursor, SWITCH_LOCK, 'Exclusive')
+                _release_applock(cursor, ACTIVE_LOCK)
+                # 取得排他鎖表示沒有其他程序仍在大量載入此資料庫
+                if _get_applock(cursor, ACTIVE_LOCK, 'Exclusive', 0):
+                    restored = _restore_recovery(cursor, database_name)
+                    if restored:
+                        self.restored[database_name] = restored
+                    _release_applock(cursor, ACTIVE_LOCK)
+                else:
+                    logger.info(f"ℹ️ 其他程序仍在大量載入 {database_name}，復原模式由最後結束的程序還原")
+                _release_applock(cursor, SWITCH_LOCK)
+            except Exception as e:
+                logger.error(f"❌ {database_name} 復原模式還原失敗（請執行 python lvr_cli.py bulk restore）: {str(e)}")
+            finally:
+                conn.close()
+        self._connections = {}
+
+        if self.backup and self.restored:
+            backup_restored(sorted(self.restored))
+
+
+def backup_restored(database_names: List[str]) -> bool:
+    """還原為 FULL 後立即備份交易記錄，含最少記錄作業的區間由此備份結束（沒有可用的完整備份時改做完整備份）"""
+    from database_backup_restore import DatabaseBackupRestore
+
+    try:
+        if DatabaseBackupRestore().backup_after_import(database_names, mode='log'):
+            logger.info(f"💾 大量載入後備份完成: {', '.join(database_names)}")
+            return True
+        logger.warning("⚠️ 大量載入後備份未全部成功，還原時無法越過最少記錄的區間，請盡快完成備份")
+    except Exception as e:
+        logger.error(f"❌ 大量載入後備份失敗: {str(e)}")
+    return False
+
+
+def restore_pending(database_names: List[str] = None, backup: bool = True) -> Dict[str, str]:
+    """
+    還原中斷的大量載入留下的復原模式（仍有程序在大量載入的資料庫略過）
+
+    Returns:
+        {資料庫: 還原後的復原模式}
+    """
+    restored = {}
+    for database_name in database_names or list(DATABASES.values()):
+        conn = connect(database_name)
+        try:
+            cursor = conn.cursor()
+            _get_applock(cursor, SWITCH_LOCK, 'Exclusive')
+            if _get_applock(cursor, ACTIVE_LOCK, 'Exclusive', 0):
+                model = _restore_recovery(cursor, database_name)
+                if model:
+                    restored[database_name] = model
+                _release_applock(cursor, ACTIVE_LOCK)
+            else:
+                logger.info(f"ℹ️ {database_name} 仍有程序在大量載入，略過")
+            _release_applock(cursor, SWITCH_LOCK)
+        finally:
+            conn.close()
+    if backup and restored:
+        backup_restored(sorted(restored))
+    return restored
+
+
+def status(database_names: List[str] = None) -> List[Dict]:
+    """各資料庫的復原模式、待還原的切換與交易記錄檔使用量"""
+    results = []
+    for database_name in database_names or list(DATABASES.values()):
+        conn = connect(database_name)
+        try:
+            cursor = conn.cursor()
+            results.append({
+                'database': database_name,
+                'recovery_model': recovery_model(cursor, database_name),
+                'pending_restore': pending_restore(cursor),
+                **log_space(cursor)
+            })
+        finally:
+            conn.close()
+    return results
@@ -5,6 +5,7 @@
 
 import pyodbc
 from config import DB_CONFIG, DATABASES
+from schema_registry import get_schema_registry
 
 def check_database_structure():
     """檢查資料庫結構"""
@@ -81,6 +82,8 @@ def create_missing_tables():
         print("🔧 建立缺少的資料表...")
         print("=" * 60)
         
+        registry = get_schema_registry()
+        
         # 為每個資料庫建立資料表
         for db_name in DATABASES.values():
             print(f"\n📊 處理資料庫: {db_name}")
@@ -100,91 +103,15 @@ def create_missing_tables():
                 conn = pyodbc.connect(conn_str)
                 cursor = conn.cursor()
         
-                # 建立主要資料表
-                tables = {
-                    'main_data': [
-                        '鄉鎮市區 NVARCHAR(50)',
-                        '交易標的 NVARCHAR(100)',
-                        '土地位置建物門牌 NVARCHAR(200)',
-                        '土地移轉總面積平方公尺 DECIMAL(10,2)',
-                        '都市土地使用分區 NVARCHAR(100)',
-                        '非都市土地使用分區 NVARCHAR(100)',
-                        '非都市土地使用編定 NVARCHAR(100)',
-                        '交易年月日 NVARCHAR(20)',
-                        '交易筆棟數 INT',
-                        '移轉層次 NVARCHAR(50)',
-                        '總樓層數 INT',
-                        '建物型態 NVARCHAR(100)',
-                        '主要用途 NVARCHAR(100)',
-                        '主要建材 NVARCHAR(100)',
-                        '建築完成年月 NVARCHAR(20)',
-                        '建物移轉總面積平方公尺 DECIMAL(10,2)',
-                        '建物現況格局-房 INT',
-                        '建物現況格局-廳 INT',
-                        '建物現況格局-衛 INT',
-                        '建物現況格局-隔間 NVARCHAR(50)',
-                        '有無管理組織 NVARCHAR(20)',
-                        '總價元 DECIMAL(15,2)',
-                        '單價元平方公尺 DECIMAL(15,2)',
-                        '車位類別 NVARCHAR(50)',
-                        '車位移轉總面積平方公尺 DECIMAL(10,2)',
-                        '車位總價元 DECIMAL(15,2)',
-                        '備註 NVARCHAR(500)',
-                        '編號 NVARCHAR(50)',
-                        '主建物面積 DECIMAL(10,2)',
-                        '附屬建物面積 DECIMAL(10,2)',
-                        '陽台面積 DECIMAL(10,2)',
-                        '電梯 NVARCHAR(20)',
-                        '移轉編號 NVARCHAR(50)'
-                    ],
-                    'build_data': [
-                        '編號 NVARCHAR(50)',
-                        '屋齡 INT',
-                        '建物移轉面積平方公尺 DECIMAL(10,2)',
-                        '主要用途 NVARCHAR(100)',
-                        '主要建材 NVARCHAR(100)',
-                        '建築完成年月 NVARCHAR(20)',
-                        '建物現況格局-房 INT',
-                        '建物現況格局-廳 INT',
-                        '建物現況格局-衛 INT',
-                        '建物現況格局-隔間 NVARCHAR(50)'
-                    ],
-                    'land_data': [
-                        '編號 NVARCHAR(50)',
-                        '土地位置 NVARCHAR(200)',
-                        '土地移轉面積平方公尺 DECIMAL(10,2)',
-                        '使用分區或編定 NVARCHAR(100)',
-                        '權利人持分分母 INT',
-                        '權利人持分分子 INT',
-                        '移轉情形 NVARCHAR(100)',
-                        '地號 NVARCHAR(50)'
-                    ],
-                    'park_data': [
-                        '編號 NVARCHAR(50)',
-                        '車位類別 NVARCHAR(50)',
-                        '車位價格 DECIMAL(15,2)',
-                        '車位面積平方公尺 DECIMAL(10,2)',
-                        '車位所在樓層 NVARCHAR(50)'
-                    ]
-                }
-                
-                for table_name, columns in tables.items():
+                # 資料表結構統一由 schema_registry 提供
+                for schema in registry.get_schemas_by_database(db_name):
+                    table_name = schema.table_name
                     try:
                         # 檢查資料表是否存在
                         cursor.execute(f"SELECT table_name FROM information_schema.tables WHERE table_name = '{table_name}'")
                         if not cursor.fetchone():
                             # 建立資料表
-                            create_sql = f"""
-                            CREATE TABLE [{table_name}] (
-                                [id] BIGINT IDENTITY(1,1) PRIMARY KEY,
-                                {', '.join([f'[{col.split()[0]}] {col.split()[1]}' for col in columns])},
-                                [created_at] DATETIME2 DEFAULT GETDATE(),
-                                [source_file] NVARCHAR(200),
-                                [quarter] NVARCHAR(10)
-                            )
-                            """
-                            
-                            cursor.execute(create_sql)
+                            cursor.execute(schema.create_table_sql(qualified=False))
                             print(f"✅ 已建立資料表: {table_name}")
                         else:
                             print(f"ℹ️ 資料表已存在: {table_name}")
@@ -0,0 +1,755 @@
+# -*- coding: utf-8 -*-
+"""
+依縣市分片的多節點匯入
+檔名第一碼即為縣市代碼（CityCodeMapping.extract_city_code_from_filename，a=臺北市 … z=連江縣），
+各縣市的資料量差異很大（臺北市、新北市每季的筆數是連江縣的數百倍）。協調器以縣市為分片單位，
+依歷史筆數分配給各節點，使各節點的預估筆數 / 執行緒數接近，最後彙整各節點的統計為一份報告：
+
+    plan         依中央資料庫 import_stats 中各縣市每季的平均筆數分配縣市（沒有歷史的縣市依檔案大小換算），
+                 寫入 SHARD_DIR/<計畫>/plan.json
+    run          節點匯入分配到的縣市，統計寫入 node-<節點>.json（其他機器以 lvr_cli.py shard run 執行）
+    report       彙整各節點統計：各節點 / 縣市的筆數與耗時、預估誤差與節點間的不平衡
+    consolidate  寫入自己 SQL Server 執行個體的節點，以 Parquet 快照（依季度 / 縣市）合併到中央資料庫，
+                 再於中央更新交易明細、價格彙總與跨市場整合資料並備份
+
+節點定義於 config.py 中的 SHARD_NODES。本機測試（lvr_cli.py shard local）以多個子程序執行各節點，
+每個節點以一個 SQLite 檔案代替資料庫，最後合併到中央 SQLite 檔案並比對筆數
+"""
+
+import os
+import json
+import time
+import sqlite3
+import zipfile
+import datetime
+import logging
+import threading
+import multiprocessing
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from config import DB_CONFIG, DATABASES, MAX_WORKERS
+from log_setup import setup_logging
+from city_code_mapping import CityCodeMapping
+from file_type_mapping import FileTypeMapping, FileType
+import zip_source
+
+try:
+    from config import SHARD_NODES
+except ImportError:
+    SHARD_NODES = []
+
+try:
+    from config import SHARD_DIR
+except ImportError:
+    SHARD_DIR = 'shards'
+
+try:
+    from config import USE_DICTIONARY_ENCODING
+except ImportError:
+    USE_DICTIONARY_ENCODING = False
+
+try:
+    from config import BUILD_TRANSACTION_DETAIL
+except ImportError:
+    BUILD_TRANSACTION_DETAIL = True
+
+logger = logging.getLogger(__name__)
+
+PLAN_FILE = 'plan.json'
+REPORT_FILE = 'report.txt'
+
+# 本機測試的中央 SQLite 檔案（位於 SHARD_DIR，保留到下次執行作為歷史筆數）
+LOCAL_CENTRAL_DB = 'local_central.db'
+
+
+def node_capacity(node: Dict) -> int:
+    """節點的並行執行緒數（未指定時為 MAX_WORKERS）"""
+    return node.get('workers') or MAX_WORKERS
+
+
+def file_bytes(file_path: str) -> int:
+    """檔案大小（壓縮檔成員為解壓縮後的大小）"""
+    member = zip_source.split_member_path(file_path)
+    if member:
+        with zipfile.ZipFile(member[0]) as archive:
+            return archive.getinfo(member[1]).file_size
+    return os.path.getsize(file_path)
+
+
+def collect_city_files(folders: List[str]) -> Dict[str, Dict]:
+    """依縣市代碼分組資料夾中的檔案 {縣市代碼: {'files': [(檔案路徑, 資料夾)], 'bytes'}}"""
+    city_mapping = CityCodeMapping()
+    cities: Dict[str, Dict] = {}
+    for folder in folders:
+        for file_path in zip_source.list_csv_files(zip_source.resolve_folder(folder)):
+            city_code = city_mapping.extract_city_code_from_filename(os.path.basename(file_path))
+            if city_code is None:
+                logger.warning(f"⚠️ 無法識別縣市代碼，略過: {file_path}")
+                continue
+            city = cities.setdefault(city_code, {'files': [], 'bytes': 0})
+            city['files'].append((file_path, folder))
+            city['bytes'] += file_bytes(file_path)
+    return cities
+
+
+def sqlserver_history() -> Dict[str, float]:
+    """中央資料庫 import_stats 中各縣市每季的平均筆數（所有資料庫、主表與附表合計）；無法連線時略過該資料庫"""
+    import pyodbc
+    from import_stats import STATS_TABLE
+
+    connection_string = (
+        f"DRIVER={{{DB_CONFIG['driver']}}};"
+        f"SERVER={DB_CONFIG['server']};"
+        f"UID={DB_CONFIG['username']};"
+        f"PWD={DB_CONFIG['password']};"
+        f"Trusted_Connection={DB_CONFIG['trusted_connection']};"
+        f"Encrypt={DB_CONFIG['encrypt']};"
+    )
+    history: Dict[str, float] = {}
+    for database_name in DATABASES.values():
+        try:
+            conn = pyodbc.connect(connection_string + f"Database={database_name};")
+        except pyodbc.Error as e:
+            logger.warning(f"⚠️ 無法讀取 {database_name} 的歷史筆數: {str(e)}")
+            continue
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"IF OBJECT_ID(N'{STATS_TABLE}', N'U') IS NOT NULL "
+                f"SELECT [縣市代碼], SUM(CAST(row_count AS BIGINT)) * 1.0 / COUNT(DISTINCT quarter) "
+                f"FROM [{STATS_TABLE}] WHERE [縣市代碼] IS NOT NULL GROUP BY [縣市代碼]"
+            )
+            if cursor.description:
+                for city_code, rows in cursor.fetchall():
+                    history[city_code] = history.get(city_code, 0.0) + float(rows)
+        finally:
+            conn.close()
+    return history
+
+
+def estimate_rows(cities: Dict[str, Dict], history: Dict[str, float], quarter_count: int) -> Tuple[Dict[str, float], str]:
+    """
+    各縣市本次的預估筆數
+
+    Returns:
+        ({縣市代碼: 預估筆數}, 依據)；依據為 'history'（沒有歷史的縣市以有歷史縣市的 筆數 / 位元組 換算）
+        或 'bytes'（完全沒有歷史時直接以位元組數作為權重）
+    """
+    known = [city_code for city_code in cities if history.get(city_code)]
+    if not known:
+        return {city_code: float(city['bytes']) for city_code, city in cities.items()}, 'bytes'
+
+    rows_per_byte = (sum(history[city_code] * quarter_count for city_code in known) /
+                     max(sum(cities[city_code]['bytes'] for city_code in known), 1))
+    estimates = {
+        city_code: history[city_code] * quarter_count if city_code in known else city['bytes'] * rows_per_byte
+        for city_code, city in cities.items()
+    }
+    return estimates, 'history'
+
+
+def assign_cities(estimates: Dict[str, float], nodes: List[Dict]) -> Dict[str, List[str]]:
+    """
+    依預估筆數由大到小，每次分配給「(已分配筆數 + 此縣市筆數) / 執行緒數」最小的節點（LPT 排程；
+    節點執行緒數相同時，最慢節點的預估筆數不超過最佳分配的 4/3 倍）
+
+    Returns:
+        {節點名稱: [縣市代碼, ...]}（依預估筆數由大到小）
+    """
+    loads = {node['name']: 0.0 for node in nodes}
+    capacity = {node['name']: node_capacity(node) for node in nodes}
+    assignment: Dict[str, List[str]] = {node['name']: [] for node in nodes}
+    for city_code in sorted(estimates, key=lambda code: (-estimates[code], code)):
+        name = min(loads, key=lambda node_name: ((loads[node_name] + estimates[city_code]) / capacity[node_name],
+                                                 node_name))
+        loads[name] += estimates[city_code]
+        assignment[name].append(city_code)
+    return assignment
+
+
+def public_definition(node: Dict) -> Dict:
+    """寫入計畫檔的節點定義（不含密碼；節點執行時優先使用本機 SHARD_NODES 中的完整定義）"""
+    definition = {key: value for key, value in node.items() if key != 'db_config'}
+    if node.get('db_config'):
+        definition['db_config'] = {key: value for key, value in node['db_config'].items() if key != 'password'}
+    return definition
+
+
+def create_plan(folders: List[str], nodes: List[Dict] = None, history: Dict[str, float] = None,
+                plan_dir: str = None, central_sqlite: str = None) -> Optional[Path]:
+    """
+    建立分片計畫
+
+    Args:
+        folders: 要匯入的資料夾或 ZIP 壓縮檔
+        nodes: 節點定義（預設為 config.py 中的 SHARD_NODES）
+        history: 各縣市每季的歷史筆數（預設由中央資料庫的 import_stats 讀取）
+        plan_dir: 計畫目錄（預設為 SHARD_DIR/plan_<時間戳記>）
+        central_sqlite: 本機測試的中央 SQLite 檔案（合併時使用）
+
+    Returns:
+        計畫目錄；沒有節點或檔案時回傳 None
+    """
+    nodes = nodes if nodes is not None else SHARD_NODES
+    if not nodes:
+        logger.error("❌ 沒有節點定義，請在 config.py 中設定 SHARD_NODES")
+        return None
+    if USE_DICTIONARY_ENCODING and any(node.get('db_config') for node in nodes):
+        # 各執行個體的維度資料表代碼各自產生，合併後代理鍵無法對應
+        logger.error("❌ 啟用字典編碼（USE_DICTIONARY_ENCODING）時，節點不能寫入自己的 SQL Server 執行個體")
+        return None
+
+    cities = collect_city_files(folders)
+    if not cities:
+        logger.error("❌ 沒有找到任何可分片的 CSV 檔案")
+        return None
+    if history is None:
+        history = sqlserver_history()
+    estimates, basis = estimate_rows(cities, history, len(folders))
+    assignment = assign_cities(estimates, nodes)
+
+    timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+    plan_dir = Path(plan_dir) if plan_dir else Path(SHARD_DIR) / f"plan_{timestamp}"
+    city_mapping = CityCodeMapping()
+    plan = {
+        'created': timestamp,
+        'folders': folders,
+        'basis': basis,
+        'central_sqlite': central_sqlite,
+        'nodes': {
+            node['name']: {
+                'definition': public_definition(node),
+                'cities': assignment[node['name']],
+                'estimated_rows': round(sum(estimates[city_code] for city_code in assignment[node['name']])),
+                'files': sum(len(cities[city_code]['files']) for city_code in assignment[node['name']])
+            }
+            for node in nodes
+        },
+        'cities': {
+            city_code: {
+                'city_name': city_mapping.get_city_name(city_code),
+                'estimated_rows': round(estimates[city_code]),
+                'bytes': cities[city_code]['bytes'],
+                'files': cities[city_code]['files']
+            }
+            for city_code in sorted(cities)
+        }
+    }
+    plan_dir.mkdir(parents=True, exist_ok=True)
+    with open(plan_dir / PLAN_FILE, 'w', encoding='utf-8') as f:
+        json.dump(plan, f, ensure_ascii=False, indent=2)
+
+    unit = '筆' if basis == 'history' else 'bytes'
+    logger.info(f"🗺️ 分片計畫 {plan_dir}（{len(cities)} 個縣市 → {len(nodes)} 個節點，"
+                f"依{'歷史筆數' if basis == 'history' else '檔案大小（沒有歷史筆數）'}分配）")
+    for name, node in plan['nodes'].items():
+        logger.info(f"   {name}: {', '.join(node['cities']) or '（無）'}，{node['files']} 個檔案，"
+                    f"預估 {node['estimated_rows']:,} {unit}")
+    return plan_dir
+
+
+def load_plan(plan_dir) -> Dict:
+    with open(Path(plan_dir) / PLAN_FILE, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def node_stats_path(plan_dir, node_name: str) -> Path:
+    return Path(plan_dir) / f"node-{node_name}.json"
+
+
+def resolve_node(plan: Dict, node_name: str) -> Dict:
+    """節點定義：優先使用本機 config.py 中 SHARD_NODES 的同名節點（含密碼），否則使用計畫中的定義"""
+    for node in SHARD_NODES:
+        if node['name'] == node_name:
+            return node
+    return plan['nodes'][node_name]['definition']
+
+
+class SqliteStandIn:
+    """
+    本機測試用的資料庫替代品（SQLite 檔案）：資料表名稱為「資料庫__資料表」，欄位依寫入的資料自動新增，
+    同一檔案再次寫入時先刪除同季度同檔名的資料（與 SQL Server 匯入相同，可重複執行）
+    """
+
+    META_COLUMNS = ['縣市代碼', '縣市名稱', 'quarter', 'source_file']
+
+    def __init__(self, path):
+        self.path = str(path)
+        # 同一個節點的多個執行緒依序寫入（解析與清理仍並行）
+        self._lock = threading.Lock()
+
+    def connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=60)
+
+    @staticmethod
+    def table_name(database_name: str, table_name: str) -> str:
+        return f"{database_name}__{table_name}"
+
+    def _ensure_columns(self, conn: sqlite3.Connection, table: str, columns: List[str]):
+        meta_columns = ', '.join(f'"{column}"' for column in self.META_COLUMNS)
+        conn.execute(f'CREATE TABLE IF NOT EXISTS main."{table}" ({meta_columns})')
+        existing = {row[1] for row in conn.execute(f'PRAGMA main.table_info("{table}")')}
+        for column in columns:
+            if column not in existing:
+                conn.execute(f'ALTER TABLE main."{table}" ADD COLUMN "{column}"')
+
+    def write(self, database_name: str, table_name: str, df: pd.DataFrame, quarter: str, source_file: str,
+              city_code: str, city_name: str) -> int:
+        """寫入單一檔案清理後的資料，回傳筆數"""
+        table = self.table_name(database_name, table_name)
+        data_columns = [column for column in df.columns if column not in self.META_COLUMNS]
+        values = df[data_columns].astype(object)
+        values = values.where(values.notna(), None)
+        rows = [(city_code, city_name, quarter, source_file, *row)
+                for row in values.itertuples(index=False, name=None)]
+        columns = ', '.join(f'"{column}"' for column in self.META_COLUMNS + data_columns)
+        placeholders = ', '.join('?' for _ in range(len(self.META_COLUMNS) + len(data_columns)))
+        with self._lock:
+            conn = self.connect()
+            try:
+                self._ensure_columns(conn, table, data_columns)
+                conn.execute(f'DELETE FROM "{table}" WHERE quarter = ? AND source_file = ?', (quarter, source_file))
+                conn.executemany(f'INSERT INTO "{table}" ({columns}) VALUES ({placeholders})', rows)
+                conn.commit()
+            finally:
+                conn.close()
+        return len(rows)
+
+    def tables(self, conn: sqlite3.Connection, schema: str = 'main') -> List[str]:
+        return [row[0] for row in conn.execute(f"SELECT name FROM {schema}.sqlite_master WHERE type = 'table'")]
+
+    def row_counts(self, quarters: List[str] = None, city_codes: List[str] = None) -> Dict[str, int]:
+        """各資料表的筆數（可只計算指定季度 / 縣市）"""
+        if not os.path.exists(self.path):
+            return {}
+        where, params = self._partition_filter(quarters, city_codes)
+        conn = self.connect()
+        try:
+            return {table: conn.execute(f'SELECT COUNT(*) FROM "{table}"{where}', params).fetchone()[0]
+                    for table in self.tables(conn)}
+        finally:
+            conn.close()
+
+    def city_history(self) -> Dict[str, float]:
+        """各縣市每季的平均筆數（所有資料表合計），作為下次分片的歷史筆數"""
+        if not os.path.exists(self.path):
+            return {}
+        history: Dict[str, float] = {}
+        conn = self.connect()
+        try:
+            for table in self.tables(conn):
+                for city_code, rows, quarters in conn.execute(
+                        f'SELECT "縣市代碼", COUNT(*), COUNT(DISTINCT quarter) FROM "{table}" GROUP BY "縣市代碼"'):
+                    history[city_code] = history.get(city_code, 0.0) + rows / max(quarters, 1)
+        finally:
+            conn.close()
+        return history
+
+    @staticmethod
+    def _partition_filter(quarters: List[str] = None, city_codes: List[str] = None) -> Tuple[str, list]:
+        conditions, params = [], []
+        for column, values in (('quarter', quarters), ('縣市代碼', city_codes)):
+            if values:
+                conditions.append(f'"{column}" IN ({", ".join("?" for _ in values)})')
+                params.extend(values)
+        return (' WHERE ' + ' AND '.join(conditions) if conditions else ''), params
+
+    def merge_into(self, central: 'SqliteStandIn', quarters: List[str], city_codes: List[str]) -> int:
+        """將指定季度 / 縣市的資料合併到中央（先刪除中央同季度同縣市的資料，可重複執行），回傳筆數"""
+        where, params = self._partition_filter(quarters, city_codes)
+        merged = 0
+        conn = central.connect()
+        try:
+            conn.execute('ATTACH DATABASE ? AS node', (self.path,))
+            for table in self.tables(conn, 'node'):
+                columns = [row[1] for row in conn.execute(f'PRAGMA node.table_info("{table}")')]
+                central._ensure_columns(conn, table, columns)
+                column_list = ', '.join(f'"{column}"' for column in columns)
+                conn.execute(f'DELETE FROM main."{table}"{where}', params)
+                cursor = conn.execute(f'INSERT INTO main."{table}" ({column_list}) '
+                                      f'SELECT {column_list} FROM node."{table}"{where}', params)
+                merged += cursor.rowcount
+            conn.commit()
+            conn.execute('DETACH DATABASE node')
+        finally:
+            conn.close()
+        return merged
+
+
+class NodeWriter:
+    """節點的匯入端：SQL Server（DB_CONFIG，或以節點的 db_config 覆寫）或本機測試用的 SQLite"""
+
+    def __init__(self, node: Dict):
+        self.node = node
+        self.stand_in = SqliteStandIn(node['sqlite']) if node.get('sqlite') else None
+        self.file_mapping = FileTypeMapping()
+        self.city_mapping = CityCodeMapping()
+
+    def import_file(self, file_path: str, folder: str) -> Dict:
+        """匯入單一檔案，結果格式同 import_new_folders.import_single_file_worker（另含 city_code，folder 為季度）"""
+        from enhanced_data_importer import EnhancedDataImporter
+
+        filename = os.path.basename(file_path)
+        quarter = zip_source.folder_name(folder)
+        start_time = time.time()
+        success, records, error = False, 0, None
+        try:
+            if self.stand_in is not None:
+                # SQLite 沒有維度資料表與交易明細，寫入字典編碼前的清理結果
+                importer = EnhancedDataImporter(use_dictionary_encoding=False, build_transaction_detail=False)
+                prepared = importer.prepare_file(file_path)
+                if prepared is not None:
+                    df, file_stats = prepared
+                    file_info = self.file_mapping.get_file_info(filename)
+                    city_code = self.city_mapping.extract_city_code_from_filename(filename)
+                    records = self.stand_in.write(file_info['database_name'], file_info['table_name'], df, quarter,
+                                                  filename, city_code, self.city_mapping.get_city_name(city_code))
+                    success = records == file_stats['rows']
+                    if not success:
+                        error = f"寫入 {records} 筆，與檔案統計 {file_stats['rows']} 筆不符"
+            else:
+                importer = EnhancedDataImporter(db_config=self.node.get('db_config'))
+                success = importer.import_single_file(file_path, quarter)
+                records = importer.last_file_stats['rows'] if success and importer.last_file_stats else 0
+        except Exception as e:
+            error = str(e)
+            logger.error(f"❌ 匯入 {filename} 失敗: {error}")
+        if not success and error is None:
+            error = '匯入失敗（詳見日誌）'
+
+        return {
+            'filename': filename,
+            'file_path': file_path,
+            'folder': quarter,
+            'city_code': self.city_mapping.extract_city_code_from_filename(filename),
+            'success': success,
+            'records': records if success else 0,
+            'processing_time': time.time() - start_time,
+            'error': None if success else error
+        }
+
+
+def run_node(plan_dir, node_name: str) -> Dict:
+    """
+    節點匯入計畫中分配到的縣市（預估筆數大的縣市先開始），統計寫入 node-<節點>.json
+
+    Returns:
+        節點統計 {'node', 'seconds', 'files', 'failed', 'rows', 'cities': {縣市代碼: {...}}, 'results'}
+    """
+    plan = load_plan(plan_dir)
+    node = resolve_node(plan, node_name)
+    assigned = plan['nodes'][node_name]['cities']
+    files = [(file_path, folder) for city_code in assigned for file_path, folder in plan['cities'][city_code]['files']]
+    logger.info(f"🚀 節點 {node_name}: {len(assigned)} 個縣市 ({', '.join(assigned)})，{len(files)} 個檔案，"
+                f"{node_capacity(node)} 個執行緒")
+
+    writer = NodeWriter(node)
+    start_time = time.time()
+    results = []
+    with ThreadPoolExecutor(max_workers=node_capacity(node)) as executor:
+        futures = [executor.submit(writer.import_file, file_path, folder) for file_path, folder in files]
+        for future in as_completed(futures):
+            results.append(future.result())
+
+    cities: Dict[str, Dict] = {}
+    for result in results:
+        city = cities.setdefault(result['city_code'], {'files': 0, 'failed': 0, 'rows': 0, 'seconds': 0.0})
+        city['files'] += 1
+        city['failed'] += 0 if result['success'] else 1
+        city['rows'] += result['records']
+        city['seconds'] += result['processing_time']
+    stats = {
+        'node': node_name,
+        'finished': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'seconds': time.time() - start_time,
+        'files': len(results),
+        'failed': sum(1 for result in results if not result['success']),
+        'rows': sum(result['records'] for result in results),
+        'cities': cities,
+        'results': results
+    }
+    with open(node_stats_path(plan_dir, node_name), 'w', encoding='utf-8') as f:
+        json.dump(stats, f, ensure_ascii=False, indent=2)
+    logger.info(f"{'✅' if not stats['failed'] else '⚠️'} 節點 {node_name} 完成: {stats['files']} 個檔案"
+                f"（失敗 {stats['failed']}），{stats['rows']:,} 筆，耗時 {stats['seconds']:.1f} 秒")
+    return stats
+
+
+def _node_process(plan_dir: str, node_name: str):
+    """子程序進入點：各節點另外寫入自己的日誌檔"""
+    setup_logging(str(Path(plan_dir) / f"node-{node_name}.log"))
+    run_node(plan_dir, node_name)
+
+
+def run_local_nodes(plan_dir, node_names: List[str] = None) -> bool:
+    """在本機以每個節點一個子程序執行計畫（子程序中仍可再建立大型檔案的解析程序池），回傳是否全部正常結束"""
+    node_names = node_names or list(load_plan(plan_dir)['nodes'])
+    processes = [multiprocessing.Process(target=_node_process, args=(str(plan_dir), name), name=f"shard-{name}")
+                 for name in node_names]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    failed = [process.name for process in processes if process.exitcode != 0]
+    if failed:
+        logger.error(f"❌ 節點程序異常結束: {', '.join(failed)}")
+    return not failed
+
+
+def load_node_stats(plan_dir) -> Dict[str, Dict]:
+    """已完成節點的統計 {節點名稱: 統計}"""
+    stats = {}
+    for node_name in load_plan(plan_dir)['nodes']:
+        path = node_stats_path(plan_dir, node_name)
+        if path.exists():
+            with open(path, 'r', encoding='utf-8') as f:
+                stats[node_name] = json.load(f)
+    return stats
+
+
+def build_report(plan_dir) -> Optional[Dict]:
+    """
+    彙整各節點統計為一份報告（寫入計畫目錄的 report.txt）
+
+    Returns:
+        {'files', 'failed', 'rows', 'seconds'（最慢節點）, 'imbalance'（最慢 / 平均節點耗時）, 'missing'（未完成節點）}
+    """
+    plan = load_plan(plan_dir)
+    node_stats = load_node_stats(plan_dir)
+    if not node_stats:
+        logger.error(f"❌ {plan_dir} 沒有任何節點完成")
+        return None
+
+    missing = [name for name in plan['nodes'] if name not in node_stats]
+    seconds = [stats['seconds'] for stats in node_stats.values()]
+    summary = {
+        'files': sum(stats['files'] for stats in node_stats.values()),
+        'failed': sum(stats['failed'] for stats in node_stats.values()),
+        'rows': sum(stats['rows'] for stats in node_stats.values()),
+        'seconds': max(seconds),
+        'imbalance': max(seconds) / (sum(seconds) / len(seconds)) if sum(seconds) else 1.0,
+        'missing': missing
+    }
+
+    lines = [
+        "縣市分片匯入統計報告",
+        f"計畫: {plan_dir}（{plan['created']}，資料夾: {', '.join(plan['folders'])}）",
+        f"分配依據: {'歷史筆數' if plan['basis'] == 'history' else '檔案大小'}",
+        f"總檔案數: {summary['files']}（失敗 {summary['failed']}）",
+        f"總記錄數: {summary['rows']:,}",
+        f"完成時間（最慢節點）: {summary['seconds']:.1f} 秒，節點不平衡（最慢 / 平均）: {summary['imbalance']:.2f}",
+    ]
+    if missing:
+        lines.append(f"未完成節點: {', '.join(missing)}")
+    lines.append("")
+    lines.append("各節點統計:")
+    for name, node in plan['nodes'].items():
+        stats = node_stats.get(name)
+        if stats is None:
+            lines.append(f"  {name}: 未完成（{', '.join(node['cities'])}）")
+            continue
+        estimate = (f"，預估 {node['estimated_rows']:,} 筆（實際 / 預估 {stats['rows'] / node['estimated_rows']:.2f}）"
+                    if plan['basis'] == 'history' and node['estimated_rows'] else '')
+        rate = stats['rows'] / stats['seconds'] if stats['seconds'] else 0
+        lines.append(f"  {name}: {', '.join(node['cities']) or '（無）'} | {stats['files']} 個檔案（失敗 {stats['failed']}）"
+                     f" | {stats['rows']:,} 筆{estimate} | {stats['seconds']:.1f} 秒，{rate:,.0f} 筆/秒")
+    lines.append("")
+    lines.append("各縣市統計:")
+    for name, stats in node_stats.items():
+        for city_code, city in sorted(stats['cities'].items(), key=lambda item: -item[1]['rows']):
+            lines.append(f"  {city_code} {plan['cities'][city_code]['city_name']}: {city['rows']:,} 筆，"
+                         f"{city['files']} 個檔案（失敗 {city['failed']}），檔案處理合計 {city['seconds']:.1f} 秒（{name}）")
+    failed_results = [result for stats in node_stats.values() for result in stats['results'] if not result['success']]
+    if failed_results:
+        lines.append("")
+        lines.append("失敗的檔案:")
+        for result in failed_results:
+            lines.append(f"  {result['folder']}/{result['filename']}: {result['error']}")
+
+    with open(Path(plan_dir) / REPORT_FILE, 'w', encoding='utf-8') as f:
+        f.write("\n".join(lines) + "\n")
+    for line in lines:
+        logger.info(line)
+    logger.info(f"📄 統計報告已保存到: {Path(plan_dir) / REPORT_FILE}")
+    return summary
+
+
+def _successful_results(node_stats: Dict[str, Dict]) -> Dict[str, List[Dict]]:
+    return {name: [result for result in stats['results'] if result['success']] for name, stats in node_stats.items()}
+
+
+def consolidate_local(plan_dir) -> bool:
+    """本機測試：各節點的 SQLite 合併到中央 SQLite，並比對中央筆數與各節點統計"""
+    plan = load_plan(plan_dir)
+    central = SqliteStandIn(plan['central_sqlite'])
+    expected = 0
+    for name, results in _successful_results(load_node_stats(plan_dir)).items():
+        if not results:
+            continue
+        quarters = sorted({result['folder'] for result in results})
+        city_codes = sorted({result['city_code'] for result in results})
+        merged = SqliteStandIn(resolve_node(plan, name)['sqlite']).merge_into(central, quarters, city_codes)
+        expected += sum(result['records'] for result in results)
+        logger.info(f"🔀 節點 {name} 合併到 {central.path}: {merged:,} 筆")
+
+    quarters = [zip_source.folder_name(folder) for folder in plan['folders']]
+    actual = sum(central.row_counts(quarters, list(plan['cities'])).values())
+    if actual != expected:
+        logger.error(f"❌ 中央筆數 {actual:,} 與各節點統計 {expected:,} 不符")
+        return False
+    logger.info(f"✅ 中央筆數 {actual:,} 與各節點統計一致")
+    return True
+
+
+def refresh_detail(results: List[Dict]) -> bool:
+    """合併後在中央更新交易明細（節點的明細表以節點自己的資料計算，不直接複製）"""
+    import pyodbc
+    from transaction_detail import TransactionDetail
+
+    file_mapping = FileTypeMapping()
+    by_data_type: Dict = {}
+    for result in results:
+        data_type, file_type = file_mapping.get_file_type(result['filename'])
+        by_data_type.setdefault(data_type, []).append((file_type, result))
+
+    success = True
+    for data_type, items in by_data_type.items():
+        detail = TransactionDetail(data_type)
+        try:
+            setup_conn = pyodbc.connect(detail.connection_string, autocommit=True)
+            try:
+                detail.ensure_table(setup_conn.cursor())
+            finally:
+                setup_conn.close()
+            conn = pyodbc.connect(detail.connection_string)
+        except Exception as e:
+            success = False
+            logger.error(f"❌ {detail.database_name} 交易明細更新失敗: {str(e)}")
+            continue
+        try:
+            # 每個檔案各自以短交易更新（同一縣市依序執行）
+            for file_type, result in items:
+                detail.refresh_file(conn, file_type, result['city_code'], result['filename'], result['folder'])
+        except Exception as e:
+            success = False
+            logger.error(f"❌ {detail.database_name} 交易明細更新失敗: {str(e)}")
+        finally:
+            conn.close()
+    return success
+
+
+def consolidate(plan_dir, backup_after: bool = True, refresh_summary: bool = None,
+                refresh_unified: bool = None) -> bool:
+    """
+    合併各節點的結果：寫入自己 SQL Server 執行個體的節點，依季度 / 縣市匯出 Parquet 快照並載入中央資料庫
+    （中央同季度同縣市的資料先刪除，可重複執行），之後在中央更新交易明細、價格彙總、跨市場整合資料並備份
+    """
+    from import_stats import STATS_TABLE
+    from parquet_snapshot import ParquetSnapshot
+    import import_new_folders
+
+    plan = load_plan(plan_dir)
+    if plan.get('central_sqlite'):
+        return consolidate_local(plan_dir)
+
+    node_stats = load_node_stats(plan_dir)
+    missing = [name for name in plan['nodes'] if name not in node_stats]
+    if missing:
+        logger.error(f"❌ 節點尚未完成，無法合併: {', '.join(missing)}")
+        return False
+    if refresh_summary is None:
+        refresh_summary = import_new_folders.SUMMARY_AFTER_IMPORT
+    if refresh_unified is None:
+        refresh_unified = import_new_folders.UNIFIED_AFTER_IMPORT
+
+    file_mapping = FileTypeMapping()
+    success = True
+    copied = []
+    for name, results in _successful_results(node_stats).items():
+        node = resolve_node(plan, name)
+        if not node.get('db_config') or not results:
+            # 直接寫入中央資料庫的節點不需合併
+            continue
+        quarters = sorted({result['folder'] for result in results})
+        city_codes = sorted({result['city_code'] for result in results})
+        tables = {STATS_TABLE}
+        database_names = set()
+        for result in results:
+            file_info = file_mapping.get_file_info(result['filename'])
+            tables.add(file_info['table_name'])
+            database_names.add(file_info['database_name'])
+
+        logger.info(f"🔀 合併節點 {name}（{node['db_config'].get('server')}）: 季度 {', '.join(quarters)}，"
+                    f"縣市 {', '.join(city_codes)}")
+        snapshot_dir = ParquetSnapshot(db_config=node['db_config']).export_snapshot(
+            sorted(database_names), sorted(tables), quarters, city_codes,
+            output_dir=str(Path(plan_dir) / 'consolidate' / name))
+        if not snapshot_dir or not ParquetSnapshot().import_snapshot(
+                str(snapshot_dir), sorted(database_names), sorted(tables), quarters, city_codes):
+            logger.error(f"❌ 節點 {name} 合併失敗")
+            success = False
+            continue
+        copied.extend(results)
+
+    if copied and BUILD_TRANSACTION_DETAIL:
+        success = refresh_detail(copied) and success
+
+    # 與 import_new_folders 相同：主要資料有匯入的季度更新彙總與整合資料，再備份有變動的資料庫
+    touched_databases = set()
+    touched_quarters: Dict[str, set] = {}
+    for results in _successful_results(node_stats).values():
+        for result in results:
+            data_type, file_type = file_mapping.get_file_type(result['filename'])
+            database_name = file_mapping.get_database_name(data_type)
+            touched_databases.add(database_name)
+            if file_type == FileType.MAIN:
+                touched_quarters.setdefault(database_name, set()).add(result['folder'])
+    if refresh_summary and touched_quarters:
+        import_new_folders.refresh_summary_after_import(touched_quarters)
+    if refresh_unified and touched_quarters:
+        unified_database = import_new_folders.refresh_unified_after_import(touched_quarters)
+        if unified_database:
+            touched_databases.add(unified_database)
+    if backup_after and touched_databases:
+        import_new_folders.backup_after_import(sorted(touched_databases))
+    return success
+
+
+def run_all(folders: List[str], nodes: List[Dict] = None, consolidate_after: bool = True, backup_after: bool = True,
+            refresh_summary: bool = None, refresh_unified: bool = None) -> bool:
+    """建立計畫、在本機以子程序執行所有節點、彙整報告並合併（節點在其他機器時改用 plan / run / report / consolidate）"""
+    plan_dir = create_plan(folders, nodes)
+    if plan_dir is None:
+        return False
+    success = run_local_nodes(plan_dir)
+    summary = build_report(plan_dir)
+    if summary is None or summary['missing']:
+        return False
+    if consolidate_after:
+        success = consolidate(plan_dir, backup_after, refresh_summary, refresh_unified) and success
+    return success and not summary['failed']
+
+
+def run_local_test(folders: List[str], node_count: int = 3, workers: int = None) -> bool:
+    """
+    本機測試：node_count 個子程序節點各以一個 SQLite 檔案代替資料庫，合併到 SHARD_DIR 中的中央 SQLite 檔案，
+    並比對中央筆數與各節點統計（中央檔案保留，下次執行時作為各縣市的歷史筆數）
+    """
+    timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+    plan_dir = Path(SHARD_DIR) / f"local_{timestamp}"
+    central = SqliteStandIn(Path(SHARD_DIR) / LOCAL_CENTRAL_DB)
+    nodes = [{'name': f"local{i}", 'sqlite': str(plan_dir / f"local{i}.db"), 'workers': workers or MAX_WORKERS}
+             for i in range(1, node_count + 1)]
+    plan_dir = create_plan(folders, nodes, history=central.city_history(), plan_dir=str(plan_dir),
+                           central_sqlite=central.path)
+    if plan_dir is None:
+        return False
+    success = run_local_nodes(plan_dir)
+    summary = build_report(plan_dir)
+    if summary is None or summary['missing']:
+        return False
+    return consolidate_local(plan_dir) and success and not summary['failed']
@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+"""
+清理結果快取
+資料表結構變更時會以 rebuild_tables_with_city.py 刪除重建所有資料表，再重新解析、清理每一季的每個 CSV；
+此模組將每個檔案清理後（字典編碼前）的資料以壓縮的 Parquet 檔案保存，
+以 (檔案內容雜湊, 清理規則版本) 為鍵，重建後再次匯入同一個檔案時略過 CSV 解碼與清理，
+直接由 Parquet 逐個 row group 串流交給寫入流程
+
+快取結構:
+    cleaned_cache/<內容雜湊>-v<清理規則版本>-<欄位定義摘要>.parquet   清理後的資料
+    cleaned_cache/<同上>.json                                        檔案統計（import_stats）與欄位；最後使用時間
+
+JSON 檔最後寫入，兩個檔案都存在才視為有效項目；超過 CLEANED_CACHE_MAX_MB 時依最後使用時間刪除最舊的項目
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from typing import Dict, Iterator, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+try:
+    from config import CLEANED_CACHE_DIR
+except ImportError:
+    CLEANED_CACHE_DIR = 'cleaned_cache'
+
+try:
+    from config import CLEANED_CACHE_MAX_MB
+except ImportError:
+    CLEANED_CACHE_MAX_MB = 4096
+
+try:
+    from config import CLEANED_CACHE_COMPRESSION
+except ImportError:
+    CLEANED_CACHE_COMPRESSION = 'zstd'
+
+logger = logging.getLogger(__name__)
+
+PARQUET_SUFFIX = '.parquet'
+META_SUFFIX = '.json'
+
+# 由快取串流讀取時每次取得的筆數（與寫入時的 row group 大小無關）
+READ_BATCH_ROWS = 50000
+
+# 同一程序中的寫入與淘汰互斥（多個匯入執行緒共用快取目錄）
+_lock = threading.Lock()
+
+
+def cache_key(content_hash: str, plan_version: int, numeric_columns: List[str], string_columns: List[str]) -> str:
+    """
+    快取鍵: 內容雜湊 + 清理規則版本 + 欄位定義摘要
+    欄位漂移檢查新增欄位後數值 / 文字欄位不同，清理結果也不同，因此一併納入
+    """
+    columns_digest = hashlib.sha256(
+        json.dumps([sorted(numeric_columns), sorted(string_columns)], ensure_ascii=False).encode('utf-8')
+    ).hexdigest()[:12]
+    return f"{content_hash.split(':')[-1]}-v{plan_version}-{columns_digest}"
+
+
+class CacheWriter:
+    """
+    寫入單一快取項目：資料分批寫入暫存檔，commit 時才改名為正式檔案並寫入統計
+    寫入失敗不影響匯入（只記錄警告並放棄此項目）
+    """
+
+    def __init__(self, cache: 'CleanedCache', key: str):
+        self.cache = cache
+        self.key = key
+        self.temp_path = f"{cache.data_path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        self._writer = None
+        self._schema = None
+        self.rows = 0
+        self.failed = False
+        self.committed = False
+
+    def write(self, df: pd.DataFrame):
+        """寫入一批清理後的資料（pandas 或 Arrow 欄位皆可）"""
+        if self.failed or df.empty:
+            return
+        try:
+            table = pa.Table.from_pandas(df, schema=self._schema, preserve_index=False)
+            if self._writer is None:
+                self._schema = table.schema
+                self._writer = pq.ParquetWriter(self.temp_path, self._schema, compression=self.cache.compression)
+            self._writer.write_table(table)
+            self.rows += len(df)
+        except Exception as e:
+            logger.warning(f"⚠️ 清理結果快取寫入失敗（不影響匯入）: {str(e)}")
+            self.abort()
+
+    def commit(self, file_stats: Dict) -> bool:
+        """完成寫入：改名為正式檔案並寫入統計，之後依大小上限淘汰舊項目"""
+        if self.failed or self._writer is None:
+            self.abort()
+            return False
+        try:
+            self._writer.close()
+            self._writer = None
+            with _lock:
+                os.replace(self.temp_path, self.cache.data_path(self.key))
+                with open(self.cache.meta_path(self.key), 'w', encoding='utf-8') as f:
+                    json.dump({'rows': self.rows, 'file_stats': file_stats, 'created_at': time.time()},
+                              f, ensure_ascii=False)
+            self.committed = True
+            self.cache.evict(keep={self.key})
+            return True
+        except Exception as e:
+            logger.warning(f"⚠️ 清理結果快取寫入失敗（不影響匯入）: {str(e)}")
+            self.abort()
+            return False
+
+    def abort(self):
+        """放棄此項目並刪除暫存檔（已完成的項目不受影響）"""
+        if self.committed:
+            return
+        self.failed = True
+        if self._writer is not None:
+            try:
+                self._writer.close()
+            except Exception:
+                pass
+            self._writer = None
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+
+class CleanedCache:
+    """清理結果快取目錄"""
+
+    def __init__(self, cache_dir: str = None, max_mb: int = None, compression: str = None):
+        self.cache_dir = cache_dir or CLEANED_CACHE_DIR
+        self.max_bytes = (max_mb if max_mb is not None else CLEANED_CACHE_MAX_MB) * 1024 * 1024
+        self.compression = compression or CLEANED_CACHE_COMPRESSION
+
+    def data_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + PARQUET_SUFFIX)
+
+    def meta_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + META_SUFFIX)
+
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        取得快取項目的統計（不存在時回傳 None），並更新最後使用時間
+
+        Returns:
+            {'rows', 'file_stats', 'columns'}
+        """
+        meta_path = self.meta_path(key)
+        data_path = self.data_path(key)
+        if not (os.path.exists(meta_path) and os.path.exists(data_path)):
+            return None
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            meta['columns'] = pq.ParquetFile(data_path).schema_arrow.names
+            os.utime(meta_path)
+        except (OSError, ValueError, pa.ArrowInvalid) as e:
+            logger.warning(f"⚠️ 略過損毀的清理結果快取 {key}: {str(e)}")
+            self.remove(key)
+            return None
+        return meta
+
+    def iter_frames(self, key: str, arrow_dtypes: bool = False,
+                    batch_rows: int = READ_BATCH_ROWS) -> Iterator[pd.DataFrame]:
+        """
+        逐批讀出快取的清理結果
+
+        Args:
+            arrow_dtypes: True 時欄位為 pd.ArrowDtype（arrow 引擎），否則為一般 pandas 型別
+        """
+        parquet_file = pq.ParquetFile(self.data_path(key))
+        for batch in parquet_file.iter_batches(batch_size=batch_rows):
+            if arrow_dtypes:
+                yield batch.to_pandas(types_mapper=pd.ArrowDtype)
+            else:
+                yield batch.to_pandas()
+
+    def writer(self, key: str) -> CacheWriter:
+        """建立快取項目寫入器"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        return CacheWriter(self, key)
+
+    def remove(self, key: str):
+        """刪除快取項目（統計檔先刪除，項目立即失效）"""
+        for path in (self.meta_path(key), self.data_path(key)):
+            try:
+                os.remove(path)
+            except OSError:
+                # 已被其他執行緒刪除，或仍在讀取中（Windows）
+                pass
+
+    def entries(self) -> List[Dict]:
+        """所有有效的快取項目 [{'key', 'bytes', 'last_used'}]（依最後使用時間由舊到新）"""
+        if not os.path.isdir(self.cache_dir):
+            return []
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(META_SUFFIX):
+                continue
+            key = name[:-len(META_SUFFIX)]
+            try:
+                entries.append({
+                    'key': key,
+                    'bytes': os.path.getsize(self.data_path(key)),
+                    'last_used': os.path.getmtime(self.meta_path(key))
+                })
+            except OSError:
+                continue
+        return sorted(entries, key=lambda entry: entry['last_used'])
+
+    def evict(self, keep: set = None) -> int:
+        """總大小超過上限時，依最後使用時間刪除最舊的項目，回傳刪除數"""
+        keep = keep or set()
+        with _lock:
+            entries = self.entries()
+            total = sum(entry['bytes'] for entry in entries)
+            removed = 0
+            for entry in entries:
+                if total <= self.max_bytes:
+                    break
+                if entry['key'] in keep:
+                    continue
+                self.remove(entry['key'])
+                total -= entry['bytes']
+                removed += 1
+        if removed:
+            logger.info(f"🧹 清理結果快取淘汰 {removed} 個項目，目前 {total / 1024 / 1024:,.1f} MB")
+        return removed
+
+    def clear(self) -> int:
+        """刪除所有快取項目與殘留的暫存檔，回傳刪除的項目數"""
+        entries = self.entries()
+        for entry in entries:
+            self.remove(entry['key'])
+        if os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                if name.endswith('.tmp'):
+                    os.remove(os.path.join(self.cache_dir, name))
+        return len(entries)
+
+    def stats(self) -> Dict:
+        """快取項目數與總大小"""
+        entries = self.entries()
+        return {
+            'entries': len(entries),
+            'bytes': sum(entry['bytes'] for entry in entries),
+            'max_bytes': self.max_bytes
+        }
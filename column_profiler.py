@@ -0,0 +1,406 @@
+# -*- coding: utf-8 -*-
+"""
+欄位資料剖析工具
+掃描所有季度資料夾，統計每個欄位的實際最大長度、數值範圍、空值比例與基數，
+並依據統計結果產生精簡後的資料表結構（縮小每列寬度，降低 Express 1.4 GB 記憶體上限下的緩衝池壓力）
+"""
+
+import os
+import re
+import glob
+import json
+import math
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from config import DATA_FOLDERS
+from log_setup import setup_logging
+from file_type_mapping import FileTypeMapping
+from city_code_mapping import CityCodeMapping
+from rebuild_tables_with_city import get_table_structures
+
+logger = logging.getLogger(__name__)
+
+# 不同值數量不超過此門檻的字串欄位，建議改為查找表 (lookup ID)
+LOW_CARDINALITY_THRESHOLD = 1000
+
+# 追蹤不同值的上限，超過後只記錄為「高基數」以節省記憶體
+DISTINCT_TRACKING_LIMIT = 10000
+
+# 即使基數很低也不建議改為查找表的欄位（識別碼、日期等）
+LOOKUP_EXCLUDED_COLUMNS = {
+    '縣市代碼', '編號', '移轉編號', 'source_file', 'quarter',
+    '交易年月日', '租賃年月日', '建築完成年月', '建築完成日期'
+}
+
+# DECIMAL 精確度對應的儲存位元組邊界 (1-9: 5 bytes, 10-19: 9 bytes, 20-28: 13 bytes, 29-38: 17 bytes)
+DECIMAL_PRECISION_BOUNDARIES = [9, 19, 28, 38]
+
+# 整數型別與範圍
+INTEGER_TYPES = [
+    ('TINYINT', 0, 255),
+    ('SMALLINT', -32768, 32767),
+    ('INT', -2147483648, 2147483647),
+    ('BIGINT', -9223372036854775808, 9223372036854775807)
+]
+
+
+def parse_column_definition(definition: str) -> Tuple[str, str]:
+    """拆解 '欄位名稱 型別' 定義，回傳 (欄位名稱, 型別)，欄位名稱去除中括號"""
+    name, sql_type = definition.rsplit(' ', 1)
+    return name.strip('[]'), sql_type
+
+
+def format_column_definition(name: str, sql_type: str) -> str:
+    """組合欄位定義，含特殊字元的欄位名稱加上中括號"""
+    if '-' in name:
+        name = f'[{name}]'
+    return f"{name} {sql_type}"
+
+
+class ColumnStats:
+    """單一欄位的累計統計資訊"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.total_count = 0
+        self.null_count = 0
+        self.max_length = 0
+        self.ascii_only = True
+        self.numeric_count = 0
+        self.strict_numeric_count = 0
+        self.integer_only = True
+        self.min_value = None
+        self.max_value = None
+        self.max_scale = 0
+        self.distinct_values = set()
+        self.distinct_overflow = False
+
+    def update(self, series: pd.Series):
+        """以一批資料更新統計（series 為原始字串）"""
+        values = series.fillna('').astype(str).str.strip()
+        values = values[~values.isin(['', 'nan', 'None', 'null'])]
+
+        self.total_count += len(series)
+        self.null_count += len(series) - len(values)
+
+        if values.empty:
+            return
+
+        self.max_length = max(self.max_length, int(values.str.len().max()))
+        if self.ascii_only:
+            self.ascii_only = bool(values.map(str.isascii).all())
+
+        # 數值判斷：與 clean_data 相同，移除千分位等非數值字元後再轉換
+        cleaned = values.str.replace(r'[^\d.-]', '', regex=True)
+        numbers = pd.to_numeric(cleaned, errors='coerce').dropna()
+        self.numeric_count += len(numbers)
+        # 僅移除千分位即可轉換者才視為純數值欄位（避免 'RPQ...' 之類的編號被誤判）
+        strict_numbers = pd.to_numeric(values.str.replace(',', '', regex=False), errors='coerce')
+        self.strict_numeric_count += int(strict_numbers.notna().sum())
+        if not numbers.empty:
+            batch_min = float(numbers.min())
+            batch_max = float(numbers.max())
+            self.min_value = batch_min if self.min_value is None else min(self.min_value, batch_min)
+            self.max_value = batch_max if self.max_value is None else max(self.max_value, batch_max)
+            if self.integer_only and not (numbers == numbers.round()).all():
+                self.integer_only = False
+            decimals = cleaned[cleaned.str.contains('.', regex=False)]
+            if not decimals.empty:
+                scale = int(decimals.str.split('.').str[-1].str.rstrip('0').str.len().max())
+                self.max_scale = max(self.max_scale, scale)
+
+        if not self.distinct_overflow:
+            self.distinct_values.update(values.unique())
+            if len(self.distinct_values) > DISTINCT_TRACKING_LIMIT:
+                self.distinct_overflow = True
+                self.distinct_values.clear()
+
+    @property
+    def non_null_count(self) -> int:
+        return self.total_count - self.null_count
+
+    @property
+    def null_ratio(self) -> float:
+        return self.null_count / self.total_count if self.total_count else 0.0
+
+    @property
+    def cardinality(self) -> Optional[int]:
+        """不同值數量，超過追蹤上限時回傳 None"""
+        return None if self.distinct_overflow else len(self.distinct_values)
+
+    @property
+    def all_numeric(self) -> bool:
+        return self.non_null_count > 0 and self.strict_numeric_count == self.non_null_count
+
+    def to_dict(self) -> Dict:
+        return {
+            'name': self.name,
+            'total_count': self.total_count,
+            'null_count': self.null_count,
+            'null_ratio': round(self.null_ratio, 4),
+            'max_length': self.max_length,
+            'ascii_only': self.ascii_only,
+            'all_numeric': self.all_numeric,
+            'integer_only': self.integer_only,
+            'min_value': self.min_value,
+            'max_value': self.max_value,
+            'max_scale': self.max_scale,
+            'cardinality': self.cardinality
+        }
+
+
+class ColumnProfiler:
+    """欄位資料剖析器"""
+
+    def __init__(self, folders: List[str] = None, headroom: float = 1.25,
+                 low_cardinality_threshold: int = LOW_CARDINALITY_THRESHOLD):
+        self.folders = folders if folders is not None else list(DATA_FOLDERS)
+        self.headroom = headroom
+        self.low_cardinality_threshold = low_cardinality_threshold
+        self.file_mapping = FileTypeMapping()
+        self.city_mapping = CityCodeMapping()
+        # {(data_type.value, table_name): {column_name: ColumnStats}}
+        self.profiles: Dict[Tuple[str, str], Dict[str, ColumnStats]] = {}
+        self.files_profiled = 0
+
+    def read_csv_as_text(self, file_path: str) -> Optional[pd.DataFrame]:
+        """以字串型態讀取 CSV（跳過第二行英文欄位名稱），保留原始值以便統計"""
+        for encoding in ['utf-8', 'big5', 'cp950', 'gbk']:
+            try:
+                return pd.read_csv(file_path, encoding=encoding, skiprows=[1],
+                                   dtype=str, keep_default_na=False)
+            except UnicodeDecodeError:
+                continue
+            except Exception as e:
+                logger.error(f"❌ 讀取 {file_path} 失敗: {str(e)}")
+                return None
+
+        logger.error(f"❌ 無法讀取 {file_path}，所有編碼都失敗")
+        return None
+
+    def profile_file(self, file_path: str, quarter: str) -> bool:
+        """剖析單一 CSV 檔案"""
+        filename = os.path.basename(file_path)
+        file_info = self.file_mapping.get_file_info(filename)
+        city_info = self.city_mapping.get_city_info_from_filename(filename)
+        if not file_info or not city_info:
+            return False
+
+        df = self.read_csv_as_text(file_path)
+        if df is None or df.empty:
+            return False
+
+        # 匯入時會額外寫入的欄位也一併剖析
+        df['縣市代碼'] = city_info['city_code']
+        df['縣市名稱'] = city_info['city_name']
+        df['source_file'] = filename
+        df['quarter'] = quarter
+
+        key = (file_info['data_type'].value, file_info['table_name'])
+        table_profile = self.profiles.setdefault(key, {})
+        for column in df.columns:
+            if column not in table_profile:
+                table_profile[column] = ColumnStats(column)
+            table_profile[column].update(df[column])
+
+        self.files_profiled += 1
+        return True
+
+    def profile_folders(self) -> Dict[Tuple[str, str], Dict[str, ColumnStats]]:
+        """剖析所有季度資料夾"""
+        logger.info(f"🔍 開始剖析 {len(self.folders)} 個資料夾")
+
+        for folder in self.folders:
+            if not os.path.exists(folder):
+                logger.warning(f"⚠️ 資料夾不存在: {folder}")
+                continue
+
+            csv_files = glob.glob(os.path.join(folder, "*.csv"))
+            logger.info(f"📁 {folder}: {len(csv_files)} 個CSV檔案")
+            for file_path in csv_files:
+                self.profile_file(file_path, folder)
+
+        logger.info(f"✅ 剖析完成，共 {self.files_profiled} 個檔案")
+        return self.profiles
+
+    def _with_headroom(self, length: int) -> int:
+        """字串長度加上預留空間，並進位到 10 的倍數"""
+        padded = max(int(math.ceil(length * self.headroom)), 10)
+        return int(math.ceil(padded / 10.0) * 10)
+
+    def suggest_numeric_type(self, stats: ColumnStats, current_type: str) -> str:
+        """
+        依數值範圍建議數值型別
+        來源定義為 DECIMAL 的欄位維持 DECIMAL（目前的資料都是整數，不代表之後的季度沒有小數），
+        只依數值範圍縮小精確度（小數位數維持原定義）；整數型別才依範圍改為較小的整數型別
+        """
+        low, high = stats.min_value, stats.max_value
+        declared = re.match(r'DECIMAL\((\d+),\s*(\d+)\)', current_type)
+        if stats.integer_only and not current_type.startswith('DECIMAL'):
+            for type_name, type_min, type_max in INTEGER_TYPES:
+                # 預留一倍空間，避免後續季度資料超出範圍
+                if low >= type_min and high * 2 <= type_max:
+                    return type_name
+            return 'BIGINT'
+
+        scale = int(declared.group(2)) if declared else stats.max_scale
+        integer_digits = len(str(int(max(abs(low), abs(high))))) + 1
+        precision = integer_digits + scale
+        for boundary in DECIMAL_PRECISION_BOUNDARIES:
+            if declared and boundary > int(declared.group(1)):
+                break
+            if precision <= boundary:
+                return f"DECIMAL({boundary},{scale})"
+        return current_type
+
+    def suggest_sql_type(self, stats: Optional[ColumnStats], current_type: str) -> str:
+        """依欄位統計建議 SQL 型別，沒有資料時保留原型別"""
+        if stats is None or stats.non_null_count == 0:
+            return current_type
+
+        is_numeric_column = current_type.startswith(('INT', 'BIGINT', 'SMALLINT', 'TINYINT', 'DECIMAL'))
+        if is_numeric_column and stats.min_value is not None:
+            return self.suggest_numeric_type(stats, current_type)
+
+        length = self._with_headroom(stats.max_length)
+        if stats.ascii_only:
+            return f"VARCHAR({length})"
+        return f"NVARCHAR({length})"
+
+    def is_lookup_candidate(self, stats: Optional[ColumnStats], sql_type: str) -> bool:
+        """判斷字串欄位是否適合改為查找表"""
+        if stats is None or stats.name in LOOKUP_EXCLUDED_COLUMNS:
+            return False
+        if not sql_type.startswith(('VARCHAR', 'NVARCHAR')):
+            return False
+        cardinality = stats.cardinality
+        return cardinality is not None and 0 < cardinality <= self.low_cardinality_threshold
+
+    def build_tightened_structures(self) -> Dict[str, Dict[str, List[str]]]:
+        """以剖析結果產生精簡後的資料表結構（格式同 get_table_structures）"""
+        tightened = {}
+        for db_type, tables in get_table_structures().items():
+            tightened[db_type] = {}
+            for table_name, columns in tables.items():
+                table_profile = self.profiles.get((db_type, table_name), {})
+                new_columns = []
+                for definition in columns:
+                    name, current_type = parse_column_definition(definition)
+                    sql_type = self.suggest_sql_type(table_profile.get(name), current_type)
+                    new_columns.append(format_column_definition(name, sql_type))
+                tightened[db_type][table_name] = new_columns
+        return tightened
+
+    def get_lookup_candidates(self) -> Dict[str, Dict[str, Dict]]:
+        """取得建議改為查找表的低基數字串欄位"""
+        candidates = {}
+        for db_type, tables in get_table_structures().items():
+            for table_name, columns in tables.items():
+                table_profile = self.profiles.get((db_type, table_name), {})
+                for definition in columns:
+                    name, current_type = parse_column_definition(definition)
+                    stats = table_profile.get(name)
+                    sql_type = self.suggest_sql_type(stats, current_type)
+                    if not self.is_lookup_candidate(stats, sql_type):
+                        continue
+                    id_type = 'TINYINT' if stats.cardinality <= 255 else 'SMALLINT'
+                    candidates.setdefault(db_type, {}).setdefault(table_name, {})[name] = {
+                        'cardinality': stats.cardinality,
+                        'id_type': id_type
+                    }
+        return candidates
+
+    def generate_schema_sql(self, structures: Dict[str, Dict[str, List[str]]]) -> str:
+        """產生精簡結構的 CREATE TABLE 腳本"""
+        database_mapping = {
+            data_type.value: db_name
+            for data_type, db_name in self.file_mapping.database_mapping.items()
+        }
+        lookup_candidates = self.get_lookup_candidates()
+
+        lines = [
+            "-- 依資料剖析結果精簡後的資料表結構",
+            f"-- 產生時間: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
+            f"-- 剖析檔案數: {self.files_profiled}",
+            ""
+        ]
+        for db_type, tables in structures.items():
+            db_name = database_mapping[db_type]
+            lines.append(f"-- {db_name} 資料庫")
+            for table_name, columns in tables.items():
+                for name, info in lookup_candidates.get(db_type, {}).get(table_name, {}).items():
+                    lines.append(f"-- 建議改為查找表: {name} ({info['cardinality']} 個不同值) → {info['id_type']} ID")
+                lines.append(f"CREATE TABLE [{db_name}].[dbo].[{table_name}] (")
+                lines.append("    id INT IDENTITY(1,1) PRIMARY KEY,")
+                lines.append(",\n".join(f"    {column}" for column in columns))
+                lines.append(");")
+                lines.append("")
+        return "\n".join(lines)
+
+    def save_results(self, output_prefix: str = 'column_profile') -> Dict[str, str]:
+        """儲存剖析報告、JSON 統計與精簡結構 SQL"""
+        structures = self.build_tightened_structures()
+
+        json_file = f"{output_prefix}.json"
+        with open(json_file, 'w', encoding='utf-8') as f:
+            json.dump({
+                'generated_at': datetime.now().isoformat(timespec='seconds'),
+                'files_profiled': self.files_profiled,
+                'profiles': {
+                    f"{db_type}.{table_name}": {name: stats.to_dict() for name, stats in table_profile.items()}
+                    for (db_type, table_name), table_profile in self.profiles.items()
+                },
+                'tightened_structures': structures,
+                'lookup_candidates': self.get_lookup_candidates()
+            }, f, ensure_ascii=False, indent=2)
+
+        sql_file = f"{output_prefix}_schema.sql"
+        with open(sql_file, 'w', encoding='utf-8') as f:
+            f.write(self.generate_schema_sql(structures))
+
+        report_file = f"{output_prefix}_report.txt"
+        with open(report_file, 'w', encoding='utf-8') as f:
+            f.write("欄位資料剖析結果\n")
+            f.write("=" * 50 + "\n")
+            for (db_type, table_name), table_profile in sorted(self.profiles.items()):
+                f.write(f"\n{db_type}.{table_name}:\n")
+                for name, stats in table_profile.items():
+                    cardinality = stats.cardinality if stats.cardinality is not None else f">{DISTINCT_TRACKING_LIMIT}"
+                    value_range = (f", 範圍 {stats.min_value:g} ~ {stats.max_value:g}"
+                                   if stats.all_numeric else "")
+                    f.write(f"  - {name}: 最大長度 {stats.max_length}, 空值 {stats.null_ratio:.1%}, "
+                            f"基數 {cardinality}{value_range}"
+                            f"{'' if stats.ascii_only else ', 含非ASCII'}\n")
+
+        logger.info(f"📄 剖析結果已儲存: {json_file}, {sql_file}, {report_file}")
+        return {'json': json_file, 'sql': sql_file, 'report': report_file}
+
+
+def load_tightened_structures(json_file: str = 'column_profile.json') -> Optional[Dict[str, Dict[str, List[str]]]]:
+    """讀取先前剖析產生的精簡資料表結構"""
+    if not os.path.exists(json_file):
+        return None
+    with open(json_file, 'r', encoding='utf-8') as f:
+        return json.load(f).get('tightened_structures')
+
+
+if __name__ == "__main__":
+    setup_logging('column_profiler.log')
+    import sys
+
+    print("🔍 LVR 欄位資料剖析工具")
+    print("=" * 80)
+
+    folders = sys.argv[1:] or None
+    profiler = ColumnProfiler(folders=folders)
+    profiler.profile_folders()
+    output_files = profiler.save_results()
+
+    print(f"\n✅ 剖析完成，共 {profiler.files_profiled} 個檔案")
+    print(f"   統計資料: {output_files['json']}")
+    print(f"   精簡結構: {output_files['sql']}")
+    print(f"   剖析報告: {output_files['report']}")
@@ -3,6 +3,8 @@
 -- LVR_UsedHouse 資料庫
 CREATE TABLE [LVR_UsedHouse].[dbo].[main_data] (
     id INT IDENTITY(1,1) PRIMARY KEY,
+    縣市代碼 NVARCHAR(10),
+    縣市名稱 NVARCHAR(50),
     鄉鎮市區 NVARCHAR(200),
     交易標的 NVARCHAR(200),
     土地位置建物門牌 NVARCHAR(500),
@@ -15,14 +17,14 @@ CREATE TABLE [LVR_UsedHouse].[dbo].[main_data] (
     移轉層次 NVARCHAR(50),
     總樓層數 INT,
     建物型態 NVARCHAR(200),
-    主要用途 NVARCHAR(200),
+    主要用途 NVARCHAR(1000),
     主要建材 NVARCHAR(200),
     建築完成年月 NVARCHAR(20),
     建物移轉總面積平方公尺 DECIMAL(15,2),
-    建物現況格局-房 INT,
-    建物現況格局-廳 INT,
-    建物現況格局-衛 INT,
-    建物現況格局-隔間 NVARCHAR(50),
+    [建物現況格局-房] INT,
+    [建物現況格局-廳] INT,
+    [建物現況格局-衛] INT,
+    [建物現況格局-隔間] NVARCHAR(50),
     有無管理組織 NVARCHAR(20),
     總價元 DECIMAL(15,2),
     單價元平方公尺 DECIMAL(15,2),
@@ -42,10 +44,12 @@ CREATE TABLE [LVR_UsedHouse].[dbo].[main_data] (
 
 CREATE TABLE [LVR_UsedHouse].[dbo].[build_data] (
     id INT IDENTITY(1,1) PRIMARY KEY,
+    縣市代碼 NVARCHAR(10),
+    縣市名稱 NVARCHAR(50),
     編號 NVARCHAR(100),
     屋齡 INT,
     建物移轉面積平方公尺 DECIMAL(15,2),
-    主要用途 NVARCHAR(200),
+    主要用途 NVARCHAR(1000),
     主要建材 NVARCHAR(200),
     建築完成日期 NVARCHAR(20),
     總層數 INT,
@@ -57,6 +61,8 @@ CREATE TABLE [LVR_UsedHouse].[dbo].[build_data] (
 
 CREATE TABLE [LVR_UsedHouse].[dbo].[land_data] (
     id INT IDENTITY(1,1) PRIMARY KEY,
+    縣市代碼 NVARCHAR(10),
+    縣市名稱 NVARCHAR(50),
     編號 NVARCHAR(100),
     土地位置 NVARCHAR(200),
     土地移轉面積平方公尺 DECIMAL(15,2),
@@ -71,6 +77,8 @@ CREATE TABLE [LVR_UsedHouse].[dbo].[land_data] (
 
 CREATE TABLE [LVR_UsedHouse].[dbo].[park_data] (
     id INT IDENTITY(1,1) PRIMARY KEY,
+    縣市代碼 NVARCHAR(10),
+    縣市名稱 NVARCHAR(50),
     編號 NVARCHAR(100),
     車位類別 NVARCHAR(50),
     車位價格 DECIMAL(15,2),
@@ -83,6 +91,8 @@ CREATE TABLE [LVR_UsedHouse].[dbo].[park_data] (
 -- LVR_PreSale 資料庫
 CREATE TABLE [LVR_PreSale].[dbo].[presale_data] (
     id INT IDENTITY(1,1) PRIMARY KEY,
+    縣市代碼 NVARCHAR(10),
+    縣市名稱 NVARCHAR(50),
     鄉鎮市區 NVARCHAR(200),
     交易標的 NVARCHAR(200),
     土地位置建物門牌 NVARCHAR(500),
@@ -95,14 +105,14 @@ CREATE TABLE [LVR_PreSale].[dbo].[presale_data] (
     移轉層次 NVARCHAR(50),
     總樓層數 INT,
     建物型態 NVARCHAR(200),
-    主要用途 NVARCHAR(200),
+    主要用途 NVARCHAR(1000),
     主要建材 NVARCHAR(200),
     建築完成年月 NVARCHAR(20),
     建物移轉總面積平方公尺 DECIMAL(15,2),
-    建物現況格局-房 INT,
-    建物現況格局-廳 INT,
-    建物現況格局-衛 INT,
-    建物現況格局-隔間 NVARCHAR(50),
+    [建物現況格局-房] INT,
+    [建物現況格局-廳] INT,
+    [建物現況格局-衛] INT,
+    [建物現況格局-隔間] NVARCHAR(50),
     有無管理組織 NVARCHAR(20),
     總價元 DECIMAL(15,2),
     單價元平方公尺 DECIMAL(15,2),
@@ -120,10 +130,12 @@ CREATE TABLE [LVR_PreSale].[dbo].[presale_data] (
 
 CREATE TABLE [LVR_PreSale].[dbo].[build_data] (
     id INT IDENTITY(1,1) PRIMARY KEY,
+    縣市代碼 NVARCHAR(10),
+    縣市名稱 NVARCHAR(50),
     編號 NVARCHAR(100),
     屋齡 INT,
     建物移轉面積平方公尺 DECIMAL(15,2),
-    主要用途 NVARCHAR(200),
+    主要用途 NVARCHAR(1000),
     主要建材 NVARCHAR(200),
     建築完成日期 NVARCHAR(20),
     總層數 INT,
@@ -135,6 +147,8 @@ CREATE TABLE [LVR_PreSale].[dbo].[build_data] (
 
 CREATE TABLE [LVR_PreSale].[dbo].[land_data] (
     id INT IDENTITY(1,1) PRIMARY KEY,
+    縣市代碼 NVARCHAR(10),
+    縣市名稱 NVARCHAR(50),
     編號 NVARCHAR(100),
     土地位置 NVARCHAR(200),
     土地移轉面積平方公尺 DECIMAL(15,2),
@@ -149,6 +163,8 @@ CREATE TABLE [LVR_PreSale].[dbo].[land_data] (
 
 CREATE TABLE [LVR_PreSale].[dbo].[park_data] (
     id INT IDENTITY(1,1) PRIMARY KEY,
+    縣市代碼 NVARCHAR(10),
+    縣市名稱 NVARCHAR(50),
     編號 NVARCHAR(100),
     車位類別 NVARCHAR(50),
     車位價格 DECIMAL(15,2),
@@ -161,6 +177,8 @@ CREATE TABLE [LVR_PreSale].[dbo].[park_data] (
 -- LVR_Rental 資料庫
 CREATE TABLE [LVR_Rental].[dbo].[rental_data] (
     id INT IDENTITY(1,1) PRIMARY KEY,
+    縣市代碼 NVARCHAR(10),
+    縣市名稱 NVARCHAR(50),
     鄉鎮市區 NVARCHAR(200),
     交易標的 NVARCHAR(200),
     土地位置建物門牌 NVARCHAR(500),
@@ -173,14 +191,14 @@ CREATE TABLE [LVR_Rental].[dbo].[rental_data] (
     租賃層次 NVARCHAR(50),
     總樓層數 INT,
     建物型態 NVARCHAR(200),
-    主要用途 NVARCHAR(200),
+    主要用途 NVARCHAR(1000),
     主要建材 NVARCHAR(200),
     建築完成年月 NVARCHAR(20),
     建物總面積平方公尺 DECIMAL(15,2),
-    建物現況格局-房 INT,
-    建物現況格局-廳 INT,
-    建物現況格局-衛 INT,
-    建物現況格局-隔間 NVARCHAR(50),
+    [建物現況格局-房] INT,
+    [建物現況格局-廳] INT,
+    [建物現況格局-衛] INT,
+    [建物現況格局-隔間] NVARCHAR(50),
     有無管理組織 NVARCHAR(20),
     有無附傢俱 NVARCHAR(20),
     總額元 DECIMAL(15,2),
@@ -202,10 +220,12 @@ CREATE TABLE [LVR_Rental].[dbo].[rental_data] (
 
 CREATE TABLE [LVR_Rental].[dbo].[build_data] (
     id INT IDENTITY(1,1) PRIMARY KEY,
+    縣市代碼 NVARCHAR(10),
+    縣市名稱 NVARCHAR(50),
     編號 NVARCHAR(100),
     屋齡 INT,
     建物移轉面積平方公尺 DECIMAL(15,2),
-    主要用途 NVARCHAR(200),
+    主要用途 NVARCHAR(1000),
     主要建材 NVARCHAR(200),
     建築完成日期 NVARCHAR(20),
     總層數 INT,
@@ -217,6 +237,8 @@ CREATE TABLE [LVR_Rental].[dbo].[build_data] (
 
 CREATE TABLE [LVR_Rental].[dbo].[land_data] (
     id INT IDENTITY(1,1) PRIMARY KEY,
+    縣市代碼 NVARCHAR(10),
+    縣市名稱 NVARCHAR(50),
     編號 NVARCHAR(100),
     土地位置 NVARCHAR(200),
     土地移轉面積平方公尺 DECIMAL(15,2),
@@ -231,6 +253,8 @@ CREATE TABLE [LVR_Rental].[dbo].[land_data] (
 
 CREATE TABLE [LVR_Rental].[dbo].[park_data] (
     id INT IDENTITY(1,1) PRIMARY KEY,
+    縣市代碼 NVARCHAR(10),
+    縣市名稱 NVARCHAR(50),
     編號 NVARCHAR(100),
     車位類別 NVARCHAR(50),
     車位價格 DECIMAL(15,2),
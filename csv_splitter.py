@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+"""
+大型 CSV 檔案內平行解析
+匯入原本以檔案為單位平行，單一大型檔案（例如多年回補的新北市、臺中市 _a_build.csv）只能由一個執行緒處理；
+此模組將檔案切成以換行對齊、不會切斷引號內換行的位元組範圍，以多個子程序同時解析與清理，
+結果依序（或依完成順序）交給同一個寫入串流，單一大型檔案也能使用多個核心
+
+切割方式:
+    1. 以 mmap 開啟檔案，依 CSV_SPLIT_CHUNK_MB 取得目標切點
+    2. 計算上一個切點到目標位置之間的雙引號數量：奇數表示目標位置在引號內
+    3. 由目標位置往後找第一個不在引號內的換行作為切點（"" 跳脫的雙引號成對出現，不影響判斷）
+big5 / cp950 / gbk 的雙位元組字元第二個位元組不會是 0x0A 或 0x22，以位元組切割不會切斷字元
+"""
+
+import io
+import os
+import math
+import mmap
+import logging
+from collections import deque
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import pandas as pd
+
+import zip_source
+
+try:
+    from config import CSV_SPLIT_THRESHOLD_MB
+except ImportError:
+    CSV_SPLIT_THRESHOLD_MB = 64
+
+try:
+    from config import CSV_SPLIT_CHUNK_MB
+except ImportError:
+    CSV_SPLIT_CHUNK_MB = 16
+
+try:
+    from config import CSV_SPLIT_WORKERS
+except ImportError:
+    CSV_SPLIT_WORKERS = None
+
+try:
+    from config import CSV_SPLIT_TRANSPORT
+except ImportError:
+    CSV_SPLIT_TRANSPORT = 'shared_memory'
+
+logger = logging.getLogger(__name__)
+
+# 第一行為中文欄位名稱、第二行為英文欄位名稱
+HEADER_LINES = 2
+
+# 子程序中重複使用的匯入器（只用於清理，不連線資料庫）
+_worker_importers = {}
+
+# 共享記憶體傳遞時每個範圍配置的大小（範圍位元組數的倍數；清理後以 Arrow 格式保存，數值欄位可能比文字大）
+SHARED_MEMORY_FACTOR = 3
+SHARED_MEMORY_MIN_BYTES = 1024 * 1024
+
+
+class SplitPlan:
+    """單一檔案的切割結果"""
+
+    def __init__(self, file_path: str, encoding: str, header: bytes, columns: List[str],
+                 ranges: List[Tuple[int, int]]):
+        self.file_path = file_path
+        self.encoding = encoding
+        # 中文欄位名稱行（含換行），每個範圍解析時加在最前面
+        self.header = header
+        self.columns = columns
+        self.ranges = ranges
+
+    def __repr__(self):
+        return f"SplitPlan({os.path.basename(self.file_path)!r}, {self.encoding!r}, {len(self.ranges)} ranges)"
+
+
+def get_split_workers() -> int:
+    """檔案內平行解析的子程序數（預設為 CPU 核心數）"""
+    return CSV_SPLIT_WORKERS or os.cpu_count() or 1
+
+
+def should_split(file_path: str) -> bool:
+    """
+    檔案大小超過 CSV_SPLIT_THRESHOLD_MB 且可使用多個核心時才切割
+    壓縮檔成員只能循序串流解壓縮，無法以 mmap 切割，一律整個檔案解析
+    """
+    if zip_source.is_member_path(file_path):
+        return False
+    return get_split_workers() > 1 and os.path.getsize(file_path) >= CSV_SPLIT_THRESHOLD_MB * 1024 * 1024
+
+
+def record_end(mm, position: int, end: int, quote_parity: int = 0) -> int:
+    """
+    由 position 往後找第一個不在引號內的換行，回傳換行後的位置（找不到時回傳 end）
+
+    Args:
+        quote_parity: position 之前（同一筆記錄內）的雙引號數量奇偶
+    """
+    while position < end:
+        newline = mm.find(b'\n', position, end)
+        if newline < 0:
+            return end
+        quote_parity ^= mm[position:newline].count(b'"') & 1
+        if not quote_parity:
+            return newline + 1
+        position = newline + 1
+    return end
+
+
+def split_ranges(mm, body_start: int, size: int, chunk_bytes: int) -> List[Tuple[int, int]]:
+    """將 body_start 之後的資料切成約 chunk_bytes 大小、以記錄邊界對齊的範圍"""
+    boundaries = [body_start]
+    parts = max(1, math.ceil((size - body_start) / chunk_bytes))
+    for index in range(1, parts):
+        target = body_start + index * chunk_bytes
+        previous = boundaries[-1]
+        if target <= previous:
+            continue
+        # 上一個切點一定是記錄開頭，由此計算目標位置是否在引號內
+        parity = mm[previous:target].count(b'"') & 1
+        boundary = record_end(mm, target, size, parity)
+        if boundary >= size:
+            break
+        boundaries.append(boundary)
+    boundaries.append(size)
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if end > start]
+
+
+def plan_file(file_path: str, encodings: List[str], chunk_bytes: int = None) -> Optional[SplitPlan]:
+    """
+    切割檔案並判斷編碼（每個範圍都以該編碼解碼成功才採用）
+
+    Returns:
+        SplitPlan；所有編碼都失敗或檔案沒有資料列時回傳 None
+    """
+    chunk_bytes = chunk_bytes or CSV_SPLIT_CHUNK_MB * 1024 * 1024
+    with open(file_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            header_end = record_end(mm, 0, size)
+            body_start = header_end
+            for _ in range(HEADER_LINES - 1):
+                body_start = record_end(mm, body_start, size)
+            if body_start >= size:
+                return None
+
+            header = mm[:header_end]
+            ranges = split_ranges(mm, body_start, size, chunk_bytes)
+
+            for encoding in encodings:
+                try:
+                    # 多位元組字元不會跨越記錄邊界，逐範圍解碼即可驗證整個檔案
+                    header.decode(encoding)
+                    for start, end in ranges:
+                        mm[start:end].decode(encoding)
+                except UnicodeDecodeError:
+                    continue
+                columns = list(pd.read_csv(io.BytesIO(header), encoding=encoding, nrows=0).columns)
+                return SplitPlan(file_path, encoding, header, columns, ranges)
+    return None
+
+
+def string_dtypes(header_columns: Iterable[str], string_columns: Iterable[str]) -> Dict[str, type]:
+    """
+    pandas 引擎的欄位型別：資料表的文字欄位固定以字串讀取（'0850101' 不會被推斷為 850101.0），其餘欄位由 pandas 推斷
+    EnhancedDataImporter.read_csv_file 與切割解析共用，檔案大小不影響讀取結果
+    """
+    string_set = set(string_columns)
+    return {column: str for column in header_columns if column in string_set}
+
+
+def parse_range(task: Tuple) -> Tuple[Union[pd.DataFrame, int], Dict]:
+    """
+    子程序：解析並清理一個位元組範圍，同時計算該範圍的匯入統計
+
+    Returns:
+        (清理後的 DataFrame 或寫入共享記憶體的位元組數, compute_file_stats 結果)
+        task 指定共享記憶體名稱時，資料以 Arrow IPC 寫入共享記憶體，只傳回位元組數；超過配置大小時仍傳回 DataFrame
+    """
+    (file_path, start, end, header, encoding, engine,
+     numeric_columns, string_columns, city_code, file_type, data_type, shared_name) = task
+    from enhanced_data_importer import EnhancedDataImporter
+    from import_stats import compute_file_stats
+
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        buffer = header + f.read(end - start)
+
+    if engine == 'arrow':
+        import pyarrow as pa
+        import arrow_csv
+
+        try:
+            df = arrow_csv.read_csv(io.BytesIO(buffer), encoding, numeric_columns, string_columns,
+                                    typed_numeric=True, skip_english_header=False)
+        except pa.ArrowInvalid:
+            # 數值欄位含非數字字元，改以字串讀取後清理
+            df = arrow_csv.read_csv(io.BytesIO(buffer), encoding, numeric_columns, string_columns,
+                                    typed_numeric=False, skip_english_header=False)
+    else:
+        # 文字欄位固定為字串，避免各範圍各自推斷出不同型別
+        header_columns = pd.read_csv(io.BytesIO(header), encoding=encoding, nrows=0).columns
+        df = pd.read_csv(io.BytesIO(buffer), encoding=encoding, dtype=string_dtypes(header_columns, string_columns))
+
+    importer = _worker_importers.get(engine)
+    if importer is None:
+        importer = EnhancedDataImporter(use_dictionary_encoding=False, build_transaction_detail=False,
+                                        csv_engine=engine, use_cleaned_cache=False)
+        _worker_importers[engine] = importer
+    df = importer.clean_data(df, file_type, data_type, numeric_columns)
+    stats = compute_file_stats(df, numeric_columns, city_code)
+    if shared_name is not None:
+        import shm_transport
+        written = shm_transport.write_frame(shared_name, df)
+        if written is not None:
+            return written, stats
+    return df, stats
+
+
+def iter_parsed_ranges(plan: SplitPlan, engine: str, numeric_columns: List[str], string_columns: List[str],
+                       city_code: str, file_type, data_type, workers: int = None,
+                       ordered: bool = True, transport: str = None) -> Iterator[Tuple[pd.DataFrame, Dict]]:
+    """
+    以子程序平行解析所有範圍，逐一產生 (DataFrame, 範圍統計)
+
+    Args:
+        ordered: True 時依檔案順序產生（寫入的 id 順序與檔案相同）；False 時依完成順序產生
+        同時進行中的範圍最多為子程序數的兩倍，寫入較慢時不會把整個檔案的結果堆在記憶體中
+        transport: 'shared_memory'（預設，CSV_SPLIT_TRANSPORT）或 'pickle'；
+                   共享記憶體傳遞時 arrow 引擎的欄位直接參照共享記憶體（不複製），
+                   pandas 引擎轉為一般 pandas 型別後即釋放共享記憶體
+    """
+    workers = workers or get_split_workers()
+    transport = transport or CSV_SPLIT_TRANSPORT
+    use_shared_memory = transport == 'shared_memory'
+    if use_shared_memory:
+        import shm_transport
+        shm_transport.start_tracker()
+    ranges = iter(plan.ranges)
+    max_pending = workers * 2
+    # 已送出、尚未取回的範圍 {future: 共享記憶體}
+    slots = {}
+
+    def submit(start: int, end: int):
+        slot = None
+        if use_shared_memory:
+            slot = shm_transport.SharedSlot(max((end - start) * SHARED_MEMORY_FACTOR, SHARED_MEMORY_MIN_BYTES))
+        task = (plan.file_path, start, end, plan.header, plan.encoding, engine,
+                list(numeric_columns), list(string_columns), city_code, file_type, data_type,
+                slot.name if slot else None)
+        future = executor.submit(parse_range, task)
+        slots[future] = slot
+        return future
+
+    def receive(future) -> Tuple[pd.DataFrame, Dict]:
+        payload, stats = future.result()
+        slot = slots.pop(future)
+        df = payload
+        if not isinstance(payload, pd.DataFrame):
+            df = slot.read_frame(payload, arrow_dtypes=engine == 'arrow')
+        if slot is not None:
+            # 刪除名稱；arrow 引擎的欄位仍參照共享記憶體，在 DataFrame 釋放後才回收
+            slot.release()
+        return df, stats
+
+    executor = ProcessPoolExecutor(max_workers=min(workers, len(plan.ranges)))
+    try:
+        if ordered:
+            pending = deque(submit(start, end) for start, end in islice(ranges, max_pending))
+            while pending:
+                result = receive(pending.popleft())
+                next_range = next(ranges, None)
+                if next_range is not None:
+                    pending.append(submit(*next_range))
+                yield result
+        else:
+            running = {submit(start, end) for start, end in islice(ranges, max_pending)}
+            while running:
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    next_range = next(ranges, None)
+                    if next_range is not None:
+                        running.add(submit(*next_range))
+                    yield receive(future)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        for slot in slots.values():
+            if slot is not None:
+                slot.release()
@@ -7,25 +7,71 @@ LVR 資料庫備份與還原工具
 import os
 import sys
 import time
+import gzip
 import shutil
 from datetime import datetime
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
 import pyodbc
 import logging
 
 from config import DB_CONFIG, DATABASES
+from log_setup import setup_logging
+from backup_catalog import BackupCatalog, BACKUP_EXTENSIONS, HEADER_BACKUP_TYPES, make_entry_id, file_checksum
+from backup_verification import collect_database_stats, compare_database_stats
+
+try:
+    from config import BACKUP_STRIPES
+except ImportError:
+    BACKUP_STRIPES = 4
+
+try:
+    from config import BACKUP_COMPRESSION
+except ImportError:
+    BACKUP_COMPRESSION = 'auto'
+
+try:
+    from config import BACKUP_MAX_WORKERS
+except ImportError:
+    BACKUP_MAX_WORKERS = 3
+
+try:
+    from config import BACKUP_AFTER_IMPORT
+except ImportError:
+    BACKUP_AFTER_IMPORT = 'diff'
+
+try:
+    from config import FULL_BACKUP_INTERVAL_DAYS
+except ImportError:
+    FULL_BACKUP_INTERVAL_DAYS = 7
 
-# 設定日誌
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('database_backup_restore.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
+# 用戶端 gzip 壓縮等級（備份檔案重複性高，等級 1 已有不錯的壓縮率且速度最快）
+CLIENT_COMPRESSION_LEVEL = 1
+COPY_BUFFER_SIZE = 8 * 1024 * 1024
+
+# 每次 I/O 的傳輸大小（4 MB 為上限，分割多檔時可提高循序寫入效率）
+BACKUP_MAX_TRANSFER_SIZE = 4 * 1024 * 1024
+
+
+def compress_file(file_path: Path) -> Path:
+    """以 gzip 壓縮檔案並刪除原檔，回傳壓縮後的路徑"""
+    gz_path = file_path.with_name(file_path.name + '.gz')
+    with open(file_path, 'rb') as src, gzip.open(gz_path, 'wb', compresslevel=CLIENT_COMPRESSION_LEVEL) as dst:
+        shutil.copyfileobj(src, dst, COPY_BUFFER_SIZE)
+    file_path.unlink()
+    return gz_path
+
+
+def decompress_file(gz_path: Path) -> Path:
+    """將 .bak.gz 解壓縮為同目錄下的 .bak（SQL Server 只能讀取未壓縮的備份檔）"""
+    file_path = gz_path.with_name(gz_path.name[:-len('.gz')])
+    with gzip.open(gz_path, 'rb') as src, open(file_path, 'wb') as dst:
+        shutil.copyfileobj(src, dst, COPY_BUFFER_SIZE)
+    return file_path
+
 class DatabaseBackupRestore:
     """資料庫備份與還原工具"""
     
@@ -35,6 +81,8 @@ class DatabaseBackupRestore:
         self.password = DB_CONFIG['password']
         self.backup_dir = Path('backups')
         self.backup_dir.mkdir(exist_ok=True)
+        self._compression_supported = None
+        self.catalog = BackupCatalog(self.backup_dir / 'backup_catalog.json')
         
     def get_connection_string(self, database='master'):
         """取得連線字串"""
@@ -91,6 +139,8 @@ class DatabaseBackupRestore:
                 logger.info(f"✅ {database_name} 備份成功")
                 logger.info(f"   檔案: {backup_file}")
                 logger.info(f"   大小: {file_size:,} bytes")
+                self._record_backup(database_name, 'full', timestamp, [backup_file], 'none',
+                                    stats=self.collect_stats(database_name))
                 return str(backup_file)
             else:
                 logger.error(f"❌ {database_name} 備份失敗 - 檔案未建立")
@@ -100,6 +150,354 @@ class DatabaseBackupRestore:
             logger.error(f"❌ {database_name} 備份失敗: {str(e)}")
             return None
     
+    def supports_backup_compression(self) -> bool:
+        """檢查伺服器版本是否支援 BACKUP ... WITH COMPRESSION（Express 與 Web 版不支援）"""
+        if self._compression_supported is None:
+            try:
+                conn = pyodbc.connect(self.get_connection_string('master'))
+                cursor = conn.cursor()
+                cursor.execute("SELECT CAST(SERVERPROPERTY('Edition') AS NVARCHAR(128))")
+                edition = cursor.fetchone()[0] or ''
+                conn.close()
+                self._compression_supported = 'Express' not in edition and 'Web' not in edition
+                logger.info(f"ℹ️ SQL Server 版本: {edition}（備份壓縮{'支援' if self._compression_supported else '不支援，改用用戶端壓縮'}）")
+            except Exception as e:
+                logger.warning(f"⚠️ 無法判斷 SQL Server 版本，改用用戶端壓縮: {str(e)}")
+                self._compression_supported = False
+        return self._compression_supported
+    
+    def _resolve_compression(self, compression: Optional[str]) -> str:
+        """決定壓縮方式：'server'（WITH COMPRESSION）、'client'（gzip）或 'none'"""
+        compression = compression or BACKUP_COMPRESSION
+        if compression == 'auto':
+            return 'server' if self.supports_backup_compression() else 'client'
+        return compression
+    
+    def _get_backup_set_info(self, cursor, database_name: str) -> Dict:
+        """從 msdb 取得最近一次備份的資料量（未壓縮）與 LSN"""
+        cursor.execute(
+            "SELECT TOP 1 backup_size, first_lsn, last_lsn, checkpoint_lsn, database_backup_lsn, has_backup_checksums "
+            "FROM msdb.dbo.backupset WHERE database_name = ? ORDER BY backup_finish_date DESC",
+            database_name
+        )
+        row = cursor.fetchone()
+        if not row:
+            return {}
+        return {
+            'backup_size': int(row[0]) if row[0] is not None else None,
+            # LSN 為 NUMERIC(25,0)，以字串保存避免精度問題
+            'first_lsn': str(row[1]) if row[1] is not None else None,
+            'last_lsn': str(row[2]) if row[2] is not None else None,
+            'checkpoint_lsn': str(row[3]) if row[3] is not None else None,
+            'database_backup_lsn': str(row[4]) if row[4] is not None else None,
+            'has_backup_checksums': bool(row[5])
+        }
+    
+    def collect_stats(self, database_name: str) -> Optional[Dict]:
+        """計算資料庫的資料列數與每季彙總值（失敗時回傳 None，不影響備份）"""
+        try:
+            conn = pyodbc.connect(self.get_connection_string(database_name))
+            try:
+                return collect_database_stats(conn.cursor())
+            finally:
+                conn.close()
+        except Exception as e:
+            logger.warning(f"⚠️ 無法計算 {database_name} 的資料統計: {str(e)}")
+            return None
+    
+    def _record_backup(self, database_name: str, backup_type: str, timestamp: str, files: List[Path],
+                       compression: str, set_info: Dict = None, stats: Dict = None) -> Dict:
+        """將備份寫入備份目錄（stats 為備份完成時的資料統計，還原後用來比對）"""
+        if set_info is None:
+            try:
+                conn = pyodbc.connect(self.get_connection_string('master'))
+                set_info = self._get_backup_set_info(conn.cursor(), database_name)
+                conn.close()
+            except Exception as e:
+                logger.warning(f"⚠️ 無法取得 {database_name} 備份的 LSN: {str(e)}")
+                set_info = {}
+        
+        base = self.catalog.latest_full(database_name) if backup_type != 'full' else None
+        existing = [Path(file) for file in files if Path(file).exists()]
+        entry = {
+            'id': make_entry_id(database_name, timestamp, backup_type),
+            'database': database_name,
+            'type': backup_type,
+            'timestamp': timestamp,
+            'files': [Path(file).name for file in files],
+            'compression': compression,
+            'first_lsn': set_info.get('first_lsn'),
+            'last_lsn': set_info.get('last_lsn'),
+            'checkpoint_lsn': set_info.get('checkpoint_lsn'),
+            'database_backup_lsn': set_info.get('database_backup_lsn'),
+            'base_timestamp': base['timestamp'] if base else None,
+            'backup_size': set_info.get('backup_size'),
+            'file_size': sum(file.stat().st_size for file in existing),
+            'checksum': file_checksum(existing) if existing else None,
+            'has_backup_checksums': set_info.get('has_backup_checksums', False),
+            'stats': stats
+        }
+        self.catalog.add(entry)
+        return entry
+    
+    def register_backup_file(self, backup_file) -> Optional[Dict]:
+        """
+        將本工具以外建立的備份檔（例如 backup_databases.bat）加入備份目錄
+        資料庫名稱、備份類型與 LSN 由 RESTORE HEADERONLY 讀取，不從檔名推測
+        """
+        backup_path = Path(backup_file)
+        if not backup_path.exists():
+            logger.error(f"❌ 備份檔案不存在: {backup_file}")
+            return None
+        if backup_path.name.endswith('.gz'):
+            logger.error(f"❌ 無法讀取壓縮檔的備份標頭: {backup_path.name}")
+            return None
+        
+        try:
+            conn = pyodbc.connect(self.get_connection_string('master'), autocommit=True)
+            cursor = conn.cursor()
+            cursor.execute(f"RESTORE HEADERONLY FROM DISK = N'{backup_path.absolute()}'")
+            columns = [column[0] for column in cursor.description]
+            header = dict(zip(columns, cursor.fetchone()))
+            conn.close()
+        except Exception as e:
+            logger.error(f"❌ 讀取備份標頭失敗 {backup_path.name}: {str(e)}")
+            return None
+        
+        backup_type = HEADER_BACKUP_TYPES.get(header['BackupType'])
+        if not backup_type:
+            logger.error(f"❌ 不支援的備份類型 {header['BackupType']}: {backup_path.name}")
+            return None
+        
+        # 檔案不在備份資料夾中時，目錄只記錄檔名，因此先移入備份資料夾
+        if backup_path.parent.resolve() != self.backup_dir.resolve():
+            backup_path = Path(shutil.move(str(backup_path), str(self.backup_dir / backup_path.name)))
+        
+        set_info = {
+            'backup_size': int(header['BackupSize']) if header.get('BackupSize') is not None else None,
+            'first_lsn': str(header['FirstLSN']) if header.get('FirstLSN') is not None else None,
+            'last_lsn': str(header['LastLSN']) if header.get('LastLSN') is not None else None,
+            'checkpoint_lsn': str(header['CheckpointLSN']) if header.get('CheckpointLSN') is not None else None,
+            'database_backup_lsn': str(header['DatabaseBackupLSN']) if header.get('DatabaseBackupLSN') is not None else None,
+            'has_backup_checksums': bool(header.get('HasBackupChecksums'))
+        }
+        timestamp = header['BackupFinishDate'].strftime('%Y%m%d_%H%M%S')
+        entry = self._record_backup(header['DatabaseName'], backup_type, timestamp, [backup_path],
+                                    'server' if header.get('Compressed') else 'none', set_info)
+        logger.info(f"📒 已加入備份目錄: {entry['id']} ({backup_path.name})")
+        return entry
+    
+    def rebuild_catalog(self) -> int:
+        """將備份資料夾中尚未登錄的備份檔加入目錄（一次性的維護作業），回傳新增筆數"""
+        added = 0
+        for backup_file in sorted(self.backup_dir.iterdir()):
+            if backup_file.suffix.lower() not in ('.bak', '.dif', '.trn') or self.catalog.find_by_file(backup_file.name):
+                continue
+            if self.register_backup_file(backup_file):
+                added += 1
+        logger.info(f"📒 備份目錄重建完成，新增 {added} 筆")
+        return added
+    
+    def backup_database_striped(self, database_name: str, timestamp: str = None,
+                                stripes: int = None, compression: str = None,
+                                backup_type: str = 'full') -> Optional[Dict]:
+        """
+        備份單一資料庫到多個分割檔，並依版本使用伺服器端或用戶端壓縮
+        
+        Args:
+            backup_type: 'full'（完整）、'diff'（差異）或 'log'（交易記錄）
+        
+        Returns:
+            {'database', 'files', 'compression', 'backup_size', 'file_size',
+             'backup_seconds', 'compress_seconds', 'mb_per_sec'}；失敗時回傳 None
+        """
+        stripes = stripes or BACKUP_STRIPES
+        timestamp = timestamp or datetime.now().strftime('%Y%m%d_%H%M%S')
+        mode = self._resolve_compression(compression)
+        
+        ext = BACKUP_EXTENSIONS[backup_type]
+        if stripes > 1:
+            files = [self.backup_dir / f"{database_name}_{timestamp}.s{i}of{stripes}.{ext}" for i in range(1, stripes + 1)]
+        else:
+            files = [self.backup_dir / f"{database_name}_{timestamp}.{ext}"]
+        
+        type_names = {'full': 'Full Database Backup', 'diff': 'Differential Backup', 'log': 'Log Backup'}
+        options = ["FORMAT", "INIT", f"NAME = N'{database_name}-{type_names[backup_type]}'", "CHECKSUM",
+                   f"MAXTRANSFERSIZE = {BACKUP_MAX_TRANSFER_SIZE}", "STATS = 10"]
+        if backup_type == 'diff':
+            options.insert(0, "DIFFERENTIAL")
+        if mode == 'server':
+            options.append("COMPRESSION")
+        disks = ", ".join(f"DISK = N'{file.absolute()}'" for file in files)
+        statement = "BACKUP LOG" if backup_type == 'log' else "BACKUP DATABASE"
+        backup_sql = f"{statement} [{database_name}] TO {disks} WITH {', '.join(options)}"
+        
+        try:
+            logger.info(f"🔄 開始備份 {database_name}（{backup_type}，{stripes} 個分割檔，壓縮: {mode}）...")
+            start_time = time.time()
+            
+            # BACKUP 不能在交易中執行；需讀完所有訊息結果集，否則關閉連線時備份會被中斷
+            conn = pyodbc.connect(self.get_connection_string('master'), autocommit=True)
+            cursor = conn.cursor()
+            cursor.execute(backup_sql)
+            while cursor.nextset():
+                pass
+            backup_seconds = time.time() - start_time
+            set_info = self._get_backup_set_info(cursor, database_name)
+            backup_size = set_info.get('backup_size')
+            conn.close()
+            # 備份完成後立即記錄資料統計（之後的用戶端壓縮期間資料可能已有變動）
+            stats = self.collect_stats(database_name)
+            
+            missing = [str(file) for file in files if not file.exists()]
+            if missing:
+                logger.error(f"❌ {database_name} 備份失敗 - 檔案未建立: {', '.join(missing)}")
+                return None
+            
+            compress_seconds = 0.0
+            if mode == 'client':
+                # 各分割檔平行壓縮（zlib 壓縮時會釋放 GIL）
+                compress_start = time.time()
+                with ThreadPoolExecutor(max_workers=len(files)) as executor:
+                    files = list(executor.map(compress_file, files))
+                compress_seconds = time.time() - compress_start
+            
+            file_size = sum(file.stat().st_size for file in files)
+            backup_size = backup_size or file_size
+            total_seconds = backup_seconds + compress_seconds
+            mb_per_sec = backup_size / 1024 / 1024 / total_seconds if total_seconds > 0 else 0.0
+            
+            logger.info(f"✅ {database_name} 備份成功: {backup_size / 1024 / 1024:,.1f} MB → "
+                        f"{file_size / 1024 / 1024:,.1f} MB，耗時 {total_seconds:.1f} 秒，{mb_per_sec:,.1f} MB/s")
+            if mode == 'client':
+                logger.info(f"   其中用戶端壓縮耗時 {compress_seconds:.1f} 秒")
+            
+            self._record_backup(database_name, backup_type, timestamp, files, mode, set_info, stats)
+            
+            return {
+                'database': database_name,
+                'type': backup_type,
+                'files': [str(file) for file in files],
+                'compression': mode,
+                'backup_size': backup_size,
+                'file_size': file_size,
+                'backup_seconds': backup_seconds,
+                'compress_seconds': compress_seconds,
+                'mb_per_sec': mb_per_sec
+            }
+            
+        except Exception as e:
+            logger.error(f"❌ {database_name} 備份失敗: {str(e)}")
+            return None
+    
+    def backup_all_databases_parallel(self, max_workers: int = None, stripes: int = None,
+                                      compression: str = None, backup_types: Dict[str, str] = None) -> bool:
+        """
+        以獨立連線同時備份所有資料庫（分割檔 + 壓縮）
+        
+        Args:
+            backup_types: {資料庫名稱: 'full' | 'diff' | 'log'}，預設為所有資料庫完整備份
+        """
+        logger.info("🚀 開始平行備份所有 LVR 資料庫")
+        logger.info("=" * 60)
+        
+        if not self.test_connection():
+            return False
+        
+        max_workers = max_workers or BACKUP_MAX_WORKERS
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        # 先在主執行緒判斷壓縮方式，避免各執行緒重複查詢版本
+        compression = self._resolve_compression(compression)
+        backup_types = backup_types or {db_name: 'full' for db_name in DATABASES.values()}
+        db_names = list(backup_types)
+        
+        start_time = time.time()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(
+                lambda db_name: self.backup_database_striped(db_name, timestamp, stripes, compression,
+                                                             backup_types[db_name]),
+                db_names
+            ))
+        elapsed = time.time() - start_time
+        
+        backup_results = {db_name: result for db_name, result in zip(db_names, results) if result}
+        self.create_backup_info(timestamp, {db_name: result['files'] for db_name, result in backup_results.items()},
+                                backup_results)
+        
+        total_size = sum(result['backup_size'] for result in backup_results.values())
+        logger.info("\n" + "=" * 60)
+        logger.info("📊 平行備份完成統計:")
+        logger.info(f"   成功: {len(backup_results)}/{len(db_names)}")
+        for db_name, result in backup_results.items():
+            logger.info(f"   {db_name} ({result['type']}): {result['mb_per_sec']:,.1f} MB/s ({len(result['files'])} 個檔案)")
+        if elapsed > 0:
+            logger.info(f"   總耗時: {elapsed:.1f} 秒，整體 {total_size / 1024 / 1024 / elapsed:,.1f} MB/s")
+        
+        return len(backup_results) == len(db_names)
+    
+    def choose_backup_type(self, database_name: str, mode: str = None) -> str:
+        """
+        決定匯入後的備份類型
+        
+        沒有完整備份、完整備份超過 FULL_BACKUP_INTERVAL_DAYS 天，或最近一次完整備份不在備份目錄中
+        （例如由 backup_databases.bat 建立，差異備份會以它為基礎）時改做完整備份
+        """
+        mode = mode or BACKUP_AFTER_IMPORT
+        full = self.catalog.latest_full(database_name)
+        if not full:
+            return 'full'
+        
+        age = datetime.now() - datetime.strptime(full['timestamp'], '%Y%m%d_%H%M%S')
+        if age.days >= FULL_BACKUP_INTERVAL_DAYS:
+            logger.info(f"ℹ️ {database_name} 完整備份已 {age.days} 天，改做完整備份")
+            return 'full'
+        
+        conn = pyodbc.connect(self.get_connection_string('master'))
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT TOP 1 checkpoint_lsn FROM msdb.dbo.backupset "
+                "WHERE database_name = ? AND type = 'D' AND is_copy_only = 0 ORDER BY backup_finish_date DESC",
+                database_name
+            )
+            row = cursor.fetchone()
+            cursor.execute("SELECT recovery_model_desc FROM sys.databases WHERE name = ?", database_name)
+            recovery_model = cursor.fetchone()[0]
+        finally:
+            conn.close()
+        
+        if full.get('checkpoint_lsn') and row and str(row[0]) != full['checkpoint_lsn']:
+            logger.info(f"ℹ️ {database_name} 最近一次完整備份不在備份目錄中，改做完整備份")
+            return 'full'
+        
+        if mode == 'log':
+            if recovery_model in ('FULL', 'BULK_LOGGED'):
+                return 'log'
+            logger.info(f"ℹ️ {database_name} 為 {recovery_model} 復原模式，無法備份交易記錄，改做差異備份")
+        return 'diff'
+    
+    def backup_after_import(self, database_names: List[str] = None, mode: str = None) -> bool:
+        """
+        匯入完成後的備份：依排程做完整備份，其餘做差異（或交易記錄）備份
+        備份量與還原時間只和本次匯入的變動量成正比
+        
+        Args:
+            mode: 'diff'、'log' 或 'none'（預設使用 config.py 中的 BACKUP_AFTER_IMPORT）
+        """
+        mode = mode or BACKUP_AFTER_IMPORT
+        if mode == 'none':
+            return True
+        
+        database_names = database_names or list(DATABASES.values())
+        try:
+            backup_types = {db_name: self.choose_backup_type(db_name, mode) for db_name in database_names}
+        except Exception as e:
+            logger.error(f"❌ 無法決定備份類型: {str(e)}")
+            return False
+        
+        logger.info(f"💾 匯入後備份: {', '.join(f'{db}={t}' for db, t in backup_types.items())}")
+        return self.backup_all_databases_parallel(backup_types=backup_types)
+    
     def backup_all_databases(self):
         """備份所有資料庫"""
         logger.info("🚀 開始備份所有 LVR 資料庫")
@@ -132,8 +530,8 @@ class DatabaseBackupRestore:
         
         return success_count == len(DATABASES)
     
-    def create_backup_info(self, timestamp, backup_files):
-        """建立備份資訊檔案"""
+    def create_backup_info(self, timestamp, backup_files, backup_results=None):
+        """建立備份資訊檔案（backup_files 的值可為單一檔案或分割檔列表）"""
         info_file = self.backup_dir / f"backup_info_{timestamp}.txt"
         
         with open(info_file, 'w', encoding='utf-8') as f:
@@ -149,48 +547,70 @@ class DatabaseBackupRestore:
             
             f.write("\n備份檔案:\n")
             for db_name, backup_file in backup_files.items():
-                if backup_file:
-                    file_path = Path(backup_file)
+                if not backup_file:
+                    continue
+                for file in ([backup_file] if isinstance(backup_file, (str, Path)) else backup_file):
+                    file_path = Path(file)
                     file_size = file_path.stat().st_size if file_path.exists() else 0
                     f.write(f"- {file_path.name}: {file_size:,} bytes\n")
+            
+            if backup_results:
+                f.write("\n備份效能:\n")
+                for db_name, result in backup_results.items():
+                    f.write(f"- {db_name}: {result['backup_size'] / 1024 / 1024:,.1f} MB, "
+                            f"{result['backup_seconds'] + result['compress_seconds']:.1f} 秒, "
+                            f"{result['mb_per_sec']:,.1f} MB/s (壓縮: {result['compression']})\n")
         
         logger.info(f"📄 備份資訊已儲存至: {info_file}")
     
-    def restore_database(self, database_name, backup_file):
-        """還原單一資料庫"""
+    def _restore_backup_sets(self, database_name: str, backup_sets: List) -> bool:
+        """
+        依序還原多個備份組 [(類型, [檔案, ...]), ...]
+        除最後一組外皆使用 NORECOVERY，最後一組 RECOVERY 後資料庫才可使用
+        """
+        temp_files = []
         try:
-            backup_path = Path(backup_file)
-            if not backup_path.exists():
-                logger.error(f"❌ 備份檔案不存在: {backup_file}")
+            missing = [str(path) for _, files in backup_sets for path in files if not path.exists()]
+            if missing:
+                logger.error(f"❌ 備份檔案不存在: {', '.join(missing)}")
                 return False
             
             logger.info(f"🔄 開始還原 {database_name} 資料庫...")
-            logger.info(f"   備份檔案: {backup_path}")
+            for backup_type, files in backup_sets:
+                logger.info(f"   備份檔案 ({backup_type}): {', '.join(path.name for path in files)}")
+            
+            # 用戶端壓縮的分割檔先平行解壓縮
+            compressed = [path for _, files in backup_sets for path in files if path.name.endswith('.gz')]
+            if compressed:
+                logger.info(f"   解壓縮 {len(compressed)} 個檔案...")
+                with ThreadPoolExecutor(max_workers=min(len(compressed), 8)) as executor:
+                    temp_files = list(executor.map(decompress_file, compressed))
+                decompressed = dict(zip(compressed, temp_files))
+                backup_sets = [(backup_type, [decompressed.get(path, path) for path in files])
+                               for backup_type, files in backup_sets]
             
             conn_str = self.get_connection_string('master')
-            conn = pyodbc.connect(conn_str)
+            conn = pyodbc.connect(conn_str, autocommit=True)
             cursor = conn.cursor()
             
             # 斷開資料庫連線
             logger.info("   斷開資料庫連線...")
             cursor.execute(f"ALTER DATABASE [{database_name}] SET SINGLE_USER WITH ROLLBACK IMMEDIATE")
-            conn.commit()
-            
-            # 還原資料庫
-            logger.info("   還原資料庫...")
-            restore_sql = f"""
-            RESTORE DATABASE [{database_name}] 
-            FROM DISK = '{backup_path}' 
-            WITH REPLACE, STATS = 10
-            """
             
-            cursor.execute(restore_sql)
-            conn.commit()
+            # 還原資料庫（需讀完所有訊息結果集，否則還原會被中斷）
+            for index, (backup_type, files) in enumerate(backup_sets):
+                is_last = index == len(backup_sets) - 1
+                statement = "RESTORE LOG" if backup_type == 'log' else "RESTORE DATABASE"
+                options = (["REPLACE"] if index == 0 else []) + ["RECOVERY" if is_last else "NORECOVERY", "STATS = 10"]
+                disks = ", ".join(f"DISK = N'{path.absolute()}'" for path in files)
+                logger.info(f"   還原 {backup_type} 備份 ({index + 1}/{len(backup_sets)})...")
+                cursor.execute(f"{statement} [{database_name}] FROM {disks} WITH {', '.join(options)}")
+                while cursor.nextset():
+                    pass
             
             # 恢復多使用者模式
             logger.info("   恢復多使用者模式...")
             cursor.execute(f"ALTER DATABASE [{database_name}] SET MULTI_USER")
-            conn.commit()
             
             conn.close()
             
@@ -200,82 +620,250 @@ class DatabaseBackupRestore:
         except Exception as e:
             logger.error(f"❌ {database_name} 還原失敗: {str(e)}")
             return False
+        finally:
+            for path in temp_files:
+                if path.exists():
+                    path.unlink()
     
-    def list_backup_files(self):
-        """列出所有備份檔案"""
-        backup_files = list(self.backup_dir.glob("*.bak"))
+    def verify_backup_set(self, backup_set: Dict):
+        """
+        檢查單一備份組的媒體（不影響線上資料庫，可平行執行）
+        1. 檔案的 SHA-256 與備份目錄記錄比對
+        2. 用戶端壓縮的檔案先解壓縮
+        3. RESTORE VERIFYONLY（備份含檢查碼時加上 WITH CHECKSUM，逐頁驗證）
         
-        if not backup_files:
-            logger.info("📁 沒有找到備份檔案")
-            return []
+        Args:
+            backup_set: {'id', 'type', 'files': [Path, ...], 'checksum', 'has_backup_checksums'}
         
-        logger.info("📁 可用的備份檔案:")
-        logger.info("-" * 60)
+        Returns:
+            (可直接還原的檔案列表, 解壓縮產生的暫存檔列表, 錯誤訊息或 None)
+        """
+        files = backup_set['files']
+        missing = [str(path) for path in files if not path.exists()]
+        if missing:
+            return files, [], f"備份檔案不存在: {', '.join(missing)}"
         
-        # 按時間分組
-        backup_groups = {}
-        for backup_file in backup_files:
-            # 從檔案名稱提取時間戳記
-            parts = backup_file.stem.split('_')
-            if len(parts) >= 3:
-                timestamp = f"{parts[-2]}_{parts[-1]}"
-                if timestamp not in backup_groups:
-                    backup_groups[timestamp] = []
-                backup_groups[timestamp].append(backup_file)
-        
-        for timestamp in sorted(backup_groups.keys(), reverse=True):
-            logger.info(f"\n時間戳記: {timestamp}")
-            for backup_file in backup_groups[timestamp]:
-                file_size = backup_file.stat().st_size
-                logger.info(f"  - {backup_file.name} ({file_size:,} bytes)")
+        try:
+            if backup_set.get('checksum') and file_checksum(files) != backup_set['checksum']:
+                return files, [], "檔案檢查碼與備份目錄記錄不符"
+        except Exception as e:
+            return files, [], f"計算檔案檢查碼失敗: {str(e)}"
+        
+        # 解壓縮目的檔先列入暫存檔，解壓縮中途失敗時呼叫端仍會刪除已寫出的部分
+        compressed = [path for path in files if path.name.endswith('.gz')]
+        temp_files = [path.with_name(path.name[:-len('.gz')]) for path in compressed]
+        if compressed:
+            try:
+                with ThreadPoolExecutor(max_workers=min(len(compressed), 8)) as executor:
+                    list(executor.map(decompress_file, compressed))
+            except Exception as e:
+                return files, temp_files, f"解壓縮失敗: {str(e)}"
+            decompressed = dict(zip(compressed, temp_files))
+            files = [decompressed.get(path, path) for path in files]
         
-        return backup_files
+        try:
+            conn = pyodbc.connect(self.get_connection_string('master'), autocommit=True)
+            cursor = conn.cursor()
+            disks = ", ".join(f"DISK = N'{path.absolute()}'" for path in files)
+            options = " WITH CHECKSUM" if backup_set.get('has_backup_checksums') else ""
+            cursor.execute(f"RESTORE VERIFYONLY FROM {disks}{options}")
+            while cursor.nextset():
+                pass
+            conn.close()
+        except Exception as e:
+            return files, temp_files, f"RESTORE VERIFYONLY 失敗: {str(e)}"
+        
+        return files, temp_files, None
     
-    def restore_by_timestamp(self, timestamp):
-        """根據時間戳記還原所有資料庫"""
-        logger.info(f"🔄 開始還原時間戳記為 {timestamp} 的資料庫...")
+    def verify_restored_database(self, database_name: str, expected_stats: Optional[Dict]) -> bool:
+        """比對還原後的資料列數與每季彙總值和備份時的記錄"""
+        if not expected_stats:
+            logger.warning(f"⚠️ {database_name} 的備份沒有資料統計記錄，略過還原後比對")
+            return True
         
-        success_count = 0
-        total_count = 0
+        actual_stats = self.collect_stats(database_name)
+        if actual_stats is None:
+            return False
         
-        for db_type, db_name in DATABASES.items():
-            backup_file = self.backup_dir / f"{db_name}_{timestamp}.bak"
+        mismatches = compare_database_stats(expected_stats, actual_stats)
+        if mismatches:
+            logger.error(f"❌ {database_name} 還原後資料與備份時不一致（{len(mismatches)} 項）:")
+            for mismatch in mismatches[:20]:
+                logger.error(f"   {mismatch}")
+            return False
+        
+        logger.info(f"✅ {database_name} 資料列數與每季彙總值與備份時一致 "
+                    f"({len(expected_stats.get('row_counts', {}))} 個資料表)")
+        return True
+    
+    def _entry_backup_set(self, entry: Dict) -> Dict:
+        """將備份目錄記錄轉為還原用的備份組"""
+        return {
+            'id': entry['id'],
+            'type': entry['type'],
+            'files': [self.backup_dir / name for name in entry['files']],
+            'checksum': entry.get('checksum'),
+            'has_backup_checksums': entry.get('has_backup_checksums', False)
+        }
+    
+    def restore_verified(self, plans: Dict[str, List[Dict]], expected_stats: Dict[str, Optional[Dict]] = None,
+                         verify: bool = True) -> bool:
+        """
+        驗證後同時還原多個資料庫
+        1. 平行驗證所有備份組（任一失敗即中止，所有資料庫維持線上）
+        2. 各資料庫以獨立連線同時還原，離線時間約為最慢的一個資料庫
+        3. 比對還原後的資料列數與每季彙總值
+        
+        Args:
+            plans: {資料庫名稱: [備份組, ...]}（依還原順序）
+            expected_stats: {資料庫名稱: 備份時的資料統計}
+            verify: False 時略過驗證與比對，直接還原
+        """
+        expected_stats = expected_stats or {}
+        backup_sets = [backup_set for sets in plans.values() for backup_set in sets]
+        temp_files = []
+        try:
+            if verify:
+                logger.info(f"🔍 驗證 {len(backup_sets)} 個備份組（資料庫仍維持線上）...")
+                start_time = time.time()
+                with ThreadPoolExecutor(max_workers=min(len(backup_sets), 8)) as executor:
+                    results = list(executor.map(self.verify_backup_set, backup_sets))
+                
+                errors = []
+                for backup_set, (files, temps, error) in zip(backup_sets, results):
+                    temp_files.extend(temps)
+                    backup_set['files'] = files
+                    if error:
+                        errors.append(f"{backup_set['id']}: {error}")
+                if errors:
+                    for error in errors:
+                        logger.error(f"❌ {error}")
+                    logger.error("❌ 備份驗證失敗，未還原任何資料庫")
+                    return False
+                logger.info(f"✅ 備份驗證通過，耗時 {time.time() - start_time:.1f} 秒")
             
-            if backup_file.exists():
-                total_count += 1
-                if self.restore_database(db_name, backup_file):
-                    success_count += 1
-            else:
-                logger.warning(f"⚠️  跳過 {db_name} (沒有找到備份檔案)")
+            start_time = time.time()
+            with ThreadPoolExecutor(max_workers=max(1, min(len(plans), BACKUP_MAX_WORKERS))) as executor:
+                results = list(executor.map(self._restore_planned_database, plans, [plans[db_name] for db_name in plans]))
+            restored = dict(zip(plans, results))
+            logger.info(f"⏱️ 還原耗時 {time.time() - start_time:.1f} 秒（資料庫離線期間）")
+        finally:
+            for path in temp_files:
+                if path.exists():
+                    path.unlink()
+        
+        if verify:
+            for db_name, success in restored.items():
+                if not success:
+                    continue
+                try:
+                    restored[db_name] = self.verify_restored_database(db_name, expected_stats.get(db_name))
+                except Exception as e:
+                    logger.error(f"❌ {db_name} 還原後比對失敗: {str(e)}")
+                    restored[db_name] = False
         
-        logger.info(f"\n📊 還原完成: {success_count}/{total_count} 成功")
-        return success_count == total_count
+        return all(restored.values())
     
-    def restore_latest(self):
-        """還原最新的備份檔案"""
-        logger.info("🔄 開始還原最新的備份檔案...")
+    def _restore_planned_database(self, database_name: str, backup_sets: List[Dict]) -> bool:
+        """還原單一資料庫的已驗證備份組；失敗時記錄並回傳 False，不影響同時還原的其他資料庫"""
+        try:
+            return self._restore_backup_sets(
+                database_name, [(backup_set['type'], backup_set['files']) for backup_set in backup_sets]
+            )
+        except Exception as e:
+            logger.error(f"❌ 還原 {database_name} 失敗: {str(e)}")
+            return False
+    
+    def restore_database(self, database_name, backup_file, verify: bool = True):
+        """還原單一資料庫（支援分割檔與用戶端壓縮的 .bak.gz）"""
+        entry = self.catalog.find_by_file(backup_file)
+        if entry:
+            return self.restore_sequences({database_name: [entry]}, verify)
         
-        success_count = 0
-        total_count = 0
+        # 未登錄的檔案視為單一檔案的完整備份（沒有檢查碼與資料統計，只做 RESTORE VERIFYONLY）
+        backup_path = Path(backup_file)
+        if not backup_path.exists() and (self.backup_dir / backup_path.name).exists():
+            backup_path = self.backup_dir / backup_path.name
+        backup_set = {'id': backup_path.name, 'type': 'full', 'files': [backup_path]}
+        return self.restore_verified({database_name: [backup_set]}, verify=verify)
+    
+    def restore_sequences(self, sequences: Dict[str, List[Dict]], verify: bool = True) -> bool:
+        """依備份目錄算出的順序（完整 + 差異 + 交易記錄）驗證後同時還原多個資料庫"""
+        for database_name, entries in sequences.items():
+            logger.info(f"📋 {database_name} 還原順序: " +
+                        " → ".join(f"{entry['type']}@{entry['timestamp']}" for entry in entries))
+        return self.restore_verified(
+            {db_name: [self._entry_backup_set(entry) for entry in entries] for db_name, entries in sequences.items()},
+            # 還原後的資料應與還原順序中最後一份備份完成時相同
+            {db_name: entries[-1].get('stats') for db_name, entries in sequences.items()},
+            verify
+        )
+    
+    def restore_sequence(self, database_name: str, entries: List[Dict], verify: bool = True) -> bool:
+        """依備份目錄算出的順序還原單一資料庫"""
+        return self.restore_sequences({database_name: entries}, verify)
+    
+    def restore_entry(self, entry_id: str, verify: bool = True) -> bool:
+        """還原到指定的還原點（自動加上所需的完整 / 差異 / 交易記錄備份）"""
+        entry = self.catalog.find(entry_id)
+        if not entry:
+            logger.error(f"❌ 備份目錄中沒有 {entry_id}")
+            return False
+        sequence = self.catalog.get_restore_sequence(entry['database'], before=entry['timestamp'])
+        if not sequence or sequence[-1]['id'] != entry_id:
+            # 指定的差異 / 交易記錄備份不在最少還原順序的尾端（例如之後還有同時間的記錄），明確還原到它為止
+            sequence = [item for item in sequence if item['timestamp'] < entry['timestamp']] + [entry]
+        return self.restore_sequence(entry['database'], sequence, verify)
+    
+    def list_backup_files(self, limit: int = None):
+        """列出備份目錄中的還原點（新到舊）"""
+        entries = self.catalog.list_restore_points(limit=limit)
+        
+        if not entries:
+            logger.info("📁 備份目錄中沒有備份（舊的備份檔可用 rebuild_catalog() 加入）")
+            return []
+        
+        logger.info("📁 可用的備份:")
+        logger.info("-" * 60)
+        
+        current_timestamp = None
+        for index, entry in enumerate(entries, 1):
+            if entry['timestamp'] != current_timestamp:
+                current_timestamp = entry['timestamp']
+                logger.info(f"\n時間戳記: {current_timestamp}")
+            suffix = f" ({len(entry['files'])} 個分割檔)" if len(entry['files']) > 1 else ""
+            logger.info(f"  {index}. {entry['database']} [{entry['type']}]{suffix} "
+                        f"{entry['file_size'] or 0:,} bytes")
         
+        return entries
+    
+    def _restore_all(self, before: str = None, verify: bool = True) -> bool:
+        """驗證後同時還原所有資料庫到指定時間（含）為止的最新還原點"""
+        sequences = {}
         for db_type, db_name in DATABASES.items():
-            # 找到最新的備份檔案
-            pattern = f"{db_name}_*.bak"
-            backup_files = list(self.backup_dir.glob(pattern))
-            
-            if backup_files:
-                # 按修改時間排序，取最新的
-                latest_backup = max(backup_files, key=lambda x: x.stat().st_mtime)
-                total_count += 1
-                
-                logger.info(f"📁 使用最新備份: {latest_backup.name}")
-                if self.restore_database(db_name, latest_backup):
-                    success_count += 1
+            sequence = self.catalog.get_restore_sequence(db_name, before=before)
+            if sequence:
+                sequences[db_name] = sequence
             else:
                 logger.warning(f"⚠️  跳過 {db_name} (沒有找到備份檔案)")
         
-        logger.info(f"\n📊 還原完成: {success_count}/{total_count} 成功")
-        return success_count == total_count
+        if not sequences:
+            logger.error("❌ 沒有可還原的備份")
+            return False
+        
+        success = self.restore_sequences(sequences, verify)
+        logger.info(f"\n📊 還原完成: {'全部成功' if success else '有資料庫還原或驗證失敗'} ({len(sequences)} 個資料庫)")
+        return success
+    
+    def restore_by_timestamp(self, timestamp, verify: bool = True):
+        """根據時間戳記還原所有資料庫（還原到該時間點為止的完整 + 差異 + 交易記錄備份）"""
+        logger.info(f"🔄 開始還原時間戳記為 {timestamp} 的資料庫...")
+        return self._restore_all(before=timestamp, verify=verify)
+    
+    def restore_latest(self, verify: bool = True):
+        """還原最新的備份檔案（最新完整 + 最新差異 + 其後的交易記錄）"""
+        logger.info("🔄 開始還原最新的備份檔案...")
+        return self._restore_all(verify=verify)
 
 def main():
     """主函數"""
@@ -293,9 +881,12 @@ def main():
         print("5. 還原單一資料庫")
         print("6. 列出備份檔案")
         print("7. 測試資料庫連線")
+        print("8. 平行備份所有資料庫 (分割檔 + 壓縮)")
+        print("9. 差異備份所有資料庫 (依排程自動改做完整備份)")
+        print("10. 將備份資料夾中未登錄的備份加入備份目錄")
         print("0. 結束")
         
-        choice = input("\n請選擇 (0-7): ").strip()
+        choice = input("\n請選擇 (0-10): ").strip()
         
         if choice == "0":
             print("👋 再見！")
@@ -326,21 +917,31 @@ def main():
         elif choice == "4":
             tool.restore_latest()
         elif choice == "5":
-            backup_files = tool.list_backup_files()
-            if backup_files:
-                backup_file = input("請輸入備份檔案名稱: ").strip()
-                if backup_file:
-                    # 從檔案名稱提取資料庫名稱
-                    db_name = backup_file.split('_')[0] + '_' + backup_file.split('_')[1]
-                    tool.restore_database(db_name, tool.backup_dir / backup_file)
+            entries = tool.list_backup_files(limit=50)
+            if entries:
+                try:
+                    entry_choice = int(input("請選擇還原點編號: ")) - 1
+                    if 0 <= entry_choice < len(entries):
+                        tool.restore_entry(entries[entry_choice]['id'])
+                    else:
+                        print("❌ 無效的選擇")
+                except ValueError:
+                    print("❌ 請輸入有效的數字")
         elif choice == "6":
             tool.list_backup_files()
         elif choice == "7":
             tool.test_connection()
+        elif choice == "8":
+            tool.backup_all_databases_parallel()
+        elif choice == "9":
+            tool.backup_after_import(mode='diff')
+        elif choice == "10":
+            tool.rebuild_catalog()
         else:
             print("❌ 無效的選擇")
 
 if __name__ == "__main__":
+    setup_logging('database_backup_restore.log')
     main()
 
 
@@ -5,24 +5,14 @@
 """
 
 import pyodbc
-import pandas as pd
-from sqlalchemy import create_engine, text
-from sqlalchemy.exc import SQLAlchemyError
 import logging
 from typing import Dict, List, Optional
 import os
 
 from config import DB_CONFIG, DATABASES
+from log_setup import setup_logging
+from schema_registry import get_schema_registry
 
-# 設定日誌
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('lvr_import.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
 
@@ -92,6 +82,8 @@ class DatabaseManager:
     
     def get_schema_info(self, schema_file: str) -> Dict[str, str]:
         """讀取 schema 檔案，取得欄位名稱和標題對應"""
+        import pandas as pd
+        
         try:
             df = pd.read_csv(schema_file, encoding='utf-8')
             schema_dict = dict(zip(df['name'], df['title']))
@@ -102,46 +94,12 @@ class DatabaseManager:
     
     def create_table_sql(self, table_name: str, schema_dict: Dict[str, str]) -> str:
         """根據 schema 產生 CREATE TABLE SQL 語句"""
-        # 簡化的資料類型對應，實際使用時可能需要更精確的對應
-        type_mapping = {
-            '鄉鎮市區': 'NVARCHAR(50)',
-            '交易標的': 'NVARCHAR(100)',
-            '土地位置建物門牌': 'NVARCHAR(200)',
-            '土地移轉總面積平方公尺': 'DECIMAL(10,2)',
-            '都市土地使用分區': 'NVARCHAR(100)',
-            '非都市土地使用分區': 'NVARCHAR(100)',
-            '非都市土地使用編定': 'NVARCHAR(100)',
-            '交易年月日': 'NVARCHAR(20)',
-            '交易筆棟數': 'INT',
-            '移轉層次': 'NVARCHAR(50)',
-            '總樓層數': 'INT',
-            '建物型態': 'NVARCHAR(100)',
-            '主要用途': 'NVARCHAR(100)',
-            '主要建材': 'NVARCHAR(100)',
-            '建築完成年月': 'NVARCHAR(20)',
-            '建物移轉總面積平方公尺': 'DECIMAL(10,2)',
-            '建物現況格局-房': 'INT',
-            '建物現況格局-廳': 'INT',
-            '建物現況格局-衛': 'INT',
-            '建物現況格局-隔間': 'NVARCHAR(50)',
-            '有無管理組織': 'NVARCHAR(20)',
-            '總價元': 'DECIMAL(15,2)',
-            '單價元平方公尺': 'DECIMAL(15,2)',
-            '車位類別': 'NVARCHAR(50)',
-            '車位移轉總面積平方公尺': 'DECIMAL(10,2)',
-            '車位總價元': 'DECIMAL(15,2)',
-            '備註': 'NVARCHAR(500)',
-            '編號': 'NVARCHAR(50)',
-            '主建物面積': 'DECIMAL(10,2)',
-            '附屬建物面積': 'DECIMAL(10,2)',
-            '陽台面積': 'DECIMAL(10,2)',
-            '電梯': 'NVARCHAR(20)',
-            '移轉編號': 'NVARCHAR(50)'
-        }
+        # 欄位型別統一由 schema_registry 提供
+        registry = get_schema_registry()
         
         columns = []
         for field_name in schema_dict.keys():
-            sql_type = type_mapping.get(field_name, 'NVARCHAR(255)')  # 預設使用 NVARCHAR(255)
+            sql_type = registry.get_column_type(field_name)  # 未定義的欄位預設使用 NVARCHAR(255)
             columns.append(f"[{field_name}] {sql_type}")
         
         # 加入建立時間和來源檔案欄位
@@ -225,6 +183,7 @@ class DatabaseManager:
 
 
 if __name__ == "__main__":
+    setup_logging('lvr_import.log')
     # 測試資料庫管理功能
     db_manager = DatabaseManager()
     success = db_manager.setup_all_databases()
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+字典編碼器
+將低基數文字欄位（鄉鎮市區、交易標的、建物型態等）改存為整數代理鍵，
+文字值集中存放於各資料庫的維度資料表 (dim_*)，大幅縮小主要資料表的每列寬度
+"""
+
+import threading
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+import pyodbc
+
+from config import DB_CONFIG
+from schema_registry import ENCODED_COLUMNS, ENCODED_KEY_TYPE, get_encoded_column_name
+
+logger = logging.getLogger(__name__)
+
+# SQL Server 單一語句最多 2100 個參數
+MAX_PARAMS_PER_QUERY = 1000
+
+# 維度資料表 value 欄位的定序：二進位比較，與 Python 字典的鍵比對一致。
+# 預設定序不分大小寫與全半形，'Ａ' 與 'A' 會被視為同一個值（唯一條件衝突、查不到新值的代碼）
+VALUE_COLLATION = 'Chinese_Taiwan_Stroke_BIN2'
+
+
+def get_encoded_structures(structures: Dict[str, Dict[str, List[str]]]) -> Dict[str, Dict[str, List[str]]]:
+    """將資料表結構中的低基數文字欄位替換為代理鍵欄位"""
+    encoded = {}
+    for db_type, tables in structures.items():
+        encoded[db_type] = {}
+        for table_name, columns in tables.items():
+            new_columns = []
+            for definition in columns:
+                name = definition.rsplit(' ', 1)[0].strip('[]')
+                if name in ENCODED_COLUMNS:
+                    new_columns.append(f"{get_encoded_column_name(name)} {ENCODED_KEY_TYPE}")
+                else:
+                    new_columns.append(definition)
+            encoded[db_type][table_name] = new_columns
+    return encoded
+
+
+def create_dimension_tables(cursor) -> bool:
+    """建立所有維度資料表（已存在則略過；value 欄位不是二進位定序時改為二進位定序）"""
+    try:
+        for table_name in ENCODED_COLUMNS.values():
+            cursor.execute(f"""
+                IF NOT EXISTS (SELECT * FROM sys.tables WHERE name = '{table_name}')
+                CREATE TABLE [{table_name}] (
+                    id {ENCODED_KEY_TYPE} IDENTITY(1,1) PRIMARY KEY,
+                    value NVARCHAR(500) COLLATE {VALUE_COLLATION} NOT NULL,
+                    CONSTRAINT [UQ_{table_name}_value] UNIQUE (value)
+                )
+            """)
+            # 舊版以資料庫預設定序建立的維度資料表：原本的值在不分大小寫的定序下已互不相同，改定序不會違反唯一條件
+            cursor.execute(f"""
+                IF EXISTS (SELECT * FROM sys.columns WHERE object_id = OBJECT_ID(N'{table_name}')
+                           AND name = 'value' AND collation_name <> '{VALUE_COLLATION}')
+                BEGIN
+                    ALTER TABLE [{table_name}] DROP CONSTRAINT [UQ_{table_name}_value];
+                    ALTER TABLE [{table_name}] ALTER COLUMN value NVARCHAR(500) COLLATE {VALUE_COLLATION} NOT NULL;
+                    ALTER TABLE [{table_name}] ADD CONSTRAINT [UQ_{table_name}_value] UNIQUE (value);
+                END
+            """)
+        logger.info(f"✅ 已建立維度資料表: {', '.join(ENCODED_COLUMNS.values())}")
+        return True
+    except Exception as e:
+        logger.error(f"❌ 建立維度資料表失敗: {str(e)}")
+        return False
+
+
+def create_decoded_view(cursor, table_name: str, columns: List[str]) -> bool:
+    """建立還原文字值的檢視表 (<table>_decoded)，供查詢時使用原欄位名稱"""
+    try:
+        select_list = ["f.id"]
+        joins = []
+        for index, definition in enumerate(columns):
+            name = definition.rsplit(' ', 1)[0].strip('[]')
+            source = name[:-len('_id')] if name.endswith('_id') else None
+            if source in ENCODED_COLUMNS:
+                alias = f"d{index}"
+                select_list.append(f"{alias}.value AS [{source}]")
+                joins.append(f"LEFT JOIN [{ENCODED_COLUMNS[source]}] {alias} ON {alias}.id = f.[{name}]")
+            else:
+                select_list.append(f"f.[{name}]")
+
+        cursor.execute(
+            f"CREATE OR ALTER VIEW [{table_name}_decoded] AS\n"
+            f"SELECT {', '.join(select_list)}\n"
+            f"FROM [{table_name}] f\n" + "\n".join(joins)
+        )
+        logger.info(f"✅ 已建立檢視表: {table_name}_decoded")
+        return True
+    except Exception as e:
+        logger.error(f"❌ 建立檢視表 {table_name}_decoded 失敗: {str(e)}")
+        return False
+
+
+class DictionaryEncoder:
+    """
+    字典編碼器
+
+    代碼快取為類別層級、依資料庫區分，同一程序內所有匯入器實例（含各工作執行緒）共用，
+    只有遇到新的文字值時才會連線資料庫；新值以獨立交易寫入並立即提交，
+    避免主要資料匯入失敗回滾時快取中留下不存在的代碼。
+    """
+
+    # {(database_name, column): {value: id}}
+    _cache: Dict[Tuple[str, str], Dict[str, int]] = {}
+    _lock = threading.Lock()
+
+    def __init__(self, database_name: str):
+        self.database_name = database_name
+        self.connection_string = (
+            f"DRIVER={{{DB_CONFIG['driver']}}};"
+            f"SERVER={DB_CONFIG['server']};"
+            f"UID={DB_CONFIG['username']};"
+            f"PWD={DB_CONFIG['password']};"
+            f"Trusted_Connection={DB_CONFIG['trusted_connection']};"
+            f"Encrypt={DB_CONFIG['encrypt']};"
+            f"Database={database_name};"
+        )
+
+    def _get_column_cache(self, column: str) -> Dict[str, int]:
+        """取得（必要時載入）單一欄位的代碼快取，需在持有鎖時呼叫"""
+        key = (self.database_name, column)
+        if key not in self._cache:
+            conn = pyodbc.connect(self.connection_string)
+            try:
+                cursor = conn.cursor()
+                cursor.execute(f"SELECT value, id FROM [{ENCODED_COLUMNS[column]}]")
+                self._cache[key] = {value: code for value, code in cursor.fetchall()}
+            finally:
+                conn.close()
+            logger.info(f"📚 已載入 {self.database_name}.{ENCODED_COLUMNS[column]} 代碼 {len(self._cache[key])} 筆")
+        return self._cache[key]
+
+    def _add_values(self, column: str, values: List[str], column_cache: Dict[str, int]):
+        """將新的文字值寫入維度資料表並更新快取，需在持有鎖時呼叫"""
+        dim_table = ENCODED_COLUMNS[column]
+        conn = pyodbc.connect(self.connection_string)
+        try:
+            cursor = conn.cursor()
+            # 其他程序可能同時寫入相同的值，以 UPDLOCK/HOLDLOCK 避免違反唯一條件
+            cursor.executemany(
+                f"INSERT INTO [{dim_table}] (value) "
+                f"SELECT ? WHERE NOT EXISTS (SELECT 1 FROM [{dim_table}] WITH (UPDLOCK, HOLDLOCK) WHERE value = ?)",
+                [(value, value) for value in values]
+            )
+            conn.commit()
+
+            for i in range(0, len(values), MAX_PARAMS_PER_QUERY):
+                chunk = values[i:i + MAX_PARAMS_PER_QUERY]
+                placeholders = ', '.join('?' for _ in chunk)
+                cursor.execute(f"SELECT value, id FROM [{dim_table}] WHERE value IN ({placeholders})", chunk)
+                column_cache.update({value: code for value, code in cursor.fetchall()})
+        finally:
+            conn.close()
+
+        logger.info(f"➕ {self.database_name}.{dim_table} 新增 {len(values)} 個代碼")
+
+    def encode_values(self, column: str, values: List[str]) -> Dict[str, int]:
+        """取得一組文字值的代碼對應（不存在的值會先寫入維度資料表）"""
+        with self._lock:
+            column_cache = self._get_column_cache(column)
+            missing = [value for value in values if value not in column_cache]
+            if missing:
+                self._add_values(column, missing, column_cache)
+            return {value: column_cache[value] for value in values}
+
+    def encode_value(self, column: str, value: Optional[str]) -> Optional[int]:
+        """取得單一文字值的代碼，空值回傳 None"""
+        if value is None or value == '':
+            return None
+        return self.encode_values(column, [value])[value]
+
+    def encode_dataframe(self, df: pd.DataFrame) -> pd.DataFrame:
+        """將 DataFrame 中需編碼的欄位替換為代理鍵欄位（欄位順序不變）"""
+        rename_map = {}
+        for column in df.columns:
+            if column not in ENCODED_COLUMNS:
+                continue
+
+            values = df[column].where(df[column].notna(), '').astype(str).str.strip()
+            unique_values = [value for value in values.unique() if value not in ('', 'nan', 'None', 'null')]
+            mapping = self.encode_values(column, unique_values) if unique_values else {}
+
+            df[column] = pd.Series([mapping.get(value) for value in values], index=df.index, dtype=object)
+            rename_map[column] = get_encoded_column_name(column)
+
+        return df.rename(columns=rename_map)
+
+    @classmethod
+    def clear_cache(cls):
+        """清除代碼快取（重建維度資料表後使用）"""
+        with cls._lock:
+            cls._cache.clear()
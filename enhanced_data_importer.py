@@ -8,73 +8,160 @@ import pandas as pd
 import pyodbc
 import logging
 import os
-import glob
-from typing import Dict, List, Optional, Tuple
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple, Union
 from config import DB_CONFIG, BATCH_SIZE
+from log_setup import setup_logging
 from file_type_mapping import FileTypeMapping, DataType, FileType
 from city_code_mapping import CityCodeMapping
+from dictionary_encoder import DictionaryEncoder, create_dimension_tables
+from schema_registry import get_schema_registry, get_encoded_column_name, build_insert_sql, CLEANING_PLAN_VERSION
+from import_stats import compute_file_stats, merge_file_stats, ensure_stats_table, save_file_stats
+import csv_splitter
+import file_access
+import cleaned_cache
+import zip_source
+from transaction_detail import TransactionDetail
+import bulk_load
+
+try:
+    from config import USE_DICTIONARY_ENCODING
+except ImportError:
+    USE_DICTIONARY_ENCODING = False
+
+try:
+    from config import BUILD_TRANSACTION_DETAIL
+except ImportError:
+    BUILD_TRANSACTION_DETAIL = True
+
+try:
+    from config import CSV_ENGINE
+except ImportError:
+    CSV_ENGINE = 'pandas'
+
+try:
+    from config import USE_CLEANED_CACHE
+except ImportError:
+    USE_CLEANED_CACHE = False
+
+CSV_ENCODINGS = ['utf-8', 'big5', 'cp950', 'gbk']
 
-# 設定日誌
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('enhanced_import.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
+# 已完成匯入前準備（import_stats、明細表與索引）的 {(伺服器, 資料庫, 資料類型)}，每個程序只執行一次
+_prepared_databases = set()
+_prepare_lock = threading.Lock()
+
 class EnhancedDataImporter:
     """增強版資料匯入器（含縣市代碼）"""
     
-    def __init__(self):
+    def __init__(self, use_dictionary_encoding: bool = None, build_transaction_detail: bool = None,
+                 csv_engine: str = None, split_large_files: bool = True, use_cleaned_cache: bool = None,
+                 db_config: Dict = None, bulk: bool = None):
+        # 連線設定：覆寫 config.py 中 DB_CONFIG 的欄位（city_shards 的節點寫入自己的 SQL Server 執行個體）
+        self.db_config = {**DB_CONFIG, **(db_config or {})}
         self.connection_string = self._build_connection_string()
         self.file_mapping = FileTypeMapping()
         self.city_mapping = CityCodeMapping()
+        self.schema_registry = get_schema_registry()
+        # 啟用字典編碼時，低基數文字欄位改寫入維度資料表的代理鍵
+        if use_dictionary_encoding is None:
+            use_dictionary_encoding = USE_DICTIONARY_ENCODING
+        self.use_dictionary_encoding = use_dictionary_encoding
+        self.city_name_column = get_encoded_column_name('縣市名稱') if use_dictionary_encoding else '縣市名稱'
+        # 寫入每個檔案時一併更新 transaction_detail 交易明細整合表
+        if build_transaction_detail is None:
+            build_transaction_detail = BUILD_TRANSACTION_DETAIL
+        self.build_transaction_detail = build_transaction_detail
+        # CSV 解析引擎: 'pandas'（預設 C 引擎）或 'arrow'（pyarrow 多執行緒解析，欄位維持 Arrow 型別）
+        self.csv_engine = csv_engine or CSV_ENGINE
+        # 超過 CSV_SPLIT_THRESHOLD_MB 的檔案切割為多個範圍，以子程序平行解析與清理（csv_splitter）
+        self.split_large_files = split_large_files
+        # 清理結果快取：同一檔案內容已以相同清理規則清理過時，略過 CSV 解析與清理（cleaned_cache，預設關閉）
+        if use_cleaned_cache is None:
+            use_cleaned_cache = USE_CLEANED_CACHE
+        self.cleaned_cache = cleaned_cache.CleanedCache() if use_cleaned_cache else None
+        # 最近一次 import_single_file 的檔案統計（匯入失敗時為 None）
+        self.last_file_stats = None
+        # 最近一次 read_csv_file 的檔案掃描結果（file_access.FileScan: 大小、雜湊、行數 / 記錄數、編碼）
+        self.last_file_scan = None
+        # 提交前呼叫 commit_guard(cursor, file_stats)，與資料列在同一個交易中執行；引發例外時整個交易不提交
+        # （work_queue 以此在同一個交易中確認租約並標記完成）
+        self.commit_guard = None
+        # 大量載入：資料列先寫入暫存資料表，再以 INSERT ... WITH (TABLOCK) SELECT 寫入目標資料表（最少記錄）
+        # None 時依本程序是否有涵蓋該資料庫的 bulk_load.BulkLoadWindow 決定
+        self.bulk = bulk
         
     def _build_connection_string(self) -> str:
         """建立連線字串"""
         return (
-            f"DRIVER={{{DB_CONFIG['driver']}}};"
-            f"SERVER={DB_CONFIG['server']};"
-            f"UID={DB_CONFIG['username']};"
-            f"PWD={DB_CONFIG['password']};"
-            f"Trusted_Connection={DB_CONFIG['trusted_connection']};"
-            f"Encrypt={DB_CONFIG['encrypt']};"
+            f"DRIVER={{{self.db_config['driver']}}};"
+            f"SERVER={self.db_config['server']};"
+            f"UID={self.db_config['username']};"
+            f"PWD={self.db_config['password']};"
+            f"Trusted_Connection={self.db_config['trusted_connection']};"
+            f"Encrypt={self.db_config['encrypt']};"
         )
     
-    def read_csv_file(self, file_path: str) -> Optional[pd.DataFrame]:
-        """讀取 CSV 檔案"""
+    def read_csv_file(self, file_path: str, schema=None) -> Optional[pd.DataFrame]:
+        """
+        讀取 CSV 檔案
+        檔案只以 mmap 對應一次：同一次掃描判斷編碼並計算雜湊與換行數（存於 last_file_scan），
+        解析器再以判斷出的編碼讀取同一個對應，不再依編碼逐一重新開檔解析
+        
+        Args:
+            schema: 資料表定義（依此指定欄位型別；未提供時依檔名查詢）
+        """
         try:
-            # 嘗試不同的編碼
-            encodings = ['utf-8', 'big5', 'cp950', 'gbk']
-            
-            for encoding in encodings:
-                try:
-                    # 讀取 CSV，跳過第二行 (欄位名稱)
-                    df = pd.read_csv(file_path, encoding=encoding, skiprows=[1])
-                    logger.info(f"✅ 成功讀取 {file_path} (編碼: {encoding})")
-                    return df
-                except UnicodeDecodeError:
-                    continue
-            
-            logger.error(f"❌ 無法讀取 {file_path}，所有編碼都失敗")
-            return None
+            with file_access.CsvFile(file_path, CSV_ENCODINGS) as content:
+                scan = content.scan()
+                self.last_file_scan = scan
+                if scan.encoding is None:
+                    logger.error(f"❌ 無法讀取 {file_path}，所有編碼都失敗")
+                    return None
+                
+                schema = schema or self.schema_registry.get_schema_for_file(os.path.basename(file_path))
+                if self.csv_engine == 'arrow' and schema is not None:
+                    import arrow_csv
+                    return arrow_csv.read_csv_file(content, schema.numeric_columns, schema.string_columns)
+                
+                # 讀取 CSV，跳過第二行 (欄位名稱)；文字欄位固定為字串（與 csv_splitter 切割解析相同）
+                dtype = None
+                if schema is not None:
+                    header_columns = pd.read_csv(content.reader(), encoding=scan.encoding, nrows=0).columns
+                    dtype = csv_splitter.string_dtypes(header_columns, schema.string_columns)
+                df = pd.read_csv(content.reader(), encoding=scan.encoding, skiprows=[1], dtype=dtype)
+                logger.info(f"✅ 成功讀取 {file_path} (編碼: {scan.encoding})")
+                return df
             
         except Exception as e:
             logger.error(f"❌ 讀取 {file_path} 失敗: {str(e)}")
             return None
     
-    def clean_data(self, df: pd.DataFrame, file_type: FileType) -> pd.DataFrame:
-        """清理資料"""
+    def clean_data(self, df: pd.DataFrame, file_type: FileType, data_type: DataType = None,
+                   numeric_columns: List[str] = None) -> pd.DataFrame:
+        """
+        清理資料
+        
+        Args:
+            numeric_columns: 數值欄位（未提供時由 schema_registry 取得；csv_splitter 的子程序由主程序傳入，
+                             包含欄位漂移檢查在執行期間加入的欄位）
+        """
         try:
+            if numeric_columns is None:
+                numeric_columns = self._get_numeric_columns(file_type, data_type)
+            
+            # arrow 引擎讀取的資料以 pyarrow.compute 清理，欄位維持 Arrow 型別
+            if self.csv_engine == 'arrow':
+                import arrow_csv
+                if arrow_csv.is_arrow_frame(df):
+                    df = arrow_csv.clean_frame(df, numeric_columns)
+                    logger.info(f"✅ 資料清理完成，剩餘 {len(df)} 行")
+                    return df
+            
             # 移除完全空白的行
             df = df.dropna(how='all')
             
-            # 根據檔案類型定義數值欄位
-            numeric_columns = self._get_numeric_columns(file_type)
-            
             # 處理數值欄位
             for col in numeric_columns:
                 if col in df.columns:
@@ -105,153 +192,371 @@ class EnhancedDataImporter:
             logger.error(f"❌ 資料清理失敗: {str(e)}")
             return df
     
-    def _get_numeric_columns(self, file_type: FileType) -> List[str]:
-        """根據檔案類型取得數值欄位列表"""
-        if file_type == FileType.MAIN:
-            return [
-                '土地移轉總面積平方公尺', '交易筆棟數', '總樓層數', '建物移轉總面積平方公尺',
-                '[建物現況格局-房]', '[建物現況格局-廳]', '[建物現況格局-衛]', '總價元', '單價元平方公尺',
-                '車位移轉總面積平方公尺', '車位總價元', '主建物面積', '附屬建物面積', '陽台面積',
-                '土地面積平方公尺', '建物總面積平方公尺', '車位面積平方公尺', '車位總額元', '總額元',
-                '租賃筆棟數', '屋齡', '建物移轉面積平方公尺', '權利人持分分母', '權利人持分分子',
-                '車位價格', '車位面積平方公尺'
-            ]
-        elif file_type == FileType.BUILD:
-            return [
-                '屋齡', '建物移轉面積平方公尺', '總層數'
-            ]
-        elif file_type == FileType.LAND:
-            return [
-                '土地移轉面積平方公尺', '權利人持分分母', '權利人持分分子'
-            ]
-        elif file_type == FileType.PARK:
-            return [
-                '車位價格', '車位面積平方公尺'
-            ]
-        else:
-            return []
+    def _get_numeric_columns(self, file_type: FileType, data_type: DataType = None) -> List[str]:
+        """根據檔案類型取得數值欄位列表（由 schema_registry 提供）"""
+        return self.schema_registry.get_numeric_columns(file_type, data_type)
+    
+    def insert_columns(self, columns: List[str]) -> List[str]:
+        """INSERT 的欄位：縣市代碼、縣市名稱 + 資料欄位 + source_file、quarter"""
+        return ['縣市代碼', self.city_name_column] + columns + ['source_file', 'quarter']
     
     def create_insert_sql(self, table_name: str, columns: List[str]) -> str:
         """建立 INSERT SQL 語句"""
         # 加入額外欄位（縣市代碼、縣市名稱、source_file、quarter）
-        all_columns = ['縣市代碼', '縣市名稱'] + columns + ['source_file', 'quarter']
-        placeholders = ', '.join(['?' for _ in all_columns])
-        column_names = ', '.join([f'[{col}]' if '-' in col else col for col in all_columns])
+        return build_insert_sql(table_name, tuple(self.insert_columns(columns)))
+    
+    def prepare_batch_rows(self, batch_df: pd.DataFrame, city_code: str, city_name: str,
+                           source_file: str, quarter: str) -> List[list]:
+        """將一批資料轉為 INSERT 參數列（縣市代碼、縣市名稱 + 資料欄位 + source_file、quarter）"""
+        batch_data = []
+        
+        # arrow 引擎的資料逐欄轉為 Python 值後組成資料列，不經 iterrows 為每列建立 Series
+        # （Arrow 欄位以 to_pylist 轉換，空值直接為 None）
+        if any(isinstance(dtype, pd.ArrowDtype) for dtype in batch_df.dtypes):
+            import pyarrow as pa
+            row_iter = zip(*(
+                pa.array(batch_df[column].array).to_pylist() if isinstance(batch_df[column].dtype, pd.ArrowDtype)
+                else batch_df[column].tolist()
+                for column in batch_df.columns
+            ))
+        else:
+            row_iter = (row.values for _, row in batch_df.iterrows())
         
-        return f"INSERT INTO [{table_name}] ({column_names}) VALUES ({placeholders})"
+        for values in row_iter:
+            # 準備資料行，處理資料類型
+            row_data = []
+            
+            # 加入縣市代碼和縣市名稱
+            row_data.extend([city_code, city_name])
+            
+            for value in values:
+                if pd.isna(value) or value is None:
+                    row_data.append(None)
+                elif isinstance(value, (int, float)):
+                    # 確保數值在合理範圍內
+                    if isinstance(value, float) and (value > 1e15 or value < -1e15):
+                        row_data.append(None)
+                    else:
+                        row_data.append(value)
+                else:
+                    # 字串資料
+                    str_value = str(value).strip()
+                    if str_value in ['', 'nan', 'None', 'null']:
+                        row_data.append(None)
+                    else:
+                        row_data.append(str_value)
+            
+            # 加入額外欄位
+            row_data.extend([source_file, quarter])
+            batch_data.append(row_data)
+        
+        return batch_data
     
-    def insert_data_batch(self, database_name: str, table_name: str, df: pd.DataFrame,
-                         source_file: str, quarter: str, city_code: str, city_name: str) -> bool:
-        """批次插入資料（含縣市代碼）"""
+    def prepare_database(self, database_name: str, data_type: Optional[DataType] = None):
+        """
+        匯入前的結構準備：以自動認可的連線建立 import_stats、字典編碼的維度資料表（含定序更新），
+        以及 transaction_detail 與來源資料表的 (縣市代碼, 編號) 索引
+        （未指定 data_type 時不建立明細表）
+        每個程序、每個資料庫只執行一次，在任何檔案的資料交易開始之前；
+        DDL 不在各檔案的交易中執行，平行匯入時不會持有自己資料表的鎖等待其他資料表的結構修改鎖。
+        多個匯入程序同時第一次匯入時，以應用程式鎖依序建立
+        """
+        key = (self.db_config['server'], database_name, data_type)
+        with _prepare_lock:
+            if key in _prepared_databases:
+                return
+            conn = pyodbc.connect(self.connection_string + f"Database={database_name};", autocommit=True)
+            try:
+                cursor = conn.cursor()
+                cursor.execute("EXEC sp_getapplock @Resource = N'lvr_import_setup', @LockMode = 'Exclusive', "
+                               "@LockOwner = 'Session'")
+                ensure_stats_table(cursor)
+                if self.use_dictionary_encoding and not create_dimension_tables(cursor):
+                    raise RuntimeError(f"{database_name} 維度資料表準備失敗")
+                if self.build_transaction_detail and data_type is not None:
+                    TransactionDetail(data_type).ensure_table(cursor)
+            finally:
+                # 關閉連線時一併釋放應用程式鎖
+                conn.close()
+            _prepared_databases.add(key)
+    
+    def insert_data_batch(self, database_name: str, table_name: str, df: Union[pd.DataFrame, Iterable[pd.DataFrame]],
+                         source_file: str, quarter: str, city_code: str, city_name: str,
+                         file_stats: Dict = None) -> bool:
+        """
+        批次插入資料（含縣市代碼）
+        file_stats 寫入 import_stats 與資料列在同一個交易中完成；
+        資料提交後再以獨立的短交易更新 transaction_detail（明細更新失敗時資料仍保留，可執行 lvr_cli.py detail 重建）
+        
+        Args:
+            df: DataFrame，或欄位相同的多個 DataFrame（例如 csv_splitter 逐一產生的範圍，依序寫入同一個交易）；
+                file_stats 在所有資料寫入後、提交前才讀取，可由產生器在結束時填入
+        """
+        conn = None
         try:
+            schema = self.schema_registry.get_schema_by_table(database_name, table_name)
+            self.prepare_database(database_name, schema.data_type if schema else None)
+            
             # 連接到指定資料庫
             conn_str = self.connection_string + f"Database={database_name};"
             conn = pyodbc.connect(conn_str)
-            cursor = conn.cursor()
             
-            # 準備資料
-            columns = list(df.columns)
-            insert_sql = self.create_insert_sql(table_name, columns)
+            success_count = self.write_rows(conn, database_name, table_name, df, source_file, quarter,
+                                            city_code, city_name, file_stats)
+            
+            conn.commit()
+            
+        except Exception as e:
+            logger.error(f"❌ 插入資料到 {database_name}.{table_name} 失敗: {str(e)}")
+            if conn is not None:
+                conn.close()
+            return False
+        
+        logger.info(f"✅ 成功插入 {success_count} 行到 {database_name}.{table_name}")
+        
+        try:
+            if self.build_transaction_detail and schema:
+                TransactionDetail(schema.data_type).refresh_file(conn, schema.file_type, city_code, source_file, quarter)
+        except Exception as e:
+            logger.error(f"❌ {database_name} 交易明細更新失敗（資料已寫入，請執行 python lvr_cli.py detail 重建）: {str(e)}")
+        finally:
+            conn.close()
+        return True
+    
+    def write_rows(self, conn, database_name: str, table_name: str, df: Union[pd.DataFrame, Iterable[pd.DataFrame]],
+                   source_file: str, quarter: str, city_code: str, city_name: str, file_stats: Dict = None) -> int:
+        """
+        在 conn 目前的交易中寫入資料列與檔案統計（資料表須已由 prepare_database 建立；不提交，由呼叫端提交或復原；交易明細由 insert_data_batch 在提交後更新）
+        
+        大量載入時資料列先寫入暫存資料表，最後才以 TABLOCK 寫入目標資料表：
+        耗時的逐批傳送不持有目標資料表的鎖，排他鎖只持有到提交為止
+        
+        Returns:
+            寫入的資料列數
+        """
+        bulk = self.bulk if self.bulk is not None else bulk_load.is_active(database_name)
+        cursor = conn.cursor()
+        
+        frames = [df] if isinstance(df, pd.DataFrame) else df
+        insert_sql = None
+        all_columns = None
+        schema = None
+        success_count = 0
+        
+        for frame in frames:
+            if insert_sql is None:
+                # 準備資料
+                columns = list(frame.columns)
+                all_columns = self.insert_columns(columns)
+                if bulk:
+                    cursor.execute(bulk_load.stage_table_sql(table_name, all_columns))
+                    insert_sql = self.create_insert_sql(bulk_load.STAGE_TABLE, columns)
+                else:
+                    insert_sql = self.create_insert_sql(table_name, columns)
+                
+                # 依資料表定義固定參數型別，避免每批因 None/字串混用而重新繫結
+                schema = self.schema_registry.get_schema_by_table(database_name, table_name)
+                if schema:
+                    input_sizes = schema.get_input_sizes(tuple(all_columns))
+                    if input_sizes:
+                        cursor.setinputsizes(input_sizes)
             
             # 批次處理
-            total_rows = len(df)
-            success_count = 0
+            total_rows = len(frame)
             
             for i in range(0, total_rows, BATCH_SIZE):
-                batch_df = df.iloc[i:i+BATCH_SIZE]
-                batch_data = []
-                
-                for _, row in batch_df.iterrows():
-                    # 準備資料行，處理資料類型
-                    row_data = []
-                    
-                    # 加入縣市代碼和縣市名稱
-                    row_data.extend([city_code, city_name])
-                    
-                    for value in row.values:
-                        if pd.isna(value) or value is None:
-                            row_data.append(None)
-                        elif isinstance(value, (int, float)):
-                            # 確保數值在合理範圍內
-                            if isinstance(value, float) and (value > 1e15 or value < -1e15):
-                                row_data.append(None)
-                            else:
-                                row_data.append(value)
-                        else:
-                            # 字串資料
-                            str_value = str(value).strip()
-                            if str_value in ['', 'nan', 'None', 'null']:
-                                row_data.append(None)
-                            else:
-                                row_data.append(str_value)
-                    
-                    # 加入額外欄位
-                    row_data.extend([source_file, quarter])
-                    batch_data.append(row_data)
+                batch_df = frame.iloc[i:i+BATCH_SIZE]
+                batch_data = self.prepare_batch_rows(batch_df, city_code, city_name, source_file, quarter)
                 
                 # 執行批次插入
                 cursor.executemany(insert_sql, batch_data)
                 success_count += len(batch_data)
                 
                 # 顯示進度
-                progress = min(i + BATCH_SIZE, total_rows)
-                logger.info(f"📊 進度: {progress}/{total_rows} 行已處理")
-            
-            conn.commit()
-            conn.close()
-            
-            logger.info(f"✅ 成功插入 {success_count} 行到 {database_name}.{table_name}")
-            return True
-            
-        except Exception as e:
-            logger.error(f"❌ 插入資料到 {database_name}.{table_name} 失敗: {str(e)}")
+                logger.info(f"📊 進度: {success_count} 行已處理")
+        
+        if bulk and insert_sql is not None:
+            # 另開游標，不沿用暫存寫入的 setinputsizes
+            conn.cursor().execute(bulk_load.load_stage_sql(table_name, all_columns))
+        
+        if file_stats is not None:
+            # 另開游標，不沿用 INSERT 的 setinputsizes
+            # import_stats 資料表已由 prepare_database 在交易外建立
+            save_file_stats(conn.cursor(), table_name, source_file, quarter, city_code, file_stats)
+        
+        if self.commit_guard is not None:
+            self.commit_guard(conn.cursor(), file_stats)
+        
+        return success_count
+    
+    def _resolve_file(self, filename: str) -> Optional[Tuple[Dict, Dict, object]]:
+        """取得檔案類型、縣市資訊與資料表定義；不支援的檔案回傳 None"""
+        # 取得檔案類型資訊
+        file_info = self.file_mapping.get_file_info(filename)
+        if not file_info:
+            logger.error(f"❌ 不支援的檔案類型: {filename}")
+            return None
+        
+        # 取得縣市資訊
+        city_info = self.city_mapping.get_city_info_from_filename(filename)
+        if not city_info:
+            logger.error(f"❌ 無法識別縣市代碼: {filename}")
+            return None
+        
+        schema = self.schema_registry.get_schema(file_info['data_type'], file_info['file_type'])
+        return file_info, city_info, schema
+    
+    def _cache_key(self, file_path: str, schema) -> str:
+        """清理結果快取鍵：檔案內容雜湊（file_access 掃描結果，讀取 CSV 時不再重新計算）與清理規則版本"""
+        return cleaned_cache.cache_key(file_access.scan_file(file_path, CSV_ENCODINGS).content_hash,
+                                       CLEANING_PLAN_VERSION, schema.numeric_columns, schema.string_columns)
+    
+    def _parse_and_clean(self, file_path: str, file_info: Dict, city_info: Dict, schema,
+                         cache_writer: 'cleaned_cache.CacheWriter' = None) -> Optional[Tuple[pd.DataFrame, Dict]]:
+        """讀取、檢查標題、清理並計算檔案統計（不連線資料庫），回傳 (清理後的 DataFrame, 檔案統計)"""
+        filename = os.path.basename(file_path)
+        
+        # 讀取CSV檔案
+        df = self.read_csv_file(file_path, schema)
+        if df is None or df.empty:
+            logger.error(f"❌ 檔案為空或讀取失敗: {filename}")
+            return None
+        
+        if not self._check_header(schema, list(df.columns), filename):
+            return None
+        
+        # 清理資料
+        df = self.clean_data(df, file_info['file_type'], file_info['data_type'])
+        if df.empty:
+            logger.error(f"❌ 清理後資料為空: {filename}")
+            return None
+        
+        # 寫入前計算檔案統計（字典編碼前，空值與數值欄位和寫入資料庫的值一致）
+        file_stats = compute_file_stats(df, schema.numeric_columns, city_info['city_code'])
+        
+        # 保存清理結果（字典編碼前；寫入失敗不影響匯入）
+        if cache_writer is not None:
+            cache_writer.write(df)
+            cache_writer.commit(file_stats)
+        return df, file_stats
+    
+    def _write_cleaned(self, df: pd.DataFrame, file_stats: Dict, filename: str, quarter: str,
+                       file_info: Dict, city_info: Dict) -> bool:
+        """字典編碼後寫入清理後的資料與檔案統計"""
+        # 字典編碼：低基數文字欄位轉為代理鍵（代碼快取於記憶體，僅新值需寫入資料庫）
+        city_name = city_info['city_name']
+        if self.use_dictionary_encoding:
+            encoder = DictionaryEncoder(file_info['database_name'])
+            df = encoder.encode_dataframe(df)
+            city_name = encoder.encode_value('縣市名稱', city_name)
+        
+        # 插入資料
+        return self.insert_data_batch(
+            file_info['database_name'],
+            file_info['table_name'],
+            df,
+            filename,
+            quarter,
+            city_info['city_code'],
+            city_name,
+            file_stats
+        )
+    
+    def prepare_file(self, file_path: str, numeric_columns: List[str] = None,
+                     string_columns: List[str] = None) -> Optional[Tuple[pd.DataFrame, Dict]]:
+        """
+        匯入的 CPU 階段（不連線資料庫）：讀取、清理並計算檔案統計，清理結果快取命中時直接讀出快取
+        與 write_prepared_file 分開呼叫，可在子程序中解析、在其他執行緒寫入（async_importer）
+        
+        Args:
+            numeric_columns, string_columns: 主程序資料表定義的欄位（async_importer 的子程序由主程序傳入，
+                                             包含欄位漂移檢查在執行期間加入的欄位，標題驗證與清理前先補入本程序的定義）
+        
+        Returns:
+            (清理後、字典編碼前的 DataFrame, 檔案統計)；失敗時回傳 None
+        """
+        filename = os.path.basename(file_path)
+        resolved = self._resolve_file(filename)
+        if resolved is None:
+            return None
+        file_info, city_info, schema = resolved
+        if numeric_columns is not None or string_columns is not None:
+            self._sync_schema_columns(schema, list(numeric_columns or []) + list(string_columns or []))
+        
+        cache_writer = None
+        if self.cleaned_cache is not None:
+            key = self._cache_key(file_path, schema)
+            entry = self.cleaned_cache.get(key)
+            if entry is not None:
+                if not self._check_header(schema, entry['columns'], filename):
+                    return None
+                logger.info(f"♻️ {filename} 使用清理結果快取 ({entry['rows']:,} 筆)，略過 CSV 解析與清理")
+                frames = list(self.cleaned_cache.iter_frames(key, arrow_dtypes=self.csv_engine == 'arrow'))
+                return pd.concat(frames, ignore_index=True), entry['file_stats']
+            cache_writer = self.cleaned_cache.writer(key)
+        
+        return self._parse_and_clean(file_path, file_info, city_info, schema, cache_writer)
+    
+    def _sync_schema_columns(self, schema, columns: List[str]):
+        """將主程序已加入、本程序 schema_registry 還沒有的欄位補入資料表定義（型別判斷與欄位漂移檢查相同）"""
+        from schema_drift_checker import DEFAULT_NEW_COLUMN_TYPE
+        
+        additions = [(name, self.schema_registry.get_column_type(name, DEFAULT_NEW_COLUMN_TYPE))
+                     for name in columns if name not in schema.csv_column_set]
+        if additions:
+            self.schema_registry.add_columns(schema.data_type, schema.file_type, additions)
+    
+    def write_prepared_file(self, file_path: str, quarter: str, df: pd.DataFrame, file_stats: Dict) -> bool:
+        """匯入的資料庫階段：寫入 prepare_file 的結果（不修改匯入器狀態，可由多個執行緒共用同一個匯入器）"""
+        filename = os.path.basename(file_path)
+        resolved = self._resolve_file(filename)
+        if resolved is None:
             return False
+        file_info, city_info, _ = resolved
+        
+        if self._write_cleaned(df, file_stats, filename, quarter, file_info, city_info):
+            logger.info(f"✅ 檔案匯入成功: {filename}")
+            return True
+        logger.error(f"❌ 檔案匯入失敗: {filename}")
+        return False
     
     def import_single_file(self, file_path: str, quarter: str) -> bool:
         """匯入單一檔案（含縣市代碼）"""
+        self.last_file_stats = None
         try:
             filename = os.path.basename(file_path)
             logger.info(f"🔄 開始匯入檔案: {filename}")
             
-            # 取得檔案類型資訊
-            file_info = self.file_mapping.get_file_info(filename)
-            if not file_info:
-                logger.error(f"❌ 不支援的檔案類型: {filename}")
-                return False
-            
-            # 取得縣市資訊
-            city_info = self.city_mapping.get_city_info_from_filename(filename)
-            if not city_info:
-                logger.error(f"❌ 無法識別縣市代碼: {filename}")
+            resolved = self._resolve_file(filename)
+            if resolved is None:
                 return False
+            file_info, city_info, schema = resolved
             
             logger.info(f"📋 檔案資訊: {file_info['description']} → {file_info['database_name']}.{file_info['table_name']}")
             logger.info(f"🏙️ 縣市資訊: {city_info['city_code']} ({city_info['city_name']})")
             
-            # 讀取CSV檔案
-            df = self.read_csv_file(file_path)
-            if df is None or df.empty:
-                logger.error(f"❌ 檔案為空或讀取失敗: {filename}")
-                return False
+            # 清理結果快取：以檔案內容雜湊與清理規則版本為鍵
+            cache_writer = None
+            if self.cleaned_cache is not None:
+                key = self._cache_key(file_path, schema)
+                entry = self.cleaned_cache.get(key)
+                if entry is not None:
+                    return self._import_cached_file(key, entry, file_path, quarter, file_info, city_info, schema)
+                cache_writer = self.cleaned_cache.writer(key)
             
-            # 清理資料
-            df = self.clean_data(df, file_info['file_type'])
-            if df.empty:
-                logger.error(f"❌ 清理後資料為空: {filename}")
+            # 大型檔案切割為多個範圍，以子程序平行解析與清理
+            if self.split_large_files and csv_splitter.should_split(file_path):
+                return self._import_split_file(file_path, quarter, file_info, city_info, schema, cache_writer)
+            
+            parsed = self._parse_and_clean(file_path, file_info, city_info, schema, cache_writer)
+            if parsed is None:
                 return False
+            df, file_stats = parsed
             
-            # 插入資料
-            success = self.insert_data_batch(
-                file_info['database_name'],
-                file_info['table_name'],
-                df,
-                filename,
-                quarter,
-                city_info['city_code'],
-                city_info['city_name']
-            )
+            success = self._write_cleaned(df, file_stats, filename, quarter, file_info, city_info)
             
             if success:
+                self.last_file_stats = file_stats
                 logger.info(f"✅ 檔案匯入成功: {filename}")
                 return True
             else:
@@ -262,6 +567,122 @@ class EnhancedDataImporter:
             logger.error(f"❌ 匯入檔案失敗 {file_path}: {str(e)}")
             return False
     
+    def _check_header(self, schema, columns: List[str], filename: str) -> bool:
+        """檢查 CSV 標題是否與資料表定義一致（未定義的欄位會在 INSERT 時失敗）"""
+        header_check = schema.validate_header(columns)
+        if header_check['unexpected']:
+            logger.error(f"❌ {filename} 含有資料表未定義的欄位: {', '.join(header_check['unexpected'])}")
+            return False
+        if header_check['missing']:
+            logger.warning(f"⚠️ {filename} 缺少欄位（將寫入 NULL）: {', '.join(header_check['missing'])}")
+        return True
+    
+    def _import_cached_file(self, key: str, entry: Dict, file_path: str, quarter: str, file_info: Dict,
+                            city_info: Dict, schema) -> bool:
+        """由清理結果快取逐批讀出資料寫入（不解析、不清理 CSV），檔案統計使用快取保存的結果"""
+        filename = os.path.basename(file_path)
+        if not self._check_header(schema, entry['columns'], filename):
+            return False
+        
+        logger.info(f"♻️ {filename} 使用清理結果快取 ({entry['rows']:,} 筆)，略過 CSV 解析與清理")
+        
+        city_name = city_info['city_name']
+        encoder = None
+        if self.use_dictionary_encoding:
+            encoder = DictionaryEncoder(file_info['database_name'])
+            city_name = encoder.encode_value('縣市名稱', city_name)
+        
+        def frames():
+            for df in self.cleaned_cache.iter_frames(key, arrow_dtypes=self.csv_engine == 'arrow'):
+                if encoder is not None:
+                    df = encoder.encode_dataframe(df)
+                yield df
+        
+        file_stats = entry['file_stats']
+        success = self.insert_data_batch(
+            file_info['database_name'],
+            file_info['table_name'],
+            frames(),
+            filename,
+            quarter,
+            city_info['city_code'],
+            city_name,
+            file_stats
+        )
+        
+        if success:
+            self.last_file_stats = file_stats
+            logger.info(f"✅ 檔案匯入成功: {filename}")
+            return True
+        logger.error(f"❌ 檔案匯入失敗: {filename}")
+        return False
+    
+    def _import_split_file(self, file_path: str, quarter: str, file_info: Dict, city_info: Dict, schema,
+                           cache_writer: 'cleaned_cache.CacheWriter' = None) -> bool:
+        """大型檔案：切割為多個範圍平行解析與清理，依檔案順序寫入同一個交易"""
+        filename = os.path.basename(file_path)
+        plan = csv_splitter.plan_file(file_path, CSV_ENCODINGS)
+        if plan is None or not self._check_header(schema, plan.columns, filename):
+            if plan is None:
+                logger.error(f"❌ 檔案為空或讀取失敗: {filename}")
+            if cache_writer is not None:
+                cache_writer.abort()
+            return False
+        
+        logger.info(f"✂️ {filename} 切割為 {len(plan.ranges)} 個範圍平行解析 "
+                    f"(編碼: {plan.encoding}, 子程序: {csv_splitter.get_split_workers()})")
+        
+        city_name = city_info['city_name']
+        encoder = None
+        if self.use_dictionary_encoding:
+            encoder = DictionaryEncoder(file_info['database_name'])
+            city_name = encoder.encode_value('縣市名稱', city_name)
+        
+        # 各範圍的統計在全部寫入後合併；insert_data_batch 在提交前才讀取 file_stats
+        file_stats = {}
+        
+        def frames():
+            range_stats = []
+            try:
+                for df, stats in csv_splitter.iter_parsed_ranges(
+                        plan, self.csv_engine, schema.numeric_columns, schema.string_columns,
+                        city_info['city_code'], file_info['file_type'], file_info['data_type']):
+                    range_stats.append(stats)
+                    if df.empty:
+                        continue
+                    if cache_writer is not None:
+                        cache_writer.write(df)
+                    if encoder is not None:
+                        df = encoder.encode_dataframe(df)
+                    yield df
+                file_stats.update(merge_file_stats(range_stats))
+                if not file_stats['rows']:
+                    raise ValueError(f"清理後資料為空: {filename}")
+                # 所有範圍都已寫入快取後才保存（寫入中斷時放棄）
+                if cache_writer is not None:
+                    cache_writer.commit(file_stats)
+            finally:
+                if cache_writer is not None:
+                    cache_writer.abort()
+        
+        success = self.insert_data_batch(
+            file_info['database_name'],
+            file_info['table_name'],
+            frames(),
+            filename,
+            quarter,
+            city_info['city_code'],
+            city_name,
+            file_stats
+        )
+        
+        if success:
+            self.last_file_stats = file_stats
+            logger.info(f"✅ 檔案匯入成功: {filename}")
+            return True
+        logger.error(f"❌ 檔案匯入失敗: {filename}")
+        return False
+    
     def import_single_folder(self, folder_name: str) -> Dict[str, int]:
         """匯入單一資料夾的所有檔案（含縣市代碼）"""
         logger.info(f"🔄 開始匯入資料夾: {folder_name}")
@@ -271,8 +692,9 @@ class EnhancedDataImporter:
             logger.error(f"❌ 資料夾不存在: {folder_name}")
             return {'success': 0, 'failed': 0, 'total': 0}
         
-        # 取得所有CSV檔案
-        csv_files = glob.glob(os.path.join(folder_name, "*.csv"))
+        # 取得所有CSV檔案（folder_name 也可以是 ZIP 壓縮檔，季度名稱為去掉 .zip 的檔名）
+        csv_files = zip_source.list_csv_files(folder_name)
+        quarter = zip_source.folder_name(folder_name)
         
         if not csv_files:
             logger.error(f"❌ 資料夾中沒有CSV檔案: {folder_name}")
@@ -288,7 +710,7 @@ class EnhancedDataImporter:
             filename = os.path.basename(file_path)
             print(f"\n📄 處理檔案: {filename}")
             
-            if self.import_single_file(file_path, folder_name):
+            if self.import_single_file(file_path, quarter):
                 success_count += 1
                 print(f"✅ {filename} 匯入成功")
             else:
@@ -316,7 +738,7 @@ class EnhancedDataImporter:
         if not os.path.exists(folder_name):
             return {'error': '資料夾不存在'}
         
-        csv_files = glob.glob(os.path.join(folder_name, "*.csv"))
+        csv_files = zip_source.list_csv_files(folder_name)
         file_stats = {}
         
         for file_path in csv_files:
@@ -334,13 +756,15 @@ class EnhancedDataImporter:
                 if city_key not in file_stats[file_type]:
                     file_stats[file_type][city_key] = []
                 
-                # 讀取檔案行數
+                # 筆數取自檔案掃描的記錄數（不解析整個檔案），欄位數只解析標題
                 try:
-                    df = pd.read_csv(file_path, encoding='utf-8', skiprows=[1])
+                    with file_access.CsvFile(file_path, CSV_ENCODINGS) as content:
+                        scan = content.scan()
+                        columns = pd.read_csv(content.reader(), encoding=scan.encoding, nrows=0).columns
                     file_stats[file_type][city_key].append({
                         'filename': filename,
-                        'rows': len(df),
-                        'columns': len(df.columns)
+                        'rows': scan.data_rows,
+                        'columns': len(columns)
                     })
                 except:
                     file_stats[file_type][city_key].append({
@@ -391,5 +815,6 @@ def test_enhanced_importer():
         print(f"❌ 測試檔案不存在: {test_file}")
 
 if __name__ == "__main__":
+    setup_logging('enhanced_import.log')
     test_enhanced_importer()
 
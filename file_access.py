@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+"""
+CSV 檔案存取層
+每個 CSV 只以 mmap 對應一次，在同一次循序掃描中計算內容雜湊（sha256）、換行數、記錄數與編碼判斷，
+解析器再直接讀取同一個對應（不再依編碼逐一重新開檔解析），檔案內容在一次匯入中只從磁碟讀取一次
+
+壓縮檔成員（zip_source）無法 mmap，以串流解壓縮讀入記憶體，其餘流程相同；
+掃描（計算清理結果快取鍵）後解壓縮的內容保留給接著的解析使用，同一成員不必解壓縮兩次
+
+編碼判斷: 以第一個候選編碼的增量解碼器隨掃描解碼；失敗時改用下一個候選編碼，
+由對應中的開頭重新解碼到目前位置（記憶體內進行，不重新讀取磁碟）
+記錄數: 只計算不在引號內的換行（依雙引號切開後，引號外的片段交替出現；"" 跳脫的雙引號不影響奇偶）
+"""
+
+import io
+import os
+import mmap
+import codecs
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+import zip_source
+
+logger = logging.getLogger(__name__)
+
+# 與 EnhancedDataImporter 相同的編碼嘗試順序
+DEFAULT_ENCODINGS = ['utf-8', 'big5', 'cp950', 'gbk']
+
+# 掃描時每次處理的位元組數
+SCAN_CHUNK_BYTES = 8 * 1024 * 1024
+
+# 第一行為中文欄位名稱、第二行為英文欄位名稱
+HEADER_LINES = 2
+
+# 掃描結果快取 {(檔案路徑, 候選編碼): ((大小, 修改時間), FileScan)}，依最近使用順序，最多 SCAN_CACHE_ENTRIES 個；
+# 匯入前的分析（例如 ParallelBatchImporter.analyze_files）掃描過的檔案，匯入時不必再計算
+SCAN_CACHE_ENTRIES = 4096
+_scan_cache: 'OrderedDict[Tuple[str, Tuple[str, ...]], Tuple[Tuple[int, int], FileScan]]' = OrderedDict()
+
+# 已解壓縮、尚未解析的壓縮檔成員 {(成員路徑, (大小, 修改時間)): 內容}，依最近使用順序，合計最多 MEMBER_BUFFER_BYTES
+MEMBER_BUFFER_BYTES = 256 * 1024 * 1024
+_member_buffers: 'OrderedDict[Tuple[str, Tuple[int, int]], bytes]' = OrderedDict()
+
+# 多個匯入執行緒共用兩個快取
+_cache_lock = threading.Lock()
+
+
+def _cached_scan(key, signature) -> Optional['FileScan']:
+    with _cache_lock:
+        cached = _scan_cache.get(key)
+        if cached is None or cached[0] != signature:
+            return None
+        _scan_cache.move_to_end(key)
+        return cached[1]
+
+
+def _store_scan(key, signature, scan: 'FileScan'):
+    with _cache_lock:
+        _scan_cache[key] = (signature, scan)
+        _scan_cache.move_to_end(key)
+        while len(_scan_cache) > SCAN_CACHE_ENTRIES:
+            _scan_cache.popitem(last=False)
+
+
+def _take_member_buffer(key) -> Optional[bytes]:
+    """取出（並移除）保留的成員內容"""
+    with _cache_lock:
+        return _member_buffers.pop(key, None)
+
+
+def _keep_member_buffer(key, buffer: bytes):
+    """保留成員內容給之後的解析；超過 MEMBER_BUFFER_BYTES 時捨棄最久未使用的內容"""
+    if len(buffer) > MEMBER_BUFFER_BYTES:
+        return
+    with _cache_lock:
+        _member_buffers[key] = buffer
+        _member_buffers.move_to_end(key)
+        total = sum(len(item) for item in _member_buffers.values())
+        while total > MEMBER_BUFFER_BYTES:
+            _, dropped = _member_buffers.popitem(last=False)
+            total -= len(dropped)
+
+
+class FileScan:
+    """單一檔案的掃描結果"""
+
+    def __init__(self, size: int, content_hash: str, line_count: int, record_count: int,
+                 encoding: Optional[str]):
+        self.size = size
+        self.content_hash = content_hash
+        # 行數（欄位內含換行時多於記錄數）
+        self.line_count = line_count
+        # 記錄數（含兩行標題）
+        self.record_count = record_count
+        # 可完整解碼的第一個候選編碼；所有編碼都失敗時為 None
+        self.encoding = encoding
+
+    @property
+    def data_rows(self) -> int:
+        """扣除兩行標題的資料筆數"""
+        return max(self.record_count - HEADER_LINES, 0)
+
+    def to_dict(self) -> Dict:
+        return {'size': self.size, 'hash': self.content_hash, 'lines': self.line_count,
+                'records': self.record_count, 'encoding': self.encoding}
+
+    def __repr__(self):
+        return (f"FileScan({self.size} bytes, {self.line_count} lines, {self.record_count} records, "
+                f"{self.encoding!r}, {self.content_hash[:19]}...)")
+
+
+def _file_signature(file_path: str) -> Optional[Tuple[int, int]]:
+    """一般檔案的 (大小, 修改時間)；壓縮檔成員以壓縮檔的修改時間代表"""
+    member = zip_source.split_member_path(file_path)
+    try:
+        stat = os.stat(member[0] if member else file_path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+class _MappedReader(io.RawIOBase):
+    """
+    mmap 的唯讀檔案物件（mmap 本身沒有 mode 屬性，pandas 會當成文字檔而忽略指定的編碼，
+    包裝為 io.BufferedReader 後即為二進位檔案物件）
+    """
+
+    def __init__(self, buffer: mmap.mmap):
+        super().__init__()
+        self._buffer = buffer
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, target) -> int:
+        data = self._buffer[self._position:self._position + len(target)]
+        target[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: len(self._buffer)}[whence]
+        self._position = max(base + offset, 0)
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+
+class CsvFile:
+    """
+    以單一記憶體對應存取 CSV 檔案
+
+    用法:
+        with CsvFile(file_path) as content:
+            if content.encoding:
+                df = pd.read_csv(content.reader(), encoding=content.encoding, skiprows=[1])
+    """
+
+    def __init__(self, file_path: str, encodings: List[str] = None):
+        self.file_path = file_path
+        self.encodings = encodings or DEFAULT_ENCODINGS
+        self._file = None
+        self._buffer = None
+        self._scan: Optional[FileScan] = None
+        # 壓縮檔成員: (成員路徑, 簽章)；解析器未讀取時，關閉後保留內容給下一次開啟
+        self._member_key = None
+        self._parsed = False
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def open(self):
+        """建立記憶體對應（壓縮檔成員則解壓縮讀入記憶體）"""
+        if self._buffer is not None:
+            return
+        if zip_source.is_member_path(self.file_path):
+            signature = _file_signature(self.file_path)
+            self._member_key = (self.file_path, signature) if signature is not None else None
+            self._buffer = _take_member_buffer(self._member_key) if self._member_key else None
+            if self._buffer is None:
+                with zip_source.open_file(self.file_path) as stream:
+                    self._buffer = stream.read()
+            return
+        self._file = open(self.file_path, 'rb')
+        if os.fstat(self._file.fileno()).st_size == 0:
+            # 空檔案無法 mmap
+            self._buffer = b''
+        else:
+            self._buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+        elif self._member_key is not None and self._buffer is not None and not self._parsed:
+            # 只掃描、尚未解析（例如計算清理結果快取鍵）：解析時不必再解壓縮
+            _keep_member_buffer(self._member_key, self._buffer)
+        self._buffer = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    @property
+    def size(self) -> int:
+        self.open()
+        return len(self._buffer)
+
+    def scan(self) -> FileScan:
+        """一次循序掃描計算雜湊、換行數與編碼（同一檔案未變更時使用快取結果）"""
+        if self._scan is not None:
+            return self._scan
+
+        signature = _file_signature(self.file_path)
+        cache_key = (self.file_path, tuple(self.encodings))
+        cached = _cached_scan(cache_key, signature)
+        if cached is not None:
+            self._scan = cached
+            return self._scan
+
+        self.open()
+        buffer = self._buffer
+        size = len(buffer)
+        digest = hashlib.sha256()
+        line_count = 0
+        record_count = 0
+        in_quotes = False
+        candidates = iter(self.encodings)
+        encoding = next(candidates, None)
+        decoder = codecs.getincrementaldecoder(encoding)() if encoding else None
+
+        for start in range(0, size, SCAN_CHUNK_BYTES):
+            chunk = buffer[start:start + SCAN_CHUNK_BYTES]
+            digest.update(chunk)
+            line_count += chunk.count(b'\n')
+            parts = chunk.split(b'"')
+            record_count += sum(part.count(b'\n') for part in parts[1 if in_quotes else 0::2])
+            in_quotes ^= (len(parts) - 1) & 1
+            while decoder is not None:
+                try:
+                    decoder.decode(chunk, final=start + SCAN_CHUNK_BYTES >= size)
+                    break
+                except UnicodeDecodeError:
+                    encoding, decoder = self._next_decoder(candidates, start)
+
+        # 最後一行沒有換行時仍計入
+        if size and buffer[size - 1:size] != b'\n':
+            line_count += 1
+            record_count += 1
+
+        self._scan = FileScan(size, f"sha256:{digest.hexdigest()}", line_count, record_count, encoding)
+        if signature is not None:
+            _store_scan(cache_key, signature, self._scan)
+        return self._scan
+
+    def _next_decoder(self, candidates, position: int):
+        """改用下一個候選編碼，並由開頭解碼到 position（記憶體內）；沒有候選編碼時回傳 (None, None)"""
+        for encoding in candidates:
+            decoder = codecs.getincrementaldecoder(encoding)()
+            try:
+                for start in range(0, position, SCAN_CHUNK_BYTES):
+                    decoder.decode(self._buffer[start:min(start + SCAN_CHUNK_BYTES, position)])
+            except UnicodeDecodeError:
+                continue
+            return encoding, decoder
+        return None, None
+
+    @property
+    def content_hash(self) -> str:
+        return self.scan().content_hash
+
+    @property
+    def line_count(self) -> int:
+        return self.scan().line_count
+
+    @property
+    def record_count(self) -> int:
+        return self.scan().record_count
+
+    @property
+    def encoding(self) -> Optional[str]:
+        return self.scan().encoding
+
+    def reader(self) -> BinaryIO:
+        """
+        解析器的輸入：由開頭讀取同一個對應的檔案物件（pandas / pyarrow 皆可直接讀取）
+        同一時間只應有一個解析器讀取
+        """
+        self.open()
+        self._parsed = True
+        if isinstance(self._buffer, mmap.mmap):
+            return io.BufferedReader(_MappedReader(self._buffer))
+        return io.BytesIO(self._buffer)
+
+
+def scan_file(file_path: str, encodings: List[str] = None) -> FileScan:
+    """掃描單一檔案（結果會快取，之後匯入同一檔案時不必再計算）"""
+    with CsvFile(file_path, encodings) as content:
+        return content.scan()
@@ -5,31 +5,55 @@
 """
 
 import os
-import glob
+import ast
+import zipfile
 import logging
 import time
 import re
 import sys
 from datetime import datetime
 from typing import List, Dict, Optional
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from tqdm import tqdm
 import threading
+import contextlib
 
 from config import DATA_FOLDERS, MAX_WORKERS
-from enhanced_data_importer import EnhancedDataImporter
+from log_setup import setup_logging
+from file_type_mapping import FileTypeMapping, FileType
+import zip_source
+
+try:
+    from config import SUMMARY_AFTER_IMPORT
+except ImportError:
+    SUMMARY_AFTER_IMPORT = True
+
+try:
+    from config import UNIFIED_AFTER_IMPORT
+except ImportError:
+    UNIFIED_AFTER_IMPORT = True
+
+try:
+    from config import IMPORT_ORCHESTRATOR
+except ImportError:
+    IMPORT_ORCHESTRATOR = 'threads'
+
+try:
+    from config import USE_WORK_QUEUE
+except ImportError:
+    USE_WORK_QUEUE = False
+
+try:
+    from config import BULK_LOAD_MODE
+except ImportError:
+    BULK_LOAD_MODE = False
+
+# pandas、pyodbc、tqdm 等較重的模組延後到實際匯入時才載入，
+# 沒有新資料夾時（最常見的情況）不需要付出載入成本
 
-# 設定日誌
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('new_folders_import.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
+# 最近一次 import_new_folders 中本程序匯入失敗的檔案數（lvr_cli.py import 依此決定結束代碼）
+last_failed_files = 0
+
 def scan_new_folders(exclude_folders: List[str] = None) -> List[str]:
     """
     掃描當前目錄下的新資料夾
@@ -59,22 +83,38 @@ def scan_new_folders(exclude_folders: List[str] = None) -> List[str]:
         # 只處理資料夾，且不在排除列表中
         if os.path.isdir(item_path) and item not in exclude_items:
             # 檢查資料夾中是否有 CSV 檔案
-            csv_files = glob.glob(os.path.join(item_path, "*.csv"))
+            csv_files = zip_source.list_csv_files(item_path)
             if csv_files:
                 new_folders.append(item)
                 logger.info(f"📁 發現新資料夾: {item} (包含 {len(csv_files)} 個CSV檔案)")
+        # 開放資料的 ZIP 壓縮檔視為虛擬資料夾（已解壓縮成同名資料夾時以資料夾為準）
+        elif zip_source.is_archive(item_path):
+            quarter = zip_source.folder_name(item)
+            if quarter in exclude_items or os.path.isdir(os.path.join(current_dir, quarter)):
+                continue
+            try:
+                csv_files = zip_source.list_csv_files(item_path)
+            except zipfile.BadZipFile:
+                logger.warning(f"⚠️ 略過損毀的壓縮檔: {item}")
+                continue
+            if csv_files:
+                new_folders.append(item)
+                logger.info(f"🗜️ 發現新壓縮檔: {item} (包含 {len(csv_files)} 個CSV檔案，"
+                            f"{len(zip_source.read_schemas(item_path))} 個欄位說明檔)")
     
     return sorted(new_folders)
 
 def import_single_file_worker(file_path: str, folder: str) -> dict:
-    """單一檔案匯入工作函數"""
+    """單一檔案匯入工作函數（壓縮檔成員由各工作執行緒各自串流解壓縮）"""
+    from enhanced_data_importer import EnhancedDataImporter
+    
     filename = os.path.basename(file_path)
     start_time = time.time()
     
     try:
         # 建立獨立的匯入器實例
         importer = EnhancedDataImporter()
-        success = importer.import_single_file(file_path, folder)
+        success = importer.import_single_file(file_path, zip_source.folder_name(folder))
         
         processing_time = time.time() - start_time
         
@@ -83,6 +123,7 @@ def import_single_file_worker(file_path: str, folder: str) -> dict:
             'file_path': file_path,
             'folder': folder,
             'success': success,
+            'records': importer.last_file_stats['rows'] if importer.last_file_stats else 0,
             'processing_time': processing_time,
             'error': None
         }
@@ -95,24 +136,94 @@ def import_single_file_worker(file_path: str, folder: str) -> dict:
             'file_path': file_path,
             'folder': folder,
             'success': False,
+            'records': 0,
             'processing_time': processing_time,
             'error': str(e)
         }
 
-def import_new_folders(new_folders: List[str], max_workers: int = None):
+def backup_after_import(database_names: List[str]):
+    """匯入完成後對有變動的資料庫做差異（或依排程完整）備份，備份失敗不影響匯入結果"""
+    from database_backup_restore import DatabaseBackupRestore
+    
+    try:
+        if DatabaseBackupRestore().backup_after_import(database_names):
+            logger.info(f"💾 匯入後備份完成: {', '.join(database_names)}")
+        else:
+            logger.warning("⚠️ 匯入後備份未全部成功，請檢查 database_backup_restore 日誌")
+    except Exception as e:
+        logger.error(f"❌ 匯入後備份失敗: {str(e)}")
+
+def refresh_summary_after_import(quarters_by_database: Dict[str, set]):
+    """匯入完成後只重新計算本次涉及季度的價格彙總資料，失敗不影響匯入結果"""
+    from price_summary import PriceSummary
+    
+    try:
+        if not PriceSummary().refresh(quarters_by_database):
+            logger.warning("⚠️ 價格彙總資料未全部更新，請執行 python lvr_cli.py summary 重建")
+    except Exception as e:
+        logger.error(f"❌ 價格彙總資料更新失敗: {str(e)}")
+
+def refresh_unified_after_import(quarters_by_database: Dict[str, set]) -> Optional[str]:
+    """
+    匯入完成後只重新寫入本次涉及季度的跨市場整合資料，失敗不影響匯入結果
+    
+    Returns:
+        整合資料表所在的資料庫名稱（更新失敗時為 None）
+    """
+    from unified_transactions import UnifiedTransactions
+    
+    try:
+        unified = UnifiedTransactions()
+        if unified.refresh(quarters_by_database):
+            return unified.database_name
+        logger.warning("⚠️ 跨市場整合資料未更新，請執行 python lvr_cli.py unified 重建")
+    except Exception as e:
+        logger.error(f"❌ 跨市場整合資料更新失敗: {str(e)}")
+    return None
+
+def import_new_folders(new_folders: List[str], max_workers: int = None, check_schema: bool = True,
+                       backup_after: bool = True, refresh_summary: bool = None, refresh_unified: bool = None,
+                       orchestrator: str = None, use_work_queue: bool = None, bulk_load: bool = None):
     """
     匯入新資料夾中的所有CSV檔案
     
     Args:
-        new_folders: 要匯入的新資料夾列表
+        new_folders: 要匯入的新資料夾列表（也可以是 ZIP 壓縮檔，不需先解壓縮）
         max_workers: 最大並行執行緒數（預設使用 config.py 中的 MAX_WORKERS）
+        check_schema: 是否在匯入前檢查 CSV 標題並補齊資料表欄位
+        backup_after: 匯入成功後是否備份有變動的資料庫（類型依 config.py 中的 BACKUP_AFTER_IMPORT）
+        refresh_summary: 匯入成功後是否更新涉及季度的價格彙總資料（預設使用 config.py 中的 SUMMARY_AFTER_IMPORT）
+        refresh_unified: 匯入成功後是否更新涉及季度的跨市場整合資料（預設使用 config.py 中的 UNIFIED_AFTER_IMPORT）
+        orchestrator: 'threads'（每個檔案一個執行緒）或 'asyncio'（async_importer：子程序解析、max_workers 條連線寫入，
+                      預設使用 config.py 中的 IMPORT_ORCHESTRATOR）
+        use_work_queue: 是否經由資料庫中的工作佇列（work_queue）與其他匯入程序分擔檔案；
+                        所有檔案結束後只有一個程序執行收尾（彙總、整合、備份），其餘程序回傳空列表、不更新 config.py
+                        （預設使用 config.py 中的 USE_WORK_QUEUE）
+        bulk_load: 是否以大量載入模式匯入（bulk_load：FULL 復原模式的資料庫暫時切換為 BULK_LOGGED、
+                   以 TABLOCK 最少記錄寫入，結束後還原並備份交易記錄；預設使用 config.py 中的 BULK_LOAD_MODE）
     """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    from tqdm import tqdm
+    from schema_drift_checker import run_preflight
+    global last_failed_files
+    
+    last_failed_files = 0
     if not new_folders:
         logger.info("✅ 沒有發現新資料夾")
         return
     
     if max_workers is None:
         max_workers = MAX_WORKERS
+    if refresh_summary is None:
+        refresh_summary = SUMMARY_AFTER_IMPORT
+    if refresh_unified is None:
+        refresh_unified = UNIFIED_AFTER_IMPORT
+    if orchestrator is None:
+        orchestrator = IMPORT_ORCHESTRATOR
+    if use_work_queue is None:
+        use_work_queue = USE_WORK_QUEUE
+    if bulk_load is None:
+        bulk_load = BULK_LOAD_MODE
     
     logger.info(f"🚀 開始匯入 {len(new_folders)} 個新資料夾 (使用 {max_workers} 個執行緒)")
     logger.info(f"📂 新資料夾列表: {', '.join(new_folders)}")
@@ -124,14 +235,19 @@ def import_new_folders(new_folders: List[str], max_workers: int = None):
     total_records = 0
     start_time = datetime.now()
     processing_times = []
+    orchestrator_metrics = None
     lock = threading.Lock()
     folder_stats = {}
+    file_mapping = FileTypeMapping()
+    touched_databases = set()
+    # 主要資料檔案有匯入的 {資料庫: {季度, ...}}（附表不影響價格彙總與跨市場整合資料）
+    touched_quarters = {}
     
     # 掃描所有新資料夾中的CSV檔案
     all_files = []
     for folder in new_folders:
         if os.path.exists(folder):
-            csv_files = glob.glob(os.path.join(folder, "*.csv"))
+            csv_files = zip_source.list_csv_files(folder)
             all_files.extend([(file_path, folder) for file_path in csv_files])
             folder_stats[folder] = {
                 'total_files': len(csv_files),
@@ -149,38 +265,116 @@ def import_new_folders(new_folders: List[str], max_workers: int = None):
         logger.warning("❌ 沒有找到任何CSV檔案")
         return
     
+    # 匯入前檢查 CSV 標題（欄位漂移），必定失敗的檔案不交給工作執行緒
+    blocked_files = set()
+    if check_schema:
+        logger.info(f"\n🔍 檢查 CSV 標題與資料表結構...")
+        blocked_files = run_preflight([folder for folder in new_folders if os.path.exists(folder)])
+        if blocked_files:
+            for file_path, folder in all_files:
+                if file_path in blocked_files:
+                    failed_files += 1
+                    folder_stats[folder]['failed_files'] += 1
+            all_files = [(file_path, folder) for file_path, folder in all_files if file_path not in blocked_files]
+    
+    def mark_touched(filename: str, quarter: str):
+        file_type_info = file_mapping.get_file_type(filename)
+        if file_type_info:
+            database_name = file_mapping.get_database_name(file_type_info[0])
+            touched_databases.add(database_name)
+            if file_type_info[1] == FileType.MAIN:
+                touched_quarters.setdefault(database_name, set()).add(quarter)
+    
+    def record_result(result: dict):
+        nonlocal successful_files, failed_files, total_records
+        with lock:
+            if result['success']:
+                successful_files += 1
+                total_records += result['records']
+                folder_stats[result['folder']]['successful_files'] += 1
+                mark_touched(result['filename'], zip_source.folder_name(result['folder']))
+            else:
+                failed_files += 1
+                folder_stats[result['folder']]['failed_files'] += 1
+                logger.warning(f"❌ {result['folder']}/{result['filename']}: {result['error']}")
+            
+            processing_times.append(result['processing_time'])
+    
     # 開始並行匯入
     logger.info(f"\n🚀 開始並行匯入...")
     
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        # 提交所有任務
-        future_to_file = {
-            executor.submit(import_single_file_worker, file_path, folder): (file_path, folder)
-            for file_path, folder in all_files
-        }
+    # 本次檔案寫入的資料庫 {資料庫: 資料類型}
+    import_databases = {}
+    for file_path, _ in all_files:
+        file_type_info = file_mapping.get_file_type(os.path.basename(file_path))
+        if file_type_info:
+            import_databases[file_mapping.get_database_name(file_type_info[0])] = file_type_info[0]
+    
+    # 工作執行緒開始前以自動認可的連線建立明細表與索引，各檔案的資料交易中不執行 DDL
+    from enhanced_data_importer import EnhancedDataImporter
+    setup_importer = EnhancedDataImporter()
+    for database_name, data_type in sorted(import_databases.items()):
+        try:
+            setup_importer.prepare_database(database_name, data_type)
+        except Exception as e:
+            logger.error(f"❌ {database_name} 匯入前準備失敗: {str(e)}")
+    
+    # 大量載入時涵蓋本次檔案寫入的資料庫；匯入結束即還原復原模式（之後的彙總、整合資料一般記錄）
+    bulk_window = contextlib.nullcontext()
+    if bulk_load:
+        from bulk_load import BulkLoadWindow
         
-        # 使用 tqdm 顯示進度
-        with tqdm(total=total_files, desc="匯入進度", unit="檔案") as pbar:
-            for future in as_completed(future_to_file):
-                result = future.result()
+        bulk_window = BulkLoadWindow(sorted(import_databases), backup=backup_after)
+    
+    with bulk_window:
+        if use_work_queue:
+            from work_queue import WorkQueue, QueueWorker
+            
+            # 與其他匯入程序共用工作佇列：已登錄的檔案不重複登錄，已完成的檔案不再匯入
+            queue = WorkQueue()
+            quarter_folders = {zip_source.folder_name(folder): folder for folder in folder_stats}
+            queue.enqueue(list(folder_stats), skip_files=blocked_files)
+            with tqdm(total=len(all_files), desc="匯入進度（本程序）", unit="檔案") as pbar:
+                def on_result(result: dict):
+                    result['folder'] = quarter_folders[result['folder']]
+                    record_result(result)
+                    pbar.update(1)
                 
-                with lock:
-                    if result['success']:
-                        successful_files += 1
-                        folder_stats[result['folder']]['successful_files'] += 1
-                    else:
-                        failed_files += 1
-                        folder_stats[result['folder']]['failed_files'] += 1
-                        logger.warning(f"❌ {result['folder']}/{result['filename']}: {result['error']}")
-                    
-                    processing_times.append(result['processing_time'])
+                QueueWorker(queue, threads=max_workers, folders=sorted(quarter_folders)).run(on_result)
+            
+            # 統計只包含本程序處理的檔案
+            for stats in folder_stats.values():
+                stats['total_files'] = stats['successful_files'] + stats['failed_files']
+            total_files = successful_files + failed_files
+        elif orchestrator == 'asyncio':
+            from async_importer import AsyncImporter
+            
+            # 子程序解析清理、max_workers 條連線寫入，所有檔案同時排入佇列
+            with tqdm(total=len(all_files), desc="匯入進度", unit="檔案") as pbar:
+                def on_result(result: dict):
+                    record_result(result)
+                    pbar.update(1)
                 
-                pbar.update(1)
+                orchestrator_metrics = AsyncImporter(db_writers=max_workers).run(all_files, on_result)['metrics']
+        else:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                # 提交所有任務
+                future_to_file = {
+                    executor.submit(import_single_file_worker, file_path, folder): (file_path, folder)
+                    for file_path, folder in all_files
+                }
+                
+                # 使用 tqdm 顯示進度
+                with tqdm(total=len(all_files), desc="匯入進度", unit="檔案") as pbar:
+                    for future in as_completed(future_to_file):
+                        record_result(future.result())
+                        pbar.update(1)
     
     # 計算統計資訊
     end_time = datetime.now()
     duration = end_time - start_time
     success_rate = (successful_files / total_files * 100) if total_files > 0 else 0
+    last_failed_files = failed_files
     avg_processing_time = sum(processing_times) / len(processing_times) if processing_times else 0
     
     # 輸出統計資訊
@@ -190,6 +384,13 @@ def import_new_folders(new_folders: List[str], max_workers: int = None):
     logger.info(f"匯入時間: {start_time.strftime('%Y-%m-%d %H:%M:%S')} - {end_time.strftime('%Y-%m-%d %H:%M:%S')}")
     logger.info(f"總耗時: {duration}")
     logger.info(f"使用執行緒數: {max_workers}")
+    if bulk_load:
+        logger.info(f"大量載入: {', '.join(f'{db}={model}' for db, model in bulk_window.models.items())}（匯入前的復原模式）")
+    if use_work_queue:
+        logger.info(f"工作佇列: {queue.database_name}（匯入程序 {queue.owner}，以下只統計本程序處理的檔案）")
+    if orchestrator_metrics:
+        logger.info(f"asyncio 協調器: 同時進行中 最大 {orchestrator_metrics['peak_in_flight']} 個 / "
+                    f"平均 {orchestrator_metrics['avg_in_flight']:.1f} 個檔案")
     logger.info(f"總檔案數: {total_files}")
     logger.info(f"成功檔案數: {successful_files}")
     logger.info(f"失敗檔案數: {failed_files}")
@@ -209,6 +410,17 @@ def import_new_folders(new_folders: List[str], max_workers: int = None):
         f.write(f"匯入時間: {start_time.strftime('%Y-%m-%d %H:%M:%S')} - {end_time.strftime('%Y-%m-%d %H:%M:%S')}\n")
         f.write(f"總耗時: {duration}\n")
         f.write(f"使用執行緒數: {max_workers}\n")
+        if bulk_load:
+            f.write(f"大量載入: {', '.join(f'{db}={model}' for db, model in bulk_window.models.items())}（匯入前的復原模式）\n")
+        if use_work_queue:
+            f.write(f"工作佇列: {queue.database_name}（匯入程序 {queue.owner}，以下只統計本程序處理的檔案）\n")
+        if orchestrator_metrics:
+            f.write(f"asyncio 協調器: 同時進行中 最大 {orchestrator_metrics['peak_in_flight']} 個 / "
+                    f"平均 {orchestrator_metrics['avg_in_flight']:.1f} 個檔案\n")
+            for stage, stats in orchestrator_metrics['stages'].items():
+                if stats['count']:
+                    f.write(f"  {stage}: {stats['count']} 次，佇列等待 平均 {stats['wait_avg']:.2f}s / "
+                            f"p95 {stats['wait_p95']:.2f}s / 最大 {stats['wait_max']:.2f}s\n")
         f.write(f"總檔案數: {total_files}\n")
         f.write(f"成功檔案數: {successful_files}\n")
         f.write(f"失敗檔案數: {failed_files}\n")
@@ -222,9 +434,35 @@ def import_new_folders(new_folders: List[str], max_workers: int = None):
     
     logger.info(f"📄 統計報告已保存到: {stats_file}")
     
-    # 返回成功匯入的資料夾列表，用於更新 config.py
+    if use_work_queue:
+        # 所有程序都結束後只有一個程序取得收尾工作，依所有程序完成的檔案更新彙總、整合與備份
+        finalized = queue.finalize(sorted(quarter_folders))
+        if not finalized:
+            logger.info("⏭️ 收尾工作（彙總、整合、備份、更新 config.py）由其他匯入程序執行")
+            return []
+        touched_databases.clear()
+        touched_quarters.clear()
+        for stats in folder_stats.values():
+            stats['successful_files'] = 0
+        for quarter, filename, _ in queue.done_files(finalized):
+            mark_touched(filename, quarter)
+            folder_stats[quarter_folders[quarter]]['successful_files'] += 1
+        logger.info(f"🏁 本程序負責收尾: {', '.join(finalized)}")
+    
+    # 先更新彙總與整合資料，匯入後的備份才會包含最新的彙總表
+    if refresh_summary and touched_quarters:
+        refresh_summary_after_import(touched_quarters)
+    if refresh_unified and touched_quarters:
+        unified_database = refresh_unified_after_import(touched_quarters)
+        if unified_database:
+            touched_databases.add(unified_database)
+    
+    if backup_after and touched_databases:
+        backup_after_import(sorted(touched_databases))
+    
+    # 返回成功匯入的資料夾列表（壓縮檔為其季度名稱），用於更新 config.py
     successfully_imported_folders = [
-        folder for folder, stats in folder_stats.items()
+        zip_source.folder_name(folder) for folder, stats in folder_stats.items()
         if stats['successful_files'] > 0  # 至少有一個檔案成功匯入
     ]
     
@@ -250,8 +488,13 @@ def update_config_file(new_folders: List[str]) -> bool:
         with open(config_file_path, 'r', encoding='utf-8') as f:
             content = f.read()
         
-        # 讀取現有的 DATA_FOLDERS
-        from config import DATA_FOLDERS as existing_folders
+        # 讀取現有的 DATA_FOLDERS（由檔案內容解析，同時執行的其他程序可能已更新過 config.py）
+        pattern = r'DATA_FOLDERS\s*=\s*\[.*?\]'
+        match = re.search(pattern, content, flags=re.DOTALL)
+        try:
+            existing_folders = list(ast.literal_eval(match.group(0).split('=', 1)[1]))
+        except (AttributeError, ValueError, SyntaxError):
+            from config import DATA_FOLDERS as existing_folders
         
         # 合併現有和新資料夾，去除重複並排序
         all_folders = sorted(list(set(existing_folders + new_folders)))
@@ -284,7 +527,6 @@ def update_config_file(new_folders: List[str]) -> bool:
         
         # 使用正則表達式替換 DATA_FOLDERS 定義
         # 匹配 DATA_FOLDERS = [...] 的整個區塊（支援多行）
-        pattern = r'DATA_FOLDERS\s*=\s*\[.*?\]'
         replacement = f'DATA_FOLDERS = {new_data_folders_str}'
         
         new_content = re.sub(pattern, replacement, content, flags=re.DOTALL)
@@ -303,12 +545,22 @@ def update_config_file(new_folders: List[str]) -> bool:
         logger.error(f"❌ 更新 config.py 失敗: {str(e)}")
         return False
 
-def main(auto_mode: bool = False):
+def main(auto_mode: bool = False, orchestrator: str = None, use_work_queue: bool = None, bulk_load: bool = None,
+         max_workers: int = None, check_schema: bool = True, backup_after: bool = True,
+         refresh_summary: bool = None, refresh_unified: bool = None) -> bool:
     """
     主函數
     
     Args:
         auto_mode: 是否為自動模式（帶參數 1 時為 True，跳過所有交互式輸入）
+        orchestrator: 'threads' 或 'asyncio'（預設使用 config.py 中的 IMPORT_ORCHESTRATOR）
+        use_work_queue: 是否經由工作佇列與其他匯入程序分擔（預設使用 config.py 中的 USE_WORK_QUEUE）
+        bulk_load: 是否以大量載入模式匯入（預設使用 config.py 中的 BULK_LOAD_MODE）
+        max_workers: 執行緒數（指定時不詢問執行緒數；預設使用 config.py 中的 MAX_WORKERS）
+        check_schema, backup_after, refresh_summary, refresh_unified: 傳給 import_new_folders()
+    
+    Returns:
+        沒有檔案匯入失敗（含沒有新資料夾）時為 True；取消或有檔案失敗時為 False
     """
     print("=" * 80)
     print("🔍 自動掃描新資料夾並匯入")
@@ -321,19 +573,24 @@ def main(auto_mode: bool = False):
     if not new_folders:
         print("✅ 沒有發現新資料夾")
         print(f"\n目前 config.py 中已定義的資料夾: {', '.join(DATA_FOLDERS)}")
-        return
+        return True
     
     print(f"\n📂 發現 {len(new_folders)} 個新資料夾:")
     for i, folder in enumerate(new_folders, 1):
-        csv_count = len(glob.glob(os.path.join(folder, "*.csv")))
+        csv_count = len(zip_source.list_csv_files(folder))
         print(f"  {i}. {folder} ({csv_count} 個CSV檔案)")
     
     # 根據模式選擇執行方式
     if auto_mode:
-        # 自動模式：直接使用自動設定執行緒數
-        max_workers = MAX_WORKERS
+        # 自動模式：直接使用自動設定（或指定）的執行緒數
+        max_workers = max_workers or MAX_WORKERS
         print(f"\n🤖 自動模式：使用 {max_workers} 個執行緒")
         print(f"⚠️ 即將開始匯入 {len(new_folders)} 個新資料夾...")
+    elif max_workers:
+        print(f"\n⚠️ 即將開始匯入 {len(new_folders)} 個新資料夾，使用 {max_workers} 個執行緒...")
+        if input("確定要繼續嗎? (y/N): ").strip().lower() != 'y':
+            print("❌ 匯入已取消")
+            return False
     else:
         # 交互模式：詢問用戶
         print("\n選擇執行模式:")
@@ -345,7 +602,7 @@ def main(auto_mode: bool = False):
         
         if choice == "3":
             print("❌ 已取消")
-            return
+            return False
         
         if choice == "2":
             try:
@@ -363,10 +620,13 @@ def main(auto_mode: bool = False):
         
         if confirm != 'y':
             print("❌ 匯入已取消")
-            return
+            return False
     
     # 執行匯入
-    successfully_imported = import_new_folders(new_folders, max_workers=max_workers)
+    successfully_imported = import_new_folders(new_folders, max_workers=max_workers, check_schema=check_schema,
+                                               backup_after=backup_after, refresh_summary=refresh_summary,
+                                               refresh_unified=refresh_unified, orchestrator=orchestrator,
+                                               use_work_queue=use_work_queue, bulk_load=bulk_load)
     print("\n✅ 新資料夾匯入完成!")
     
     # 處理 config.py 更新
@@ -395,8 +655,13 @@ def main(auto_mode: bool = False):
                 print("⏭️  已跳過更新 config.py")
     else:
         print("⚠️  沒有成功匯入任何資料夾，不更新 config.py")
+    
+    if last_failed_files:
+        print(f"❌ {last_failed_files} 個檔案匯入失敗，詳見日誌")
+    return not last_failed_files
 
 if __name__ == "__main__":
+    setup_logging('new_folders_import.log')
     # 檢查命令行參數
     auto_mode = False
     if len(sys.argv) > 1:
@@ -408,5 +673,5 @@ if __name__ == "__main__":
             print("  1: 自動模式（自動設定執行緒數，無需交互）")
             sys.exit(1)
     
-    main(auto_mode=auto_mode)
+    sys.exit(0 if main(auto_mode=auto_mode) else 1)
 
@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+"""
+匯入統計
+匯入器在記憶體中已持有整個檔案的資料，寫入時順便計算每個檔案的筆數、各欄位空值數、
+主要數值欄位的最小 / 最大 / 合計與縣市筆數，與資料列在同一個交易中寫入 import_stats 資料表（資料表由匯入前的結構準備建立，不在各檔案的交易中執行 DDL）；
+驗證時每個資料表只需一個依 source_file 分組的彙總查詢與記錄比對。未指定季度時只比對最近匯入的
+VERIFY_RECENT_QUARTERS 個季度（依 import_stats 的匯入時間）；全部季度的比對會掃描整個資料表，需明確指定 full
+"""
+
+import json
+import math
+import logging
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+try:
+    from config import VERIFY_RECENT_QUARTERS
+except ImportError:
+    VERIFY_RECENT_QUARTERS = 1
+
+logger = logging.getLogger(__name__)
+
+STATS_TABLE = 'import_stats'
+
+# 主要數值欄位（存在於資料表時才計算）
+KEY_NUMERIC_COLUMNS = ['總價元', '總額元', '單價元平方公尺', '建物移轉總面積平方公尺', '土地移轉總面積平方公尺']
+
+# 與 EnhancedDataImporter.insert_data_batch 相同：這些字串與超出範圍的數值寫入為 NULL
+NULL_STRINGS = ('', 'nan', 'None', 'null')
+NUMERIC_LIMIT = 1e15
+
+# 合計值比對容許誤差（資料表欄位為 DECIMAL(15,2)）
+SUM_TOLERANCE = Decimal('0.01')
+
+CREATE_STATS_TABLE_SQL = f"""
+IF OBJECT_ID(N'{STATS_TABLE}', N'U') IS NULL
+BEGIN
+    CREATE TABLE [{STATS_TABLE}] (
+        id INT IDENTITY(1,1) PRIMARY KEY,
+        table_name NVARCHAR(128) NOT NULL,
+        source_file NVARCHAR(200) NOT NULL,
+        quarter NVARCHAR(20) NOT NULL,
+        [縣市代碼] NVARCHAR(10),
+        row_count INT NOT NULL,
+        null_counts NVARCHAR(MAX),
+        numeric_stats NVARCHAR(MAX),
+        imported_at DATETIME2 NOT NULL DEFAULT SYSDATETIME()
+    );
+    CREATE UNIQUE INDEX [IX_{STATS_TABLE}_file] ON [{STATS_TABLE}] (table_name, quarter, source_file);
+END
+"""
+
+
+def compute_file_stats(df: pd.DataFrame, numeric_columns: List[str], city_code: str) -> Dict:
+    """
+    計算單一檔案（清理後、寫入前）的統計
+
+    Returns:
+        {'rows', 'city_counts': {縣市代碼: 筆數}, 'null_counts': {欄位: 空值數},
+         'numeric': {欄位: {'min', 'max', 'sum'}}}（數值以字串保存，與資料庫 DECIMAL 比對時不失真）
+    """
+    rows = len(df)
+    null_counts = {}
+    numeric = {}
+    numeric_set = set(numeric_columns)
+
+    for column in df.columns:
+        series = df[column]
+        if column in numeric_set:
+            values = pd.to_numeric(series, errors='coerce')
+            values = values.where(values.abs() <= NUMERIC_LIMIT)
+        else:
+            values = series.where(~series.astype(str).str.strip().isin(NULL_STRINGS))
+        nulls = int(values.isna().sum())
+        if nulls:
+            null_counts[column] = nulls
+
+        if column in KEY_NUMERIC_COLUMNS and column in numeric_set:
+            present = values.dropna().round(2)
+            if not present.empty:
+                numeric[column] = {
+                    'min': f"{present.min():.2f}",
+                    'max': f"{present.max():.2f}",
+                    'sum': f"{math.fsum(present):.2f}"
+                }
+
+    return {
+        'rows': rows,
+        'city_counts': {city_code: rows},
+        'null_counts': null_counts,
+        'numeric': numeric
+    }
+
+
+def merge_file_stats(stats_list: List[Dict]) -> Dict:
+    """合併同一檔案各部分（csv_splitter 切割的範圍）的統計；合計以 Decimal 相加，與整個檔案一次計算相同"""
+    merged = {'rows': 0, 'city_counts': {}, 'null_counts': {}, 'numeric': {}}
+    for stats in stats_list:
+        merged['rows'] += stats['rows']
+        for city_code, rows in stats['city_counts'].items():
+            merged['city_counts'][city_code] = merged['city_counts'].get(city_code, 0) + rows
+        for column, nulls in stats['null_counts'].items():
+            merged['null_counts'][column] = merged['null_counts'].get(column, 0) + nulls
+        for column, values in stats['numeric'].items():
+            current = merged['numeric'].get(column)
+            if current is None:
+                merged['numeric'][column] = dict(values)
+                continue
+            current['min'] = min(current['min'], values['min'], key=Decimal)
+            current['max'] = max(current['max'], values['max'], key=Decimal)
+            current['sum'] = f"{Decimal(current['sum']) + Decimal(values['sum']):.2f}"
+    return merged
+
+
+def ensure_stats_table(cursor):
+    """建立 import_stats 資料表（已存在時不變更；以自動認可的連線在匯入開始前執行）"""
+    cursor.execute(CREATE_STATS_TABLE_SQL)
+
+
+def save_file_stats(cursor, table_name: str, source_file: str, quarter: str, city_code: str, stats: Dict):
+    """寫入單一檔案的統計（重新匯入同一檔案時取代舊記錄；由呼叫端提交交易）"""
+    cursor.execute(
+        f"DELETE FROM [{STATS_TABLE}] WHERE table_name = ? AND quarter = ? AND source_file = ?",
+        table_name, quarter, source_file
+    )
+    cursor.execute(
+        f"INSERT INTO [{STATS_TABLE}] (table_name, source_file, quarter, [縣市代碼], row_count, null_counts, numeric_stats) "
+        f"VALUES (?, ?, ?, ?, ?, ?, ?)",
+        table_name, source_file, quarter, city_code, stats['rows'],
+        json.dumps(stats['null_counts'], ensure_ascii=False),
+        json.dumps(stats['numeric'], ensure_ascii=False)
+    )
+
+
+def recent_quarters(cursor, limit: int = VERIFY_RECENT_QUARTERS) -> List[str]:
+    """import_stats 中最近匯入的 limit 個季度（依各季度最後的匯入時間）；沒有 import_stats 時回傳空列表"""
+    cursor.execute(f"SELECT OBJECT_ID(N'{STATS_TABLE}', N'U')")
+    if cursor.fetchone()[0] is None:
+        return []
+    cursor.execute(
+        f"SELECT TOP (?) quarter FROM [{STATS_TABLE}] GROUP BY quarter ORDER BY MAX(imported_at) DESC",
+        limit
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def load_recorded_stats(cursor, quarters: List[str] = None) -> Dict[str, Dict]:
+    """讀取 import_stats 記錄 {資料表: {(source_file, quarter): 記錄}}"""
+    cursor.execute(f"SELECT OBJECT_ID(N'{STATS_TABLE}', N'U')")
+    if cursor.fetchone()[0] is None:
+        return {}
+
+    sql = f"SELECT table_name, source_file, quarter, row_count, numeric_stats FROM [{STATS_TABLE}]"
+    params = []
+    if quarters:
+        sql += f" WHERE quarter IN ({', '.join('?' for _ in quarters)})"
+        params = list(quarters)
+    cursor.execute(sql, *params)
+
+    recorded: Dict[str, Dict] = {}
+    for table_name, source_file, quarter, row_count, numeric_stats in cursor.fetchall():
+        recorded.setdefault(table_name, {})[(source_file, quarter)] = {
+            'rows': row_count,
+            'numeric': json.loads(numeric_stats) if numeric_stats else {}
+        }
+    return recorded
+
+
+def verify_table(cursor, table_name: str, recorded: Dict, quarters: List[str] = None) -> List[str]:
+    """
+    以一個依 source_file 分組的彙總查詢比對資料表與 import_stats 記錄
+    指定 quarters 時只彙總這些季度；未指定時彙總整個資料表（全表掃描）
+
+    Returns:
+        差異說明列表（一致時為空列表）
+    """
+    columns = sorted({column for stats in recorded.values() for column in stats['numeric']})
+    select_list = ["source_file", "quarter", "COUNT_BIG(*)"]
+    for column in columns:
+        select_list += [f"MIN([{column}])", f"MAX([{column}])", f"SUM(CAST([{column}] AS DECIMAL(38,2)))"]
+
+    sql = f"SELECT {', '.join(select_list)} FROM [{table_name}]"
+    params = []
+    if quarters:
+        sql += f" WHERE quarter IN ({', '.join('?' for _ in quarters)})"
+        params = list(quarters)
+    cursor.execute(sql + " GROUP BY source_file, quarter", *params)
+
+    actual = {}
+    for row in cursor.fetchall():
+        values = {}
+        for index, column in enumerate(columns):
+            minimum, maximum, total = row[3 + index * 3: 6 + index * 3]
+            values[column] = (minimum, maximum, total)
+        actual[(row[0], row[1])] = (int(row[2]), values)
+
+    mismatches = []
+    for key, stats in sorted(recorded.items()):
+        source_file, quarter = key
+        if key not in actual:
+            mismatches.append(f"{table_name} {quarter}/{source_file}: 資料表中沒有此檔案的資料（記錄 {stats['rows']:,} 筆）")
+            continue
+        rows, values = actual[key]
+        if rows != stats['rows']:
+            mismatches.append(f"{table_name} {quarter}/{source_file}: 筆數 {rows:,}（匯入時 {stats['rows']:,}）")
+            continue
+        for column, expected in stats['numeric'].items():
+            minimum, maximum, total = values.get(column, (None, None, None))
+            if total is None or abs(Decimal(total) - Decimal(expected['sum'])) > SUM_TOLERANCE \
+                    or Decimal(str(minimum)) != Decimal(expected['min']) \
+                    or Decimal(str(maximum)) != Decimal(expected['max']):
+                mismatches.append(f"{table_name} {quarter}/{source_file}: {column} "
+                                  f"最小/最大/合計 {minimum}/{maximum}/{total}"
+                                  f"（匯入時 {expected['min']}/{expected['max']}/{expected['sum']}）")
+
+    unrecorded = set(actual) - set(recorded)
+    if unrecorded:
+        # 啟用匯入統計之前匯入的檔案
+        logger.info(f"ℹ️ {table_name} 有 {len(unrecorded)} 個檔案沒有匯入統計記錄，未比對")
+
+    return mismatches
+
+
+def verify_database(cursor, quarters: List[str] = None, full: bool = False) -> Optional[List[str]]:
+    """
+    比對目前連線資料庫所有有記錄的資料表；沒有 import_stats 時回傳 None
+    未指定 quarters 時只比對最近匯入的季度，full 為 True 時比對全部季度（全表掃描）
+    """
+    if not quarters and not full:
+        quarters = recent_quarters(cursor)
+        if not quarters:
+            return None
+    recorded = load_recorded_stats(cursor, quarters)
+    if not recorded:
+        return None
+    mismatches = []
+    for table_name, table_stats in sorted(recorded.items()):
+        mismatches.extend(verify_table(cursor, table_name, table_stats, quarters))
+    return mismatches
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""
+日誌設定
+由各程式的進入點（__main__ 或 lvr_cli.py 子命令）呼叫，模組匯入時不再建立檔案處理器
+"""
+
+import os
+import logging
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+
+def setup_logging(log_file: str = None, level: int = logging.INFO):
+    """
+    設定根日誌：輸出到主控台，並可另外寫入日誌檔
+
+    重複呼叫時只會補上尚未加入的日誌檔，不會重複輸出到主控台
+    """
+    root = logging.getLogger()
+    root.setLevel(level)
+    formatter = logging.Formatter(LOG_FORMAT)
+
+    if not any(type(handler) is logging.StreamHandler for handler in root.handlers):
+        stream_handler = logging.StreamHandler()
+        stream_handler.setFormatter(formatter)
+        root.addHandler(stream_handler)
+
+    if log_file:
+        log_path = os.path.abspath(log_file)
+        if not any(isinstance(handler, logging.FileHandler) and handler.baseFilename == log_path
+                   for handler in root.handlers):
+            # delay=True：沒有實際寫入日誌前不建立檔案
+            file_handler = logging.FileHandler(log_file, encoding='utf-8', delay=True)
+            file_handler.setFormatter(formatter)
+            root.addHandler(file_handler)
@@ -0,0 +1,489 @@
+# -*- coding: utf-8 -*-
+"""
+LVR 統一命令列工具
+以子命令整合掃描、匯入、驗證、備份、還原與欄位剖析，
+各子命令需要的模組（pandas、pyodbc、tqdm 等）在執行時才載入，未使用的功能不付出啟動成本
+
+用法:
+    python lvr_cli.py scan
+    python lvr_cli.py import [--auto] [--folders 114Q3 114Q4.zip ...] [--workers N] [--async] [--queue] [--bulk-load] [--no-schema-check] [--no-backup] [--no-summary] [--no-unified]
+    python lvr_cli.py verify [--quarters 114Q1 ...] [--full]
+    python lvr_cli.py backup [--database LVR_UsedHouse] [--parallel | --differential] [--stripes N] [--compression auto]
+    python lvr_cli.py restore (--latest | --timestamp 20250909_084500 | --id 資料庫@時間戳記.類型 | --file X.bak --database D | --list) [--no-verify]
+    python lvr_cli.py catalog (list | register 備份檔 ... | rebuild)
+    python lvr_cli.py snapshot export [--database D ...] [--tables T ...] [--quarters 114Q1 ...] [--cities a ...] [--output 目錄]
+    python lvr_cli.py snapshot import 快照目錄 [--database D ...] [--tables T ...] [--quarters 114Q1 ...] [--cities a ...]
+    python lvr_cli.py summary [--database D ...] [--quarters 114Q1 ...]
+    python lvr_cli.py unified [--quarters 114Q1 ...]
+    python lvr_cli.py detail [--market used_house|presale|rental ...]
+    python lvr_cli.py query [--market used_house|presale|rental] [--cities 臺北市 ...] [--last-quarters 4] [--rooms 2 3] [--output 結果.csv]
+    python lvr_cli.py profile [資料夾 ...]
+    python lvr_cli.py cache (stats | clear | evict)
+    python lvr_cli.py shard (plan --folders ... | run 計畫目錄 --node 節點 | report 計畫目錄 | consolidate 計畫目錄 | execute --folders ... | local --folders ... [--nodes N])
+    python lvr_cli.py queue (status | enqueue 資料夾 ... | work [--threads N] | retry | reset) [--folders 114Q3 ...]
+    python lvr_cli.py bulk (status | restore) [--database D ...] [--no-backup]
+"""
+
+import sys
+import argparse
+
+from log_setup import setup_logging
+
+
+def cmd_scan(args) -> int:
+    """掃描尚未匯入的新資料夾（不連線資料庫）"""
+    from import_new_folders import scan_new_folders
+
+    new_folders = scan_new_folders()
+    if not new_folders:
+        print("✅ 沒有發現新資料夾")
+        return 0
+
+    print(f"📂 發現 {len(new_folders)} 個新資料夾: {', '.join(new_folders)}")
+    return 0
+
+
+def cmd_import(args) -> int:
+    """匯入新資料夾（有任何檔案匯入失敗時結束代碼為 1）"""
+    import import_new_folders
+
+    if not args.folders:
+        imported = import_new_folders.main(auto_mode=args.auto, orchestrator='asyncio' if args.use_async else None,
+                                           use_work_queue=args.queue or None, bulk_load=args.bulk_load or None,
+                                           max_workers=args.workers, check_schema=not args.no_schema_check,
+                                           backup_after=not args.no_backup,
+                                           refresh_summary=False if args.no_summary else None,
+                                           refresh_unified=False if args.no_unified else None)
+        return 0 if imported else 1
+
+    # 指定資料夾時不掃描、不更新 config.py
+    imported = import_new_folders.import_new_folders(
+        args.folders, max_workers=args.workers, check_schema=not args.no_schema_check,
+        backup_after=not args.no_backup, refresh_summary=False if args.no_summary else None,
+        refresh_unified=False if args.no_unified else None,
+        orchestrator='asyncio' if args.use_async else None, use_work_queue=args.queue or None,
+        bulk_load=args.bulk_load or None
+    )
+    if imported is None:
+        return 1
+    # 工作佇列中不負責收尾的程序回傳空列表，只以本程序失敗的檔案數判斷
+    return 1 if import_new_folders.last_failed_files else 0
+
+
+def cmd_verify(args) -> int:
+    """比對匯入統計（預設只比對最近匯入的季度）；--full 時比對全部季度並另外逐表檢查縣市代碼分佈"""
+    from verify_city_codes import verify_city_codes, verify_all_databases, verify_import_stats
+
+    passed = verify_import_stats(args.quarters, args.full)
+    if args.full:
+        verify_city_codes()
+        verify_all_databases()
+    return 0 if passed else 1
+
+
+def cmd_backup(args) -> int:
+    """備份資料庫"""
+    from database_backup_restore import DatabaseBackupRestore
+
+    tool = DatabaseBackupRestore()
+    if args.after_import:
+        return 0 if tool.backup_after_import([args.database] if args.database else None, mode='diff') else 1
+    if args.parallel:
+        if args.database:
+            result = tool.backup_database_striped(args.database, stripes=args.stripes, compression=args.compression)
+            return 0 if result else 1
+        return 0 if tool.backup_all_databases_parallel(stripes=args.stripes, compression=args.compression) else 1
+    if args.database:
+        return 0 if tool.backup_database(args.database) else 1
+    return 0 if tool.backup_all_databases() else 1
+
+
+def cmd_restore(args) -> int:
+    """還原資料庫"""
+    from database_backup_restore import DatabaseBackupRestore
+
+    tool = DatabaseBackupRestore()
+    if args.list:
+        tool.list_backup_files()
+        return 0
+    verify = not args.no_verify
+    if args.latest:
+        return 0 if tool.restore_latest(verify) else 1
+    if args.timestamp:
+        return 0 if tool.restore_by_timestamp(args.timestamp, verify) else 1
+    if args.id:
+        return 0 if tool.restore_entry(args.id, verify) else 1
+    if args.file and args.database:
+        return 0 if tool.restore_database(args.database, args.file, verify) else 1
+
+    print("❌ 請指定 --latest、--timestamp、--id、--list，或同時指定 --file 與 --database")
+    return 2
+
+
+def cmd_catalog(args) -> int:
+    """備份目錄維護（.bat 工具也透過此子命令登錄與查詢備份）"""
+    from database_backup_restore import DatabaseBackupRestore
+
+    tool = DatabaseBackupRestore()
+    if args.action == 'list':
+        for entry in tool.catalog.list_restore_points(args.database, limit=args.limit):
+            print(f"{entry['id']:<45} {len(entry['files'])} 個檔案 {entry['file_size'] or 0:>16,} bytes")
+        return 0
+    if args.action == 'register':
+        results = [tool.register_backup_file(path) for path in args.files]
+        return 0 if all(results) else 1
+    if args.action == 'rebuild':
+        tool.rebuild_catalog()
+        return 0
+    return 2
+
+
+def cmd_snapshot(args) -> int:
+    """Parquet 邏輯快照（依季度 / 縣市匯出與重新載入）"""
+    from parquet_snapshot import ParquetSnapshot
+
+    snapshot = ParquetSnapshot()
+    if args.action == 'export':
+        snapshot_dir = snapshot.export_snapshot(args.database, args.tables, args.quarters, args.cities, args.output)
+        return 0 if snapshot_dir else 1
+    return 0 if snapshot.import_snapshot(args.snapshot_dir, args.database, args.tables,
+                                         args.quarters, args.cities) else 1
+
+
+def cmd_summary(args) -> int:
+    """重新計算價格彙總資料（未指定季度時重建全部）"""
+    from price_summary import refresh_all
+
+    return 0 if refresh_all(args.database, args.quarters) else 1
+
+
+def cmd_unified(args) -> int:
+    """重新寫入跨市場整合資料（未指定季度時重建全部）"""
+    from unified_transactions import refresh_all
+
+    return 0 if refresh_all(args.quarters) else 1
+
+
+def cmd_detail(args) -> int:
+    """重建交易明細整合表"""
+    from file_type_mapping import DataType
+    from transaction_detail import rebuild_all
+
+    return 0 if rebuild_all([DataType(market) for market in args.market or []] or None) else 1
+
+
+def cmd_query(args) -> int:
+    """依條件查詢主要資料，逐頁輸出（--output 時寫入 CSV）"""
+    from datetime import date
+    from file_type_mapping import DataType
+    from transaction_query import TransactionQuery, TransactionFilter
+
+    with TransactionQuery(DataType(args.market)) as query:
+        if args.create_indexes:
+            query.ensure_indexes()
+        quarters = args.quarters or (query.latest_quarters(args.last_quarters) if args.last_quarters else None)
+        criteria = TransactionFilter(
+            cities=args.cities, districts=args.districts, quarters=quarters,
+            date_from=date.fromisoformat(args.date_from) if args.date_from else None,
+            date_to=date.fromisoformat(args.date_to) if args.date_to else None,
+            price_min=args.price[0] if args.price else None, price_max=args.price[1] if args.price else None,
+            building_types=args.building_types,
+            rooms_min=args.rooms[0] if args.rooms else None, rooms_max=args.rooms[1] if args.rooms else None
+        )
+
+        if not args.output:
+            names, rows, _ = query.fetch_page(criteria, limit=args.limit)
+            print('\t'.join(names))
+            for row in rows:
+                print('\t'.join('' if value is None else str(value) for value in row))
+            print(f"共 {query.count(criteria):,} 筆符合條件（顯示前 {len(rows)} 筆）")
+            return 0
+
+        total = 0
+        with open(args.output, 'w', encoding='utf-8-sig', newline='') as f:
+            for index, df in enumerate(query.iter_dataframes(criteria)):
+                df.to_csv(f, header=index == 0, index=False)
+                total += len(df)
+        print(f"✅ 已輸出 {total:,} 筆到 {args.output}")
+        return 0
+
+
+def cmd_profile(args) -> int:
+    """剖析 CSV 欄位並產生精簡資料表結構"""
+    from column_profiler import ColumnProfiler
+
+    profiler = ColumnProfiler(folders=args.folders or None)
+    profiler.profile_folders()
+    output_files = profiler.save_results()
+    print(f"✅ 剖析完成，共 {profiler.files_profiled} 個檔案")
+    for path in output_files.values():
+        print(f"   {path}")
+    return 0
+
+
+def cmd_cache(args) -> int:
+    """清理結果快取的統計、清除與依大小上限淘汰"""
+    from cleaned_cache import CleanedCache
+
+    cache = CleanedCache()
+    if args.action == 'clear':
+        print(f"🧹 已刪除 {cache.clear()} 個快取項目")
+    elif args.action == 'evict':
+        print(f"🧹 已淘汰 {cache.evict()} 個快取項目")
+    stats = cache.stats()
+    print(f"📦 {cache.cache_dir}: {stats['entries']} 個項目, "
+          f"{stats['bytes'] / 1024 / 1024:,.1f} / {stats['max_bytes'] / 1024 / 1024:,.0f} MB")
+    return 0
+
+
+def cmd_queue(args) -> int:
+    """分散式匯入工作佇列的狀態、登錄、處理與重設"""
+    from config import MAX_WORKERS
+    from work_queue import WorkQueue, QueueWorker
+
+    queue = WorkQueue()
+    quarters = args.folders
+    if args.action == 'enqueue':
+        if not args.paths:
+            print("❌ 請指定要登錄的資料夾或 ZIP 壓縮檔")
+            return 2
+        queue.enqueue(args.paths)
+    elif args.action == 'work':
+        # 只匯入檔案，不執行收尾（由 import --queue 的程序負責）
+        results = QueueWorker(queue, threads=args.threads or MAX_WORKERS, folders=quarters).run()
+        failed = [result for result in results if not result['success']]
+        print(f"👷 本程序處理 {len(results)} 個檔案，失敗 {len(failed)} 個")
+        for result in failed:
+            print(f"   ❌ {result['folder']}/{result['filename']}: {result['error']}")
+    elif args.action == 'retry':
+        print(f"🔁 已將 {queue.retry_failed(quarters)} 個失敗的檔案放回佇列")
+    elif args.action == 'reset':
+        if not quarters:
+            print("❌ 請以 --folders 指定要重設的季度")
+            return 2
+        print(f"🗑️ 已刪除 {queue.reset(quarters)} 筆工作記錄（已匯入的資料不受影響）")
+
+    status = queue.status(quarters)
+    print(f"📋 {queue.database_name}: {len(status['folders'])} 個季度")
+    for folder, counts in status['folders'].items():
+        parts = [f"{state} {counts[state][0]}" for state in ('pending', 'leased', 'done', 'failed') if state in counts]
+        rows = counts.get('done', (0, 0))[1]
+        finalized = f"，已由 {counts['finalized_by']} 收尾" if counts.get('finalized_by') else ''
+        print(f"  {folder}: {', '.join(parts) or '沒有工作'}（{rows:,} 筆）{finalized}")
+    for folder, filename, owner, remaining in status['leases']:
+        print(f"  ⏳ {folder}/{filename}: {owner}，租約剩餘 {remaining} 秒")
+    for folder, filename, attempts, error in status['failed']:
+        print(f"  ❌ {folder}/{filename}: {attempts} 次，{error}")
+    return 0
+
+
+def cmd_bulk(args) -> int:
+    """大量載入模式的復原模式與交易記錄檔狀態；restore 還原中斷的大量載入留下的 BULK_LOGGED"""
+    import bulk_load
+
+    if args.action == 'restore':
+        restored = bulk_load.restore_pending(args.database, backup=not args.no_backup)
+        print(f"🔄 已還原 {len(restored)} 個資料庫的復原模式" +
+              (f": {', '.join(f'{db}={model}' for db, model in restored.items())}" if restored else ''))
+
+    for item in bulk_load.status(args.database):
+        pending = f"，待還原為 {item['pending_restore']}" if item['pending_restore'] else ''
+        print(f"🗄️ {item['database']}: {item['recovery_model']}{pending}，交易記錄檔 "
+              f"{item['used'] / 1024 / 1024:,.1f} / {item['total'] / 1024 / 1024:,.1f} MB（等待: {item['reuse_wait']}）")
+    return 0
+
+
+def cmd_shard(args) -> int:
+    """依縣市分片的多節點匯入（計畫、節點執行、報告、合併，以及本機的 SQLite 測試）"""
+    import city_shards
+
+    if args.action in ('plan', 'execute', 'local') and not args.folders:
+        print("❌ 請以 --folders 指定要匯入的資料夾或 ZIP 壓縮檔")
+        return 2
+    if args.action in ('run', 'report', 'consolidate') and not args.plan_dir:
+        print("❌ 請指定計畫目錄")
+        return 2
+
+    consolidate_options = dict(backup_after=not args.no_backup, refresh_summary=False if args.no_summary else None,
+                               refresh_unified=False if args.no_unified else None)
+    if args.action == 'plan':
+        return 0 if city_shards.create_plan(args.folders) else 1
+    if args.action == 'run':
+        if not args.node:
+            print("❌ 請以 --node 指定節點名稱")
+            return 2
+        return 0 if not city_shards.run_node(args.plan_dir, args.node)['failed'] else 1
+    if args.action == 'report':
+        summary = city_shards.build_report(args.plan_dir)
+        return 0 if summary and not summary['missing'] and not summary['failed'] else 1
+    if args.action == 'consolidate':
+        return 0 if city_shards.consolidate(args.plan_dir, **consolidate_options) else 1
+    if args.action == 'execute':
+        return 0 if city_shards.run_all(args.folders, **consolidate_options) else 1
+    return 0 if city_shards.run_local_test(args.folders, node_count=args.nodes, workers=args.workers) else 1
+
+
+# 子命令 → (處理函數, 日誌檔)；日誌檔沿用各獨立程式原本的名稱
+COMMANDS = {
+    'scan': (cmd_scan, None),
+    'import': (cmd_import, 'new_folders_import.log'),
+    'verify': (cmd_verify, 'verify_city_codes.log'),
+    'backup': (cmd_backup, 'database_backup_restore.log'),
+    'restore': (cmd_restore, 'database_backup_restore.log'),
+    'catalog': (cmd_catalog, 'database_backup_restore.log'),
+    'snapshot': (cmd_snapshot, 'parquet_snapshot.log'),
+    'summary': (cmd_summary, 'price_summary.log'),
+    'unified': (cmd_unified, 'unified_transactions.log'),
+    'detail': (cmd_detail, 'transaction_detail.log'),
+    'query': (cmd_query, None),
+    'profile': (cmd_profile, 'column_profiler.log'),
+    'cache': (cmd_cache, None),
+    'queue': (cmd_queue, 'new_folders_import.log'),
+    'shard': (cmd_shard, 'city_shards.log'),
+    'bulk': (cmd_bulk, 'new_folders_import.log'),
+}
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """建立命令列參數解析器"""
+    parser = argparse.ArgumentParser(prog='lvr_cli.py', description='LVR 實價登錄資料庫工具')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('scan', help='掃描尚未匯入的新資料夾')
+
+    import_parser = subparsers.add_parser('import', help='匯入新資料夾')
+    import_parser.add_argument('--auto', action='store_true', help='自動模式（不詢問，匯入後自動更新 config.py）')
+    import_parser.add_argument('--folders', nargs='+', help='指定要匯入的資料夾或 ZIP 壓縮檔（不掃描、不更新 config.py）')
+    import_parser.add_argument('--workers', type=int, help='並行執行緒數（預設使用 config.py 中的 MAX_WORKERS）')
+    import_parser.add_argument('--async', dest='use_async', action='store_true',
+                               help='以 asyncio 協調器匯入（子程序解析清理，--workers 條連線寫入）')
+    import_parser.add_argument('--queue', action='store_true',
+                               help='經由資料庫中的工作佇列與其他匯入程序（可在其他機器）分擔檔案')
+    import_parser.add_argument('--bulk-load', action='store_true',
+                               help='大量載入模式（暫時切換為 BULK_LOGGED 復原模式、以 TABLOCK 最少記錄寫入，結束後還原並備份）')
+    import_parser.add_argument('--no-schema-check', action='store_true', help='略過匯入前的 CSV 標題檢查')
+    import_parser.add_argument('--no-backup', action='store_true', help='匯入後不做差異備份')
+    import_parser.add_argument('--no-summary', action='store_true', help='匯入後不更新價格彙總資料')
+    import_parser.add_argument('--no-unified', action='store_true', help='匯入後不更新跨市場整合資料')
+
+    verify_parser = subparsers.add_parser('verify', help='比對匯入統計與資料表內容')
+    verify_parser.add_argument('--quarters', nargs='+', help='只比對指定季度（預設為最近匯入的季度）')
+    verify_parser.add_argument('--full', action='store_true', help='比對全部季度並另外逐表檢查縣市代碼分佈（全表掃描）')
+
+    backup_parser = subparsers.add_parser('backup', help='備份資料庫')
+    backup_parser.add_argument('--database', help='只備份指定的資料庫')
+    backup_parser.add_argument('--parallel', action='store_true', help='平行備份，每個資料庫分割為多個檔案並壓縮')
+    backup_parser.add_argument('--differential', dest='after_import', action='store_true',
+                               help='差異備份（完整備份過舊或不存在時自動改做完整備份）')
+    backup_parser.add_argument('--stripes', type=int, help='分割檔數（預設使用 config.py 中的 BACKUP_STRIPES）')
+    backup_parser.add_argument('--compression', choices=['auto', 'server', 'client', 'none'],
+                               help='壓縮方式（預設使用 config.py 中的 BACKUP_COMPRESSION）')
+
+    restore_parser = subparsers.add_parser('restore', help='還原資料庫')
+    restore_group = restore_parser.add_mutually_exclusive_group()
+    restore_group.add_argument('--latest', action='store_true', help='還原最新的備份')
+    restore_group.add_argument('--timestamp', help='還原指定時間戳記的備份 (例如: 20250909_084500)')
+    restore_group.add_argument('--id', help='還原到備份目錄中的還原點 (例如: LVR_UsedHouse@20250909_084500.full)')
+    restore_group.add_argument('--file', help='還原指定的備份檔案（需搭配 --database）')
+    restore_group.add_argument('--list', action='store_true', help='列出備份檔案')
+    restore_parser.add_argument('--database', help='還原的目標資料庫')
+    restore_parser.add_argument('--no-verify', action='store_true',
+                                help='略過還原前的備份驗證與還原後的資料比對')
+
+    catalog_parser = subparsers.add_parser('catalog', help='備份目錄（列出、登錄外部備份、重建）')
+    catalog_subparsers = catalog_parser.add_subparsers(dest='action', required=True)
+    catalog_list_parser = catalog_subparsers.add_parser('list', help='列出還原點（新到舊）')
+    catalog_list_parser.add_argument('--database', help='只列出指定資料庫')
+    catalog_list_parser.add_argument('--limit', type=int, help='最多列出筆數')
+    catalog_register_parser = catalog_subparsers.add_parser('register', help='登錄本工具以外建立的備份檔')
+    catalog_register_parser.add_argument('files', nargs='+', help='備份檔案路徑')
+    catalog_subparsers.add_parser('rebuild', help='將備份資料夾中未登錄的備份檔加入目錄')
+
+    snapshot_parser = subparsers.add_parser('snapshot', help='Parquet 邏輯快照（依季度 / 縣市匯出與重新載入）')
+    snapshot_subparsers = snapshot_parser.add_subparsers(dest='action', required=True)
+    snapshot_export_parser = snapshot_subparsers.add_parser('export', help='匯出快照')
+    snapshot_export_parser.add_argument('--output', help='快照目錄（預設為 config.py 中的 SNAPSHOT_DIR/snapshot_<時間戳記>）')
+    snapshot_import_parser = snapshot_subparsers.add_parser('import', help='重新載入快照（同季度同縣市的資料先刪除再寫入）')
+    snapshot_import_parser.add_argument('snapshot_dir', help='快照目錄')
+    for sub_parser in (snapshot_export_parser, snapshot_import_parser):
+        sub_parser.add_argument('--database', nargs='+', help='資料庫名稱（預設為所有 LVR 資料庫）')
+        sub_parser.add_argument('--tables', nargs='+', help='資料表名稱（預設為所有資料表）')
+        sub_parser.add_argument('--quarters', nargs='+', help='季度 (例如: 114Q1)')
+        sub_parser.add_argument('--cities', nargs='+', help='縣市代碼 (例如: a f)')
+
+    summary_parser = subparsers.add_parser('summary', help='重新計算價格彙總資料 (price_summary)')
+    summary_parser.add_argument('--database', nargs='+', help='資料庫名稱（預設為所有 LVR 資料庫）')
+    summary_parser.add_argument('--quarters', nargs='+', help='只重新計算指定季度（預設為全部）')
+
+    unified_parser = subparsers.add_parser('unified', help='重新寫入跨市場整合資料 (unified_transactions)')
+    unified_parser.add_argument('--quarters', nargs='+', help='只重新寫入指定季度（預設為全部）')
+
+    detail_parser = subparsers.add_parser('detail', help='重建交易明細整合表 (transaction_detail)')
+    detail_parser.add_argument('--market', nargs='+', choices=['used_house', 'presale', 'rental'],
+                               help='資料類型（預設為全部）')
+
+    query_parser = subparsers.add_parser('query', help='依條件查詢交易資料')
+    query_parser.add_argument('--market', choices=['used_house', 'presale', 'rental'], default='used_house',
+                              help='資料類型（預設為中古屋）')
+    query_parser.add_argument('--cities', nargs='+', help='縣市代碼或名稱 (例如: a 或 臺北市)')
+    query_parser.add_argument('--districts', nargs='+', help='鄉鎮市區')
+    query_parser.add_argument('--quarters', nargs='+', help='季度 (例如: 114Q1)')
+    query_parser.add_argument('--last-quarters', type=int, help='最近 N 季')
+    query_parser.add_argument('--date-from', help='交易日期起 (例如: 2024-01-01)')
+    query_parser.add_argument('--date-to', help='交易日期迄 (例如: 2024-12-31)')
+    query_parser.add_argument('--price', nargs=2, type=float, metavar=('MIN', 'MAX'), help='總價元（租屋為總額元）範圍')
+    query_parser.add_argument('--building-types', nargs='+', help='建物型態')
+    query_parser.add_argument('--rooms', nargs=2, type=int, metavar=('MIN', 'MAX'), help='房數範圍')
+    query_parser.add_argument('--limit', type=int, default=20, help='未指定 --output 時顯示的筆數')
+    query_parser.add_argument('--output', help='將所有結果寫入 CSV 檔')
+    query_parser.add_argument('--create-indexes', action='store_true', help='先建立查詢用的索引（縣市代碼 + 季度）')
+
+    profile_parser = subparsers.add_parser('profile', help='剖析 CSV 欄位並產生精簡資料表結構')
+    profile_parser.add_argument('folders', nargs='*', help='要剖析的資料夾（預設為 config.py 中的 DATA_FOLDERS）')
+
+    cache_parser = subparsers.add_parser('cache', help='清理結果快取（Parquet）的統計與清除')
+    cache_parser.add_argument('action', nargs='?', choices=['stats', 'clear', 'evict'], default='stats',
+                              help='stats: 統計（預設）; clear: 刪除所有項目; evict: 依 CLEANED_CACHE_MAX_MB 淘汰')
+
+    shard_parser = subparsers.add_parser('shard', help='依縣市分片的多節點匯入')
+    shard_parser.add_argument('action', choices=['plan', 'run', 'report', 'consolidate', 'execute', 'local'],
+                              help='plan: 依歷史筆數分配縣市; run: 執行單一節點; report: 彙整各節點統計; '
+                                   'consolidate: 合併到中央資料庫; execute: 在本機執行 SHARD_NODES 的所有步驟; '
+                                   'local: 以子程序與 SQLite 代替資料庫的本機測試')
+    shard_parser.add_argument('plan_dir', nargs='?', help='計畫目錄（run / report / consolidate）')
+    shard_parser.add_argument('--folders', nargs='+', help='要匯入的資料夾或 ZIP 壓縮檔（plan / execute / local）')
+    shard_parser.add_argument('--node', help='run 時的節點名稱')
+    shard_parser.add_argument('--nodes', type=int, default=3, help='local 時的節點數（預設 3）')
+    shard_parser.add_argument('--workers', type=int, help='local 時每個節點的執行緒數（預設使用 MAX_WORKERS）')
+    shard_parser.add_argument('--no-backup', action='store_true', help='合併後不做差異備份')
+    shard_parser.add_argument('--no-summary', action='store_true', help='合併後不更新價格彙總資料')
+    shard_parser.add_argument('--no-unified', action='store_true', help='合併後不更新跨市場整合資料')
+
+    queue_parser = subparsers.add_parser('queue', help='分散式匯入工作佇列（狀態、登錄、處理、重試、重設）')
+    queue_parser.add_argument('action', nargs='?', choices=['status', 'enqueue', 'work', 'retry', 'reset'],
+                              default='status',
+                              help='status: 狀態（預設）; enqueue: 登錄檔案; work: 協助匯入（不收尾）; '
+                                   'retry: 失敗的檔案放回佇列; reset: 刪除工作記錄以便重新匯入')
+    queue_parser.add_argument('paths', nargs='*', help='enqueue 時要登錄的資料夾或 ZIP 壓縮檔')
+    queue_parser.add_argument('--folders', nargs='+', help='只處理指定季度 (例如: 114Q3)')
+    queue_parser.add_argument('--threads', type=int, help='work 時的執行緒數（預設使用 config.py 中的 MAX_WORKERS）')
+
+    bulk_parser = subparsers.add_parser('bulk', help='大量載入模式（復原模式與交易記錄檔狀態、還原中斷的切換）')
+    bulk_parser.add_argument('action', nargs='?', choices=['status', 'restore'], default='status',
+                             help='status: 狀態（預設）; restore: 還原中斷的大量載入留下的復原模式並備份交易記錄')
+    bulk_parser.add_argument('--database', nargs='+', help='資料庫名稱（預設為所有 LVR 資料庫）')
+    bulk_parser.add_argument('--no-backup', action='store_true', help='restore 後不備份交易記錄')
+
+    return parser
+
+
+def main(argv=None) -> int:
+    """主函數"""
+    args = build_parser().parse_args(argv)
+    handler, log_file = COMMANDS[args.command]
+    setup_logging(log_file)
+    return handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,7 +5,6 @@
 """
 
 import os
-import glob
 import logging
 import time
 import threading
@@ -21,24 +20,25 @@ from config import DB_CONFIG, DATABASES, DATA_FOLDERS, BATCH_SIZE, MAX_WORKERS
 from enhanced_data_importer import EnhancedDataImporter
 from file_type_mapping import FileTypeMapping
 from city_code_mapping import CityCodeMapping
+import file_access
+import zip_source
+from log_setup import setup_logging
+
+try:
+    from config import IMPORT_ORCHESTRATOR
+except ImportError:
+    IMPORT_ORCHESTRATOR = 'threads'
 
-# 設定日誌
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('parallel_batch_import.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
 class ParallelBatchImporter:
     """並行批次匯入器"""
     
-    def __init__(self, max_workers: int = None, use_processes: bool = False):
+    def __init__(self, max_workers: int = None, use_processes: bool = False, orchestrator: str = None):
         self.max_workers = max_workers or min(MAX_WORKERS, mp.cpu_count())
         self.use_processes = use_processes
+        # 'threads'（每個檔案一個執行緒）或 'asyncio'（async_importer：子程序解析，max_workers 條連線寫入）
+        self.orchestrator = orchestrator or IMPORT_ORCHESTRATOR
         self.file_mapping = FileTypeMapping()
         self.city_mapping = CityCodeMapping()
         self.stats = {
@@ -65,8 +65,10 @@ class ParallelBatchImporter:
         all_files = {}
         
         for folder in DATA_FOLDERS:
-            if os.path.exists(folder):
-                csv_files = glob.glob(os.path.join(folder, "*.csv"))
+            # 尚未解壓縮的季度直接讀取同名 ZIP 壓縮檔，各成員仍由工作執行緒分別匯入
+            source = zip_source.resolve_folder(folder)
+            if os.path.exists(source):
+                csv_files = zip_source.list_csv_files(source)
                 all_files[folder] = csv_files
                 logger.info(f"📁 {folder}: 找到 {len(csv_files)} 個CSV檔案")
             else:
@@ -111,10 +113,9 @@ class ParallelBatchImporter:
                         analysis['city_distribution'][city_name] = 0
                     analysis['city_distribution'][city_name] += 1
                 
-                # 估算檔案大小（快速預覽）
+                # 估算檔案大小：mmap 掃描的記錄數（掃描結果會快取，匯入時不必再判斷編碼與計算雜湊）
                 try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        line_count = sum(1 for _ in f)
+                    line_count = file_access.scan_file(file_path).record_count
                     
                     if line_count < 1000:
                         analysis['files_by_size']['small'].append(file_path)
@@ -174,47 +175,57 @@ class ParallelBatchImporter:
             'processing_times': []
         }
         
-        # 使用執行緒池進行並行處理
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            # 提交所有任務
-            future_to_file = {
-                executor.submit(self.import_single_file_worker, file_path, folder): file_path
-                for file_path in files
-            }
-            
-            # 使用進度條追蹤進度
-            with tqdm(total=len(files), desc=f"並行匯入 {folder}", unit="檔案") as pbar:
-                for future in as_completed(future_to_file):
-                    result = future.result()
-                    filename = result['filename']
+        with tqdm(total=len(files), desc=f"並行匯入 {folder}", unit="檔案") as pbar:
+            def record_result(result: Dict):
+                filename = result['filename']
+                
+                # 更新統計
+                with self.lock:
+                    if result['success']:
+                        folder_stats['successful_files'] += 1
+                        folder_stats['total_records'] += result.get('records', 0)
+                        folder_stats['file_results'][filename] = {
+                            'status': 'success',
+                            'processing_time': result['processing_time']
+                        }
+                        logger.info(f"✅ {filename} 匯入成功 ({result['processing_time']:.2f}s)")
+                    else:
+                        folder_stats['failed_files'] += 1
+                        folder_stats['file_results'][filename] = {
+                            'status': 'failed',
+                            'error': result['error'],
+                            'processing_time': result['processing_time']
+                        }
+                        folder_stats['errors'].append(f"{filename}: {result['error']}")
+                        logger.error(f"❌ {filename} 匯入失敗: {result['error']}")
                     
-                    # 更新統計
-                    with self.lock:
-                        if result['success']:
-                            folder_stats['successful_files'] += 1
-                            folder_stats['file_results'][filename] = {
-                                'status': 'success',
-                                'processing_time': result['processing_time']
-                            }
-                            logger.info(f"✅ {filename} 匯入成功 ({result['processing_time']:.2f}s)")
-                        else:
-                            folder_stats['failed_files'] += 1
-                            folder_stats['file_results'][filename] = {
-                                'status': 'failed',
-                                'error': result['error'],
-                                'processing_time': result['processing_time']
-                            }
-                            folder_stats['errors'].append(f"{filename}: {result['error']}")
-                            logger.error(f"❌ {filename} 匯入失敗: {result['error']}")
-                        
-                        folder_stats['processing_times'].append(result['processing_time'])
+                    folder_stats['processing_times'].append(result['processing_time'])
+                
+                pbar.set_postfix({
+                    '成功': folder_stats['successful_files'],
+                    '失敗': folder_stats['failed_files'],
+                    '平均時間': f"{sum(folder_stats['processing_times'])/len(folder_stats['processing_times']):.2f}s"
+                })
+                pbar.update(1)
+            
+            if self.orchestrator == 'asyncio':
+                from async_importer import AsyncImporter
+                
+                # 所有檔案同時排入佇列：子程序解析清理，max_workers 條連線寫入
+                result = AsyncImporter(db_writers=self.max_workers).run(
+                    [(file_path, folder) for file_path in files], record_result)
+                folder_stats['orchestrator_metrics'] = result['metrics']
+            else:
+                # 使用執行緒池進行並行處理
+                with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                    # 提交所有任務
+                    future_to_file = {
+                        executor.submit(self.import_single_file_worker, file_path, folder): file_path
+                        for file_path in files
+                    }
                     
-                    pbar.set_postfix({
-                        '成功': folder_stats['successful_files'],
-                        '失敗': folder_stats['failed_files'],
-                        '平均時間': f"{sum(folder_stats['processing_times'])/len(folder_stats['processing_times']):.2f}s"
-                    })
-                    pbar.update(1)
+                    for future in as_completed(future_to_file):
+                        record_result(future.result())
         
         # 計算平均處理時間
         if folder_stats['processing_times']:
@@ -392,6 +403,7 @@ def main():
             print("❌ 匯入已取消")
 
 if __name__ == "__main__":
+    setup_logging('parallel_batch_import.log')
     main()
 
 
@@ -0,0 +1,377 @@
+# -*- coding: utf-8 -*-
+"""
+Parquet 邏輯快照
+將資料表依 季度 / 縣市代碼 分割匯出為壓縮的 Parquet 檔案，並可依相同條件重新載入，
+單獨搬移或還原某一季、某一縣市的資料時不需還原整個 .bak，也可直接供分析工具讀取
+
+快照結構:
+    snapshots/<快照名稱>/manifest.json
+    snapshots/<快照名稱>/<資料庫>/<資料表>/quarter=114Q1/縣市代碼=a/part-0.parquet
+    snapshots/<快照名稱>/<資料庫>/<資料表>/part-0.parquet   （沒有季度 / 縣市欄位的資料表，例如維度資料表）
+"""
+
+import os
+import json
+import time
+import decimal
+import datetime
+import logging
+from itertools import groupby
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pyodbc
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from config import DB_CONFIG, DATABASES
+from log_setup import setup_logging
+from schema_registry import build_insert_sql, quote_column
+
+try:
+    from config import SNAPSHOT_DIR
+except ImportError:
+    SNAPSHOT_DIR = 'snapshots'
+
+try:
+    from config import SNAPSHOT_CHUNK_ROWS
+except ImportError:
+    SNAPSHOT_CHUNK_ROWS = 50000
+
+try:
+    from config import SNAPSHOT_COMPRESSION
+except ImportError:
+    SNAPSHOT_COMPRESSION = 'zstd'
+
+logger = logging.getLogger(__name__)
+
+# 分割欄位（依序為目錄層級）
+PARTITION_COLUMNS = ['quarter', '縣市代碼']
+
+MANIFEST_FILE = 'manifest.json'
+
+# 分割值為 NULL 時的目錄名稱（Hive 慣例）
+NULL_PARTITION = '__HIVE_DEFAULT_PARTITION__'
+
+
+def arrow_type(description) -> pa.DataType:
+    """由 cursor.description 的欄位描述決定 Arrow 型別"""
+    _, type_code, _, _, precision, scale, _ = description
+    if type_code is decimal.Decimal:
+        return pa.decimal128(precision or 38, scale or 0)
+    if type_code is int:
+        return pa.int64()
+    if type_code is float:
+        return pa.float64()
+    if type_code is bool:
+        return pa.bool_()
+    if type_code is datetime.datetime:
+        return pa.timestamp('ms')
+    if type_code is datetime.date:
+        return pa.date32()
+    if type_code in (bytes, bytearray):
+        return pa.binary()
+    return pa.string()
+
+
+def partition_path(values: Dict[str, str]) -> str:
+    """分割值 → 相對目錄（Hive 格式，pyarrow.dataset / pandas 可直接辨識）"""
+    if not values:
+        return ''
+    return os.path.join(*[
+        f"{column}={NULL_PARTITION if values[column] is None else values[column]}" for column in PARTITION_COLUMNS
+    ])
+
+
+class ParquetSnapshot:
+    """資料表的 Parquet 匯出與重新載入"""
+
+    def __init__(self, chunk_rows: int = None, compression: str = None, db_config: Dict = None):
+        # db_config 覆寫 DB_CONFIG 的欄位（例如 city_shards 由節點的 SQL Server 執行個體匯出）
+        db_config = {**DB_CONFIG, **(db_config or {})}
+        self.connection_string = (
+            f"DRIVER={{{db_config['driver']}}};"
+            f"SERVER={db_config['server']};"
+            f"UID={db_config['username']};"
+            f"PWD={db_config['password']};"
+            f"Trusted_Connection={db_config['trusted_connection']};"
+            f"Encrypt={db_config['encrypt']};"
+        )
+        self.chunk_rows = chunk_rows or SNAPSHOT_CHUNK_ROWS
+        self.compression = compression or SNAPSHOT_COMPRESSION
+
+    def connect(self, database_name: str, autocommit: bool = False):
+        """連線到指定資料庫"""
+        return pyodbc.connect(self.connection_string + f"Database={database_name};", autocommit=autocommit)
+
+    @staticmethod
+    def get_tables(cursor) -> Dict[str, Dict]:
+        """列出資料庫的使用者資料表 {資料表: {'columns': [...], 'identity': 識別欄位或 None}}"""
+        cursor.execute("""
+            SELECT t.name, c.name, c.is_identity
+            FROM sys.tables t
+            JOIN sys.columns c ON c.object_id = t.object_id
+            WHERE t.is_ms_shipped = 0
+            ORDER BY t.name, c.column_id
+        """)
+        tables: Dict[str, Dict] = {}
+        for table_name, column_name, is_identity in cursor.fetchall():
+            table = tables.setdefault(table_name, {'columns': [], 'identity': None})
+            table['columns'].append(column_name)
+            if is_identity:
+                table['identity'] = column_name
+        return tables
+
+    # ------------------------------------------------------------------ 匯出
+
+    def export_table(self, cursor, database_name: str, table_name: str, columns: List[str],
+                     output_dir: Path, quarters: List[str] = None, city_codes: List[str] = None) -> Dict:
+        """
+        以順向資料流游標分批讀取資料表並寫入 Parquet（每批為一個 row group，記憶體用量與資料表大小無關）
+
+        Returns:
+            {'rows', 'partitions': [{'values': {...}, 'path', 'rows'}], 'seconds'}
+        """
+        start_time = time.time()
+        partitioned = all(column in columns for column in PARTITION_COLUMNS)
+
+        conditions, params = [], []
+        if partitioned:
+            for column, values in zip(PARTITION_COLUMNS, [quarters, city_codes]):
+                if values:
+                    conditions.append(f"{quote_column(column)} IN ({', '.join('?' for _ in values)})")
+                    params.extend(values)
+
+        sql = f"SELECT {', '.join(quote_column(column) for column in columns)} FROM [{table_name}]"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        if partitioned:
+            # 依分割欄位排序，同一時間只需開啟一個 ParquetWriter
+            sql += " ORDER BY " + ", ".join(quote_column(column) for column in PARTITION_COLUMNS)
+        cursor.execute(sql, *params)
+
+        schema = pa.schema([pa.field(description[0], arrow_type(description)) for description in cursor.description])
+        key_indexes = [columns.index(column) for column in PARTITION_COLUMNS] if partitioned else []
+
+        partitions = []
+        writer = None
+        current_key = None
+        try:
+            while True:
+                rows = cursor.fetchmany(self.chunk_rows)
+                if not rows:
+                    break
+                for key, group in groupby(rows, key=lambda row: tuple(row[index] for index in key_indexes)):
+                    group = list(group)
+                    if writer is None or key != current_key:
+                        if writer is not None:
+                            writer.close()
+                        current_key = key
+                        values = {column: None if value is None else str(value)
+                                  for column, value in zip(PARTITION_COLUMNS, key)}
+                        # 定序不區分大小寫時同一分割可能不連續出現，改寫入下一個 part 檔案
+                        part = sum(1 for partition in partitions if partition['values'] == values)
+                        relative = os.path.join(partition_path(values), f'part-{part}.parquet')
+                        file_path = output_dir / relative
+                        file_path.parent.mkdir(parents=True, exist_ok=True)
+                        writer = pq.ParquetWriter(file_path, schema, compression=self.compression)
+                        partitions.append({'values': values, 'path': relative.replace(os.sep, '/'), 'rows': 0})
+                    writer.write_table(pa.Table.from_arrays(
+                        [pa.array(column_values, type=field.type) for column_values, field in zip(zip(*group), schema)],
+                        schema=schema
+                    ))
+                    partitions[-1]['rows'] += len(group)
+        finally:
+            if writer is not None:
+                writer.close()
+
+        total_rows = sum(partition['rows'] for partition in partitions)
+        elapsed = time.time() - start_time
+        logger.info(f"📦 {database_name}.{table_name}: {total_rows:,} 筆，{len(partitions)} 個分割，耗時 {elapsed:.1f} 秒")
+        return {'rows': total_rows, 'partitions': partitions, 'seconds': elapsed}
+
+    def export_snapshot(self, database_names: List[str] = None, tables: List[str] = None,
+                        quarters: List[str] = None, city_codes: List[str] = None,
+                        output_dir: str = None) -> Optional[Path]:
+        """
+        匯出快照
+
+        Args:
+            database_names: 要匯出的資料庫（預設為所有 LVR 資料庫）
+            tables: 只匯出指定資料表（預設為資料庫中所有資料表）
+            quarters / city_codes: 只匯出指定季度 / 縣市（沒有這些欄位的資料表整個匯出）
+            output_dir: 快照目錄（預設為 SNAPSHOT_DIR/snapshot_<時間戳記>）
+
+        Returns:
+            快照目錄；失敗時回傳 None
+        """
+        city_codes = [code.lower() for code in city_codes] if city_codes else None
+        timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+        snapshot_dir = Path(output_dir) if output_dir else Path(SNAPSHOT_DIR) / f"snapshot_{timestamp}"
+        database_names = database_names or list(DATABASES.values())
+        manifest = {
+            'created': timestamp,
+            'filters': {'quarters': quarters, 'city_codes': city_codes},
+            'compression': self.compression,
+            'databases': {}
+        }
+
+        logger.info(f"🚀 匯出 Parquet 快照到 {snapshot_dir}")
+        start_time = time.time()
+        try:
+            for database_name in database_names:
+                conn = self.connect(database_name)
+                try:
+                    cursor = conn.cursor()
+                    table_info = self.get_tables(cursor)
+                    for table_name, info in table_info.items():
+                        if tables and table_name not in tables:
+                            continue
+                        result = self.export_table(cursor, database_name, table_name, info['columns'],
+                                                   snapshot_dir / database_name / table_name, quarters, city_codes)
+                        manifest['databases'].setdefault(database_name, {})[table_name] = {
+                            'columns': info['columns'],
+                            'identity': info['identity'],
+                            'partitioned': all(column in info['columns'] for column in PARTITION_COLUMNS),
+                            'rows': result['rows'],
+                            'partitions': result['partitions']
+                        }
+                finally:
+                    conn.close()
+        except Exception as e:
+            logger.error(f"❌ 匯出快照失敗: {str(e)}")
+            return None
+
+        snapshot_dir.mkdir(parents=True, exist_ok=True)
+        with open(snapshot_dir / MANIFEST_FILE, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+        total_rows = sum(table['rows'] for tables_ in manifest['databases'].values() for table in tables_.values())
+        logger.info(f"✅ 快照匯出完成: {total_rows:,} 筆，耗時 {time.time() - start_time:.1f} 秒")
+        return snapshot_dir
+
+    # ------------------------------------------------------------------ 載入
+
+    def load_partition(self, cursor, table_name: str, file_path: Path, columns: List[str]) -> int:
+        """將單一 Parquet 檔案分批寫入資料表，回傳筆數"""
+        insert_sql = build_insert_sql(table_name, tuple(columns))
+        parquet_file = pq.ParquetFile(file_path)
+        loaded = 0
+        for batch in parquet_file.iter_batches(batch_size=self.chunk_rows, columns=columns):
+            rows = list(zip(*[column.to_pylist() for column in batch.columns]))
+            if rows:
+                cursor.executemany(insert_sql, rows)
+                loaded += len(rows)
+        return loaded
+
+    def import_snapshot(self, snapshot_dir: str, database_names: List[str] = None, tables: List[str] = None,
+                        quarters: List[str] = None, city_codes: List[str] = None) -> bool:
+        """
+        重新載入快照
+
+        有季度 / 縣市欄位的資料表：每個分割在一個交易中先刪除同季度同縣市的資料再寫入（可重複執行），
+        識別欄位由資料庫重新產生；其他資料表（維度資料表）只載入到空資料表並保留原本的代碼
+        """
+        # 縣市代碼以小寫存放（與 CityCodeMapping 相同）
+        city_codes = [code.lower() for code in city_codes] if city_codes else None
+        snapshot_dir = Path(snapshot_dir)
+        manifest_file = snapshot_dir / MANIFEST_FILE
+        if not manifest_file.exists():
+            logger.error(f"❌ 找不到快照清單: {manifest_file}")
+            return False
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+
+        logger.info(f"🚀 從 {snapshot_dir} 載入 Parquet 快照")
+        start_time = time.time()
+        total_rows = 0
+        failed = 0
+
+        for database_name, table_entries in manifest['databases'].items():
+            if database_names and database_name not in database_names:
+                continue
+            conn = self.connect(database_name)
+            try:
+                cursor = conn.cursor()
+                cursor.fast_executemany = True
+                for table_name, table in table_entries.items():
+                    if tables and table_name not in tables:
+                        continue
+                    base_dir = snapshot_dir / database_name / table_name
+                    try:
+                        if table['partitioned']:
+                            columns = [column for column in table['columns'] if column != table['identity']]
+                            groups: Dict[str, List[Dict]] = {}
+                            for partition in table['partitions']:
+                                values = partition['values']
+                                if (quarters and values['quarter'] not in quarters) or \
+                                        (city_codes and values['縣市代碼'] not in city_codes):
+                                    continue
+                                groups.setdefault(partition_path(values), []).append(partition)
+                            for parts in groups.values():
+                                values = parts[0]['values']
+                                conditions = [f"{quote_column(column)} IS NULL" if values[column] is None
+                                              else f"{quote_column(column)} = ?" for column in PARTITION_COLUMNS]
+                                cursor.execute(f"DELETE FROM [{table_name}] WHERE " + " AND ".join(conditions),
+                                               *[values[column] for column in PARTITION_COLUMNS
+                                                 if values[column] is not None])
+                                loaded = sum(self.load_partition(cursor, table_name, base_dir / part['path'], columns)
+                                             for part in parts)
+                                conn.commit()
+                                total_rows += loaded
+                                logger.info(f"   {database_name}.{table_name} {partition_path(values)}: {loaded:,} 筆")
+                        else:
+                            cursor.execute(f"SELECT COUNT_BIG(*) FROM [{table_name}]")
+                            if cursor.fetchone()[0] > 0:
+                                logger.warning(f"⚠️ {database_name}.{table_name} 已有資料，略過（只載入到空資料表）")
+                                continue
+                            if table['identity']:
+                                cursor.execute(f"SET IDENTITY_INSERT [{table_name}] ON")
+                            loaded = sum(self.load_partition(cursor, table_name, base_dir / partition['path'],
+                                                             table['columns'])
+                                         for partition in table['partitions'])
+                            if table['identity']:
+                                cursor.execute(f"SET IDENTITY_INSERT [{table_name}] OFF")
+                            conn.commit()
+                            total_rows += loaded
+                            logger.info(f"   {database_name}.{table_name}: {loaded:,} 筆")
+                    except Exception as e:
+                        conn.rollback()
+                        failed += 1
+                        logger.error(f"❌ 載入 {database_name}.{table_name} 失敗: {str(e)}")
+            finally:
+                conn.close()
+
+        logger.info(f"{'✅' if not failed else '⚠️'} 快照載入完成: {total_rows:,} 筆，"
+                    f"{failed} 個資料表失敗，耗時 {time.time() - start_time:.1f} 秒")
+        return failed == 0
+
+
+def main():
+    """主函數"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='LVR 資料表 Parquet 快照')
+    parser.add_argument('action', choices=['export', 'import'])
+    parser.add_argument('snapshot_dir', nargs='?', help='快照目錄（import 必須指定）')
+    parser.add_argument('--database', nargs='+', help='資料庫名稱')
+    parser.add_argument('--tables', nargs='+', help='資料表名稱')
+    parser.add_argument('--quarters', nargs='+', help='季度 (例如: 114Q1)')
+    parser.add_argument('--cities', nargs='+', help='縣市代碼 (例如: a f)')
+    args = parser.parse_args()
+
+    snapshot = ParquetSnapshot()
+    if args.action == 'export':
+        return 0 if snapshot.export_snapshot(args.database, args.tables, args.quarters, args.cities,
+                                             args.snapshot_dir) else 1
+    if not args.snapshot_dir:
+        parser.error('import 需要指定快照目錄')
+    return 0 if snapshot.import_snapshot(args.snapshot_dir, args.database, args.tables,
+                                         args.quarters, args.cities) else 1
+
+
+if __name__ == "__main__":
+    import sys
+
+    setup_logging('parquet_snapshot.log')
+    sys.exit(main())
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+季度價格統計彙總表
+每個資料庫維護一個 price_summary 資料表，依 季度 / 縣市 / 鄉鎮市區 / 建物型態 預先計算
+交易筆數與單價、總價（租屋為總額）的平均數及中位數；
+匯入後只重新計算本次匯入涉及的季度，儀表板查詢讀取數百筆彙總資料即可，不需掃描主要資料表
+
+（中位數無法以索引檢視表維護，因此採用依季度整批重算的彙總資料表）
+"""
+
+import time
+import logging
+from typing import Dict, Iterable, List
+
+import pyodbc
+
+from config import DB_CONFIG
+from log_setup import setup_logging
+from file_type_mapping import FileTypeMapping, DataType, FileType
+from schema_registry import get_schema_registry, quote_column
+
+try:
+    from config import USE_DICTIONARY_ENCODING
+except ImportError:
+    USE_DICTIONARY_ENCODING = False
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_TABLE = 'price_summary'
+
+# 彙總維度
+GROUP_COLUMNS = ['quarter', '縣市代碼', '縣市名稱', '鄉鎮市區', '建物型態']
+
+# 叢集索引鍵：全部彙總維度的 NVARCHAR 合計最多 960 位元組，超過索引鍵的 900 位元組上限（過長的列無法寫入），
+# 因此只以 季度 + 縣市代碼 為鍵；每個季度、縣市只有數百筆彙總資料，其餘維度在搜尋到的範圍內篩選即可
+INDEX_COLUMNS = ['quarter', '縣市代碼']
+
+# 各資料類型的統計欄位（只計入大於 0 的值）
+SUMMARY_MEASURES = {
+    DataType.USED_HOUSE: ['單價元平方公尺', '總價元'],
+    DataType.PRESALE: ['單價元平方公尺', '總價元'],
+    DataType.RENTAL: ['單價元平方公尺', '總額元'],
+}
+
+
+class PriceSummary:
+    """季度價格統計彙總表維護"""
+
+    def __init__(self):
+        self.connection_string = (
+            f"DRIVER={{{DB_CONFIG['driver']}}};"
+            f"SERVER={DB_CONFIG['server']};"
+            f"UID={DB_CONFIG['username']};"
+            f"PWD={DB_CONFIG['password']};"
+            f"Trusted_Connection={DB_CONFIG['trusted_connection']};"
+            f"Encrypt={DB_CONFIG['encrypt']};"
+        )
+        self.file_mapping = FileTypeMapping()
+        self.registry = get_schema_registry()
+
+    def get_data_type(self, database_name: str) -> DataType:
+        """資料庫名稱 → 資料類型"""
+        for data_type in SUMMARY_MEASURES:
+            if self.file_mapping.get_database_name(data_type) == database_name:
+                return data_type
+        raise ValueError(f"未知的資料庫: {database_name}")
+
+    def create_table_sql(self, data_type: DataType) -> str:
+        """產生彙總資料表的 CREATE TABLE 語句（已存在時不重建）"""
+        columns = [f"{quote_column(name)} {self.registry.get_column_type(name)}" for name in GROUP_COLUMNS]
+        columns.append("[交易筆數] INT NOT NULL")
+        for measure in SUMMARY_MEASURES[data_type]:
+            columns.append(f"{quote_column('平均' + measure)} DECIMAL(15,2)")
+            columns.append(f"{quote_column('中位數' + measure)} DECIMAL(15,2)")
+        columns.append("[refreshed_at] DATETIME2 NOT NULL")
+
+        index_columns = ', '.join(quote_column(name) for name in INDEX_COLUMNS)
+        create_index = f"CREATE CLUSTERED INDEX [IX_{SUMMARY_TABLE}] ON [{SUMMARY_TABLE}] ({index_columns});"
+        return (
+            f"IF OBJECT_ID(N'{SUMMARY_TABLE}', N'U') IS NULL\n"
+            f"BEGIN\n"
+            f"    CREATE TABLE [{SUMMARY_TABLE}] (\n        " + ",\n        ".join(columns) + "\n    );\n"
+            f"    {create_index}\n"
+            f"END\n"
+            # 舊版以全部彙總維度為鍵建立的叢集索引改為較短的鍵
+            f"ELSE IF EXISTS (SELECT * FROM sys.index_columns ic\n"
+            f"    JOIN sys.indexes i ON i.object_id = ic.object_id AND i.index_id = ic.index_id\n"
+            f"    WHERE i.object_id = OBJECT_ID(N'{SUMMARY_TABLE}') AND i.name = N'IX_{SUMMARY_TABLE}'\n"
+            f"      AND ic.key_ordinal > {len(INDEX_COLUMNS)})\n"
+            f"BEGIN\n"
+            f"    DROP INDEX [IX_{SUMMARY_TABLE}] ON [{SUMMARY_TABLE}];\n"
+            f"    {create_index}\n"
+            f"END"
+        )
+
+    def refresh_sql(self, data_type: DataType, quarter_count: int = None) -> str:
+        """
+        產生重新計算彙總資料的 INSERT 語句
+
+        Args:
+            quarter_count: 只計算指定數量的季度（WHERE quarter IN (?, ...)）；None 時計算全部
+        """
+        source_table = self.file_mapping.get_table_name(data_type, FileType.MAIN)
+        if USE_DICTIONARY_ENCODING:
+            # 字典編碼時由檢視表取得原始文字值
+            source_table += '_decoded'
+        measures = SUMMARY_MEASURES[data_type]
+        groups = ', '.join(quote_column(name) for name in GROUP_COLUMNS)
+
+        source_columns = [groups] + [
+            f"CASE WHEN {quote_column(measure)} > 0 THEN {quote_column(measure)} END AS [m{index}]"
+            for index, measure in enumerate(measures)
+        ]
+        median_columns = ['*'] + [
+            f"PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY [m{index}]) OVER (PARTITION BY {groups}) AS [median{index}]"
+            for index in range(len(measures))
+        ]
+        target_columns = GROUP_COLUMNS + ['交易筆數']
+        select_columns = [groups, "COUNT_BIG(*)"]
+        for index, measure in enumerate(measures):
+            target_columns += ['平均' + measure, '中位數' + measure]
+            select_columns += [f"AVG([m{index}])", f"MAX([median{index}])"]
+        target_columns.append('refreshed_at')
+        select_columns.append("SYSDATETIME()")
+
+        where = ""
+        if quarter_count:
+            where = f"\n    WHERE [quarter] IN ({', '.join('?' for _ in range(quarter_count))})"
+
+        return (
+            f"WITH source AS (\n"
+            f"    SELECT {', '.join(source_columns)}\n"
+            f"    FROM [{source_table}]{where}\n"
+            f"), ranked AS (\n"
+            f"    SELECT {', '.join(median_columns)} FROM source\n"
+            f")\n"
+            f"INSERT INTO [{SUMMARY_TABLE}] ({', '.join(quote_column(name) for name in target_columns)})\n"
+            f"SELECT {', '.join(select_columns)}\n"
+            f"FROM ranked\n"
+            f"GROUP BY {groups}"
+        )
+
+    def refresh_database(self, database_name: str, quarters: Iterable[str] = None) -> bool:
+        """
+        重新計算指定季度的彙總資料（在同一個交易中刪除舊資料再寫入，查詢端不會看到不完整的季度）
+
+        Args:
+            quarters: 要重新計算的季度；None 時重建整個彙總資料表
+        """
+        data_type = self.get_data_type(database_name)
+        quarters = sorted(quarters) if quarters is not None else None
+        start_time = time.time()
+
+        conn = pyodbc.connect(self.connection_string + f"Database={database_name};")
+        try:
+            cursor = conn.cursor()
+            cursor.execute(self.create_table_sql(data_type))
+            if quarters is None:
+                cursor.execute(f"DELETE FROM [{SUMMARY_TABLE}]")
+                cursor.execute(self.refresh_sql(data_type))
+            else:
+                placeholders = ', '.join('?' for _ in quarters)
+                cursor.execute(f"DELETE FROM [{SUMMARY_TABLE}] WHERE [quarter] IN ({placeholders})", *quarters)
+                cursor.execute(self.refresh_sql(data_type, len(quarters)), *quarters)
+            rows = cursor.rowcount
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"❌ {database_name} 彙總資料更新失敗: {str(e)}")
+            return False
+        finally:
+            conn.close()
+
+        scope = ', '.join(quarters) if quarters is not None else '全部季度'
+        logger.info(f"📈 {database_name}.{SUMMARY_TABLE} 已更新 ({scope}): {rows:,} 筆，耗時 {time.time() - start_time:.1f} 秒")
+        return True
+
+    def refresh(self, quarters_by_database: Dict[str, Iterable[str]]) -> bool:
+        """重新計算多個資料庫的彙總資料 {資料庫名稱: 季度列表或 None}"""
+        results = [self.refresh_database(database_name, quarters)
+                   for database_name, quarters in quarters_by_database.items()]
+        return all(results)
+
+
+def refresh_all(database_names: List[str] = None, quarters: List[str] = None) -> bool:
+    """重新計算所有（或指定）資料庫的彙總資料"""
+    summary = PriceSummary()
+    database_names = database_names or [summary.file_mapping.get_database_name(data_type)
+                                        for data_type in SUMMARY_MEASURES]
+    return summary.refresh({database_name: quarters for database_name in database_names})
+
+
+if __name__ == "__main__":
+    import sys
+
+    setup_logging('price_summary.log')
+    # 用法: python price_summary.py [季度 ...]（不指定時重建所有季度）
+    sys.exit(0 if refresh_all(quarters=sys.argv[1:] or None) else 1)
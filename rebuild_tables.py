@@ -8,257 +8,14 @@ import pyodbc
 import logging
 from typing import Dict, List
 from config import DB_CONFIG, DATABASES
+from log_setup import setup_logging
+from schema_registry import get_schema_registry
 
-# 設定日誌
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('rebuild_tables.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
 def get_table_structures() -> Dict[str, Dict[str, List[str]]]:
-    """取得所有資料表的結構定義"""
-    
-    # 中古屋資料表結構
-    used_house_tables = {
-        'main_data': [
-            '縣市代碼 NVARCHAR(10)',
-            '縣市名稱 NVARCHAR(50)',
-            '鄉鎮市區 NVARCHAR(200)',
-            '交易標的 NVARCHAR(200)',
-            '土地位置建物門牌 NVARCHAR(500)',
-            '土地移轉總面積平方公尺 DECIMAL(15,2)',
-            '都市土地使用分區 NVARCHAR(500)',
-            '非都市土地使用分區 NVARCHAR(200)',
-            '非都市土地使用編定 NVARCHAR(200)',
-            '交易年月日 NVARCHAR(20)',
-            '交易筆棟數 INT',
-            '移轉層次 NVARCHAR(50)',
-            '總樓層數 INT',
-            '建物型態 NVARCHAR(200)',
-            '主要用途 NVARCHAR(1000)',
-            '主要建材 NVARCHAR(200)',
-            '建築完成年月 NVARCHAR(20)',
-            '建物移轉總面積平方公尺 DECIMAL(15,2)',
-            '[建物現況格局-房] INT',
-            '[建物現況格局-廳] INT',
-            '[建物現況格局-衛] INT',
-            '[建物現況格局-隔間] NVARCHAR(50)',
-            '有無管理組織 NVARCHAR(20)',
-            '總價元 DECIMAL(15,2)',
-            '單價元平方公尺 DECIMAL(15,2)',
-            '車位類別 NVARCHAR(50)',
-            '車位移轉總面積平方公尺 DECIMAL(15,2)',
-            '車位總價元 DECIMAL(15,2)',
-            '備註 NVARCHAR(1000)',
-            '編號 NVARCHAR(100)',
-            '主建物面積 DECIMAL(15,2)',
-            '附屬建物面積 DECIMAL(15,2)',
-            '陽台面積 DECIMAL(15,2)',
-            '電梯 NVARCHAR(20)',
-            '移轉編號 NVARCHAR(100)',
-            'source_file NVARCHAR(200)',
-            'quarter NVARCHAR(20)'
-        ],
-        'build_data': [
-            '編號 NVARCHAR(100)',
-            '屋齡 INT',
-            '建物移轉面積平方公尺 DECIMAL(15,2)',
-            '主要用途 NVARCHAR(1000)',
-            '主要建材 NVARCHAR(200)',
-            '建築完成日期 NVARCHAR(20)',
-            '總層數 INT',
-            '建物分層 NVARCHAR(100)',
-            '移轉情形 NVARCHAR(200)',
-            'source_file NVARCHAR(200)',
-            'quarter NVARCHAR(20)'
-        ],
-        'land_data': [
-            '編號 NVARCHAR(100)',
-            '土地位置 NVARCHAR(200)',
-            '土地移轉面積平方公尺 DECIMAL(15,2)',
-            '使用分區或編定 NVARCHAR(500)',
-            '權利人持分分母 DECIMAL(15,2)',
-            '權利人持分分子 DECIMAL(15,2)',
-            '移轉情形 NVARCHAR(200)',
-            '地號 NVARCHAR(100)',
-            'source_file NVARCHAR(200)',
-            'quarter NVARCHAR(20)'
-        ],
-        'park_data': [
-            '編號 NVARCHAR(100)',
-            '車位類別 NVARCHAR(50)',
-            '車位價格 DECIMAL(15,2)',
-            '車位面積平方公尺 DECIMAL(15,2)',
-            '車位所在樓層 NVARCHAR(50)',
-            'source_file NVARCHAR(200)',
-            'quarter NVARCHAR(20)'
-        ]
-    }
-    
-    # 預售屋資料表結構
-    presale_tables = {
-        'presale_data': [
-            '縣市代碼 NVARCHAR(10)',
-            '縣市名稱 NVARCHAR(50)',
-            '鄉鎮市區 NVARCHAR(200)',
-            '交易標的 NVARCHAR(200)',
-            '土地位置建物門牌 NVARCHAR(500)',
-            '土地移轉總面積平方公尺 DECIMAL(15,2)',
-            '都市土地使用分區 NVARCHAR(500)',
-            '非都市土地使用分區 NVARCHAR(200)',
-            '非都市土地使用編定 NVARCHAR(200)',
-            '交易年月日 NVARCHAR(20)',
-            '交易筆棟數 INT',
-            '移轉層次 NVARCHAR(50)',
-            '總樓層數 INT',
-            '建物型態 NVARCHAR(200)',
-            '主要用途 NVARCHAR(1000)',
-            '主要建材 NVARCHAR(200)',
-            '建築完成年月 NVARCHAR(20)',
-            '建物移轉總面積平方公尺 DECIMAL(15,2)',
-            '[建物現況格局-房] INT',
-            '[建物現況格局-廳] INT',
-            '[建物現況格局-衛] INT',
-            '[建物現況格局-隔間] NVARCHAR(50)',
-            '有無管理組織 NVARCHAR(20)',
-            '總價元 DECIMAL(15,2)',
-            '單價元平方公尺 DECIMAL(15,2)',
-            '車位類別 NVARCHAR(50)',
-            '車位移轉總面積平方公尺 DECIMAL(15,2)',
-            '車位總價元 DECIMAL(15,2)',
-            '備註 NVARCHAR(1000)',
-            '編號 NVARCHAR(100)',
-            '建案名稱 NVARCHAR(200)',
-            '棟及號 NVARCHAR(100)',
-            '解約情形 NVARCHAR(50)',
-            'source_file NVARCHAR(200)',
-            'quarter NVARCHAR(20)'
-        ],
-        'build_data': [
-            '編號 NVARCHAR(100)',
-            '屋齡 INT',
-            '建物移轉面積平方公尺 DECIMAL(15,2)',
-            '主要用途 NVARCHAR(1000)',
-            '主要建材 NVARCHAR(200)',
-            '建築完成日期 NVARCHAR(20)',
-            '總層數 INT',
-            '建物分層 NVARCHAR(100)',
-            '移轉情形 NVARCHAR(200)',
-            'source_file NVARCHAR(200)',
-            'quarter NVARCHAR(20)'
-        ],
-        'land_data': [
-            '編號 NVARCHAR(100)',
-            '土地位置 NVARCHAR(200)',
-            '土地移轉面積平方公尺 DECIMAL(15,2)',
-            '使用分區或編定 NVARCHAR(500)',
-            '權利人持分分母 DECIMAL(15,2)',
-            '權利人持分分子 DECIMAL(15,2)',
-            '移轉情形 NVARCHAR(200)',
-            '地號 NVARCHAR(100)',
-            'source_file NVARCHAR(200)',
-            'quarter NVARCHAR(20)'
-        ],
-        'park_data': [
-            '編號 NVARCHAR(100)',
-            '車位類別 NVARCHAR(50)',
-            '車位價格 DECIMAL(15,2)',
-            '車位面積平方公尺 DECIMAL(15,2)',
-            '車位所在樓層 NVARCHAR(50)',
-            'source_file NVARCHAR(200)',
-            'quarter NVARCHAR(20)'
-        ]
-    }
-    
-    # 租屋資料表結構
-    rental_tables = {
-        'rental_data': [
-            '縣市代碼 NVARCHAR(10)',
-            '縣市名稱 NVARCHAR(50)',
-            '鄉鎮市區 NVARCHAR(200)',
-            '交易標的 NVARCHAR(200)',
-            '土地位置建物門牌 NVARCHAR(500)',
-            '土地面積平方公尺 DECIMAL(15,2)',
-            '都市土地使用分區 NVARCHAR(500)',
-            '非都市土地使用分區 NVARCHAR(200)',
-            '非都市土地使用編定 NVARCHAR(200)',
-            '租賃年月日 NVARCHAR(20)',
-            '租賃筆棟數 INT',
-            '租賃層次 NVARCHAR(50)',
-            '總樓層數 INT',
-            '建物型態 NVARCHAR(200)',
-            '主要用途 NVARCHAR(1000)',
-            '主要建材 NVARCHAR(200)',
-            '建築完成年月 NVARCHAR(20)',
-            '建物總面積平方公尺 DECIMAL(15,2)',
-            '[建物現況格局-房] INT',
-            '[建物現況格局-廳] INT',
-            '[建物現況格局-衛] INT',
-            '[建物現況格局-隔間] NVARCHAR(50)',
-            '有無管理組織 NVARCHAR(20)',
-            '有無附傢俱 NVARCHAR(20)',
-            '總額元 DECIMAL(15,2)',
-            '單價元平方公尺 DECIMAL(15,2)',
-            '車位類別 NVARCHAR(50)',
-            '車位面積平方公尺 DECIMAL(15,2)',
-            '車位總額元 DECIMAL(15,2)',
-            '備註 NVARCHAR(1000)',
-            '編號 NVARCHAR(100)',
-            '出租型態 NVARCHAR(50)',
-            '有無管理員 NVARCHAR(20)',
-            '租賃期間 NVARCHAR(50)',
-            '有無電梯 NVARCHAR(20)',
-            '附屬設備 NVARCHAR(500)',
-            '租賃住宅服務 NVARCHAR(200)',
-            'source_file NVARCHAR(200)',
-            'quarter NVARCHAR(20)'
-        ],
-        'build_data': [
-            '編號 NVARCHAR(100)',
-            '屋齡 INT',
-            '建物移轉面積平方公尺 DECIMAL(15,2)',
-            '主要用途 NVARCHAR(1000)',
-            '主要建材 NVARCHAR(200)',
-            '建築完成日期 NVARCHAR(20)',
-            '總層數 INT',
-            '建物分層 NVARCHAR(100)',
-            '移轉情形 NVARCHAR(200)',
-            'source_file NVARCHAR(200)',
-            'quarter NVARCHAR(20)'
-        ],
-        'land_data': [
-            '編號 NVARCHAR(100)',
-            '土地位置 NVARCHAR(200)',
-            '土地移轉面積平方公尺 DECIMAL(15,2)',
-            '使用分區或編定 NVARCHAR(500)',
-            '權利人持分分母 DECIMAL(15,2)',
-            '權利人持分分子 DECIMAL(15,2)',
-            '移轉情形 NVARCHAR(200)',
-            '地號 NVARCHAR(100)',
-            'source_file NVARCHAR(200)',
-            'quarter NVARCHAR(20)'
-        ],
-        'park_data': [
-            '編號 NVARCHAR(100)',
-            '車位類別 NVARCHAR(50)',
-            '車位價格 DECIMAL(15,2)',
-            '車位面積平方公尺 DECIMAL(15,2)',
-            '車位所在樓層 NVARCHAR(50)',
-            'source_file NVARCHAR(200)',
-            'quarter NVARCHAR(20)'
-        ]
-    }
-    
-    return {
-        'used_house': used_house_tables,
-        'presale': presale_tables,
-        'rental': rental_tables
-    }
+    """取得所有資料表的結構定義，欄位定義統一來自 schema_registry"""
+    return get_schema_registry().get_table_structures()
 
 def drop_table(cursor, database_name: str, table_name: str) -> bool:
     """刪除資料表"""
@@ -381,6 +138,7 @@ def rebuild_all_tables():
         return False
 
 if __name__ == "__main__":
+    setup_logging('rebuild_tables.log')
     print("🏗️ LVR 資料表重建工具")
     print("=" * 80)
     print("⚠️ 警告：此操作將刪除所有現有資料！")
@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""
+欄位漂移檢查器
+匯入前只讀取每個 CSV 的前兩行（中文/英文標題），與 schema_registry 及資料庫實際欄位比對，
+CSV 新增的欄位自動產生 ALTER TABLE ... ADD，無法匯入的檔案在工作執行緒啟動前即排除
+"""
+
+import os
+import csv
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+import pyodbc
+
+from config import DB_CONFIG
+from file_type_mapping import FileTypeMapping, DataType, FileType
+from schema_registry import get_schema_registry, get_encoded_column_name, quote_column
+from enhanced_data_importer import CSV_ENCODINGS
+import zip_source
+
+try:
+    from config import SCHEMA_DRIFT_AUTO_ALTER
+except ImportError:
+    SCHEMA_DRIFT_AUTO_ALTER = True
+
+logger = logging.getLogger(__name__)
+
+# 未在 schema_registry 中定義的新欄位預設型別
+DEFAULT_NEW_COLUMN_TYPE = 'NVARCHAR(500)'
+
+
+def read_csv_header(file_path: str) -> Optional[List[str]]:
+    """讀取 CSV 前兩行並回傳中文標題欄位（壓縮檔成員只解壓縮開頭部分）；無法解碼時回傳 None"""
+    with zip_source.open_file(file_path) as f:
+        raw = f.readline() + f.readline()
+
+    # 與 EnhancedDataImporter.read_csv_file 相同的編碼嘗試順序；UTF-8 的 BOM 與 pandas 相同不列入欄位名稱
+    for encoding in CSV_ENCODINGS:
+        try:
+            text = raw.decode(encoding).lstrip('\ufeff')
+        except UnicodeDecodeError:
+            continue
+        rows = list(csv.reader(text.splitlines()))
+        return rows[0] if rows else None
+    return None
+
+
+class SchemaDriftChecker:
+    """匯入前的 CSV 標題檢查與資料表欄位補齊"""
+
+    def __init__(self):
+        self.connection_string = (
+            f"DRIVER={{{DB_CONFIG['driver']}}};"
+            f"SERVER={DB_CONFIG['server']};"
+            f"UID={DB_CONFIG['username']};"
+            f"PWD={DB_CONFIG['password']};"
+            f"Trusted_Connection={DB_CONFIG['trusted_connection']};"
+            f"Encrypt={DB_CONFIG['encrypt']};"
+        )
+        self.file_mapping = FileTypeMapping()
+        self.registry = get_schema_registry()
+        self._table_columns: Dict[Tuple[str, str], Optional[Set[str]]] = {}
+
+    def get_table_columns(self, database_name: str, table_name: str) -> Optional[Set[str]]:
+        """查詢資料表目前的欄位（資料表不存在時回傳 None）"""
+        key = (database_name, table_name)
+        if key not in self._table_columns:
+            conn = pyodbc.connect(self.connection_string + f"Database={database_name};")
+            try:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "SELECT COLUMN_NAME FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_NAME = ?",
+                    table_name
+                )
+                columns = {row[0] for row in cursor.fetchall()}
+            finally:
+                conn.close()
+            self._table_columns[key] = columns or None
+        return self._table_columns[key]
+
+    def scan_headers(self, file_paths: List[str]) -> Dict:
+        """
+        讀取所有檔案標題並依 (DataType, FileType) 彙整
+
+        Returns:
+            {'headers': {(data_type, file_type): {欄位: [檔案, ...]}},
+             'unknown_files': [...], 'unreadable_files': [...]}
+        """
+        headers: Dict[Tuple[DataType, FileType], Dict[str, List[str]]] = {}
+        unknown_files = []
+        unreadable_files = []
+
+        for file_path in file_paths:
+            file_type_info = self.file_mapping.get_file_type(os.path.basename(file_path))
+            if not file_type_info:
+                unknown_files.append(file_path)
+                continue
+
+            try:
+                header = read_csv_header(file_path)
+            except OSError as e:
+                logger.error(f"❌ 讀取標題失敗 {file_path}: {str(e)}")
+                header = None
+            if not header:
+                unreadable_files.append(file_path)
+                continue
+
+            columns = headers.setdefault(file_type_info, {})
+            for name in header:
+                columns.setdefault(name, []).append(file_path)
+
+        return {
+            'headers': headers,
+            'unknown_files': unknown_files,
+            'unreadable_files': unreadable_files
+        }
+
+    def check(self, file_paths: List[str]) -> Dict:
+        """
+        比對 CSV 標題與預期欄位及資料庫實際欄位
+
+        Returns:
+            {'alters': {(data_type, file_type): [(欄位, 型別), ...]},
+             'blocked_files': {檔案: 原因}, 'file_count': int}
+        """
+        scan = self.scan_headers(file_paths)
+        blocked_files = {path: '無法判斷檔案類型' for path in scan['unknown_files']}
+        blocked_files.update({path: '無法讀取 CSV 標題' for path in scan['unreadable_files']})
+        alters: Dict[Tuple[DataType, FileType], List[Tuple[str, str]]] = {}
+
+        for (data_type, file_type), header_columns in scan['headers'].items():
+            schema = self.registry.get_schema(data_type, file_type)
+            table = f"{schema.database_name}.{schema.table_name}"
+
+            try:
+                existing = self.get_table_columns(schema.database_name, schema.table_name)
+            except pyodbc.Error as e:
+                existing = None
+                logger.error(f"❌ 無法查詢 {table} 欄位: {str(e)}")
+
+            if existing is None:
+                reason = f"資料表 {table} 不存在，請先執行 rebuild_tables_with_city.py"
+                for paths in header_columns.values():
+                    blocked_files.update({path: reason for path in paths})
+                continue
+
+            additions = []
+            for name, paths in header_columns.items():
+                if name in existing or get_encoded_column_name(name) in existing:
+                    # 先前執行時已補上的欄位，同步到 schema_registry
+                    if name not in schema.csv_column_set:
+                        self.registry.add_columns(data_type, file_type, [
+                            (name, self.registry.get_column_type(name, DEFAULT_NEW_COLUMN_TYPE))
+                        ])
+                    continue
+                if not name:
+                    reason = "CSV 標題含空白欄位名稱"
+                    blocked_files.update({path: reason for path in paths})
+                    continue
+                sql_type = schema.columns_by_name[name].sql_type if name in schema.columns_by_name \
+                    else self.registry.get_column_type(name, DEFAULT_NEW_COLUMN_TYPE)
+                additions.append((name, sql_type))
+                logger.warning(f"⚠️ {table} 缺少欄位 {name} ({sql_type})，出現在 {len(paths)} 個檔案")
+
+            if additions:
+                alters[(data_type, file_type)] = additions
+
+        return {
+            'alters': alters,
+            'blocked_files': blocked_files,
+            'file_count': len(file_paths)
+        }
+
+    def generate_alter_sql(self, alters: Dict[Tuple[DataType, FileType], List[Tuple[str, str]]]) -> Dict[str, List[str]]:
+        """產生 ALTER TABLE 語句 {資料庫名稱: [SQL, ...]}"""
+        statements: Dict[str, List[str]] = {}
+        for (data_type, file_type), columns in alters.items():
+            schema = self.registry.get_schema(data_type, file_type)
+            for name, sql_type in columns:
+                statements.setdefault(schema.database_name, []).append(
+                    f"ALTER TABLE [{schema.table_name}] ADD {quote_column(name)} {sql_type}"
+                )
+        return statements
+
+    def apply_alters(self, alters: Dict[Tuple[DataType, FileType], List[Tuple[str, str]]]) -> bool:
+        """執行 ALTER TABLE 並將新欄位加入 schema_registry（供匯入時的標題驗證與 INSERT 使用）"""
+        for database_name, statements in self.generate_alter_sql(alters).items():
+            conn = pyodbc.connect(self.connection_string + f"Database={database_name};")
+            try:
+                cursor = conn.cursor()
+                for sql in statements:
+                    cursor.execute(sql)
+                    logger.info(f"🔧 {database_name}: {sql}")
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                logger.error(f"❌ {database_name} 新增欄位失敗: {str(e)}")
+                return False
+            finally:
+                conn.close()
+
+        for (data_type, file_type), columns in alters.items():
+            self.registry.add_columns(data_type, file_type, columns)
+            schema = self.registry.get_schema(data_type, file_type)
+            self._table_columns.pop((schema.database_name, schema.table_name), None)
+        return True
+
+    def save_alter_script(self, alters: Dict[Tuple[DataType, FileType], List[Tuple[str, str]]]) -> str:
+        """將產生的 ALTER TABLE 語句存檔，方便記錄與手動執行"""
+        script_file = f"schema_drift_{datetime.now().strftime('%Y%m%d_%H%M%S')}.sql"
+        with open(script_file, 'w', encoding='utf-8') as f:
+            f.write("-- 欄位漂移檢查產生的 ALTER TABLE 語句\n")
+            for database_name, statements in self.generate_alter_sql(alters).items():
+                f.write(f"\nUSE [{database_name}];\nGO\n")
+                for sql in statements:
+                    f.write(f"{sql};\n")
+                f.write("GO\n")
+        return script_file
+
+
+def run_preflight(folders: List[str], auto_alter: bool = None) -> Dict[str, str]:
+    """
+    匯入前檢查所有資料夾的 CSV 標題
+
+    Args:
+        folders: 待匯入的資料夾列表
+        auto_alter: 是否自動執行 ALTER TABLE（預設使用 config.py 中的 SCHEMA_DRIFT_AUTO_ALTER）
+
+    Returns:
+        不應匯入的檔案 {檔案路徑: 原因}
+    """
+    if auto_alter is None:
+        auto_alter = SCHEMA_DRIFT_AUTO_ALTER
+
+    file_paths = []
+    for folder in folders:
+        file_paths.extend(zip_source.list_csv_files(folder))
+
+    checker = SchemaDriftChecker()
+    report = checker.check(file_paths)
+    blocked_files = report['blocked_files']
+    alters = report['alters']
+
+    logger.info(f"🔍 標題檢查完成: {report['file_count']} 個檔案, "
+                f"{sum(len(columns) for columns in alters.values())} 個新欄位, {len(blocked_files)} 個檔案無法匯入")
+
+    if alters:
+        script_file = checker.save_alter_script(alters)
+        logger.info(f"📄 ALTER TABLE 語句已保存到: {script_file}")
+
+        if not auto_alter or not checker.apply_alters(alters):
+            # 未補齊欄位的資料表，其檔案在匯入時必定失敗
+            for (data_type, file_type), columns in alters.items():
+                names = ', '.join(name for name, _ in columns)
+                for file_path in file_paths:
+                    if checker.file_mapping.get_file_type(os.path.basename(file_path)) == (data_type, file_type):
+                        blocked_files.setdefault(file_path, f"資料表缺少欄位: {names}")
+        else:
+            logger.info("✅ 已自動新增缺少的欄位")
+
+    for file_path, reason in blocked_files.items():
+        logger.warning(f"⏭️ 略過 {file_path}: {reason}")
+
+    return blocked_files
+
+
+if __name__ == "__main__":
+    import sys
+    from log_setup import setup_logging
+
+    setup_logging()
+
+    target_folders = sys.argv[1:]
+    if not target_folders:
+        print("用法: python schema_drift_checker.py <資料夾或 ZIP 壓縮檔> [...]")
+        sys.exit(1)
+
+    checker = SchemaDriftChecker()
+    result = checker.check([
+        path for folder in target_folders for path in zip_source.list_csv_files(folder)
+    ])
+    for database_name, statements in checker.generate_alter_sql(result['alters']).items():
+        print(f"\n-- {database_name}")
+        for sql in statements:
+            print(f"{sql};")
+    for file_path, reason in result['blocked_files'].items():
+        print(f"⏭️ {file_path}: {reason}")
+    if not result['alters'] and not result['blocked_files']:
+        print("✅ 所有 CSV 標題與資料表結構一致")
@@ -0,0 +1,438 @@
+# -*- coding: utf-8 -*-
+"""
+資料表結構註冊表
+以 (DataType, FileType) 為單位集中定義所有資料表欄位，
+統一產生 DDL、資料清理計畫、參數型別 (setinputsizes) 與 CSV 標題驗證，
+其他模組不再各自維護欄位清單
+"""
+
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from file_type_mapping import FileTypeMapping, DataType, FileType
+
+# 清理計畫版本：欄位定義或清理規則（讀取型別、clean_data / arrow_csv.clean_frame）變更時遞增
+# （清理結果快取以此判斷是否失效）
+CLEANING_PLAN_VERSION = 2
+
+# 匯入時由程式補上的欄位（不在 CSV 中）
+CITY_COLUMNS = [
+    ('縣市代碼', 'NVARCHAR(10)'),
+    ('縣市名稱', 'NVARCHAR(50)'),
+]
+
+SOURCE_COLUMNS = [
+    ('source_file', 'NVARCHAR(200)'),
+    ('quarter', 'NVARCHAR(20)'),
+]
+
+# 中古屋與預售屋主要資料共用的交易欄位
+TRANSACTION_COLUMNS = [
+    ('鄉鎮市區', 'NVARCHAR(200)'),
+    ('交易標的', 'NVARCHAR(200)'),
+    ('土地位置建物門牌', 'NVARCHAR(500)'),
+    ('土地移轉總面積平方公尺', 'DECIMAL(15,2)'),
+    ('都市土地使用分區', 'NVARCHAR(500)'),
+    ('非都市土地使用分區', 'NVARCHAR(200)'),
+    ('非都市土地使用編定', 'NVARCHAR(200)'),
+    ('交易年月日', 'NVARCHAR(20)'),
+    ('交易筆棟數', 'INT'),
+    ('移轉層次', 'NVARCHAR(50)'),
+    ('總樓層數', 'INT'),
+    ('建物型態', 'NVARCHAR(200)'),
+    ('主要用途', 'NVARCHAR(1000)'),
+    ('主要建材', 'NVARCHAR(200)'),
+    ('建築完成年月', 'NVARCHAR(20)'),
+    ('建物移轉總面積平方公尺', 'DECIMAL(15,2)'),
+    ('建物現況格局-房', 'INT'),
+    ('建物現況格局-廳', 'INT'),
+    ('建物現況格局-衛', 'INT'),
+    ('建物現況格局-隔間', 'NVARCHAR(50)'),
+    ('有無管理組織', 'NVARCHAR(20)'),
+    ('總價元', 'DECIMAL(15,2)'),
+    ('單價元平方公尺', 'DECIMAL(15,2)'),
+    ('車位類別', 'NVARCHAR(50)'),
+    ('車位移轉總面積平方公尺', 'DECIMAL(15,2)'),
+    ('車位總價元', 'DECIMAL(15,2)'),
+    ('備註', 'NVARCHAR(1000)'),
+    ('編號', 'NVARCHAR(100)'),
+]
+
+USED_HOUSE_MAIN_COLUMNS = TRANSACTION_COLUMNS + [
+    ('主建物面積', 'DECIMAL(15,2)'),
+    ('附屬建物面積', 'DECIMAL(15,2)'),
+    ('陽台面積', 'DECIMAL(15,2)'),
+    ('電梯', 'NVARCHAR(20)'),
+    ('移轉編號', 'NVARCHAR(100)'),
+]
+
+PRESALE_MAIN_COLUMNS = TRANSACTION_COLUMNS + [
+    ('建案名稱', 'NVARCHAR(200)'),
+    ('棟及號', 'NVARCHAR(100)'),
+    ('解約情形', 'NVARCHAR(50)'),
+]
+
+RENTAL_MAIN_COLUMNS = [
+    ('鄉鎮市區', 'NVARCHAR(200)'),
+    ('交易標的', 'NVARCHAR(200)'),
+    ('土地位置建物門牌', 'NVARCHAR(500)'),
+    ('土地面積平方公尺', 'DECIMAL(15,2)'),
+    ('都市土地使用分區', 'NVARCHAR(500)'),
+    ('非都市土地使用分區', 'NVARCHAR(200)'),
+    ('非都市土地使用編定', 'NVARCHAR(200)'),
+    ('租賃年月日', 'NVARCHAR(20)'),
+    ('租賃筆棟數', 'INT'),
+    ('租賃層次', 'NVARCHAR(50)'),
+    ('總樓層數', 'INT'),
+    ('建物型態', 'NVARCHAR(200)'),
+    ('主要用途', 'NVARCHAR(1000)'),
+    ('主要建材', 'NVARCHAR(200)'),
+    ('建築完成年月', 'NVARCHAR(20)'),
+    ('建物總面積平方公尺', 'DECIMAL(15,2)'),
+    ('建物現況格局-房', 'INT'),
+    ('建物現況格局-廳', 'INT'),
+    ('建物現況格局-衛', 'INT'),
+    ('建物現況格局-隔間', 'NVARCHAR(50)'),
+    ('有無管理組織', 'NVARCHAR(20)'),
+    ('有無附傢俱', 'NVARCHAR(20)'),
+    ('總額元', 'DECIMAL(15,2)'),
+    ('單價元平方公尺', 'DECIMAL(15,2)'),
+    ('車位類別', 'NVARCHAR(50)'),
+    ('車位面積平方公尺', 'DECIMAL(15,2)'),
+    ('車位總額元', 'DECIMAL(15,2)'),
+    ('備註', 'NVARCHAR(1000)'),
+    ('編號', 'NVARCHAR(100)'),
+    # 112/10/21(含)之後揭露之租賃資料新增欄位
+    ('出租型態', 'NVARCHAR(50)'),
+    ('有無管理員', 'NVARCHAR(20)'),
+    ('租賃期間', 'NVARCHAR(50)'),
+    ('有無電梯', 'NVARCHAR(20)'),
+    ('附屬設備', 'NVARCHAR(500)'),
+    ('租賃住宅服務', 'NVARCHAR(200)'),
+]
+
+BUILD_COLUMNS = [
+    ('編號', 'NVARCHAR(100)'),
+    ('屋齡', 'INT'),
+    ('建物移轉面積平方公尺', 'DECIMAL(15,2)'),
+    ('主要用途', 'NVARCHAR(1000)'),
+    ('主要建材', 'NVARCHAR(200)'),
+    ('建築完成日期', 'NVARCHAR(20)'),
+    ('總層數', 'INT'),
+    ('建物分層', 'NVARCHAR(100)'),
+    ('移轉情形', 'NVARCHAR(200)'),
+]
+
+LAND_COLUMNS = [
+    ('編號', 'NVARCHAR(100)'),
+    ('土地位置', 'NVARCHAR(200)'),
+    ('土地移轉面積平方公尺', 'DECIMAL(15,2)'),
+    ('使用分區或編定', 'NVARCHAR(500)'),
+    ('權利人持分分母', 'DECIMAL(15,2)'),
+    ('權利人持分分子', 'DECIMAL(15,2)'),
+    ('移轉情形', 'NVARCHAR(200)'),
+    ('地號', 'NVARCHAR(100)'),
+]
+
+PARK_COLUMNS = [
+    ('編號', 'NVARCHAR(100)'),
+    ('車位類別', 'NVARCHAR(50)'),
+    ('車位價格', 'DECIMAL(15,2)'),
+    ('車位面積平方公尺', 'DECIMAL(15,2)'),
+    ('車位所在樓層', 'NVARCHAR(50)'),
+]
+
+# 各 (DataType, FileType) 的 CSV 欄位定義
+CSV_COLUMN_DEFINITIONS = {
+    (DataType.USED_HOUSE, FileType.MAIN): USED_HOUSE_MAIN_COLUMNS,
+    (DataType.USED_HOUSE, FileType.BUILD): BUILD_COLUMNS,
+    (DataType.USED_HOUSE, FileType.LAND): LAND_COLUMNS,
+    (DataType.USED_HOUSE, FileType.PARK): PARK_COLUMNS,
+
+    (DataType.PRESALE, FileType.MAIN): PRESALE_MAIN_COLUMNS,
+    (DataType.PRESALE, FileType.BUILD): BUILD_COLUMNS,
+    (DataType.PRESALE, FileType.LAND): LAND_COLUMNS,
+    (DataType.PRESALE, FileType.PARK): PARK_COLUMNS,
+
+    (DataType.RENTAL, FileType.MAIN): RENTAL_MAIN_COLUMNS,
+    (DataType.RENTAL, FileType.BUILD): BUILD_COLUMNS,
+    (DataType.RENTAL, FileType.LAND): LAND_COLUMNS,
+    (DataType.RENTAL, FileType.PARK): PARK_COLUMNS,
+}
+
+# 字典編碼欄位：欄位名稱 → 維度資料表名稱
+ENCODED_COLUMNS = {
+    '鄉鎮市區': 'dim_district',
+    '交易標的': 'dim_transaction_target',
+    '建物型態': 'dim_building_type',
+    '主要建材': 'dim_building_material',
+    '車位類別': 'dim_parking_type',
+    '都市土地使用分區': 'dim_urban_zoning',
+    '縣市名稱': 'dim_city'
+}
+
+# 代理鍵欄位的型別（每個欄位不同值僅數百個，SMALLINT 已足夠）
+ENCODED_KEY_TYPE = 'SMALLINT'
+
+NUMERIC_TYPE_PATTERN = re.compile(r'^(TINYINT|SMALLINT|INT|BIGINT|DECIMAL|NUMERIC|FLOAT|REAL)\b')
+LENGTH_PATTERN = re.compile(r'\((\d+|MAX)\)')
+
+
+def quote_column(name: str) -> str:
+    """以中括號包住欄位名稱（可安全處理 '建物現況格局-房' 等含特殊字元的名稱）"""
+    return f"[{name}]"
+
+
+def format_column_definition(name: str, sql_type: str) -> str:
+    """組合 '欄位名稱 型別' 定義，含特殊字元的欄位名稱加上中括號"""
+    if '-' in name:
+        name = quote_column(name)
+    return f"{name} {sql_type}"
+
+
+def get_encoded_column_name(column: str) -> str:
+    """取得字典編碼後的代理鍵欄位名稱"""
+    return f"{column}_id"
+
+
+class ColumnSpec:
+    """單一欄位定義"""
+
+    def __init__(self, name: str, sql_type: str, in_csv: bool = True):
+        self.name = name
+        self.sql_type = sql_type
+        self.in_csv = in_csv
+        self.is_numeric = bool(NUMERIC_TYPE_PATTERN.match(sql_type))
+        self.is_encodable = name in ENCODED_COLUMNS
+
+        length = LENGTH_PATTERN.search(sql_type)
+        self.max_length = int(length.group(1)) if length and length.group(1) != 'MAX' else 0
+
+    @property
+    def definition(self) -> str:
+        return format_column_definition(self.name, self.sql_type)
+
+    @property
+    def input_size(self) -> Tuple[str, int, int]:
+        """
+        參數繫結型別 (pyodbc 常數名稱, 長度, 小數位數)
+        清理後的數值一律為 float，因此數值欄位以 SQL_DOUBLE 繫結，交由伺服器轉換型別
+        """
+        if self.is_numeric:
+            return ('SQL_DOUBLE', 0, 0)
+        if self.sql_type.startswith('VARCHAR'):
+            return ('SQL_VARCHAR', self.max_length, 0)
+        return ('SQL_WVARCHAR', self.max_length, 0)
+
+    def __repr__(self):
+        return f"ColumnSpec({self.name!r}, {self.sql_type!r})"
+
+
+class TableSchema:
+    """單一 (DataType, FileType) 的資料表結構"""
+
+    def __init__(self, data_type: DataType, file_type: FileType, database_name: str,
+                 table_name: str, csv_columns: List[Tuple[str, str]]):
+        self.data_type = data_type
+        self.file_type = file_type
+        self.database_name = database_name
+        self.table_name = table_name
+
+        self.columns: List[ColumnSpec] = (
+            [ColumnSpec(name, sql_type, in_csv=False) for name, sql_type in CITY_COLUMNS] +
+            [ColumnSpec(name, sql_type) for name, sql_type in csv_columns] +
+            [ColumnSpec(name, sql_type, in_csv=False) for name, sql_type in SOURCE_COLUMNS]
+        )
+        self._build_plan()
+
+    def _build_plan(self):
+        """預先計算清理計畫與欄位索引，匯入時不再逐次建立欄位清單"""
+        self.columns_by_name: Dict[str, ColumnSpec] = {column.name: column for column in self.columns}
+        self.csv_columns: List[str] = [column.name for column in self.columns if column.in_csv]
+        self.csv_column_set = frozenset(self.csv_columns)
+        self.numeric_columns: List[str] = [column.name for column in self.columns if column.in_csv and column.is_numeric]
+        self.string_columns: List[str] = [column.name for column in self.columns if column.in_csv and not column.is_numeric]
+
+        # 編碼欄位名稱 → 原欄位定義
+        for column in self.columns:
+            if column.is_encodable:
+                self.columns_by_name[get_encoded_column_name(column.name)] = ColumnSpec(
+                    get_encoded_column_name(column.name), ENCODED_KEY_TYPE, in_csv=column.in_csv
+                )
+
+    def add_column(self, name: str, sql_type: str):
+        """
+        加入 CSV 新增的欄位（欄位漂移時由 schema_drift_checker 於匯入前呼叫）
+        新欄位排在 source_file/quarter 之前，重新產生的 DDL 仍維持來源欄位在最後
+        """
+        if name in self.columns_by_name:
+            return
+        self.columns.insert(len(self.columns) - len(SOURCE_COLUMNS), ColumnSpec(name, sql_type))
+        self._build_plan()
+        _build_input_sizes.cache_clear()
+
+    @property
+    def structure_key(self) -> str:
+        """對應 get_table_structures() 的資料庫類型鍵值"""
+        return self.data_type.value
+
+    def get_column_definitions(self, encoded: bool = False) -> List[str]:
+        """取得 '欄位名稱 型別' 定義清單（格式同 get_table_structures）"""
+        definitions = []
+        for column in self.columns:
+            if encoded and column.is_encodable:
+                definitions.append(f"{get_encoded_column_name(column.name)} {ENCODED_KEY_TYPE}")
+            else:
+                definitions.append(column.definition)
+        return definitions
+
+    def create_table_sql(self, qualified: bool = True, if_not_exists: bool = False,
+                         encoded: bool = False) -> str:
+        """產生 CREATE TABLE 語句"""
+        table = f"[{self.database_name}].[dbo].[{self.table_name}]" if qualified else f"[{self.table_name}]"
+        sql = ""
+        if if_not_exists:
+            sql += f"IF OBJECT_ID(N'{table}', N'U') IS NULL\n"
+        sql += f"CREATE TABLE {table} (\n"
+        sql += "    id INT IDENTITY(1,1) PRIMARY KEY,\n"
+        sql += ",\n".join(f"    {definition}" for definition in self.get_column_definitions(encoded))
+        sql += "\n);"
+        return sql
+
+    def get_insert_sql(self, columns: Tuple[str, ...]) -> str:
+        """取得 INSERT 語句（依欄位組合快取）"""
+        return build_insert_sql(self.table_name, columns)
+
+    def get_input_sizes(self, columns: Tuple[str, ...]) -> Optional[List[Tuple[int, int, int]]]:
+        """取得 cursor.setinputsizes() 用的參數型別；有未定義欄位時回傳 None"""
+        return _build_input_sizes(self.data_type, self.file_type, columns)
+
+    def validate_header(self, header: List[str]) -> Dict[str, List[str]]:
+        """
+        比對 CSV 標題與預期欄位
+
+        Returns:
+            {'missing': 預期但 CSV 中沒有的欄位, 'unexpected': CSV 中有但未定義的欄位}
+        """
+        header_set = set(header)
+        return {
+            'missing': [name for name in self.csv_columns if name not in header_set],
+            'unexpected': [name for name in header if name not in self.csv_column_set]
+        }
+
+
+@lru_cache(maxsize=None)
+def build_insert_sql(table_name: str, columns: Tuple[str, ...]) -> str:
+    """產生 INSERT 語句（依資料表與欄位組合快取）"""
+    column_names = ', '.join(quote_column(column) for column in columns)
+    placeholders = ', '.join('?' for _ in columns)
+    return f"INSERT INTO [{table_name}] ({column_names}) VALUES ({placeholders})"
+
+
+@lru_cache(maxsize=None)
+def _build_input_sizes(data_type: DataType, file_type: FileType,
+                       columns: Tuple[str, ...]) -> Optional[List[Tuple[int, int, int]]]:
+    import pyodbc
+
+    schema = get_schema_registry().get_schema(data_type, file_type)
+    sizes = []
+    for name in columns:
+        column = schema.columns_by_name.get(name)
+        if column is None:
+            return None
+        type_name, size, digits = column.input_size
+        sizes.append((getattr(pyodbc, type_name), size, digits))
+    return sizes
+
+
+class SchemaRegistry:
+    """資料表結構註冊表"""
+
+    def __init__(self):
+        self.file_mapping = FileTypeMapping()
+        self.schemas: Dict[Tuple[DataType, FileType], TableSchema] = {}
+        for (data_type, file_type), csv_columns in CSV_COLUMN_DEFINITIONS.items():
+            self.schemas[(data_type, file_type)] = TableSchema(
+                data_type,
+                file_type,
+                self.file_mapping.get_database_name(data_type),
+                self.file_mapping.get_table_name(data_type, file_type),
+                csv_columns
+            )
+
+        # 欄位名稱 → 型別（跨資料表，供只知道欄位名稱的舊程式使用）
+        self.column_types: Dict[str, str] = {}
+        for schema in self.schemas.values():
+            for column in schema.columns:
+                self.column_types.setdefault(column.name, column.sql_type)
+
+    def get_schema(self, data_type: DataType, file_type: FileType) -> TableSchema:
+        """取得指定 (DataType, FileType) 的資料表結構"""
+        return self.schemas[(data_type, file_type)]
+
+    def get_schema_for_file(self, filename: str) -> Optional[TableSchema]:
+        """依檔案名稱取得資料表結構"""
+        file_type_info = self.file_mapping.get_file_type(filename)
+        if not file_type_info:
+            return None
+        return self.schemas[file_type_info]
+
+    def get_schema_by_table(self, database_name: str, table_name: str) -> Optional[TableSchema]:
+        """依資料庫與資料表名稱取得資料表結構"""
+        for schema in self.schemas.values():
+            if schema.database_name == database_name and schema.table_name == table_name:
+                return schema
+        return None
+
+    def get_schemas_by_database(self, database_name: str) -> List[TableSchema]:
+        """取得指定資料庫的所有資料表結構（同名資料表只取一次）"""
+        schemas = {}
+        for schema in self.schemas.values():
+            if schema.database_name == database_name and schema.table_name not in schemas:
+                schemas[schema.table_name] = schema
+        return list(schemas.values())
+
+    def add_columns(self, data_type: DataType, file_type: FileType, columns: List[Tuple[str, str]]):
+        """為指定資料表加入新欄位 [(欄位名稱, 型別), ...]"""
+        schema = self.get_schema(data_type, file_type)
+        for name, sql_type in columns:
+            schema.add_column(name, sql_type)
+            self.column_types.setdefault(name, sql_type)
+
+    def get_column_type(self, column_name: str, default: str = 'NVARCHAR(255)') -> str:
+        """依欄位名稱取得型別"""
+        return self.column_types.get(column_name, default)
+
+    def get_numeric_columns(self, file_type: FileType, data_type: DataType = None) -> List[str]:
+        """取得數值欄位；未指定資料類型時回傳該檔案類型在所有資料類型中的數值欄位聯集"""
+        if data_type is not None:
+            return self.get_schema(data_type, file_type).numeric_columns
+
+        columns = []
+        for (dt, ft), schema in self.schemas.items():
+            if ft == file_type:
+                columns.extend(name for name in schema.numeric_columns if name not in columns)
+        return columns
+
+    def get_table_structures(self, encoded: bool = False) -> Dict[str, Dict[str, List[str]]]:
+        """產生 {'used_house': {'main_data': ['欄位 型別', ...]}} 格式的結構定義"""
+        structures = {}
+        for schema in self.schemas.values():
+            tables = structures.setdefault(schema.structure_key, {})
+            if schema.table_name not in tables:
+                tables[schema.table_name] = schema.get_column_definitions(encoded)
+        return structures
+
+
+@lru_cache(maxsize=None)
+def get_schema_registry() -> SchemaRegistry:
+    """取得共用的資料表結構註冊表"""
+    return SchemaRegistry()
+
+
+if __name__ == "__main__":
+    registry = get_schema_registry()
+    for (data_type, file_type), schema in registry.schemas.items():
+        print(f"{schema.database_name}.{schema.table_name:<14} ({data_type.value}/{file_type.value}): "
+              f"{len(schema.csv_columns)} 個CSV欄位, 數值欄位 {len(schema.numeric_columns)} 個")
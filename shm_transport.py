@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+共享記憶體傳遞
+子程序解析、清理後的 DataFrame 原本以 pickle 經由程序池傳回（逐個 Python 字串物件序列化再重建），
+此模組改為由主程序為每個工作配置一塊 multiprocessing.shared_memory，子程序把清理結果以 Arrow IPC 格式
+直接寫入該記憶體，經由程序池只傳回寫入的位元組數；主程序以 pyarrow 直接在共享記憶體上建立欄位（不複製），
+組成 INSERT 參數列時才由緩衝區轉為 Python 值
+
+共享記憶體由主程序建立與刪除（Windows 的具名共享記憶體在最後一個控制代碼關閉時即消失，
+因此不能由子程序建立後關閉）；資料超過配置大小時，該工作改以 pickle 傳回。
+刪除時欄位仍參照共享記憶體的 SharedMemory 由本模組保留，之後建立新的共享記憶體或程序結束時再關閉
+"""
+
+import os
+import atexit
+import logging
+import threading
+from multiprocessing import resource_tracker, shared_memory
+from typing import List, Optional
+
+import pandas as pd
+import pyarrow as pa
+
+logger = logging.getLogger(__name__)
+
+TRANSPORTS = ('shared_memory', 'pickle')
+
+# 已刪除名稱、但仍有欄位參照而無法關閉的共享記憶體（由本模組持有，參照釋放後才關閉）
+_unclosed: List[shared_memory.SharedMemory] = []
+_unclosed_lock = threading.Lock()
+
+
+def _try_close(shm: shared_memory.SharedMemory) -> bool:
+    """關閉共享記憶體的對應；仍有緩衝區參照時回傳 False"""
+    try:
+        shm.close()
+    except BufferError:
+        return False
+    return True
+
+
+def close_released():
+    """關閉先前刪除時仍有參照、現在已沒有參照的共享記憶體"""
+    with _unclosed_lock:
+        _unclosed[:] = [shm for shm in _unclosed if not _try_close(shm)]
+
+
+atexit.register(close_released)
+
+
+def start_tracker():
+    """
+    建立程序池前呼叫：先啟動主程序的 resource_tracker，讓子程序繼承共用
+    （否則子程序附加共享記憶體時會啟動自己的 tracker，結束時把主程序已刪除的共享記憶體視為洩漏）
+    """
+    if os.name == 'posix':
+        resource_tracker.ensure_running()
+
+
+def _write_stream(target, table: pa.Table):
+    """將資料表以 Arrow IPC 寫入記憶體區塊（在獨立的函數中，返回後不再參照共享記憶體）"""
+    stream = pa.FixedSizeBufferWriter(pa.py_buffer(target))
+    with pa.ipc.new_stream(stream, table.schema) as writer:
+        writer.write_table(table)
+    stream.close()
+
+
+def write_frame(name: str, df: pd.DataFrame) -> Optional[int]:
+    """
+    子程序：將清理後的 DataFrame（pandas 或 Arrow 欄位）以 Arrow IPC 寫入主程序配置的共享記憶體
+    （子程序與主程序共用同一個 resource_tracker，附加時的重複登記不影響主程序刪除）
+
+    Returns:
+        寫入的位元組數；超過配置大小時回傳 None（由呼叫端改以 pickle 傳回）
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.MockOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        if sink.size() > shm.size:
+            return None
+        _write_stream(shm.buf, table)
+        return sink.size()
+    finally:
+        shm.close()
+
+
+class SharedSlot:
+    """主程序配置給單一工作的共享記憶體"""
+
+    def __init__(self, size: int):
+        close_released()
+        self._shm: Optional[shared_memory.SharedMemory] = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        self.name = self._shm.name
+        self.size = self._shm.size
+
+    def read_frame(self, written: int, arrow_dtypes: bool = True) -> pd.DataFrame:
+        """
+        讀取子程序寫入的資料
+
+        Args:
+            written: 子程序回傳的位元組數
+            arrow_dtypes: True 時欄位為 pd.ArrowDtype（不複製，直接參照共享記憶體）；
+                          False 時轉為一般 pandas 型別（複製）
+        """
+        table = pa.ipc.open_stream(pa.py_buffer(self._shm.buf)[:written]).read_all()
+        if arrow_dtypes:
+            return table.to_pandas(types_mapper=pd.ArrowDtype)
+        return table.to_pandas()
+
+    def release(self) -> bool:
+        """
+        刪除共享記憶體；仍有欄位參照時只刪除名稱，SharedMemory 交由本模組保留，
+        最後的 Arrow 緩衝區釋放後由 close_released 關閉並回收記憶體
+
+        Returns:
+            是否已立即關閉對應
+        """
+        if self._shm is None:
+            return True
+        shm, self._shm = self._shm, None
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+        if _try_close(shm):
+            return True
+        # 呼叫端仍持有參照此記憶體的欄位：保留 SharedMemory 物件（不能在仍有參照時被回收），稍後再關閉
+        with _unclosed_lock:
+            _unclosed.append(shm)
+        return False
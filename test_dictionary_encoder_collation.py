@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+測試字典編碼維度資料表的定序
+只差在大小寫或全半形的文字值（'Ａ' 與 'A'、'a' 與 'A'）必須取得不同的代碼，
+編碼時不會因資料庫定序視為相同而查不到新值（KeyError）。
+使用 TESTCOLLATE 開頭的測試值，結束後刪除
+
+用法: python test_dictionary_encoder_collation.py
+"""
+
+import sys
+
+import pyodbc
+
+from log_setup import setup_logging
+from file_type_mapping import FileTypeMapping, DataType
+from schema_registry import ENCODED_COLUMNS
+from dictionary_encoder import DictionaryEncoder, create_dimension_tables
+
+COLUMN = '建物型態'
+VALUE_PREFIX = 'TESTCOLLATE'
+# 半形、全形、小寫、全形小寫
+TEST_VALUES = [VALUE_PREFIX + suffix for suffix in ('A', 'Ａ', 'a', 'ａ')]
+
+
+def cleanup(conn):
+    """刪除測試值"""
+    cursor = conn.cursor()
+    cursor.execute(f"DELETE FROM [{ENCODED_COLUMNS[COLUMN]}] WHERE value LIKE ?", VALUE_PREFIX + '%')
+    conn.commit()
+    DictionaryEncoder.clear_cache()
+
+
+def run_width_and_case_distinct_values() -> bool:
+    """大小寫與全半形不同的值各自取得代碼"""
+    print("🧪 測試維度資料表區分大小寫與全半形")
+    print("=" * 80)
+
+    database_name = FileTypeMapping().get_database_name(DataType.USED_HOUSE)
+    encoder = DictionaryEncoder(database_name)
+    conn = pyodbc.connect(encoder.connection_string, autocommit=True)
+    create_dimension_tables(conn.cursor())
+    conn.autocommit = False
+    cleanup(conn)
+
+    passed = True
+    try:
+        # 逐一編碼：每個值都在前一個值已寫入維度資料表之後才出現
+        codes = {}
+        for value in TEST_VALUES:
+            try:
+                codes[value] = encoder.encode_value(COLUMN, value)
+            except KeyError:
+                print(f"❌ {value!r} 編碼失敗：維度資料表將其視為已存在的值")
+                passed = False
+
+        if passed:
+            # 清除快取後一次編碼全部的值，代碼需與資料庫中的對應一致
+            DictionaryEncoder.clear_cache()
+            reloaded = encoder.encode_values(COLUMN, TEST_VALUES)
+            if len(set(codes.values())) != len(TEST_VALUES) or reloaded != codes:
+                print(f"❌ 代碼對應不正確: {codes}（重新載入 {reloaded}）")
+                passed = False
+            else:
+                print(f"✅ {len(TEST_VALUES)} 個值各自取得不同代碼")
+    finally:
+        cleanup(conn)
+        conn.close()
+
+    return passed
+
+
+def test_width_and_case_distinct_values():
+    assert run_width_and_case_distinct_values()
+
+
+if __name__ == "__main__":
+    setup_logging('test_dictionary_encoder_collation.log')
+    sys.exit(0 if run_width_and_case_distinct_values() else 1)
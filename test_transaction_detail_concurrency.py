@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+測試交易明細的同時更新
+同一縣市的主檔與建物 / 土地 / 車位附表（編號 相同）由不同執行緒同時寫入，
+確認每個檔案都匯入成功（沒有死結或重複建立物件的錯誤），且明細表的各類欄位都已更新。
+使用 TESTDETAIL 開頭的測試編號，結束後刪除測試資料
+
+用法: python test_transaction_detail_concurrency.py [回合數]（預設 10）
+"""
+
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pyodbc
+
+from log_setup import setup_logging
+from file_type_mapping import FileTypeMapping, DataType, FileType
+from enhanced_data_importer import EnhancedDataImporter
+from transaction_detail import DETAIL_TABLE
+
+CITY_CODE = 'a'
+CITY_NAME = '臺北市'
+SERIAL_PREFIX = 'TESTDETAIL'
+TEST_QUARTER = 'TEST'
+ROWS_PER_FILE = 50
+FILE_TYPES = [FileType.MAIN, FileType.BUILD, FileType.LAND, FileType.PARK]
+
+
+def _import(importer, database_name: str, table_name: str, df: pd.DataFrame, source_file: str, city_name) -> bool:
+    return importer.insert_data_batch(database_name, table_name, df, source_file, TEST_QUARTER,
+                                      CITY_CODE, city_name)
+
+
+def cleanup(conn, file_mapping: FileTypeMapping):
+    """刪除測試資料列與明細"""
+    cursor = conn.cursor()
+    for file_type in FILE_TYPES:
+        table_name = file_mapping.get_table_name(DataType.USED_HOUSE, file_type)
+        cursor.execute(f"DELETE FROM [{table_name}] WHERE [quarter] = ? AND [編號] LIKE ?",
+                       TEST_QUARTER, SERIAL_PREFIX + '%')
+    cursor.execute(f"DELETE FROM [{DETAIL_TABLE}] WHERE [縣市代碼] = ? AND [編號] LIKE ?",
+                   CITY_CODE, SERIAL_PREFIX + '%')
+    conn.commit()
+
+
+def run_same_city_concurrent_files(rounds: int = 10) -> bool:
+    """同一縣市的四種檔案同時匯入 rounds 回合"""
+    print("🧪 測試同一縣市的主檔與附表同時匯入")
+    print("=" * 80)
+
+    file_mapping = FileTypeMapping()
+    database_name = file_mapping.get_database_name(DataType.USED_HOUSE)
+    importer = EnhancedDataImporter(use_cleaned_cache=False)
+    city_name = CITY_NAME
+    if importer.use_dictionary_encoding:
+        from dictionary_encoder import DictionaryEncoder
+        city_name = DictionaryEncoder(database_name).encode_value('縣市名稱', CITY_NAME)
+    conn = pyodbc.connect(importer.connection_string + f"Database={database_name};")
+    cleanup(conn, file_mapping)
+
+    passed = True
+    try:
+        with ThreadPoolExecutor(max_workers=len(FILE_TYPES)) as executor:
+            for round_number in range(rounds):
+                serials = [f"{SERIAL_PREFIX}{round_number:04d}{index:06d}" for index in range(ROWS_PER_FILE)]
+                futures = {
+                    file_type: executor.submit(
+                        _import, importer, database_name,
+                        file_mapping.get_table_name(DataType.USED_HOUSE, file_type),
+                        pd.DataFrame({'編號': serials}),
+                        f"a_lvr_land_a_test_{file_type.value}_{round_number}.csv", city_name
+                    )
+                    for file_type in FILE_TYPES
+                }
+                failed = [file_type.value for file_type, future in futures.items() if not future.result()]
+                if failed:
+                    print(f"❌ 第 {round_number + 1} 回合匯入失敗: {', '.join(failed)}")
+                    passed = False
+
+        cursor = conn.cursor()
+        cursor.execute(
+            f"SELECT COUNT(*), SUM(CASE WHEN main_id IS NOT NULL AND [建物筆數] = 1 AND [土地筆數] = 1 "
+            f"AND [車位數] = 1 THEN 1 ELSE 0 END) FROM [{DETAIL_TABLE}] WHERE [縣市代碼] = ? AND [編號] LIKE ?",
+            CITY_CODE, SERIAL_PREFIX + '%'
+        )
+        total, complete = cursor.fetchone()
+        conn.commit()
+        expected = rounds * ROWS_PER_FILE
+        if total != expected or complete != expected:
+            print(f"❌ 明細表: {total} 筆，其中 {complete} 筆各類欄位完整（預期 {expected} 筆）")
+            passed = False
+        else:
+            print(f"✅ {rounds} 回合皆成功，明細表 {total} 筆各類欄位完整")
+    finally:
+        cleanup(conn, file_mapping)
+        conn.close()
+
+    return passed
+
+
+def test_same_city_concurrent_files():
+    assert run_same_city_concurrent_files()
+
+
+if __name__ == "__main__":
+    setup_logging('test_transaction_detail_concurrency.log')
+    sys.exit(0 if run_same_city_concurrent_files(int(sys.argv[1]) if len(sys.argv) > 1 else 10) else 1)
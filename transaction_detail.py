@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+"""
+交易明細整合表
+主要資料與建物 / 土地 / 車位附表只以 編號 關聯，查詢單筆交易的明細原本需要分別掃描三個附表；
+每個資料庫維護一個以 (縣市代碼, 編號) 為叢集主鍵的 transaction_detail 資料表，
+彙總附表資訊（建物筆數與最高樓層、土地面積與持分、車位數與總價）並以 JSON 保存各附表的原始明細，
+查詢單筆交易只需一次索引搜尋
+
+匯入器在每個檔案的資料提交後，以獨立的短交易 MERGE 更新該檔案涉及的 編號（只更新該檔案類型負責的欄位）：
+同一縣市的主檔與附表由不同執行緒寫入時 編號 相同，明細更新以縣市為單位的應用程式鎖依序執行，
+不持有資料交易的鎖，也不互相死結。明細表與索引在匯入開始前以自動認可的連線建立（ensure_table），
+各檔案的交易中不執行 DDL
+"""
+
+import time
+import logging
+from typing import Dict, List, Optional
+
+import pyodbc
+
+from config import DB_CONFIG
+from log_setup import setup_logging
+from file_type_mapping import FileTypeMapping, DataType, FileType
+from schema_registry import get_schema_registry, quote_column
+
+try:
+    from config import USE_DICTIONARY_ENCODING
+except ImportError:
+    USE_DICTIONARY_ENCODING = False
+
+logger = logging.getLogger(__name__)
+
+DETAIL_TABLE = 'transaction_detail'
+KEY_COLUMNS = ['縣市代碼', '編號']
+
+# 各檔案類型在明細表中負責的欄位: (欄位名稱, 型別, 彙總運算式)
+DETAIL_COLUMNS = {
+    FileType.MAIN: [
+        ('main_id', 'INT', "MAX([id])"),
+        ('quarter', 'NVARCHAR(20)', "MAX([quarter])"),
+    ],
+    FileType.BUILD: [
+        ('建物筆數', 'INT', "COUNT(*)"),
+        ('建物移轉面積合計', 'DECIMAL(15,2)', "SUM([建物移轉面積平方公尺])"),
+        ('建物最高總層數', 'INT', "MAX([總層數])"),
+    ],
+    FileType.LAND: [
+        ('土地筆數', 'INT', "COUNT(*)"),
+        ('土地移轉面積合計', 'DECIMAL(15,2)', "SUM([土地移轉面積平方公尺])"),
+        ('土地持分面積合計', 'DECIMAL(15,2)',
+         "SUM([土地移轉面積平方公尺] * [權利人持分分子] / NULLIF([權利人持分分母], 0))"),
+    ],
+    FileType.PARK: [
+        ('車位數', 'INT', "COUNT(*)"),
+        ('車位價格合計', 'DECIMAL(15,2)', "SUM([車位價格])"),
+        ('車位面積合計', 'DECIMAL(15,2)', "SUM([車位面積平方公尺])"),
+    ],
+}
+
+# 以 JSON 保存原始明細的欄位
+JSON_COLUMNS = {
+    FileType.BUILD: '建物明細',
+    FileType.LAND: '土地明細',
+    FileType.PARK: '車位明細',
+}
+
+
+def create_table_sql() -> str:
+    """產生明細表的 CREATE TABLE 語句（已存在時不重建）"""
+    columns = ["[縣市代碼] NVARCHAR(10) NOT NULL", "[編號] NVARCHAR(100) NOT NULL"]
+    for file_type, definitions in DETAIL_COLUMNS.items():
+        columns += [f"{quote_column(name)} {sql_type}" for name, sql_type, _ in definitions]
+        if file_type in JSON_COLUMNS:
+            columns.append(f"{quote_column(JSON_COLUMNS[file_type])} NVARCHAR(MAX)")
+    columns.append("[updated_at] DATETIME2 NOT NULL")
+    columns.append(f"CONSTRAINT [PK_{DETAIL_TABLE}] PRIMARY KEY CLUSTERED ([縣市代碼], [編號])")
+    return (
+        f"IF OBJECT_ID(N'{DETAIL_TABLE}', N'U') IS NULL\n"
+        f"    CREATE TABLE [{DETAIL_TABLE}] (\n        " + ",\n        ".join(columns) + "\n    );"
+    )
+
+
+def key_index_sql(table_name: str) -> str:
+    """
+    產生來源資料表 (縣市代碼, 編號) 索引的建立語句（已存在時略過）
+    包含 source_file / quarter，取得單一檔案涉及的 編號 時不需回查資料表
+    """
+    index_name = f"IX_{table_name}_city_serial"
+    return (
+        f"IF NOT EXISTS (SELECT 1 FROM sys.indexes WHERE name = N'{index_name}' AND object_id = OBJECT_ID(N'{table_name}'))\n"
+        f"    CREATE INDEX [{index_name}] ON [{table_name}] ([縣市代碼], [編號]) INCLUDE ([source_file], [quarter]);"
+    )
+
+
+class TransactionDetail:
+    """單一資料類型（資料庫）的交易明細整合表維護"""
+
+    def __init__(self, data_type: DataType):
+        self.data_type = data_type
+        self.file_mapping = FileTypeMapping()
+        self.registry = get_schema_registry()
+        self.database_name = self.file_mapping.get_database_name(data_type)
+        self.connection_string = (
+            f"DRIVER={{{DB_CONFIG['driver']}}};"
+            f"SERVER={DB_CONFIG['server']};"
+            f"UID={DB_CONFIG['username']};"
+            f"PWD={DB_CONFIG['password']};"
+            f"Trusted_Connection={DB_CONFIG['trusted_connection']};"
+            f"Encrypt={DB_CONFIG['encrypt']};"
+            f"Database={self.database_name};"
+        )
+
+    def ensure_table(self, cursor):
+        """
+        建立明細表與各來源資料表的 (縣市代碼, 編號) 索引（已存在時不變更）
+        DDL 需要各資料表的結構修改鎖，須在自動認可的連線中、匯入的資料交易開始前執行
+        """
+        cursor.execute(create_table_sql())
+        for file_type in DETAIL_COLUMNS:
+            cursor.execute(key_index_sql(self.file_mapping.get_table_name(self.data_type, file_type)))
+
+    def json_columns(self, file_type: FileType) -> List[str]:
+        """JSON 明細中保存的欄位（CSV 欄位，不含 編號）"""
+        schema = self.registry.get_schema(self.data_type, file_type)
+        return [name for name in schema.csv_columns if name != '編號']
+
+    def merge_sql(self, file_type: FileType, single_file: bool = True) -> str:
+        """
+        產生以 MERGE 更新明細表的語句
+
+        Args:
+            single_file: True 時只更新指定檔案涉及的 編號（參數: 縣市代碼, source_file, quarter）；
+                         False 時更新資料表中所有的 編號
+        """
+        table_name = self.file_mapping.get_table_name(self.data_type, file_type)
+        # 字典編碼時由檢視表取得原始文字值
+        source_name = f"{table_name}_decoded" if USE_DICTIONARY_ENCODING else table_name
+        definitions = DETAIL_COLUMNS[file_type]
+
+        select_columns = ["c.[縣市代碼]", "c.[編號]"] + [
+            f"{expression} AS {quote_column(name)}" for name, _, expression in definitions
+        ]
+        target_columns = [name for name, _, _ in definitions]
+        if file_type in JSON_COLUMNS:
+            json_select = ', '.join(f"d.{quote_column(name)}" for name in self.json_columns(file_type))
+            select_columns.append(
+                f"(SELECT {json_select} FROM [{source_name}] d "
+                f"WHERE d.[縣市代碼] = c.[縣市代碼] AND d.[編號] = c.[編號] "
+                f"ORDER BY d.[id] FOR JSON PATH) AS {quote_column(JSON_COLUMNS[file_type])}"
+            )
+            target_columns.append(JSON_COLUMNS[file_type])
+
+        where = "WHERE [編號] IS NOT NULL"
+        if single_file:
+            where += " AND [縣市代碼] = ? AND [source_file] = ? AND [quarter] = ?"
+
+        update_list = ', '.join(f"t.{quote_column(name)} = s.{quote_column(name)}" for name in target_columns)
+        insert_columns = KEY_COLUMNS + target_columns
+        return (
+            f"WITH keys AS (\n"
+            f"    SELECT DISTINCT [縣市代碼], [編號] FROM [{table_name}] {where}\n"
+            f")\n"
+            f"MERGE [{DETAIL_TABLE}] WITH (HOLDLOCK) AS t\n"
+            f"USING (\n"
+            f"    SELECT {', '.join(select_columns)}\n"
+            f"    FROM [{source_name}] c\n"
+            f"    JOIN keys k ON k.[縣市代碼] = c.[縣市代碼] AND k.[編號] = c.[編號]\n"
+            f"    GROUP BY c.[縣市代碼], c.[編號]\n"
+            f") AS s\n"
+            f"ON t.[縣市代碼] = s.[縣市代碼] AND t.[編號] = s.[編號]\n"
+            f"WHEN MATCHED THEN UPDATE SET {update_list}, t.[updated_at] = SYSDATETIME()\n"
+            f"WHEN NOT MATCHED THEN INSERT ({', '.join(quote_column(name) for name in insert_columns)}, [updated_at])\n"
+            f"    VALUES ({', '.join('s.' + quote_column(name) for name in insert_columns)}, SYSDATETIME());"
+        )
+
+    def refresh_file(self, conn, file_type: FileType, city_code: str, source_file: str, quarter: str) -> int:
+        """
+        更新單一檔案涉及的 編號，回傳筆數
+        由匯入器在檔案的資料提交後呼叫，以 conn 執行獨立的短交易並提交（失敗時復原後引發例外）；
+        同一縣市的更新以連線層級的應用程式鎖依序執行（MERGE 的範圍鎖只持有到這個短交易提交）
+        """
+        cursor = conn.cursor()
+        resource = f"{DETAIL_TABLE}:{city_code}"
+        cursor.execute("EXEC sp_getapplock @Resource = ?, @LockMode = 'Exclusive', @LockOwner = 'Session'", resource)
+        try:
+            cursor.execute(self.merge_sql(file_type), city_code, source_file, quarter)
+            rows = cursor.rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.execute("EXEC sp_releaseapplock @Resource = ?, @LockOwner = 'Session'", resource)
+        return rows
+
+    def rebuild(self) -> bool:
+        """依目前資料表內容重建整個明細表（例如手動刪除附表資料之後）"""
+        start_time = time.time()
+        try:
+            setup_conn = pyodbc.connect(self.connection_string, autocommit=True)
+            try:
+                self.ensure_table(setup_conn.cursor())
+            finally:
+                setup_conn.close()
+        except Exception as e:
+            logger.error(f"❌ {self.database_name}.{DETAIL_TABLE} 建立失敗: {str(e)}")
+            return False
+
+        conn = pyodbc.connect(self.connection_string)
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f"DELETE FROM [{DETAIL_TABLE}]")
+            for file_type in DETAIL_COLUMNS:
+                cursor.execute(self.merge_sql(file_type, single_file=False))
+            cursor.execute(f"SELECT COUNT_BIG(*) FROM [{DETAIL_TABLE}]")
+            rows = cursor.fetchone()[0]
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"❌ {self.database_name}.{DETAIL_TABLE} 重建失敗: {str(e)}")
+            return False
+        finally:
+            conn.close()
+
+        logger.info(f"🧩 {self.database_name}.{DETAIL_TABLE} 已重建: {rows:,} 筆，耗時 {time.time() - start_time:.1f} 秒")
+        return True
+
+    def get(self, city_code: str, serial: str) -> Optional[Dict]:
+        """以 (縣市代碼, 編號) 取得單筆交易明細（叢集索引搜尋）"""
+        conn = pyodbc.connect(self.connection_string)
+        try:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT * FROM [{DETAIL_TABLE}] WHERE [縣市代碼] = ? AND [編號] = ?",
+                           city_code.lower(), serial)
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            return {description[0]: value for description, value in zip(cursor.description, row)}
+        finally:
+            conn.close()
+
+
+def rebuild_all(data_types: List[DataType] = None) -> bool:
+    """重建所有（或指定）資料類型的明細表"""
+    data_types = data_types or [DataType.USED_HOUSE, DataType.PRESALE, DataType.RENTAL]
+    results = [TransactionDetail(data_type).rebuild() for data_type in data_types]
+    return all(results)
+
+
+if __name__ == "__main__":
+    import sys
+
+    setup_logging('transaction_detail.log')
+    # 用法: python transaction_detail.py [used_house|presale|rental ...]（不指定時重建全部）
+    sys.exit(0 if rebuild_all([DataType(value) for value in sys.argv[1:]] or None) else 1)
@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+"""
+交易資料查詢
+以型別化的篩選條件查詢中古屋 / 預售屋 / 租屋主要資料，條件全部轉為參數化 SQL 在資料庫端過濾，
+以 id 做 keyset 分頁（WHERE id > ? ORDER BY id，不使用 OFFSET），結果可逐頁取得 pandas DataFrame 或 Arrow 資料
+
+範例（臺北市、最近 4 季、2~3 房的中古屋）:
+    query = TransactionQuery(DataType.USED_HOUSE)
+    criteria = TransactionFilter(cities=['臺北市'], quarters=query.latest_quarters(4), rooms_min=2, rooms_max=3)
+    for df in query.iter_dataframes(criteria):
+        ...
+"""
+
+import re
+import logging
+from datetime import date
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import pyodbc
+
+from config import DB_CONFIG
+from file_type_mapping import FileTypeMapping, DataType, FileType
+from city_code_mapping import CityCodeMapping
+from schema_registry import quote_column
+
+try:
+    from config import USE_DICTIONARY_ENCODING
+except ImportError:
+    USE_DICTIONARY_ENCODING = False
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 10000
+
+# 各資料類型中意義相同但名稱不同的欄位
+FIELD_COLUMNS = {
+    DataType.USED_HOUSE: {'date': '交易年月日', 'price': '總價元', 'area': '建物移轉總面積平方公尺'},
+    DataType.PRESALE: {'date': '交易年月日', 'price': '總價元', 'area': '建物移轉總面積平方公尺'},
+    DataType.RENTAL: {'date': '租賃年月日', 'price': '總額元', 'area': '建物總面積平方公尺'},
+}
+
+# 未指定欄位時回傳的欄位（{date} 等依資料類型代換）
+DEFAULT_COLUMNS = ['id', '縣市代碼', '縣市名稱', '鄉鎮市區', '{date}', '建物型態', '{price}', '單價元平方公尺',
+                   '{area}', '建物現況格局-房', '建物現況格局-廳', '建物現況格局-衛', 'quarter']
+
+# 查詢常用的索引：縣市 + 季度（id 為叢集索引鍵，分頁排序不需額外排序）
+QUERY_INDEXES = {
+    'IX_{table}_city_quarter': ['縣市代碼', 'quarter'],
+}
+
+QUARTER_PATTERN = re.compile(r'^\d{3}Q[1-4]$')
+
+
+def to_roc_date(value: date) -> str:
+    """西元日期 → 資料中使用的民國年月日字串（例如 2024-01-05 → '1130105'）"""
+    return f"{value.year - 1911:03d}{value.month:02d}{value.day:02d}"
+
+
+class TransactionFilter:
+    """
+    查詢條件（所有條件皆為 AND；未指定的條件不過濾）
+
+    Args:
+        cities: 縣市代碼（a、f…）或縣市名稱（臺北市…）
+        districts: 鄉鎮市區
+        quarters: 季度（匯入時的資料夾名稱，例如 114Q1）
+        date_from / date_to: 交易（租賃）日期範圍（含）
+        price_min / price_max: 總價元（租屋為總額元）範圍
+        unit_price_min / unit_price_max: 單價元平方公尺範圍
+        building_types: 建物型態（完整名稱，例如 '住宅大樓(11層含以上有電梯)'）
+        rooms_min / rooms_max: 建物現況格局-房 範圍
+    """
+
+    def __init__(self, cities: List[str] = None, districts: List[str] = None, quarters: List[str] = None,
+                 date_from: date = None, date_to: date = None,
+                 price_min: float = None, price_max: float = None,
+                 unit_price_min: float = None, unit_price_max: float = None,
+                 building_types: List[str] = None, rooms_min: int = None, rooms_max: int = None):
+        self.cities = cities
+        self.districts = districts
+        self.quarters = quarters
+        self.date_from = date_from
+        self.date_to = date_to
+        self.price_min = price_min
+        self.price_max = price_max
+        self.unit_price_min = unit_price_min
+        self.unit_price_max = unit_price_max
+        self.building_types = building_types
+        self.rooms_min = rooms_min
+        self.rooms_max = rooms_max
+
+    def to_sql(self, data_type: DataType) -> Tuple[List[str], List]:
+        """轉換為 WHERE 條件與參數（條件欄位直接比較，不包函數，可使用索引）"""
+        fields = FIELD_COLUMNS[data_type]
+        conditions: List[str] = []
+        params: List = []
+
+        def add_in(column: str, values: Optional[List]):
+            if values:
+                conditions.append(f"{quote_column(column)} IN ({', '.join('?' for _ in values)})")
+                params.extend(values)
+
+        def add_range(column: str, minimum, maximum):
+            if minimum is not None:
+                conditions.append(f"{quote_column(column)} >= ?")
+                params.append(minimum)
+            if maximum is not None:
+                conditions.append(f"{quote_column(column)} <= ?")
+                params.append(maximum)
+
+        if self.cities:
+            city_mapping = CityCodeMapping()
+            add_in('縣市代碼', [city_mapping.get_city_code(city) or city.lower() for city in self.cities])
+        add_in('quarter', self.quarters)
+        add_in('鄉鎮市區', self.districts)
+        add_in('建物型態', self.building_types)
+        add_range(fields['date'],
+                  to_roc_date(self.date_from) if self.date_from else None,
+                  to_roc_date(self.date_to) if self.date_to else None)
+        add_range(fields['price'], self.price_min, self.price_max)
+        add_range('單價元平方公尺', self.unit_price_min, self.unit_price_max)
+        add_range('建物現況格局-房', self.rooms_min, self.rooms_max)
+        return conditions, params
+
+
+class TransactionQuery:
+    """單一資料類型（中古屋 / 預售屋 / 租屋）主要資料的查詢"""
+
+    def __init__(self, data_type: DataType = DataType.USED_HOUSE):
+        self.data_type = data_type
+        file_mapping = FileTypeMapping()
+        self.database_name = file_mapping.get_database_name(data_type)
+        self.table_name = file_mapping.get_table_name(data_type, FileType.MAIN)
+        # 字典編碼時由檢視表取得原始文字值
+        self.source_name = f"{self.table_name}_decoded" if USE_DICTIONARY_ENCODING else self.table_name
+        self.connection_string = (
+            f"DRIVER={{{DB_CONFIG['driver']}}};"
+            f"SERVER={DB_CONFIG['server']};"
+            f"UID={DB_CONFIG['username']};"
+            f"PWD={DB_CONFIG['password']};"
+            f"Trusted_Connection={DB_CONFIG['trusted_connection']};"
+            f"Encrypt={DB_CONFIG['encrypt']};"
+            f"Database={self.database_name};"
+        )
+        self._conn = None
+
+    def connect(self):
+        """取得（重複使用的）資料庫連線"""
+        if self._conn is None:
+            self._conn = pyodbc.connect(self.connection_string)
+        return self._conn
+
+    def close(self):
+        """關閉資料庫連線"""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def default_columns(self) -> List[str]:
+        """依資料類型代換後的預設欄位"""
+        return [column.format(**FIELD_COLUMNS[self.data_type]) for column in DEFAULT_COLUMNS]
+
+    def build_page_sql(self, criteria: TransactionFilter, columns: List[str] = None) -> Tuple[str, List]:
+        """
+        產生單頁查詢 SQL（參數依序為: 筆數上限, 篩選條件..., 上一頁最後的 id）
+
+        Returns:
+            (SQL, 篩選條件參數)
+        """
+        columns = list(columns or self.default_columns())
+        if 'id' not in columns:
+            columns.insert(0, 'id')
+        conditions, params = criteria.to_sql(self.data_type)
+        conditions.append("[id] > ?")
+        sql = (
+            f"SELECT TOP (?) {', '.join(quote_column(column) for column in columns)}\n"
+            f"FROM [{self.source_name}]\n"
+            f"WHERE {' AND '.join(conditions)}\n"
+            f"ORDER BY [id]"
+        )
+        return sql, params
+
+    def fetch_page(self, criteria: TransactionFilter, after_id: int = 0, limit: int = 100,
+                   columns: List[str] = None) -> Tuple[List[str], List[tuple], Optional[int]]:
+        """
+        取得一頁資料
+
+        Returns:
+            (欄位名稱, 資料列, 下一頁的 after_id；沒有下一頁時為 None)
+        """
+        sql, params = self.build_page_sql(criteria, columns)
+        cursor = self.connect().cursor()
+        cursor.execute(sql, limit, *params, after_id)
+        names = [description[0] for description in cursor.description]
+        rows = [tuple(row) for row in cursor.fetchall()]
+        id_index = names.index('id')
+        next_id = rows[-1][id_index] if len(rows) == limit else None
+        return names, rows, next_id
+
+    def iter_pages(self, criteria: TransactionFilter, columns: List[str] = None,
+                   page_size: int = DEFAULT_PAGE_SIZE) -> Iterator[Tuple[List[str], List[tuple]]]:
+        """依 keyset 逐頁取得資料（每頁都是索引搜尋，不會隨頁數變慢）"""
+        after_id = 0
+        while True:
+            names, rows, next_id = self.fetch_page(criteria, after_id, page_size, columns)
+            if rows:
+                yield names, rows
+            if next_id is None:
+                break
+            after_id = next_id
+
+    def iter_dataframes(self, criteria: TransactionFilter, columns: List[str] = None,
+                        page_size: int = DEFAULT_PAGE_SIZE):
+        """逐頁產生 pandas DataFrame"""
+        import pandas as pd
+
+        for names, rows in self.iter_pages(criteria, columns, page_size):
+            yield pd.DataFrame.from_records(rows, columns=names)
+
+    def iter_arrow(self, criteria: TransactionFilter, columns: List[str] = None,
+                   page_size: int = DEFAULT_PAGE_SIZE):
+        """逐頁產生 pyarrow.Table"""
+        import pyarrow as pa
+
+        for names, rows in self.iter_pages(criteria, columns, page_size):
+            yield pa.Table.from_arrays([pa.array(values) for values in zip(*rows)], names=names)
+
+    def count(self, criteria: TransactionFilter) -> int:
+        """符合條件的筆數"""
+        conditions, params = criteria.to_sql(self.data_type)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        cursor = self.connect().cursor()
+        cursor.execute(f"SELECT COUNT_BIG(*) FROM [{self.source_name}]{where}", *params)
+        return int(cursor.fetchone()[0])
+
+    def latest_quarters(self, count: int = 4) -> List[str]:
+        """最近的季度（只計入 114Q1 格式的資料夾名稱）"""
+        cursor = self.connect().cursor()
+        cursor.execute(f"SELECT DISTINCT [quarter] FROM [{self.table_name}]")
+        quarters = sorted((row[0] for row in cursor.fetchall() if row[0] and QUARTER_PATTERN.match(row[0])),
+                          reverse=True)
+        return quarters[:count]
+
+    def ensure_indexes(self) -> Dict[str, bool]:
+        """建立查詢用的索引（已存在時略過），回傳 {索引名稱: 是否新建立}"""
+        conn = self.connect()
+        cursor = conn.cursor()
+        created = {}
+        for name_template, columns in QUERY_INDEXES.items():
+            index_name = name_template.format(table=self.table_name)
+            cursor.execute("SELECT 1 FROM sys.indexes WHERE name = ? AND object_id = OBJECT_ID(?)",
+                           index_name, self.table_name)
+            if cursor.fetchone():
+                created[index_name] = False
+                continue
+            cursor.execute(f"CREATE INDEX [{index_name}] ON [{self.table_name}] "
+                           f"({', '.join(quote_column(column) for column in columns)})")
+            conn.commit()
+            created[index_name] = True
+            logger.info(f"✅ 已建立索引: {self.database_name}.{self.table_name}.{index_name}")
+        return created
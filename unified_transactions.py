@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""
+跨市場整合交易資料表
+將中古屋、預售屋、租屋三個資料庫的主要資料以統一的欄位名稱寫入同一個資料表（unified_transactions），
+以 market 欄位區分市場別；匯入後只重新整理涉及的季度，跨市場分析只需查詢一個有索引的資料表
+
+欄位對應（例如 交易年月日 / 租賃年月日 → 交易日期，總價元 / 總額元 → 總金額元）定義於 UNIFIED_COLUMNS
+"""
+
+import time
+import logging
+from typing import Dict, Iterable, List
+
+import pyodbc
+
+from config import DB_CONFIG, DATABASES
+from log_setup import setup_logging
+from file_type_mapping import FileTypeMapping, DataType, FileType
+from schema_registry import quote_column
+
+try:
+    from config import USE_DICTIONARY_ENCODING
+except ImportError:
+    USE_DICTIONARY_ENCODING = False
+
+try:
+    from config import UNIFIED_DATABASE
+except ImportError:
+    UNIFIED_DATABASE = DATABASES['used_house']
+
+logger = logging.getLogger(__name__)
+
+UNIFIED_TABLE = 'unified_transactions'
+
+# 市場別代碼（market 欄位的值）
+MARKETS = {
+    DataType.USED_HOUSE: 'used_house',
+    DataType.PRESALE: 'presale',
+    DataType.RENTAL: 'rental',
+}
+
+# (統一欄位名稱, 型別, {資料類型: 來源欄位})；來源欄位未列出的資料類型寫入 NULL
+_SAME = {data_type: None for data_type in MARKETS}
+UNIFIED_COLUMNS = [
+    ('縣市代碼', 'NVARCHAR(10)', _SAME),
+    ('縣市名稱', 'NVARCHAR(50)', _SAME),
+    ('鄉鎮市區', 'NVARCHAR(200)', _SAME),
+    ('交易標的', 'NVARCHAR(200)', _SAME),
+    ('土地位置建物門牌', 'NVARCHAR(500)', _SAME),
+    ('交易日期', 'NVARCHAR(20)', {DataType.USED_HOUSE: '交易年月日', DataType.PRESALE: '交易年月日',
+                               DataType.RENTAL: '租賃年月日'}),
+    ('總金額元', 'DECIMAL(15,2)', {DataType.USED_HOUSE: '總價元', DataType.PRESALE: '總價元',
+                                DataType.RENTAL: '總額元'}),
+    ('單價元平方公尺', 'DECIMAL(15,2)', _SAME),
+    ('建物面積平方公尺', 'DECIMAL(15,2)', {DataType.USED_HOUSE: '建物移轉總面積平方公尺',
+                                    DataType.PRESALE: '建物移轉總面積平方公尺',
+                                    DataType.RENTAL: '建物總面積平方公尺'}),
+    ('土地面積平方公尺', 'DECIMAL(15,2)', {DataType.USED_HOUSE: '土地移轉總面積平方公尺',
+                                    DataType.PRESALE: '土地移轉總面積平方公尺',
+                                    DataType.RENTAL: '土地面積平方公尺'}),
+    ('建物型態', 'NVARCHAR(200)', _SAME),
+    ('主要用途', 'NVARCHAR(1000)', _SAME),
+    ('總樓層數', 'INT', _SAME),
+    ('建物現況格局-房', 'INT', _SAME),
+    ('建物現況格局-廳', 'INT', _SAME),
+    ('建物現況格局-衛', 'INT', _SAME),
+    ('建築完成年月', 'NVARCHAR(20)', _SAME),
+    ('編號', 'NVARCHAR(100)', _SAME),
+    ('quarter', 'NVARCHAR(20)', _SAME),
+    ('source_file', 'NVARCHAR(200)', _SAME),
+]
+
+
+def source_column(unified_name: str, mapping: Dict, data_type: DataType):
+    """取得統一欄位在指定資料類型中的來源欄位名稱（None 表示同名）"""
+    if data_type not in mapping:
+        return None
+    return mapping[data_type] or unified_name
+
+
+class UnifiedTransactions:
+    """跨市場整合交易資料表維護"""
+
+    def __init__(self, database_name: str = None):
+        self.database_name = database_name or UNIFIED_DATABASE
+        self.connection_string = (
+            f"DRIVER={{{DB_CONFIG['driver']}}};"
+            f"SERVER={DB_CONFIG['server']};"
+            f"UID={DB_CONFIG['username']};"
+            f"PWD={DB_CONFIG['password']};"
+            f"Trusted_Connection={DB_CONFIG['trusted_connection']};"
+            f"Encrypt={DB_CONFIG['encrypt']};"
+            f"Database={self.database_name};"
+        )
+        self.file_mapping = FileTypeMapping()
+
+    def get_data_type(self, database_name: str) -> DataType:
+        """資料庫名稱 → 資料類型"""
+        for data_type in MARKETS:
+            if self.file_mapping.get_database_name(data_type) == database_name:
+                return data_type
+        raise ValueError(f"未知的資料庫: {database_name}")
+
+    def create_table_sql(self) -> str:
+        """產生整合資料表的 CREATE TABLE 語句（已存在時不重建）"""
+        columns = ["id BIGINT IDENTITY(1,1) PRIMARY KEY NONCLUSTERED",
+                   "market NVARCHAR(20) NOT NULL",
+                   "source_id INT NOT NULL"]
+        columns += [f"{quote_column(name)} {sql_type}" for name, sql_type, _ in UNIFIED_COLUMNS]
+        return (
+            f"IF OBJECT_ID(N'{UNIFIED_TABLE}', N'U') IS NULL\n"
+            f"BEGIN\n"
+            f"    CREATE TABLE [{UNIFIED_TABLE}] (\n        " + ",\n        ".join(columns) + "\n    );\n"
+            f"    CREATE CLUSTERED INDEX [IX_{UNIFIED_TABLE}_quarter_city] ON [{UNIFIED_TABLE}] ([quarter], [縣市代碼], market);\n"
+            f"    CREATE INDEX [IX_{UNIFIED_TABLE}_city_district] ON [{UNIFIED_TABLE}] ([縣市代碼], [鄉鎮市區]) INCLUDE (market, [交易日期], [總金額元], [單價元平方公尺]);\n"
+            f"END"
+        )
+
+    def refresh_sql(self, data_type: DataType, quarter_count: int = None) -> str:
+        """產生由來源資料庫寫入整合資料表的 INSERT ... SELECT（跨資料庫三段式名稱）"""
+        source_database = self.file_mapping.get_database_name(data_type)
+        source_table = self.file_mapping.get_table_name(data_type, FileType.MAIN)
+        if USE_DICTIONARY_ENCODING:
+            # 字典編碼時由檢視表取得原始文字值
+            source_table += '_decoded'
+
+        target_columns = ['market', 'source_id'] + [name for name, _, _ in UNIFIED_COLUMNS]
+        select_columns = ["?", "[id]"]
+        for name, _, mapping in UNIFIED_COLUMNS:
+            column = source_column(name, mapping, data_type)
+            select_columns.append(quote_column(column) if column else "NULL")
+
+        sql = (
+            f"INSERT INTO [{UNIFIED_TABLE}] ({', '.join(quote_column(name) for name in target_columns)})\n"
+            f"SELECT {', '.join(select_columns)}\n"
+            f"FROM [{source_database}].[dbo].[{source_table}]"
+        )
+        if quarter_count:
+            sql += f"\nWHERE [quarter] IN ({', '.join('?' for _ in range(quarter_count))})"
+        return sql
+
+    def refresh_market(self, cursor, data_type: DataType, quarters: List[str] = None) -> int:
+        """重新寫入單一市場指定季度（None 為全部）的資料，回傳筆數；由呼叫端提交交易"""
+        market = MARKETS[data_type]
+        if quarters is None:
+            cursor.execute(f"DELETE FROM [{UNIFIED_TABLE}] WHERE market = ?", market)
+            cursor.execute(self.refresh_sql(data_type), market)
+        else:
+            placeholders = ', '.join('?' for _ in quarters)
+            cursor.execute(f"DELETE FROM [{UNIFIED_TABLE}] WHERE market = ? AND [quarter] IN ({placeholders})",
+                           market, *quarters)
+            cursor.execute(self.refresh_sql(data_type, len(quarters)), market, *quarters)
+        return cursor.rowcount
+
+    def refresh(self, quarters_by_database: Dict[str, Iterable[str]]) -> bool:
+        """
+        重新整理整合資料表 {來源資料庫名稱: 季度列表或 None}
+        所有市場在同一個交易中更新，查詢端不會看到只更新一半的季度
+        """
+        start_time = time.time()
+        conn = pyodbc.connect(self.connection_string)
+        try:
+            cursor = conn.cursor()
+            cursor.execute(self.create_table_sql())
+            counts = {}
+            for database_name, quarters in quarters_by_database.items():
+                data_type = self.get_data_type(database_name)
+                quarters = sorted(quarters) if quarters is not None else None
+                counts[MARKETS[data_type]] = self.refresh_market(cursor, data_type, quarters)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"❌ {self.database_name}.{UNIFIED_TABLE} 更新失敗: {str(e)}")
+            return False
+        finally:
+            conn.close()
+
+        logger.info(f"🔗 {self.database_name}.{UNIFIED_TABLE} 已更新: " +
+                    ", ".join(f"{market} {rows:,} 筆" for market, rows in counts.items()) +
+                    f"，耗時 {time.time() - start_time:.1f} 秒")
+        return True
+
+
+def refresh_all(quarters: List[str] = None) -> bool:
+    """重新整理所有市場（可只指定季度）"""
+    unified = UnifiedTransactions()
+    database_names = [unified.file_mapping.get_database_name(data_type) for data_type in MARKETS]
+    return unified.refresh({database_name: quarters for database_name in database_names})
+
+
+if __name__ == "__main__":
+    import sys
+
+    setup_logging('unified_transactions.log')
+    # 用法: python unified_transactions.py [季度 ...]（不指定時重建所有季度）
+    sys.exit(0 if refresh_all(sys.argv[1:] or None) else 1)
@@ -7,16 +7,9 @@
 import pyodbc
 import logging
 from config import DB_CONFIG, DATABASES
+from log_setup import setup_logging
+from import_stats import verify_database
 
-# 設定日誌
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('verify_city_codes.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
 def verify_city_codes():
@@ -158,7 +151,60 @@ def verify_all_databases():
         except Exception as e:
             print(f"  ❌ 檢查失敗: {str(e)}")
 
+def verify_import_stats(quarters=None, full: bool = False) -> bool:
+    """
+    比對匯入時記錄的檔案統計（import_stats）與資料表內容
+    每個資料表只執行一個依 source_file 分組的彙總查詢；未指定季度時只比對最近匯入的季度，
+    full 為 True 時比對全部季度（全表掃描）
+    """
+    scope = '、'.join(quarters) if quarters else ('全部季度' if full else '最近匯入的季度')
+    print(f"\n🔍 比對匯入統計（{scope}）")
+    print("=" * 80)
+    
+    all_passed = True
+    for db_type, db_name in DATABASES.items():
+        try:
+            conn_str = (
+                f"DRIVER={{{DB_CONFIG['driver']}}};"
+                f"SERVER={DB_CONFIG['server']};"
+                f"UID={DB_CONFIG['username']};"
+                f"PWD={DB_CONFIG['password']};"
+                f"Trusted_Connection={DB_CONFIG['trusted_connection']};"
+                f"Encrypt={DB_CONFIG['encrypt']};"
+                f"Database={db_name};"
+            )
+            conn = pyodbc.connect(conn_str)
+            mismatches = verify_database(conn.cursor(), quarters, full)
+            conn.close()
+        except Exception as e:
+            print(f"  ❌ {db_name} 檢查失敗: {str(e)}")
+            all_passed = False
+            continue
+        
+        if mismatches is None:
+            print(f"  ⏭️ {db_name}: 沒有匯入統計記錄")
+        elif mismatches:
+            all_passed = False
+            print(f"  ❌ {db_name}: {len(mismatches)} 項不一致")
+            for mismatch in mismatches:
+                print(f"     {mismatch}")
+                logger.warning(f"⚠️ {mismatch}")
+        else:
+            print(f"  ✅ {db_name}: 與匯入統計一致")
+    
+    return all_passed
+
 if __name__ == "__main__":
-    verify_city_codes()
-    verify_all_databases()
+    import sys
+    
+    setup_logging('verify_city_codes.log')
+    # 用法: python verify_city_codes.py [--full] [季度 ...]
+    arguments = sys.argv[1:]
+    full = '--full' in arguments
+    quarters = [argument for argument in arguments if argument != '--full'] or None
+    passed = verify_import_stats(quarters, full)
+    if full:
+        verify_city_codes()
+        verify_all_databases()
+    sys.exit(0 if passed else 1)
 
@@ -0,0 +1,486 @@
+# -*- coding: utf-8 -*-
+"""
+分散式匯入工作佇列
+以資料庫中的工作資料表（import_tasks，每個 (季度, 檔案) 一列）協調任意數量的匯入程序（同一台或多台機器），
+每個程序各自以多個執行緒取得檔案匯入，總處理量隨程序數增加：
+
+    enqueue   登錄資料夾中的檔案；已登錄的檔案不重複登錄，多個程序可同時登錄同一批資料夾
+    claim     以 UPDLOCK + READPAST 取得下一個待處理的檔案並設定租約（已被鎖定的列直接略過，程序間不互相等待）
+    heartbeat 背景執行緒定期延長本程序持有的租約；程序中斷時租約到期，檔案由其他程序重新取得
+    完成標記  與資料列在同一個交易中寫入（EnhancedDataImporter.commit_guard），提交前確認租約仍屬於本程序
+              且未被重新取得（以取得次數 attempts 為識別），否則整個交易復原，同一個檔案不會匯入兩次
+    finalize  所有檔案處理完畢後，只有一個程序取得收尾工作（彙總表、整合表、備份與更新 config.py）
+
+租約時間一律以資料庫伺服器的時間（SYSUTCDATETIME）計算，不受各機器時鐘差異影響。
+多台機器共用時，各機器需能以相同的相對路徑讀取資料夾或壓縮檔（例如共用網路磁碟，或各自放置相同的資料）
+"""
+
+import os
+import time
+import socket
+import uuid
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pyodbc
+
+from config import DB_CONFIG, DATABASES
+import zip_source
+
+try:
+    from config import WORK_QUEUE_DATABASE
+except ImportError:
+    WORK_QUEUE_DATABASE = DATABASES['used_house']
+
+try:
+    from config import WORK_QUEUE_LEASE_SECONDS
+except ImportError:
+    WORK_QUEUE_LEASE_SECONDS = 300
+
+try:
+    from config import WORK_QUEUE_HEARTBEAT_SECONDS
+except ImportError:
+    WORK_QUEUE_HEARTBEAT_SECONDS = 60
+
+try:
+    from config import WORK_QUEUE_MAX_ATTEMPTS
+except ImportError:
+    WORK_QUEUE_MAX_ATTEMPTS = 3
+
+try:
+    from config import WORK_QUEUE_POLL_SECONDS
+except ImportError:
+    WORK_QUEUE_POLL_SECONDS = 5
+
+logger = logging.getLogger(__name__)
+
+TASKS_TABLE = 'import_tasks'
+FOLDERS_TABLE = 'import_task_folders'
+
+# 工作狀態
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+CREATE_TABLES_SQL = f"""
+IF OBJECT_ID(N'{TASKS_TABLE}', N'U') IS NULL
+BEGIN
+    CREATE TABLE [{TASKS_TABLE}] (
+        id INT IDENTITY(1,1) PRIMARY KEY,
+        folder NVARCHAR(200) NOT NULL,
+        source_path NVARCHAR(1000) NOT NULL,
+        file_name NVARCHAR(200) NOT NULL,
+        status NVARCHAR(20) NOT NULL DEFAULT '{PENDING}',
+        owner NVARCHAR(200),
+        lease_expires_at DATETIME2,
+        attempts INT NOT NULL DEFAULT 0,
+        row_count INT,
+        error NVARCHAR(2000),
+        enqueued_at DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME(),
+        started_at DATETIME2,
+        finished_at DATETIME2
+    );
+    CREATE UNIQUE INDEX [IX_{TASKS_TABLE}_file] ON [{TASKS_TABLE}] (folder, file_name);
+    CREATE INDEX [IX_{TASKS_TABLE}_status] ON [{TASKS_TABLE}] (status, lease_expires_at) INCLUDE (folder, attempts);
+END
+IF OBJECT_ID(N'{FOLDERS_TABLE}', N'U') IS NULL
+BEGIN
+    CREATE TABLE [{FOLDERS_TABLE}] (
+        folder NVARCHAR(200) NOT NULL PRIMARY KEY,
+        enqueued_at DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME(),
+        finalized_by NVARCHAR(200),
+        finalized_at DATETIME2
+    );
+END
+"""
+
+
+class LeaseLostError(Exception):
+    """租約已到期並由其他程序重新取得（或工作已被重設），本程序的匯入結果不得提交"""
+
+
+class Task:
+    """取得的單一工作"""
+
+    def __init__(self, task_id: int, folder: str, source_path: str, file_name: str, attempts: int):
+        self.id = task_id
+        # 季度名稱（壓縮檔為去掉副檔名的名稱）
+        self.folder = folder
+        # 相對於專案目錄的路徑（以 / 分隔，壓縮檔成員為 114Q3.zip/檔名；Windows 也可直接開啟）
+        self.source_path = source_path
+        self.file_name = file_name
+        # 第幾次取得；與 owner 一起作為租約識別，租約到期後被重新取得時舊的識別即失效
+        self.attempts = attempts
+
+    def __repr__(self):
+        return f"Task({self.id}, {self.folder}/{self.file_name}, attempt {self.attempts})"
+
+
+def default_owner() -> str:
+    """本程序的識別：主機名稱:程序編號:隨機碼（程序編號可能在重新開機後重複使用）"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def _placeholders(values) -> str:
+    return ', '.join('?' for _ in values)
+
+
+class WorkQueue:
+    """資料庫中的匯入工作佇列（每次操作各自連線並自動提交，可由多個執行緒同時使用）"""
+
+    def __init__(self, database_name: str = None, owner: str = None, lease_seconds: int = None,
+                 max_attempts: int = None):
+        self.database_name = database_name or WORK_QUEUE_DATABASE
+        self.owner = owner or default_owner()
+        self.lease_seconds = lease_seconds or WORK_QUEUE_LEASE_SECONDS
+        self.max_attempts = max_attempts or WORK_QUEUE_MAX_ATTEMPTS
+        self.connection_string = (
+            f"DRIVER={{{DB_CONFIG['driver']}}};"
+            f"SERVER={DB_CONFIG['server']};"
+            f"UID={DB_CONFIG['username']};"
+            f"PWD={DB_CONFIG['password']};"
+            f"Trusted_Connection={DB_CONFIG['trusted_connection']};"
+            f"Encrypt={DB_CONFIG['encrypt']};"
+            f"Database={self.database_name};"
+        )
+        self._tables_ready = False
+
+    def _connect(self):
+        conn = pyodbc.connect(self.connection_string, autocommit=True)
+        if not self._tables_ready:
+            conn.cursor().execute(CREATE_TABLES_SQL)
+            self._tables_ready = True
+        return conn
+
+    def _execute(self, sql: str, *params) -> Tuple[int, list]:
+        """執行單一語句，回傳 (影響筆數, 結果列)"""
+        conn = self._connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(sql, *params)
+            rows = cursor.fetchall() if cursor.description else []
+            return cursor.rowcount, rows
+        finally:
+            conn.close()
+
+    def _folder_filter(self, folders: Optional[List[str]]) -> Tuple[str, list]:
+        if not folders:
+            return '', []
+        return f" AND folder IN ({_placeholders(folders)})", list(folders)
+
+    def enqueue(self, folders: List[str], skip_files=None) -> int:
+        """
+        登錄資料夾（或 ZIP 壓縮檔）中的所有 CSV 檔案，已登錄的檔案略過
+
+        Args:
+            folders: 資料夾或壓縮檔名稱（相對於專案目錄）
+            skip_files: 不登錄的檔案路徑（例如匯入前檢查必定失敗的檔案）
+
+        Returns:
+            新登錄的檔案數
+        """
+        skip_files = set(skip_files or [])
+        tasks = []
+        for folder in folders:
+            quarter = zip_source.folder_name(folder)
+            for file_path in zip_source.list_csv_files(zip_source.resolve_folder(folder)):
+                if file_path in skip_files:
+                    continue
+                tasks.append((quarter, file_path.replace(os.sep, '/'), os.path.basename(file_path)))
+
+        added = 0
+        conn = self._connect()
+        try:
+            conn.autocommit = False
+            cursor = conn.cursor()
+            for quarter in sorted({task[0] for task in tasks}):
+                cursor.execute(
+                    f"INSERT INTO [{FOLDERS_TABLE}] (folder) SELECT ? WHERE NOT EXISTS "
+                    f"(SELECT 1 FROM [{FOLDERS_TABLE}] WITH (UPDLOCK, HOLDLOCK) WHERE folder = ?)",
+                    quarter, quarter)
+            for quarter, source_path, file_name in tasks:
+                cursor.execute(
+                    f"INSERT INTO [{TASKS_TABLE}] (folder, source_path, file_name) SELECT ?, ?, ? WHERE NOT EXISTS "
+                    f"(SELECT 1 FROM [{TASKS_TABLE}] WITH (UPDLOCK, HOLDLOCK) WHERE folder = ? AND file_name = ?)",
+                    quarter, source_path, file_name, quarter, file_name)
+                added += cursor.rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+        logger.info(f"📋 工作佇列登錄 {added} 個檔案（{len(tasks) - added} 個已登錄）")
+        return added
+
+    def claim(self, folders: List[str] = None) -> Optional[Task]:
+        """
+        取得下一個待處理（或租約已到期）的檔案並設定租約；沒有可取得的檔案時回傳 None
+
+        Args:
+            folders: 只取得指定季度的檔案（None 為全部）
+        """
+        folder_filter, folder_params = self._folder_filter(folders)
+        sql = f"""
+WITH next_task AS (
+    SELECT TOP (1) * FROM [{TASKS_TABLE}] WITH (UPDLOCK, READPAST, ROWLOCK)
+    WHERE attempts < ?
+      AND (status = '{PENDING}' OR (status = '{LEASED}' AND lease_expires_at < SYSUTCDATETIME())){folder_filter}
+    ORDER BY id
+)
+UPDATE next_task
+SET status = '{LEASED}', owner = ?, attempts = attempts + 1, error = NULL, started_at = SYSUTCDATETIME(),
+    lease_expires_at = DATEADD(SECOND, ?, SYSUTCDATETIME())
+OUTPUT inserted.id, inserted.folder, inserted.source_path, inserted.file_name, inserted.attempts;
+"""
+        _, rows = self._execute(sql, self.max_attempts, *folder_params, self.owner, self.lease_seconds)
+        if not rows:
+            return None
+        return Task(*rows[0])
+
+    def renew(self) -> int:
+        """延長本程序持有的所有租約，回傳延長的工作數"""
+        count, _ = self._execute(
+            f"UPDATE [{TASKS_TABLE}] SET lease_expires_at = DATEADD(SECOND, ?, SYSUTCDATETIME()) "
+            f"WHERE owner = ? AND status = '{LEASED}'",
+            self.lease_seconds, self.owner)
+        return count
+
+    def commit_guard(self, task: Task) -> Callable:
+        """
+        EnhancedDataImporter.commit_guard：在資料列的交易中（同一台伺服器的跨資料庫更新）標記完成，
+        租約已不屬於本程序時引發 LeaseLostError，資料列一併復原
+        """
+        def guard(cursor, file_stats: Optional[Dict]):
+            cursor.execute(
+                f"UPDATE [{self.database_name}]..[{TASKS_TABLE}] "
+                f"SET status = '{DONE}', row_count = ?, lease_expires_at = NULL, finished_at = SYSUTCDATETIME() "
+                f"WHERE id = ? AND owner = ? AND attempts = ? AND status = '{LEASED}'",
+                file_stats['rows'] if file_stats else None, task.id, self.owner, task.attempts)
+            if cursor.rowcount != 1:
+                raise LeaseLostError(f"{task.folder}/{task.file_name} 的租約已由其他程序取得")
+        return guard
+
+    def fail(self, task: Task, error: str) -> bool:
+        """
+        匯入失敗：未達重試上限時放回佇列，否則標記為失敗
+
+        Returns:
+            是否仍持有租約（False 表示已由其他程序取得，結果不記錄）
+        """
+        count, _ = self._execute(
+            f"UPDATE [{TASKS_TABLE}] "
+            f"SET status = CASE WHEN attempts >= ? THEN '{FAILED}' ELSE '{PENDING}' END, "
+            f"owner = NULL, lease_expires_at = NULL, error = ?, finished_at = SYSUTCDATETIME() "
+            f"WHERE id = ? AND owner = ? AND attempts = ? AND status = '{LEASED}'",
+            self.max_attempts, (error or '')[:2000], task.id, self.owner, task.attempts)
+        return count == 1
+
+    def expire_exhausted(self, folders: List[str] = None) -> int:
+        """租約到期且已達重試上限的工作（持有的程序一再中斷）標記為失敗，回傳筆數"""
+        folder_filter, folder_params = self._folder_filter(folders)
+        count, _ = self._execute(
+            f"UPDATE [{TASKS_TABLE}] SET status = '{FAILED}', owner = NULL, lease_expires_at = NULL, "
+            f"error = N'租約到期次數達上限（匯入程序中斷）', finished_at = SYSUTCDATETIME() "
+            f"WHERE status = '{LEASED}' AND lease_expires_at < SYSUTCDATETIME() AND attempts >= ?{folder_filter}",
+            self.max_attempts, *folder_params)
+        if count:
+            logger.warning(f"⚠️ {count} 個檔案的租約到期次數達上限，標記為失敗")
+        return count
+
+    def unfinished(self, folders: List[str] = None) -> int:
+        """尚未完成（待處理或租約中）的工作數"""
+        self.expire_exhausted(folders)
+        folder_filter, folder_params = self._folder_filter(folders)
+        _, rows = self._execute(
+            f"SELECT COUNT(*) FROM [{TASKS_TABLE}] WHERE status IN ('{PENDING}', '{LEASED}'){folder_filter}",
+            *folder_params)
+        return rows[0][0]
+
+    def finalize(self, folders: List[str]) -> List[str]:
+        """
+        所有指定季度的工作都已結束時，取得這些季度的收尾工作（同一批季度只會由一個程序取得）
+
+        Returns:
+            本程序取得收尾工作的季度（其他程序已取得或仍有未完成的工作時為空列表）
+        """
+        if not folders:
+            return []
+        placeholders = _placeholders(folders)
+        _, rows = self._execute(
+            f"UPDATE f SET finalized_by = ?, finalized_at = SYSUTCDATETIME() "
+            f"OUTPUT inserted.folder "
+            f"FROM [{FOLDERS_TABLE}] f "
+            f"WHERE f.finalized_by IS NULL AND f.folder IN ({placeholders}) "
+            f"AND NOT EXISTS (SELECT 1 FROM [{TASKS_TABLE}] t WHERE t.status IN ('{PENDING}', '{LEASED}') "
+            f"AND t.folder IN ({placeholders}))",
+            self.owner, *folders, *folders)
+        return sorted(row[0] for row in rows)
+
+    def done_files(self, folders: List[str]) -> List[Tuple[str, str, int]]:
+        """指定季度中已完成（由任何程序匯入）的檔案 [(季度, 檔名, 筆數)]"""
+        folder_filter, folder_params = self._folder_filter(folders)
+        _, rows = self._execute(
+            f"SELECT folder, file_name, row_count FROM [{TASKS_TABLE}] WHERE status = '{DONE}'{folder_filter}",
+            *folder_params)
+        return [(row[0], row[1], row[2] or 0) for row in rows]
+
+    def status(self, folders: List[str] = None) -> Dict:
+        """
+        佇列狀態
+
+        Returns:
+            {'folders': {季度: {狀態: (檔案數, 筆數)}, 'finalized_by'},
+             'leases': [(季度, 檔名, 持有程序, 剩餘秒數)], 'failed': [(季度, 檔名, 次數, 錯誤)]}
+        """
+        folder_filter, folder_params = self._folder_filter(folders)
+        result = {'folders': {}, 'leases': [], 'failed': []}
+        conn = self._connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"SELECT folder, status, COUNT(*), SUM(row_count) FROM [{TASKS_TABLE}] "
+                f"WHERE 1 = 1{folder_filter} GROUP BY folder, status ORDER BY folder", *folder_params)
+            for folder, status, count, rows in cursor.fetchall():
+                result['folders'].setdefault(folder, {})[status] = (count, rows or 0)
+            cursor.execute(
+                f"SELECT folder, finalized_by FROM [{FOLDERS_TABLE}] WHERE 1 = 1{folder_filter}", *folder_params)
+            for folder, finalized_by in cursor.fetchall():
+                result['folders'].setdefault(folder, {})['finalized_by'] = finalized_by
+            cursor.execute(
+                f"SELECT folder, file_name, owner, DATEDIFF(SECOND, SYSUTCDATETIME(), lease_expires_at) "
+                f"FROM [{TASKS_TABLE}] WHERE status = '{LEASED}'{folder_filter} ORDER BY lease_expires_at",
+                *folder_params)
+            result['leases'] = [tuple(row) for row in cursor.fetchall()]
+            cursor.execute(
+                f"SELECT folder, file_name, attempts, error FROM [{TASKS_TABLE}] "
+                f"WHERE status = '{FAILED}'{folder_filter} ORDER BY folder, file_name", *folder_params)
+            result['failed'] = [tuple(row) for row in cursor.fetchall()]
+        finally:
+            conn.close()
+        return result
+
+    def retry_failed(self, folders: List[str] = None) -> int:
+        """失敗的工作重設為待處理（重試次數歸零），並重新開放收尾，回傳筆數"""
+        folder_filter, folder_params = self._folder_filter(folders)
+        count, _ = self._execute(
+            f"UPDATE [{TASKS_TABLE}] SET status = '{PENDING}', attempts = 0, owner = NULL, lease_expires_at = NULL "
+            f"WHERE status = '{FAILED}'{folder_filter}", *folder_params)
+        if count:
+            self._execute(
+                f"UPDATE [{FOLDERS_TABLE}] SET finalized_by = NULL, finalized_at = NULL "
+                f"WHERE folder IN (SELECT folder FROM [{TASKS_TABLE}] WHERE status = '{PENDING}'){folder_filter}",
+                *folder_params)
+        return count
+
+    def reset(self, folders: List[str]) -> int:
+        """
+        刪除指定季度的所有工作記錄（之後可重新登錄並匯入；已匯入的資料不會刪除），回傳筆數
+        仍有租約中的工作時，持有的程序提交前會因租約失效而復原
+        """
+        if not folders:
+            return 0
+        placeholders = _placeholders(folders)
+        count, _ = self._execute(f"DELETE FROM [{TASKS_TABLE}] WHERE folder IN ({placeholders})", *folders)
+        self._execute(f"DELETE FROM [{FOLDERS_TABLE}] WHERE folder IN ({placeholders})", *folders)
+        return count
+
+
+def import_task(queue: WorkQueue, task: Task) -> dict:
+    """匯入單一工作，結果格式同 import_new_folders.import_single_file_worker（folder 為季度名稱）"""
+    from enhanced_data_importer import EnhancedDataImporter
+
+    start_time = time.time()
+    error = None
+    importer = EnhancedDataImporter()
+    importer.commit_guard = queue.commit_guard(task)
+    try:
+        success = importer.import_single_file(task.source_path, task.folder)
+    except Exception as e:
+        success = False
+        error = str(e)
+
+    if not success:
+        error = error or '匯入失敗（詳見日誌）'
+        if not queue.fail(task, error):
+            error = '租約已由其他程序取得，本程序的結果已復原'
+
+    return {
+        'filename': task.file_name,
+        'file_path': task.source_path,
+        'folder': task.folder,
+        'success': success,
+        'records': importer.last_file_stats['rows'] if success and importer.last_file_stats else 0,
+        'processing_time': time.time() - start_time,
+        'error': error
+    }
+
+
+class QueueWorker:
+    """
+    由工作佇列取得檔案匯入的程序：threads 個執行緒各自取得、匯入，加上一個延長租約的背景執行緒
+    佇列中沒有可取得的檔案、但其他程序仍持有租約時持續等待（其他程序中斷時由本程序接手），
+    指定的季度全部結束後返回
+    """
+
+    def __init__(self, queue: WorkQueue, threads: int, folders: List[str] = None,
+                 heartbeat_seconds: int = None, poll_seconds: float = None):
+        self.queue = queue
+        self.threads = max(threads, 1)
+        self.folders = folders
+        self.heartbeat_seconds = heartbeat_seconds or WORK_QUEUE_HEARTBEAT_SECONDS
+        self.poll_seconds = poll_seconds or WORK_QUEUE_POLL_SECONDS
+        self._stop = threading.Event()
+
+    def _heartbeat(self):
+        while not self._stop.wait(self.heartbeat_seconds):
+            try:
+                self.queue.renew()
+            except Exception as e:
+                # 暫時無法連線時下一次再延長；租約到期前都不影響
+                logger.warning(f"⚠️ 延長租約失敗: {str(e)}")
+
+    def _work(self, on_result: Callable[[dict], None]):
+        while not self._stop.is_set():
+            try:
+                task = self.queue.claim(self.folders)
+                if task is None:
+                    if not self.queue.unfinished(self.folders):
+                        return
+                    self._stop.wait(self.poll_seconds)
+                    continue
+            except Exception as e:
+                logger.warning(f"⚠️ 存取工作佇列失敗，稍後重試: {str(e)}")
+                self._stop.wait(self.poll_seconds)
+                continue
+            on_result(import_task(self.queue, task))
+
+    def run(self, on_result: Callable[[dict], None] = None) -> List[dict]:
+        """執行到指定季度的工作全部結束，回傳本程序處理的結果（on_result 由各工作執行緒呼叫）"""
+        results = []
+        lock = threading.Lock()
+
+        def record(result: dict):
+            with lock:
+                results.append(result)
+            if on_result:
+                on_result(result)
+
+        logger.info(f"👷 匯入程序 {self.queue.owner} 以 {self.threads} 個執行緒處理工作佇列 "
+                    f"({self.queue.database_name}.{TASKS_TABLE})")
+        heartbeat = threading.Thread(target=self._heartbeat, name='work-queue-heartbeat', daemon=True)
+        heartbeat.start()
+        workers = [threading.Thread(target=self._work, args=(record,), name=f'work-queue-{i}')
+                   for i in range(self.threads)]
+        try:
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        finally:
+            self._stop.set()
+            heartbeat.join()
+        return results
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+ZIP 壓縮檔資料來源
+內政部實價登錄開放資料以 ZIP 壓縮檔發布（例如 113Q1.zip），此模組讓掃描與讀取流程把壓縮檔當成虛擬資料夾，
+不需先解壓縮：壓縮檔中的 CSV 以「壓縮檔路徑/成員名稱」表示（例如 113Q1.zip/a_lvr_land_a.csv），
+讀取時以 ZipFile.open 串流解壓縮（不寫出暫存檔），每個成員由各自的工作執行緒獨立開啟
+
+壓縮檔中的 manifest.csv（檔案清單與說明）與 schema-*.csv（欄位說明）不是交易資料，不會匯入；
+有 manifest.csv 時依其順序列出資料檔案，並提示清單中列出但壓縮檔中不存在的檔案
+"""
+
+import io
+import os
+import csv
+import glob
+import fnmatch
+import logging
+import zipfile
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_SUFFIX = '.zip'
+MANIFEST_NAME = 'manifest.csv'
+SCHEMA_PATTERN = 'schema-*.csv'
+
+# manifest.csv / schema-*.csv 的編碼嘗試順序
+TEXT_ENCODINGS = ['utf-8-sig', 'big5', 'cp950']
+
+
+def is_archive(path: str) -> bool:
+    """是否為 ZIP 壓縮檔"""
+    return path.lower().endswith(ARCHIVE_SUFFIX) and os.path.isfile(path)
+
+
+def folder_name(folder: str) -> str:
+    """資料夾或壓縮檔對應的季度名稱（113Q1.zip → 113Q1），寫入資料表的 quarter 欄位與 DATA_FOLDERS"""
+    name = os.path.basename(os.path.normpath(folder))
+    if name.lower().endswith(ARCHIVE_SUFFIX):
+        name = name[:-len(ARCHIVE_SUFFIX)]
+    return name
+
+
+def resolve_folder(folder: str) -> str:
+    """DATA_FOLDERS 中的名稱對應的來源：資料夾不存在但有同名 ZIP 壓縮檔時使用壓縮檔"""
+    if not os.path.isdir(folder) and is_archive(folder + ARCHIVE_SUFFIX):
+        return folder + ARCHIVE_SUFFIX
+    return folder
+
+
+def split_member_path(file_path: str) -> Optional[Tuple[str, str]]:
+    """拆解「壓縮檔路徑/成員名稱」為 (壓縮檔路徑, 成員名稱)；一般檔案回傳 None"""
+    lower = file_path.lower()
+    index = lower.find(ARCHIVE_SUFFIX + os.sep)
+    if index < 0 and os.sep != '/':
+        index = lower.find(ARCHIVE_SUFFIX + '/')
+    while index >= 0:
+        archive = file_path[:index + len(ARCHIVE_SUFFIX)]
+        if os.path.isfile(archive):
+            return archive, file_path[index + len(ARCHIVE_SUFFIX) + 1:].replace(os.sep, '/')
+        index = lower.find(ARCHIVE_SUFFIX, index + 1)
+    return None
+
+
+def is_member_path(file_path: str) -> bool:
+    """是否為壓縮檔中的成員"""
+    return split_member_path(file_path) is not None
+
+
+def is_data_csv(name: str) -> bool:
+    """是否為交易資料 CSV（排除 manifest.csv 與 schema-*.csv）"""
+    basename = os.path.basename(name.replace('\\', '/')).lower()
+    return (basename.endswith('.csv') and basename != MANIFEST_NAME
+            and not fnmatch.fnmatch(basename, SCHEMA_PATTERN))
+
+
+def _read_text_csv(data: bytes) -> List[Dict[str, str]]:
+    """依序嘗試各編碼解碼 manifest / schema 檔案"""
+    for encoding in TEXT_ENCODINGS:
+        try:
+            text = data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+        return list(csv.DictReader(io.StringIO(text)))
+    return []
+
+
+def _find_member(names: List[str], basename: str) -> Optional[str]:
+    """以檔名（不分大小寫、不論所在目錄）尋找成員"""
+    for name in names:
+        if os.path.basename(name).lower() == basename:
+            return name
+    return None
+
+
+def read_manifest(archive: str) -> List[Dict[str, str]]:
+    """讀取壓縮檔中的 manifest.csv（沒有時回傳空列表）"""
+    with zipfile.ZipFile(archive) as zf:
+        member = _find_member(zf.namelist(), MANIFEST_NAME)
+        return _read_text_csv(zf.read(member)) if member else []
+
+
+def read_schemas(archive: str) -> Dict[str, List[Dict[str, str]]]:
+    """讀取壓縮檔中所有 schema-*.csv {檔名: 欄位說明列}"""
+    with zipfile.ZipFile(archive) as zf:
+        return {
+            os.path.basename(name): _read_text_csv(zf.read(name))
+            for name in zf.namelist()
+            if fnmatch.fnmatch(os.path.basename(name).lower(), SCHEMA_PATTERN)
+        }
+
+
+def manifest_files(manifest: List[Dict[str, str]]) -> List[str]:
+    """manifest.csv 中列出的資料檔名（取每列第一個以 .csv 結尾的值）"""
+    files = []
+    for row in manifest:
+        for value in row.values():
+            if isinstance(value, str) and is_data_csv(value.strip()):
+                files.append(os.path.basename(value.strip()))
+                break
+    return files
+
+
+def list_archive_files(archive: str) -> List[str]:
+    """列出壓縮檔中的資料 CSV（成員路徑）；有 manifest.csv 時依其順序，其餘成員接在後面"""
+    with zipfile.ZipFile(archive) as zf:
+        members = [info.filename for info in zf.infolist() if not info.is_dir() and is_data_csv(info.filename)]
+        manifest_member = _find_member(zf.namelist(), MANIFEST_NAME)
+        manifest = _read_text_csv(zf.read(manifest_member)) if manifest_member else []
+
+    by_basename = {os.path.basename(name).lower(): name for name in members}
+    ordered = []
+    missing = []
+    for filename in manifest_files(manifest):
+        name = by_basename.pop(filename.lower(), None)
+        if name is None:
+            missing.append(filename)
+        else:
+            ordered.append(name)
+    if missing:
+        logger.warning(f"⚠️ {os.path.basename(archive)} 的 manifest.csv 列出 {len(missing)} 個不存在的檔案: "
+                       f"{', '.join(missing[:5])}{' ...' if len(missing) > 5 else ''}")
+
+    ordered.extend(sorted(by_basename.values()))
+    return [os.path.join(archive, name) for name in ordered]
+
+
+def list_csv_files(folder: str) -> List[str]:
+    """列出資料夾或壓縮檔中的資料 CSV"""
+    if is_archive(folder):
+        return list_archive_files(folder)
+    return sorted(path for path in glob.glob(os.path.join(folder, "*.csv")) if is_data_csv(path))
+
+
+def file_size(file_path: str) -> int:
+    """檔案大小；壓縮檔成員為解壓縮後的大小"""
+    member = split_member_path(file_path)
+    if member is None:
+        return os.path.getsize(file_path)
+    archive, name = member
+    with zipfile.ZipFile(archive) as zf:
+        return zf.getinfo(name).file_size
+
+
+def open_file(file_path: str) -> BinaryIO:
+    """
+    以二進位模式開啟檔案或壓縮檔成員（成員為串流解壓縮，不會整個載入記憶體）
+    每次呼叫都開啟獨立的 ZipFile，可在多個執行緒中同時讀取同一個壓縮檔的不同成員
+    """
+    member = split_member_path(file_path)
+    if member is None:
+        return open(file_path, 'rb')
+    archive, name = member
+    with zipfile.ZipFile(archive) as zf:
+        # 關閉 ZipFile 後，已開啟的成員仍可讀取至關閉為止
+        return zf.open(name)
+